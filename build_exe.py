@@ -29,6 +29,7 @@ build_params = [
     '--windowed',  # 不显示控制台窗口
     icon_param,  # 图标文件（如果存在）
     f'--add-data={os.path.join(current_dir, "README.md")};.',  # 包含README文件
+    f'--add-data={os.path.join(current_dir, "layouts")};layouts',  # 回单版式描述文件
     '--hidden-import=tkinter',
     '--hidden-import=tkinter.ttk',
     '--hidden-import=fitz',
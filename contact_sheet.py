@@ -0,0 +1,232 @@
+"""
+回单缩略图总览
+
+把识别到的全部回单区域排成网格，便于一眼检查有没有切错的回单：
+- iter_thumbnails：在多个工作进程中以低分辨率并行渲染缩略图，按完成顺序逐个产出，
+  界面可以边渲染边显示
+- write_contact_sheet：生成总览PDF（A4分页，回单以矢量方式放置）或PNG图片，
+  状态为"需核对"或"扫描件"的回单用红框标出
+
+命令行用法（每个源文件生成一个总览文件）：
+    python contact_sheet.py 回单1.pdf 回单2.pdf --format png
+"""
+import argparse
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import fitz  # PyMuPDF
+
+from preview_renderer import PageRasterCache
+from receipt_core import STATUS_SCANNED, analyze_document, detect_receipt_layout, open_document
+
+# 缩略图分辨率（DPI）：A4宽的回单约200像素宽
+THUMBNAIL_DPI = 24
+# 每个工作进程任务包含的回单数，减少进程间通信次数
+THUMBNAIL_CHUNK_SIZE = 8
+# 需要突出显示的回单状态
+HIGHLIGHT_STATUSES = ("需核对", STATUS_SCANNED)
+
+# 总览页面排版（单位：PDF点）
+SHEET_COLUMNS = 4
+SHEET_MARGIN = 24
+SHEET_GAP = 10
+SHEET_LABEL_HEIGHT = 11
+SHEET_FONT_SIZE = 7
+# PNG总览为一张长图，超过该高度时分为多张（PDF页面尺寸上限为14400点）
+SHEET_MAX_HEIGHT = 14400
+# PNG总览的分辨率
+SHEET_PNG_DPI = 96
+
+# 每个工作进程打开一次的源文档，同一页上的回单共用一次整页渲染
+_worker_doc = None
+_worker_cache = None
+
+
+def _init_worker(source):
+    global _worker_doc, _worker_cache
+    _worker_doc = open_document(source)
+    _worker_cache = PageRasterCache(_worker_doc)
+
+
+def _render_chunk(tasks, dpi):
+    """
+    在工作进程中渲染一组缩略图
+
+    :param tasks: 列表，每项为 (回单序号, 页面索引, 回单区域)
+    :param dpi: 分辨率
+    :return: 列表，每项为 (回单序号, PPM格式的图片数据)
+    """
+    results = []
+    for seq, page_idx, rect in tasks:
+        page = _worker_doc[page_idx]
+        results.append((seq, _worker_cache.clip_ppm(page_idx, fitz.Rect(rect) & page.rect, dpi)))
+    return results
+
+
+def iter_thumbnails(source, items, dpi=THUMBNAIL_DPI, workers=None):
+    """
+    并行渲染回单缩略图，按完成顺序逐个产出
+
+    每个工作进程只打开一次源文件。调用方提前停止迭代时，尚未开始的任务被取消。
+
+    :param source: PDF文件路径或文件内容（bytes）
+    :param items: 回单数据字典列表（需包含seq、page_idx、rect）
+    :param dpi: 缩略图分辨率
+    :param workers: 工作进程数，默认等于CPU核数
+    :return: 生成器，产出 (回单序号, PPM格式的图片数据)
+    """
+    tasks = [(item["seq"], item["page_idx"], tuple(item["rect"])) for item in items]
+    chunks = [tasks[i:i + THUMBNAIL_CHUNK_SIZE] for i in range(0, len(tasks), THUMBNAIL_CHUNK_SIZE)]
+    if not chunks:
+        return
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(source,)) as executor:
+        futures = [executor.submit(_render_chunk, chunk, dpi) for chunk in chunks]
+        try:
+            for future in as_completed(futures):
+                for result in future.result():
+                    yield result
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def thumbnail_label(item):
+    """
+    缩略图下方的说明文字（只含ASCII字符，不需要嵌入中文字体；未识别的回单编号显示为"-"）
+
+    :param item: 回单数据字典
+    :return: 字符串，如 "#12  12345678901234567890  1234.56"
+    """
+    receipt_no = item.get("no", "")
+    if not receipt_no.isascii():
+        receipt_no = "-"
+    return f"#{item.get('seq')}  {receipt_no}  {item.get('amt', '')}"
+
+
+def _sheet_cell_size(doc, items, columns, page_width):
+    """
+    :return: (单元格宽度, 缩略图区域高度)，高度按最扁长的回单比例统一
+    """
+    cell_width = (page_width - 2 * SHEET_MARGIN - (columns - 1) * SHEET_GAP) / columns
+    aspect = 0
+    for item in items:
+        clip = fitz.Rect(item["rect"]) & doc[item["page_idx"]].rect
+        if clip.width > 0:
+            aspect = max(aspect, clip.height / clip.width)
+    return cell_width, cell_width * (aspect or 1)
+
+
+def build_contact_sheet(doc, items, columns=SHEET_COLUMNS, page_width=None, page_height=None):
+    """
+    生成总览文档
+
+    回单区域用show_pdf_page放置，来自同一源页面的回单共用同一个XObject。
+
+    :param doc: 源fitz.Document对象
+    :param items: 回单数据字典列表
+    :param columns: 每行的回单数
+    :param page_width: 页面宽度，默认A4宽
+    :param page_height: 页面高度，默认A4高；传0时每页尽量长（用于生成PNG长图）
+    :return: 新的fitz.Document对象（调用方负责关闭）
+    """
+    a4 = fitz.paper_rect("a4")
+    page_width = page_width or a4.width
+    if page_height is None:
+        page_height = a4.height
+    out_doc = fitz.open()
+    if not items:
+        return out_doc
+
+    cell_width, thumb_height = _sheet_cell_size(doc, items, columns, page_width)
+    row_height = thumb_height + SHEET_LABEL_HEIGHT + SHEET_GAP
+    total_rows = int(math.ceil(len(items) / float(columns)))
+    max_height = page_height or SHEET_MAX_HEIGHT
+    rows_per_page = max(1, int((max_height - 2 * SHEET_MARGIN + SHEET_GAP) // row_height))
+
+    for first_row in range(0, total_rows, rows_per_page):
+        page_rows = min(rows_per_page, total_rows - first_row)
+        height = page_height or (2 * SHEET_MARGIN + page_rows * row_height - SHEET_GAP)
+        page = out_doc.new_page(width=page_width, height=height)
+        page_items = items[first_row * columns:(first_row + page_rows) * columns]
+        for index, item in enumerate(page_items):
+            row, col = divmod(index, columns)
+            x0 = SHEET_MARGIN + col * (cell_width + SHEET_GAP)
+            y0 = SHEET_MARGIN + row * row_height
+            cell = fitz.Rect(x0, y0, x0 + cell_width, y0 + thumb_height)
+            clip = fitz.Rect(item["rect"]) & doc[item["page_idx"]].rect
+            if not clip.is_empty:
+                page.show_pdf_page(cell, doc, item["page_idx"], clip=clip)
+            highlight = item.get("status") in HIGHLIGHT_STATUSES
+            color = (0.85, 0, 0) if highlight else (0.6, 0.6, 0.6)
+            page.draw_rect(cell, color=color, width=1.5 if highlight else 0.5)
+            label = thumbnail_label(item)
+            # 说明文字过长时缩小字号，不超出单元格
+            label_width = fitz.get_text_length(label, fontsize=SHEET_FONT_SIZE)
+            font_size = min(SHEET_FONT_SIZE, SHEET_FONT_SIZE * cell_width / label_width)
+            page.insert_text((x0, cell.y1 + SHEET_FONT_SIZE + 2), label, fontsize=font_size,
+                             color=(0.85, 0, 0) if highlight else (0, 0, 0))
+    return out_doc
+
+
+def write_contact_sheet(doc, items, output_path, columns=SHEET_COLUMNS):
+    """
+    生成总览文件
+
+    扩展名为.png时生成长图（过长时分为多张，文件名追加_2、_3……），否则生成A4分页的PDF。
+    重复页上的回单（带duplicate_of）不放入。
+
+    :param doc: 源fitz.Document对象
+    :param items: 回单数据字典列表
+    :param output_path: 输出文件路径（.pdf 或 .png）
+    :param columns: 每行的回单数
+    :return: 生成的文件路径列表
+    """
+    items = [item for item in items if not item.get("duplicate_of")]
+    is_png = os.path.splitext(output_path)[1].lower() == ".png"
+    sheet = build_contact_sheet(doc, items, columns, page_height=0 if is_png else None)
+    try:
+        if not is_png:
+            sheet.save(output_path, garbage=3, deflate=True)
+            return [output_path]
+        paths = []
+        stem, ext = os.path.splitext(output_path)
+        for page_idx, page in enumerate(sheet):
+            path = output_path if page_idx == 0 else f"{stem}_{page_idx + 1}{ext}"
+            page.get_pixmap(dpi=SHEET_PNG_DPI).save(path)
+            paths.append(path)
+        return paths
+    finally:
+        sheet.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成回单缩略图总览（PDF或PNG）")
+    parser.add_argument("pdf_files", nargs="+", help="回单PDF文件")
+    parser.add_argument("--format", choices=["pdf", "png"], default="pdf", help="总览格式，默认pdf")
+    parser.add_argument("--columns", type=int, default=SHEET_COLUMNS, help="每行的回单数")
+    parser.add_argument("-o", "--output-dir", default=None, help="输出目录，默认与源文件相同")
+    args = parser.parse_args()
+
+    for pdf_file in args.pdf_files:
+        doc = open_document(pdf_file)
+        try:
+            layout, msg = detect_receipt_layout(doc)
+            if layout is None:
+                print(f"跳过 {pdf_file}: {msg}", file=sys.stderr)
+                continue
+            items = list(analyze_document(doc, pdf_file, layout=layout))
+            stem = os.path.splitext(os.path.basename(pdf_file))[0]
+            output_dir = args.output_dir or os.path.dirname(os.path.abspath(pdf_file))
+            output_path = os.path.join(output_dir, f"{stem}_总览.{args.format}")
+            paths = write_contact_sheet(doc, items, output_path, args.columns)
+            highlighted = sum(1 for item in items if item.get("status") in HIGHLIGHT_STATUSES)
+            print(f"{pdf_file}: {len(items)} 条回单（{highlighted} 条需核对）-> {', '.join(paths)}")
+        finally:
+            doc.close()
+
+
+if __name__ == "__main__":
+    main()
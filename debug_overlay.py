@@ -0,0 +1,156 @@
+"""
+回单识别的调试叠加层
+
+把识别结果画在页面图上，切错的回单一眼就能看出原因：
+- 回单区域（receipt_rects）：红框，左上角标注回单序号
+- 锚点（如"回单编号"、"金额（小写）"）：蓝框
+- 提取出的字段值所在的文字：绿框，旁边标注字段名
+  （锚点找到了但字段值不符合格式时为橙框）
+
+界面中勾选预览区下方的"调试叠加"后在预览上显示；也可以在命令行中为指定页面生成PNG图片。
+
+命令行用法：
+    python debug_overlay.py 回单.pdf --page 3 -o 第3页.png
+    python debug_overlay.py 回单.pdf             # 每页生成一张，保存在源文件旁
+"""
+import argparse
+import os
+import sys
+
+import fitz  # PyMuPDF
+
+from receipt_core import analyze_document, detect_receipt_layout, get_default_layout, get_layouts, open_document
+from receipt_layout import WordIndex
+
+# 叠加层元素的类型
+SHAPE_RECEIPT = "receipt"
+SHAPE_ANCHOR = "anchor"
+SHAPE_FIELD = "field"
+SHAPE_UNMATCHED = "unmatched"
+
+# 各类型的颜色（RGB，0~1）
+OVERLAY_COLORS = {
+    SHAPE_RECEIPT: (0.85, 0, 0),
+    SHAPE_ANCHOR: (0, 0.35, 0.9),
+    SHAPE_FIELD: (0, 0.6, 0),
+    SHAPE_UNMATCHED: (1.0, 0.55, 0),
+}
+# 调试图片的分辨率
+OVERLAY_DPI = 100
+OVERLAY_FONT_SIZE = 6
+
+
+def overlay_shapes(page, receipt_rects, layout=None, labels=None):
+    """
+    计算叠加层元素（PDF坐标）
+
+    :param page: fitz.Page对象
+    :param receipt_rects: 页面上的回单区域列表
+    :param layout: 可选，CompiledLayout对象，默认使用农行版式
+    :param labels: 可选，与receipt_rects对应的标注文字（如回单序号）
+    :return: 列表，每项为 (类型, fitz.Rect, 标注文字)
+    """
+    layout = layout or get_default_layout()
+    shapes = []
+    for idx, rect in enumerate(receipt_rects):
+        rect = fitz.Rect(rect)
+        shapes.append((SHAPE_RECEIPT, rect, labels[idx] if labels else f"#{idx + 1}"))
+        words = page.get_text("words", clip=rect)
+        if not words:
+            continue
+        index = WordIndex(words)
+        for field_name in layout.fields:
+            found = layout.locate(field_name, index)
+            if found is None:
+                continue
+            value, anchor_rect, value_rects = found
+            shapes.append((SHAPE_ANCHOR, fitz.Rect(anchor_rect), ""))
+            if value_rects:
+                box = fitz.Rect(value_rects[0])
+                for value_rect in value_rects[1:]:
+                    box |= value_rect
+                shapes.append((SHAPE_FIELD if value else SHAPE_UNMATCHED, box, field_name))
+    return shapes
+
+
+def page_overlay_shapes(doc, page_idx, items):
+    """
+    一个页面上全部回单的叠加层元素
+
+    :param doc: fitz.Document对象
+    :param page_idx: 页面索引
+    :param items: 回单数据字典列表（只使用该页上的回单，版式按各回单的bank字段选择）
+    :return: 列表，每项为 (类型, fitz.Rect, 标注文字)
+    """
+    page = doc[page_idx]
+    layouts = get_layouts()
+    shapes = []
+    for item in items:
+        if item['page_idx'] != page_idx:
+            continue
+        layout = layouts.get(item.get('bank')) or get_default_layout()
+        shapes.extend(overlay_shapes(page, [item['rect']], layout, [f"#{item['seq']}"]))
+    return shapes
+
+
+def render_overlay_pixmap(page, shapes, dpi=OVERLAY_DPI):
+    """
+    渲染带叠加层的页面图
+
+    页面以矢量方式放到临时文档中再画上叠加层，原文档不被修改。
+
+    :param page: fitz.Page对象
+    :param shapes: overlay_shapes的结果
+    :param dpi: 分辨率
+    :return: fitz.Pixmap
+    """
+    scratch = fitz.open()
+    try:
+        canvas = scratch.new_page(width=page.rect.width, height=page.rect.height)
+        canvas.show_pdf_page(canvas.rect, page.parent, page.number)
+        # 显示的页面以左上角为原点，回单坐标按页面原点平移
+        offset = fitz.Point(page.rect.x0, page.rect.y0)
+        for kind, rect, label in shapes:
+            rect = fitz.Rect(rect) - (offset.x, offset.y, offset.x, offset.y)
+            color = OVERLAY_COLORS[kind]
+            canvas.draw_rect(rect, color=color, width=1.5 if kind == SHAPE_RECEIPT else 0.7)
+            if label and label.isascii():
+                canvas.insert_text((rect.x0 + 2, rect.y0 + OVERLAY_FONT_SIZE + 1) if kind == SHAPE_RECEIPT
+                                   else (rect.x1 + 2, rect.y1), label, fontsize=OVERLAY_FONT_SIZE, color=color)
+        return canvas.get_pixmap(dpi=dpi, alpha=False)
+    finally:
+        scratch.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把回单区域、锚点和字段位置画在页面上，生成调试图片")
+    parser.add_argument("pdf_file", help="回单PDF文件")
+    parser.add_argument("--page", type=int, action="append", default=[], help="页码（从1开始，可重复指定），默认全部页面")
+    parser.add_argument("-o", "--output", default=None, help="输出PNG路径（只指定一页时有效）")
+    parser.add_argument("--dpi", type=int, default=OVERLAY_DPI, help="图片分辨率")
+    args = parser.parse_args()
+
+    doc = open_document(args.pdf_file)
+    try:
+        layout, msg = detect_receipt_layout(doc)
+        if layout is None:
+            print(f"{args.pdf_file}: {msg}", file=sys.stderr)
+            sys.exit(1)
+        items = list(analyze_document(doc, args.pdf_file, layout=layout))
+        pages = [number - 1 for number in args.page] or list(range(len(doc)))
+        stem = os.path.splitext(args.pdf_file)[0]
+        for page_idx in pages:
+            if not 0 <= page_idx < len(doc):
+                print(f"页码 {page_idx + 1} 超出范围", file=sys.stderr)
+                continue
+            shapes = page_overlay_shapes(doc, page_idx, items)
+            output = args.output if args.output and len(pages) == 1 else f"{stem}_调试_第{page_idx + 1}页.png"
+            render_overlay_pixmap(doc[page_idx], shapes, args.dpi).save(output)
+            receipt_count = sum(1 for kind, _, _ in shapes if kind == SHAPE_RECEIPT)
+            print(f"第 {page_idx + 1} 页: {receipt_count} 张回单 -> {output}")
+    finally:
+        doc.close()
+
+
+if __name__ == "__main__":
+    main()
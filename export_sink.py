@@ -0,0 +1,478 @@
+"""
+导出目标
+
+拆分后的回单可以写入本地文件夹，也可以直接上传到S3兼容的对象存储（如MinIO），
+不需要先导出到本地再复制一遍：
+- LocalDirectorySink：写入本地文件夹（先写.part临时文件再改名）
+- S3Sink：回单PDF在内存中生成后直接上传，不产生本地临时文件。多个线程共用同一个
+  连接池并发上传，较大的文件（如合并导出的PDF）自动分块上传，失败的请求自动重试
+- export_to_sink / export_combined_to_sink：把回单逐张或合并后交给导出目标
+
+S3Sink需要安装boto3（可选依赖，只导出到本地时不需要）。访问密钥和服务地址
+按boto3的默认方式读取（环境变量AWS_ACCESS_KEY_ID、AWS_SECRET_ACCESS_KEY、
+AWS_ENDPOINT_URL或~/.aws配置文件），也可以在命令行中指定服务地址。
+
+命令行用法：
+    python export_sink.py 回单.pdf s3://bucket/回单/2024-03 --endpoint-url http://127.0.0.1:9000
+    python export_sink.py 回单.pdf D:/回单导出 --mode clip --trim
+"""
+import argparse
+import csv
+import io
+import mimetypes
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from receipt_core import (DUPLICATE_EXPORT, DUPLICATE_SKIP, EXPORT_MODE_CLIP, EXPORT_MODE_CROPBOX, LOG_HEADER,
+                          SHARD_BY_COUNTERPARTY, SHARD_BY_DATE, SHARD_NONE, analyze_document,
+                          build_combined_document, build_receipt_filename, crop_receipt, detect_receipt_layout,
+                          open_document, receipt_clean_text, shard_dirname, write_bytes_atomic)
+from receipt_manifest import MANIFEST_HEADER, bytes_sha256, manifest_filename, manifest_row, source_sha256
+
+# 对象存储地址的前缀
+S3_SCHEME = "s3://"
+# 并发上传的线程数（同时也是连接池大小）
+UPLOAD_WORKERS = 8
+# 超过该大小的文件分块上传（字节）
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+# 分块大小（字节）
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+# 单个请求失败后由boto3重试的次数（含首次请求）
+REQUEST_ATTEMPTS = 5
+# 整个文件上传失败后重新上传的次数（含首次上传）
+UPLOAD_ATTEMPTS = 3
+# 重新上传前的等待时间（秒），每次翻倍
+UPLOAD_RETRY_DELAY = 1.0
+
+
+def _content_type(key):
+    """按扩展名确定上传时的Content-Type"""
+    return mimetypes.guess_type(key)[0] or "application/octet-stream"
+
+
+class LocalDirectorySink:
+    """
+    写入本地文件夹的导出目标
+
+    文件名中的"/"表示子文件夹，不存在时自动创建。
+    """
+
+    def __init__(self, output_dir):
+        """
+        :param output_dir: 输出目录路径
+        """
+        self.output_dir = output_dir
+
+    def _path(self, key):
+        return os.path.join(self.output_dir, *key.split("/"))
+
+    def existing_keys(self):
+        """
+        输出目录中已有的文件
+
+        :return: 集合，元素为相对输出目录、以"/"分隔的文件名
+        """
+        keys = set()
+        for directory, _, filenames in os.walk(self.output_dir):
+            relative = os.path.relpath(directory, self.output_dir).replace(os.sep, "/")
+            prefix = "" if relative == "." else relative + "/"
+            keys.update(prefix + filename for filename in filenames)
+        return keys
+
+    def location(self, key):
+        """:return: 文件的完整路径（记录在已导出索引中）"""
+        return self._path(key)
+
+    def write(self, key, data):
+        """
+        写入一个文件（先写入临时文件再改名）
+
+        :param key: 相对输出目录的文件名，以"/"分隔子文件夹
+        :param data: 文件内容（bytes）
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_bytes_atomic(data, path)
+
+    def flush(self):
+        """
+        等待全部写入完成
+
+        :return: 字典 {文件名: 错误信息}，本地写入是同步的，失败时write直接抛出异常，这里总是返回空字典
+        """
+        return {}
+
+    def close(self):
+        """关闭导出目标"""
+
+    def __str__(self):
+        return self.output_dir
+
+
+class S3Sink:
+    """
+    上传到S3兼容对象存储的导出目标
+
+    write只把数据交给上传线程池就返回，调用方可以继续生成下一张回单；
+    排队中的文件数有上限，上传跟不上时write会等待，内存占用不会随回单数量增长。
+    所有线程共用同一个boto3客户端（连接池大小等于线程数）。
+    """
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, max_workers=UPLOAD_WORKERS,
+                 multipart_threshold=MULTIPART_THRESHOLD, client=None):
+        """
+        :param bucket: 存储桶名称
+        :param prefix: 对象名前缀（相当于输出目录），如"回单/2024-03"
+        :param endpoint_url: 可选，S3兼容服务的地址（如MinIO的http://127.0.0.1:9000），默认按boto3配置
+        :param max_workers: 并发上传的线程数
+        :param multipart_threshold: 超过该大小的文件分块上传（字节）
+        :param client: 可选，已创建的boto3 S3客户端
+        """
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("上传到对象存储需要安装boto3：pip install boto3")
+
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        if client is None:
+            client = boto3.session.Session().client(
+                "s3", endpoint_url=endpoint_url,
+                config=Config(max_pool_connections=max_workers,
+                              retries={"max_attempts": REQUEST_ATTEMPTS, "mode": "standard"}))
+        self.client = client
+        # 大文件的各个分块由boto3另开线程并发上传，取较小的并发数，多个大文件同时上传时不会挤占连接池
+        self.transfer_config = TransferConfig(multipart_threshold=multipart_threshold,
+                                              multipart_chunksize=MULTIPART_CHUNKSIZE,
+                                              max_concurrency=max(1, max_workers // 2))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+        self._lock = threading.Lock()
+        self._futures = []
+        self.failed = {}
+
+    def object_key(self, key):
+        """:return: 存储桶中的完整对象名"""
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def existing_keys(self):
+        """
+        前缀下已有的对象（分页列出，每页最多1000个）
+
+        :return: 集合，元素为相对前缀的对象名
+        """
+        keys = set()
+        list_prefix = self.prefix + "/" if self.prefix else ""
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=list_prefix):
+            for obj in page.get("Contents", []):
+                keys.add(obj["Key"][len(list_prefix):])
+        return keys
+
+    def location(self, key):
+        """:return: 对象地址，如 s3://bucket/回单/xxx.pdf（记录在已导出索引中）"""
+        return f"{S3_SCHEME}{self.bucket}/{self.object_key(key)}"
+
+    def write(self, key, data):
+        """
+        提交一个文件上传（不等待上传完成）
+
+        :param key: 相对前缀的对象名，以"/"分隔
+        :param data: 文件内容（bytes）
+        """
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._upload, key, data)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda f: self._slots.release())
+        with self._lock:
+            self._futures.append(future)
+
+    def _upload(self, key, data):
+        """在上传线程中执行，整个文件失败后按间隔重新上传"""
+        extra_args = {"ContentType": _content_type(key)}
+        delay = UPLOAD_RETRY_DELAY
+        for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+            try:
+                self.client.upload_fileobj(io.BytesIO(data), self.bucket, self.object_key(key),
+                                           ExtraArgs=extra_args, Config=self.transfer_config)
+                return
+            except Exception as e:
+                if attempt == UPLOAD_ATTEMPTS:
+                    with self._lock:
+                        self.failed[key] = str(e)
+                    return
+                time.sleep(delay)
+                delay *= 2
+
+    def flush(self):
+        """
+        等待已提交的上传全部完成
+
+        :return: 字典 {对象名: 错误信息}，只包含本次flush前提交且最终失败的文件
+        """
+        with self._lock:
+            futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+        with self._lock:
+            failed, self.failed = self.failed, {}
+        return failed
+
+    def close(self):
+        """等待上传完成并关闭线程池"""
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+    def __str__(self):
+        return self.location("").rstrip("/")
+
+
+def parse_s3_url(url):
+    """
+    解析对象存储地址
+
+    :param url: 如 s3://bucket/回单/2024-03
+    :return: 元组 (存储桶名称, 前缀)
+    :raises ValueError: 地址格式不正确
+    """
+    if not url.startswith(S3_SCHEME):
+        raise ValueError(f"对象存储地址应以 {S3_SCHEME} 开头: {url}")
+    bucket, _, prefix = url[len(S3_SCHEME):].partition("/")
+    if not bucket:
+        raise ValueError(f"对象存储地址缺少存储桶名称: {url}")
+    return bucket, prefix.strip("/")
+
+
+def open_export_sink(target, endpoint_url=None, max_workers=UPLOAD_WORKERS):
+    """
+    按目标地址创建导出目标
+
+    :param target: 本地目录路径，或 s3://存储桶/前缀
+    :param endpoint_url: 仅对象存储有效，S3兼容服务的地址
+    :param max_workers: 仅对象存储有效，并发上传的线程数
+    :return: LocalDirectorySink 或 S3Sink 对象（调用方负责close）
+    """
+    if target.startswith(S3_SCHEME):
+        bucket, prefix = parse_s3_url(target)
+        return S3Sink(bucket, prefix, endpoint_url=endpoint_url, max_workers=max_workers)
+    return LocalDirectorySink(target)
+
+
+def receipt_pdf_bytes(doc, item, export_mode=EXPORT_MODE_CROPBOX, trim=False):
+    """
+    在内存中生成单张回单的PDF
+
+    :param doc: 源fitz.Document对象
+    :param item: 回单数据字典
+    :param export_mode: EXPORT_MODE_CROPBOX 或 EXPORT_MODE_CLIP
+    :param trim: 仅EXPORT_MODE_CLIP有效，是否删除回单区域以外的内容
+    :return: PDF文件内容（bytes）
+    """
+    new_doc = crop_receipt(doc, item, export_mode, trim)
+    try:
+        if export_mode == EXPORT_MODE_CLIP:
+            return new_doc.tobytes(garbage=3, deflate=True)
+        return new_doc.tobytes()
+    finally:
+        new_doc.close()
+
+
+def export_to_sink(doc, source_file, items, sink, progress_callback=None, export_index=None,
+                   duplicate_mode=DUPLICATE_SKIP, export_mode=EXPORT_MODE_CROPBOX, trim=False, shard_by=SHARD_NONE,
+                   archive=None):
+    """
+    将回单逐张生成PDF并写入导出目标，最后写入CSV格式的处理日志和完整性清单
+
+    与export_receipts的命名、分子文件夹和日志格式一致：导出目标中已有的文件名只列出一次，
+    重名在内存中追加序号。对象存储不支持链接，已导出过的回单在DUPLICATE_LINK方式下也跳过；
+    不记录中断进度（上传失败的回单记录在日志中，重新导出时按已导出索引只补传这些回单）。
+    清单（见receipt_manifest.py）中只记录写入成功的回单，SHA-256由上传前内存中的PDF数据计算。
+
+    :param doc: 源fitz.Document对象
+    :param source_file: 源文件路径（写入日志的原文件名）
+    :param items: 回单数据字典列表
+    :param sink: LocalDirectorySink 或 S3Sink 对象
+    :param progress_callback: 可选的进度回调，参数为(已处理数量, 总数量)
+    :param export_index: 可选的ExportIndex对象，上传成功的回单按导出目标中的地址写入索引
+    :param duplicate_mode: 已导出回单的处理方式，DUPLICATE_SKIP / DUPLICATE_LINK / DUPLICATE_EXPORT
+    :param export_mode: EXPORT_MODE_CROPBOX 或 EXPORT_MODE_CLIP
+    :param trim: 仅EXPORT_MODE_CLIP有效，是否删除回单区域以外的内容
+    :param shard_by: 子文件夹分组方式，SHARD_NONE / SHARD_BY_COUNTERPARTY / SHARD_BY_DATE
+    :param archive: 可选的ArchiveIndex对象，上传成功的回单按导出目标中的地址写入全文检索索引
+    :return: 元组(success_count, skipped_count, failed_count, log_filename)
+    """
+    existing_map = {}
+    if export_index is not None and duplicate_mode != DUPLICATE_EXPORT:
+        existing_map = export_index.lookup_many(items)
+    taken = {key.lower() for key in sink.existing_keys()}
+    source_basename = os.path.basename(source_file) if isinstance(source_file, str) else ""
+
+    source_hash = source_sha256(source_file)
+    rows = []      # 日志行，上传结果确定后再写入状态
+    written = []   # (日志行位置, 回单数据字典, 对象名, SHA-256, 字节数)
+    skipped_count = 0
+    failed_count = 0
+    total = len(items)
+    for done, item in enumerate(items, 1):
+        filename = build_receipt_filename(item)
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            if item.get('duplicate_of'):
+                rows.append([source_basename, filename, now, f"与序号 {item['duplicate_of']} 的回单在重复页上，跳过"])
+                skipped_count += 1
+                continue
+
+            existing = existing_map.get(item.get('content_hash'))
+            if existing and (existing['output_path'].startswith(S3_SCHEME) or
+                             os.path.exists(existing['output_path'])):
+                rows.append([source_basename, filename, now, f"已导出过，跳过（{existing['output_path']}）"])
+                skipped_count += 1
+                continue
+
+            subdir = shard_dirname(item, shard_by)
+            prefix = subdir + "/" if subdir else ""
+            counter = 0
+            while (prefix + filename).lower() in taken:
+                counter += 1
+                filename = build_receipt_filename(item, counter)
+            key = prefix + filename
+            taken.add(key.lower())
+
+            data = receipt_pdf_bytes(doc, item, export_mode, trim)
+            sink.write(key, data)
+            written.append((len(rows), item, key, bytes_sha256(data), len(data)))
+            rows.append([source_basename, key, now, "成功"])
+        except Exception as item_error:
+            failed_count += 1
+            rows.append([source_basename, filename, now, f"失败: {item_error}"])
+        finally:
+            if progress_callback:
+                progress_callback(done, total)
+
+    failures = sink.flush()
+    success_count = 0
+    manifest_rows = []
+    for row_idx, item, key, sha256, size in written:
+        if key in failures:
+            failed_count += 1
+            rows[row_idx][3] = f"失败: {failures[key]}"
+            continue
+        success_count += 1
+        manifest_rows.append(manifest_row(key, sha256, size, source_basename, source_hash, item))
+        if export_index is not None:
+            export_index.add(item, sink.location(key), source_file)
+        if archive is not None:
+            archive.add(item, sink.location(key), source_file,
+                        receipt_clean_text(doc[item['page_idx']], item['rect']))
+
+    log_stem = f"log_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    log_filename = f"{log_stem}.csv"
+    counter = 0
+    while log_filename.lower() in taken or manifest_filename(log_filename).lower() in taken:
+        counter += 1
+        log_filename = f"{log_stem}_{counter}.csv"
+    sink.write(log_filename, _csv_bytes(LOG_HEADER, rows))
+    sink.write(manifest_filename(log_filename), _csv_bytes(MANIFEST_HEADER, manifest_rows))
+    log_failures = sink.flush()
+    for filename in (log_filename, manifest_filename(log_filename)):
+        if filename in log_failures:
+            raise Exception(f"{filename} 上传失败: {log_failures[filename]}")
+    return success_count, skipped_count, failed_count, log_filename
+
+
+def _csv_bytes(header, rows):
+    """:return: CSV文件内容（UTF-8带BOM，Excel可直接打开）"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8-sig")
+
+
+def export_combined_to_sink(doc, items, sink, filename, trim=False, progress_callback=None):
+    """
+    将所有回单合并为一个PDF写入导出目标（对象存储中较大的文件自动分块上传）
+
+    :param doc: 源fitz.Document对象
+    :param items: 回单数据字典列表
+    :param sink: LocalDirectorySink 或 S3Sink 对象
+    :param filename: 合并后的文件名
+    :param trim: 是否删除每张回单区域以外的内容
+    :param progress_callback: 可选的进度回调，参数为(已处理数量, 总数量)
+    :return: 成功放入的回单数量
+    """
+    out_doc, placed = build_combined_document(doc, items, trim, progress_callback)
+    try:
+        write_document_to_sink(out_doc, sink, filename)
+    finally:
+        out_doc.close()
+    return placed
+
+
+def write_document_to_sink(pdf_doc, sink, filename):
+    """
+    将已生成的PDF文档写入导出目标，并等待写入完成
+
+    :param pdf_doc: fitz.Document对象（不会被关闭）
+    :param sink: LocalDirectorySink 或 S3Sink 对象
+    :param filename: 文件名（对象名）
+    :raises Exception: 上传失败
+    """
+    sink.write(filename, pdf_doc.tobytes(garbage=3, deflate=True))
+    failures = sink.flush()
+    if filename in failures:
+        raise Exception(f"上传失败: {failures[filename]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="拆分回单并写入本地文件夹或S3兼容的对象存储")
+    parser.add_argument("pdf_file", help="回单PDF文件")
+    parser.add_argument("target", help="本地输出目录，或 s3://存储桶/前缀")
+    parser.add_argument("--endpoint-url", default=None, help="S3兼容服务的地址，如 http://127.0.0.1:9000")
+    parser.add_argument("--workers", type=int, default=UPLOAD_WORKERS, help="并发上传的线程数")
+    parser.add_argument("--mode", choices=[EXPORT_MODE_CROPBOX, EXPORT_MODE_CLIP, "combined"],
+                        default=EXPORT_MODE_CROPBOX, help="导出方式：整页裁剪、仅回单区域或合并为一个PDF")
+    parser.add_argument("--trim", action="store_true", help="删除回单区域以外的内容（clip和combined方式有效）")
+    parser.add_argument("--shard", choices=["none", SHARD_BY_COUNTERPARTY, SHARD_BY_DATE], default="none",
+                        help="按客户名称或回单日期分子文件夹")
+    parser.add_argument("--company", action="append", default=[], help="本方公司户名（可重复指定）")
+    args = parser.parse_args()
+
+    doc = open_document(args.pdf_file)
+    try:
+        layout, msg = detect_receipt_layout(doc)
+        if layout is None:
+            print(f"{args.pdf_file}: {msg}", file=sys.stderr)
+            sys.exit(1)
+        items = list(analyze_document(doc, args.pdf_file, args.company, layout=layout))
+        sink = open_export_sink(args.target, endpoint_url=args.endpoint_url, max_workers=args.workers)
+        try:
+            if args.mode == "combined":
+                stem = os.path.splitext(os.path.basename(args.pdf_file))[0]
+                filename = f"{stem}_合并_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+                placed = export_combined_to_sink(doc, items, sink, filename, trim=args.trim)
+                print(f"{placed} 张回单已合并导出至 {sink.location(filename)}")
+                return
+            shard_by = SHARD_NONE if args.shard == "none" else args.shard
+            success, skipped, failed, log_filename = export_to_sink(
+                doc, args.pdf_file, items, sink, export_mode=args.mode, trim=args.trim, shard_by=shard_by)
+            print(f"成功 {success} 个，跳过 {skipped} 个，失败 {failed} 个，日志: {sink.location(log_filename)}")
+            if failed:
+                sys.exit(1)
+        finally:
+            sink.close()
+    finally:
+        doc.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+后台线程到图形界面的消息传递
+
+- GuiDispatcher：后台线程提交的界面更新放入队列，只在有新消息时唤醒主线程执行，
+  空闲时不再定时轮询
+- ProgressThrottle：在后台线程中记录进度计数，按固定间隔合并后才提交给界面，
+  导出数千张回单时状态栏每秒只重绘几次
+"""
+import queue
+import threading
+import time
+import traceback
+
+import tkinter as tk
+
+# 唤醒主线程的虚拟事件
+WAKE_EVENT = "<<GuiDispatch>>"
+# 主线程每次最多连续执行的界面更新数量，超出后先让界面重绘再继续
+MAX_BATCH = 200
+# Tcl未启用线程支持时退回定时轮询的间隔（毫秒）
+POLL_INTERVAL = 100
+# 进度提交的最小间隔（秒）
+PROGRESS_INTERVAL = 0.25
+
+
+class GuiDispatcher:
+    """
+    线程安全的界面更新队列
+
+    任意线程调用post提交更新，队列由空变为非空时通过虚拟事件唤醒主线程一次，
+    主线程在事件处理中执行队列中的全部更新。
+    Tcl未启用线程支持（不能从其他线程产生事件）时退回定时轮询。
+    """
+
+    def __init__(self, root):
+        """
+        :param root: tk.Tk根窗口（必须在主线程中创建本对象）
+        """
+        self.root = root
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._wake_pending = False
+        self._closed = False
+        self.event_driven = root.tk.eval("info exists tcl_platform(threaded)") == "1"
+        if self.event_driven:
+            root.bind(WAKE_EVENT, lambda event: self.drain())
+        else:
+            self._poll()
+
+    def post(self, callback, *args):
+        """
+        提交一个界面更新（可在任意线程中调用）
+
+        :param callback: 在主线程中执行的函数
+        :param args: 传给callback的参数
+        """
+        self._queue.put((callback, args))
+        if not self.event_driven or self._closed:
+            return
+        with self._lock:
+            if self._wake_pending:
+                return
+            self._wake_pending = True
+        self._wake()
+
+    def close(self):
+        """窗口关闭后不再唤醒主线程"""
+        self._closed = True
+
+    def _wake(self):
+        try:
+            self.root.event_generate(WAKE_EVENT, when="tail")
+        except (tk.TclError, RuntimeError):
+            # 窗口已关闭或主循环已退出
+            pass
+
+    def drain(self):
+        """
+        执行队列中的界面更新（在主线程中执行）
+
+        每次最多执行MAX_BATCH个，剩余的在界面处理完其他事件后继续，
+        后台线程大量提交时界面仍能响应。
+        单个更新出错时打印错误并继续执行后面的更新：否则剩余的更新（如导出结束后恢复按钮状态）
+        要等到下一次post才会执行，而任务结束时可能不再有新的提交。
+        """
+        with self._lock:
+            self._wake_pending = False
+        for _ in range(MAX_BATCH):
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                callback(*args)
+            except Exception:
+                traceback.print_exc()
+        if self.event_driven and not self._queue.empty():
+            with self._lock:
+                if self._wake_pending:
+                    return
+                self._wake_pending = True
+            self.root.after(1, self.drain)
+
+    def _poll(self):
+        if self._closed:
+            return
+        self.drain()
+        self.root.after(POLL_INTERVAL, self._poll)
+
+
+class ProgressThrottle:
+    """
+    进度回调的限频包装（在后台线程中调用）
+
+    每次调用只更新计数，距上次提交超过interval秒或已全部完成时才调用publish，
+    调用方不需要读取界面控件的状态。
+    """
+
+    def __init__(self, publish, interval=PROGRESS_INTERVAL):
+        """
+        :param publish: 实际提交进度的函数，参数为(已处理数量, 总数量)
+        :param interval: 两次提交的最小间隔（秒）
+        """
+        self.publish = publish
+        self.interval = interval
+        self.done = 0
+        self.total = 0
+        self._last_publish = None
+
+    def __call__(self, done, total):
+        self.done, self.total = done, total
+        now = time.monotonic()
+        if done >= total or self._last_publish is None or now - self._last_publish >= self.interval:
+            self._last_publish = now
+            self.publish(done, total)
@@ -1,20 +1,81 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, simpledialog
 import fitz  # PyMuPDF
-import pdfplumber  # 用于表格提取
 import re
 import os
+import multiprocessing
 import threading
+import time
 from datetime import datetime
-import csv
-from operator import itemgetter
-import queue
 
-# --- Pre-compiled Regular Expressions for Performance and Maintainability ---
-# Regex for a 20-digit receipt number
-RECEIPT_NO_REGEX_20 = re.compile(r'(\d{20})')
-# Regex for finding a 20-digit number after the label
-RECEIPT_NO_LABEL_REGEX_20 = re.compile(r'回单编号[：:\s]*(\d{20})')
+from receipt_core import (DUPLICATE_EXPORT, DUPLICATE_LINK, DUPLICATE_SKIP, EXPORT_MODE_CLIP, EXPORT_MODE_CROPBOX,
+                          SHARD_BY_COUNTERPARTY, SHARD_BY_DATE, SHARD_NONE, STATUS_SCANNED, analyze_document,
+                          clean_filename,
+                          detect_receipt_layout, export_combined, export_receipts, load_export_journal,
+                          load_own_companies, plan_export, receipt_clean_text, remap_counterparties,
+                          save_own_companies)
+from debug_overlay import OVERLAY_COLORS, SHAPE_RECEIPT, page_overlay_shapes
+from contact_sheet import HIGHLIGHT_STATUSES, THUMBNAIL_DPI, iter_thumbnails, thumbnail_label, write_contact_sheet
+from export_sink import (S3_SCHEME, S3Sink, export_combined_to_sink, export_to_sink, parse_s3_url,
+                         write_document_to_sink)
+from print_sheet import build_print_document, write_print_pdf
+from gui_dispatch import GuiDispatcher, ProgressThrottle
+from receipt_archive import ArchiveIndex
+from receipt_filter import ReceiptFilterIndex, parse_amount
+from receipt_index import ExportIndex
+from receipt_manifest import manifest_filename
+from receipt_summary import DIRECTION_PAY, DIRECTION_RECEIVE, CounterpartySummary, write_summary_csv
+from receipt_verifier import ReceiptVerifier
+from record_export import write_records
+from preview_renderer import (TILE_SIZE, PageRasterCache, PreviewRenderer, compute_preview_dpi, draft_factor,
+                              pixel_rect_to_clip, tiles_for_region)
+
+# 筛选栏"状态"下拉框的选项（第一项表示不限）
+FILTER_STATUS_OPTIONS = ["全部", "正常", "需核对", "已修正", "已更新", "已导出", "扫描件", "重复页"]
+# 回单数据修改后延迟重新筛选的时间（毫秒），连续修改时只重新建立一次索引
+FILTER_REFRESH_DELAY = 200
+# 汇总窗口的刷新间隔（毫秒），解析过程中连续新增回单时合并刷新
+SUMMARY_REFRESH_DELAY = 200
+# 归档检索窗口输入停顿后再检索的时间（毫秒）
+ARCHIVE_SEARCH_DELAY = 200
+
+# 缩略图总览中每个单元格的间距和说明文字高度（像素）
+THUMBNAIL_GAP = 8
+THUMBNAIL_LABEL_HEIGHT = 16
+
+# 预览缩放倍数范围（1.0表示回单宽度铺满预览区）
+PREVIEW_MIN_ZOOM = 0.5
+PREVIEW_MAX_ZOOM = 8.0
+# 预览区最多保留的清晰分块数量，超出后释放不可见的分块
+MAX_PREVIEW_TILES = 48
+
+# "已导出过的回单"下拉框选项与导出处理方式的对应关系
+DUPLICATE_MODE_OPTIONS = {
+    "跳过": DUPLICATE_SKIP,
+    "创建链接": DUPLICATE_LINK,
+    "重新导出": DUPLICATE_EXPORT,
+}
+
+# "导出方式"下拉框选项
+EXPORT_MODE_COMBINED = "combined"  # 界面专用：全部回单合并为一个PDF
+EXPORT_MODE_PRINT_2 = "print2"      # 界面专用：打印排版，每页2张
+EXPORT_MODE_PRINT_3 = "print3"      # 界面专用：打印排版，每页3张
+EXPORT_MODE_OPTIONS = {
+    "逐张拆分（整页裁剪）": EXPORT_MODE_CROPBOX,
+    "逐张拆分（仅回单区域）": EXPORT_MODE_CLIP,
+    "合并为一个PDF": EXPORT_MODE_COMBINED,
+    "打印排版（每页2张）": EXPORT_MODE_PRINT_2,
+    "打印排版（每页3张）": EXPORT_MODE_PRINT_3,
+}
+# 打印排版方式对应的每页回单数
+PRINT_PER_PAGE = {EXPORT_MODE_PRINT_2: 2, EXPORT_MODE_PRINT_3: 3}
+
+# "子文件夹"下拉框选项
+SHARD_OPTIONS = {
+    "不分": SHARD_NONE,
+    "按客户名称": SHARD_BY_COUNTERPARTY,
+    "按回单日期": SHARD_BY_DATE,
+}
 
 class ReceiptSplitterApp:
     """
@@ -50,11 +111,53 @@ class ReceiptSplitterApp:
         self.source_file = ""
         self.doc = None
         self.preview_data = []
+        self.items_by_seq = {}  # 回单序号 -> preview_data中的回单数据字典（按序号查找，不遍历列表）
         self.preview_image = None
         self.preview_image_ref = None  # 保持图片引用，防止垃圾回收
+        self.preview_item = None  # 当前预览的回单数据
+        self.preview_zoom = 1.0  # 预览缩放倍数
+        self.preview_view = None  # 当前预览视图（分辨率、图像尺寸、版本号等）
+        self.preview_generation = 0  # 预览视图版本号，用于丢弃过期的后台渲染结果
+        self.preview_tiles = {}  # 已显示的清晰分块 {(列, 行): (PhotoImage, canvas图片项)}
+        self.preview_renderer = None  # 后台分块渲染线程
+        self.preview_cache = None  # 主线程草图使用的整页渲染缓存
+        self.verifier = None  # 后台复核线程（pdfplumber交叉校验）
+        self.filter_index = None  # 解析结果列表的筛选索引，回单数据修改后置为None，下次筛选时重建
+        self.sort_column = "seq"  # 列表当前的排序列
+        self.sort_reverse = False
+        self._filter_refresh_job = None
+        self.summary = CounterpartySummary()  # 按客户汇总的笔数和金额（增量更新）
+        self.summary_window = None
+        self.summary_tree = None
+        self._summary_refresh_job = None
+        self.archive_window = None  # 归档检索窗口
+        self.archive_tree = None
+        self._archive_search_job = None
+        self.thumbnail_window = None  # 缩略图总览窗口
+        self.thumbnail_canvas = None
+        self.thumbnail_cells = {}  # {回单序号: 单元格左上角坐标}
+        self.thumbnail_images = {}  # {回单序号: PhotoImage}，保持引用避免被回收
+        self.thumbnail_generation = 0  # 总览版本号，用于丢弃已关闭窗口的渲染结果
+        self._thumbnail_stop = None
+        self._tile_refresh_job = None
+        self._preview_resize_job = None
         self.placeholder_text = "若付款方为我方公司，则取对手方(收款方)户名为客户名称，若留空则默认使用付款方户名作为客户名称"
-        self.update_queue = queue.Queue()  # 用于线程安全的GUI更新
-        self.check_queue()  # 启动队列检查
+        self.dispatcher = GuiDispatcher(root)  # 用于线程安全的GUI更新（有消息时才唤醒主线程）
+
+        # 跨运行的已导出回单索引（打开失败时不影响正常拆分）
+        try:
+            self.export_index = ExportIndex()
+        except Exception:
+            self.export_index = None
+        # 已导出回单的全文检索归档索引（打开失败时不影响正常拆分）
+        try:
+            self.archive = ArchiveIndex()
+        except Exception:
+            self.archive = None
+        # 本方公司户名列表（集团内多个法人主体），跨运行保存
+        self.own_companies = load_own_companies()
+        # 上次使用的对象存储地址（s3://存储桶/前缀），首次使用时取环境变量RECEIPT_S3_TARGET
+        self.s3_target = os.environ.get("RECEIPT_S3_TARGET", S3_SCHEME)
 
         frame_top = ttk.LabelFrame(root, text="操作面板", padding=10)
         frame_top.pack(fill="x", padx=10, pady=5)
@@ -66,6 +169,22 @@ class ReceiptSplitterApp:
         self.lbl_file.grid(row=0, column=1, padx=5, sticky="ew")
         self.btn_process = ttk.Button(frame_top, text="2. 开始拆分导出", command=self.start_processing, state="disabled")
         self.btn_process.grid(row=0, column=2, padx=(5, 0), sticky="e")
+        self.btn_export_records = ttk.Button(frame_top, text="导出明细数据", command=self.export_records,
+                                             state="disabled")
+        self.btn_export_records.grid(row=0, column=3, padx=(5, 0), sticky="e")
+        # 扫描件核对按钮（有待核对的扫描件时才显示）
+        self.btn_review_scanned = ttk.Button(frame_top, text="核对扫描件", command=self.review_next_scanned)
+        self.btn_review_scanned.grid(row=0, column=4, padx=(5, 0), sticky="e")
+        self.btn_review_scanned.grid_remove()
+        self.btn_summary = ttk.Button(frame_top, text="客户汇总", command=self.open_summary_window, state="disabled")
+        self.btn_summary.grid(row=0, column=5, padx=(5, 0), sticky="e")
+        self.btn_thumbnails = ttk.Button(frame_top, text="缩略图总览", command=self.open_thumbnail_view,
+                                         state="disabled")
+        self.btn_thumbnails.grid(row=0, column=6, padx=(5, 0), sticky="e")
+        # 归档检索不依赖当前打开的文件
+        self.btn_archive = ttk.Button(frame_top, text="归档检索", command=self.open_archive_search,
+                                      state="normal" if self.archive else "disabled")
+        self.btn_archive.grid(row=0, column=7, padx=(5, 0), sticky="e")
 
         # 电子回单本方公司户名选择区域（初始隐藏）
         self.local_company_frame = ttk.Frame(frame_top)
@@ -77,15 +196,53 @@ class ReceiptSplitterApp:
         self.combo_local_company.bind("<<ComboboxSelected>>", self.on_company_selected)
         self.local_company_frame.columnconfigure(1, weight=1)
         
+        # 管理本方户名列表（可同时设置多个本方户名）
+        self.btn_own_companies = ttk.Button(self.local_company_frame, text="本方户名列表...",
+                                            command=self.manage_own_companies)
+        self.btn_own_companies.grid(row=0, column=3, padx=(5, 0), sticky="e")
+
         # 确认更新按钮（初始隐藏，只有选择了非默认值才显示）
         self.btn_confirm_company = ttk.Button(self.local_company_frame, text="确认更新", command=self.confirm_company_name)
         # 按钮初始不显示，通过grid_remove隐藏（保留布局信息）
         
         # 提示标签
         self.lbl_hint = ttk.Label(self.local_company_frame, 
-                                  text="💡 提示：选择本方公司户名并确认更新后，系统将更新对应记录的客户名称为收款方户名；不选择则默认使用付款方户名作为客户名称", 
+                                  text="💡 提示：选择本方公司户名并确认更新后，该户名会加入本方户名列表，付款方为任一本方户名的记录将以收款方户名作为客户名称；不选择则默认使用付款方户名作为客户名称", 
                                   foreground="blue", font=("Arial", 9))
-        self.lbl_hint.grid(row=1, column=0, columnspan=2, padx=5, pady=(5, 0), sticky="w")
+        self.lbl_hint.grid(row=1, column=0, columnspan=4, padx=5, pady=(5, 0), sticky="w")
+
+        # 导出选项区域
+        self.export_options_frame = ttk.Frame(frame_top)
+        self.export_options_frame.grid(row=2, column=0, columnspan=4, padx=0, pady=(10, 0), sticky="ew")
+        ttk.Label(self.export_options_frame, text="已导出过的回单:").grid(row=0, column=0, padx=(0, 5), sticky="w")
+        self.combo_duplicate_mode = ttk.Combobox(self.export_options_frame, state="readonly", width=10,
+                                                 values=list(DUPLICATE_MODE_OPTIONS))
+        self.combo_duplicate_mode.set("跳过")
+        self.combo_duplicate_mode.grid(row=0, column=1, padx=5, sticky="w")
+        ttk.Label(self.export_options_frame, text="导出方式:").grid(row=0, column=2, padx=(15, 5), sticky="w")
+        self.combo_export_mode = ttk.Combobox(self.export_options_frame, state="readonly", width=20,
+                                              values=list(EXPORT_MODE_OPTIONS))
+        self.combo_export_mode.set("逐张拆分（整页裁剪）")
+        self.combo_export_mode.grid(row=0, column=3, padx=5, sticky="w")
+        # 仅"仅回单区域"和"合并"方式有效：删除回单区域以外的内容，拆分后的文件不再包含相邻回单的数据
+        self.trim_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(self.export_options_frame, text="去除回单区域外的内容",
+                        variable=self.trim_var).grid(row=0, column=4, padx=(15, 0), sticky="w")
+        ttk.Label(self.export_options_frame, text="子文件夹:").grid(row=1, column=0, padx=(0, 5), pady=(5, 0),
+                                                                sticky="w")
+        self.combo_shard = ttk.Combobox(self.export_options_frame, state="readonly", width=10,
+                                        values=list(SHARD_OPTIONS))
+        self.combo_shard.set("不分")
+        self.combo_shard.grid(row=1, column=1, padx=5, pady=(5, 0), sticky="w")
+        # 预演：只生成并显示导出计划，不写入任何文件
+        self.dry_run_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.export_options_frame, text="仅预演（显示导出计划，不写文件）",
+                        variable=self.dry_run_var).grid(row=1, column=2, columnspan=2, padx=(15, 0), pady=(5, 0),
+                                                        sticky="w")
+        # 直接上传到S3兼容的对象存储，不写本地文件
+        self.upload_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.export_options_frame, text="上传到对象存储（S3）",
+                        variable=self.upload_var).grid(row=1, column=4, padx=(15, 0), pady=(5, 0), sticky="w")
 
         main_pane = ttk.PanedWindow(root, orient=tk.HORIZONTAL)
         main_pane.pack(fill="both", expand=True, padx=10, pady=5)
@@ -93,13 +250,43 @@ class ReceiptSplitterApp:
         frame_left = ttk.LabelFrame(main_pane, text="解析预览 (单击查看原文, 双击可修改)", padding=10)
         main_pane.add(frame_left, weight=2)
 
+        # --- 筛选栏：每次按键都重新筛选（基于索引，不逐行比较） ---
+        filter_frame = ttk.Frame(frame_left)
+        filter_frame.pack(side="top", fill="x", pady=(0, 5))
+        self.filter_name_var = tk.StringVar()
+        self.filter_no_var = tk.StringVar()
+        self.filter_amt_min_var = tk.StringVar()
+        self.filter_amt_max_var = tk.StringVar()
+        self.filter_status_var = tk.StringVar(value=FILTER_STATUS_OPTIONS[0])
+        self.filter_page_var = tk.StringVar()
+        ttk.Label(filter_frame, text="客户:").pack(side="left")
+        ttk.Entry(filter_frame, textvariable=self.filter_name_var, width=12).pack(side="left", padx=(0, 5))
+        ttk.Label(filter_frame, text="编号:").pack(side="left")
+        ttk.Entry(filter_frame, textvariable=self.filter_no_var, width=10).pack(side="left", padx=(0, 5))
+        ttk.Label(filter_frame, text="金额:").pack(side="left")
+        ttk.Entry(filter_frame, textvariable=self.filter_amt_min_var, width=8).pack(side="left")
+        ttk.Label(filter_frame, text="-").pack(side="left")
+        ttk.Entry(filter_frame, textvariable=self.filter_amt_max_var, width=8).pack(side="left", padx=(0, 5))
+        ttk.Label(filter_frame, text="状态:").pack(side="left")
+        ttk.Combobox(filter_frame, textvariable=self.filter_status_var, values=FILTER_STATUS_OPTIONS,
+                     state="readonly", width=6).pack(side="left", padx=(0, 5))
+        ttk.Label(filter_frame, text="页:").pack(side="left")
+        ttk.Entry(filter_frame, textvariable=self.filter_page_var, width=4).pack(side="left", padx=(0, 5))
+        ttk.Button(filter_frame, text="清除", width=4, command=self.clear_filter).pack(side="left")
+        self.lbl_filter_count = ttk.Label(filter_frame, text="", foreground="gray")
+        self.lbl_filter_count.pack(side="left", padx=(5, 0))
+        for var in (self.filter_name_var, self.filter_no_var, self.filter_amt_min_var, self.filter_amt_max_var,
+                    self.filter_status_var, self.filter_page_var):
+            var.trace_add("write", lambda *args: self.apply_filter())
+
         columns = ("seq", "name", "receipt_no", "amount", "status")
         self.tree = ttk.Treeview(frame_left, columns=columns, show="headings", selectmode="browse")
-        self.tree.heading("seq", text="序号")
-        self.tree.heading("name", text="客户名称")
-        self.tree.heading("receipt_no", text="回单编号")
-        self.tree.heading("amount", text="金额")
-        self.tree.heading("status", text="状态")
+        self.column_titles = {"seq": "序号", "name": "客户名称", "receipt_no": "回单编号", "amount": "金额",
+                              "status": "状态"}
+        for column in columns:
+            # 点击列标题按该列排序，再次点击切换升序/降序
+            self.tree.heading(column, text=self.column_titles[column],
+                              command=lambda c=column: self.sort_tree_by(c))
         self.tree.column("seq", width=40, anchor="center")
         self.tree.column("name", width=200)
         self.tree.column("receipt_no", width=150)
@@ -130,16 +317,31 @@ class ReceiptSplitterApp:
         
         # 创建垂直滚动条
         v_scrollbar = ttk.Scrollbar(preview_container, orient="vertical", command=self.preview_canvas.yview)
-        self.preview_canvas.configure(yscrollcommand=v_scrollbar.set)
         
         # 创建水平滚动条
         h_scrollbar = ttk.Scrollbar(preview_container, orient="horizontal", command=self.preview_canvas.xview)
-        self.preview_canvas.configure(xscrollcommand=h_scrollbar.set)
+        
+        # 视图滚动后（滚动条、滚轮或缩放）补充渲染新露出的清晰分块
+        def on_yscroll(first, last):
+            v_scrollbar.set(first, last)
+            self._schedule_tile_refresh()
+        
+        def on_xscroll(first, last):
+            h_scrollbar.set(first, last)
+            self._schedule_tile_refresh()
+        
+        self.preview_canvas.configure(yscrollcommand=on_yscroll, xscrollcommand=on_xscroll)
+        self.preview_canvas.bind("<Configure>", self._on_preview_canvas_resize)
         
         # 布局：Canvas在中间，滚动条在边缘
         self.preview_canvas.grid(row=0, column=0, sticky="nsew")
         v_scrollbar.grid(row=0, column=1, sticky="ns")
         h_scrollbar.grid(row=1, column=0, sticky="ew")
+
+        # 调试叠加：在预览上画出回单区域、锚点和字段位置，便于查找切错的原因
+        self.overlay_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(preview_container, text="调试叠加（回单区域/锚点/字段）", variable=self.overlay_var,
+                        command=self._render_preview).grid(row=2, column=0, sticky="w")
         
         preview_container.grid_rowconfigure(0, weight=1)
         preview_container.grid_columnconfigure(0, weight=1)
@@ -213,12 +415,24 @@ class ReceiptSplitterApp:
                 elif event.num == 5:
                     self.preview_canvas.xview_scroll(1, "units")
         
+        def on_ctrl_mousewheel(event):
+            # Ctrl+滚轮：缩放预览
+            if event.delta:
+                self.zoom_preview(1.25 if event.delta > 0 else 0.8)
+            elif event.num == 4:
+                self.zoom_preview(1.25)
+            elif event.num == 5:
+                self.zoom_preview(0.8)
+        
         # 绑定滚轮事件
         self.preview_canvas.bind("<MouseWheel>", on_mousewheel)
         self.preview_canvas.bind("<Shift-MouseWheel>", on_shift_mousewheel)
+        self.preview_canvas.bind("<Control-MouseWheel>", on_ctrl_mousewheel)
         # Linux系统
         self.preview_canvas.bind("<Button-4>", on_mousewheel)
         self.preview_canvas.bind("<Button-5>", on_mousewheel)
+        self.preview_canvas.bind("<Control-Button-4>", on_ctrl_mousewheel)
+        self.preview_canvas.bind("<Control-Button-5>", on_ctrl_mousewheel)
         
         # 设置Canvas可获得焦点，以便接收键盘事件
         self.preview_canvas.focus_set()
@@ -247,34 +461,17 @@ class ReceiptSplitterApp:
         self.payer_names = []  # 存储所有付款方户名
         self.receiver_names_map = {}  # 存储付款方户名到收款方户名的映射
 
-    def check_queue(self):
-        """
-        检查队列中的GUI更新请求（线程安全）
-        
-        定期检查更新队列，执行从后台线程提交的GUI更新操作。
-        每100毫秒检查一次，确保后台线程可以安全地更新界面。
-        这是一个递归调用，通过root.after实现定时检查。
-        """
-        try:
-            while True:
-                callback, args = self.update_queue.get_nowait()
-                callback(*args)
-        except queue.Empty:
-            pass
-        finally:
-            self.root.after(100, self.check_queue)  # 每100ms检查一次
-
     def safe_gui_update(self, callback, *args):
         """
         线程安全的GUI更新方法
         
-        将GUI更新操作放入队列，由主线程的check_queue方法执行，确保线程安全。
+        将GUI更新操作交给GuiDispatcher，由主线程在下一次事件处理时执行，确保线程安全。
         用于从后台线程安全地更新GUI界面。
         
         :param callback: 要执行的回调函数（应在主线程中执行）
         :param args: 传递给回调函数的参数
         """
-        self.update_queue.put((callback, args))
+        self.dispatcher.post(callback, *args)
 
     def on_closing(self):
         """
@@ -283,9 +480,20 @@ class ReceiptSplitterApp:
         在用户关闭程序窗口时调用，负责关闭PDF文档对象，
         释放资源，然后销毁主窗口。
         """
+        self.dispatcher.close()
+        if self._thumbnail_stop is not None:
+            self._thumbnail_stop.set()
         try:
             if self.doc:
                 self.doc.close()
+            if self.export_index:
+                self.export_index.close()
+            if self.archive:
+                self.archive.close()
+            if self.preview_renderer:
+                self.preview_renderer.close()
+            if self.verifier:
+                self.verifier.close()
         except Exception:
             pass
         self.root.destroy()
@@ -319,7 +527,7 @@ class ReceiptSplitterApp:
         
         # 如果通过item_id没找到，则通过seq查找
         if item_data is None:
-            item_data = next((item for item in self.preview_data if item['seq'] == seq), None)
+            item_data = self.items_by_seq.get(seq)
         
         if not item_data:
             return
@@ -333,33 +541,16 @@ class ReceiptSplitterApp:
             page_rect = page.rect
             crop_rect = crop_rect & page_rect
             
-            # --- 1. 更新图片预览 (原有逻辑) ---
-            # 生成裁剪后的预览图片
-            pix = page.get_pixmap(dpi=150, clip=crop_rect)
-            img_data = pix.tobytes("ppm")
-            
-            # 保存图片引用，防止被垃圾回收
-            self.preview_image = tk.PhotoImage(data=img_data)
-            self.preview_image_ref = self.preview_image  # 保持引用
-            
-            # 更新Canvas上的图片
-            self.preview_canvas.delete("all")  # 清除之前的内容
-            self.preview_image_container = self.preview_canvas.create_image(0, 0, anchor="nw", image=self.preview_image)
-            
-            # 更新Canvas的滚动区域
-            self.preview_canvas.configure(scrollregion=self.preview_canvas.bbox("all"))
+            # --- 1. 更新图片预览：先显示低分辨率草图，再由后台线程渲染清晰分块 ---
+            self.preview_item = item_data
+            self._render_preview(reset_scroll=True)
+            if item_data.get('verify_notes'):
+                self.log("需核对：" + "；".join(item_data['verify_notes']))
 
             # --- 2. 更新文本复制区 (新增逻辑) ---
             try:
-                # 提取裁剪区域内的所有文本
-                raw_text = page.get_text("text", clip=crop_rect)
-                
-                # 清理文本：去除多余空格和空行，方便用户选择
-                if raw_text and raw_text.strip():
-                    lines = [line.strip() for line in raw_text.split('\n') if line.strip()]
-                    clean_text = "\n".join(lines)
-                else:
-                    clean_text = ""
+                # 提取裁剪区域内的所有文本，去除多余空格和空行，方便用户选择
+                clean_text = receipt_clean_text(page, crop_rect)
                 
                 # 更新文本内容（insert方法不会触发Key事件，所以不受disable_editing影响）
                 self.txt_extract.config(state="normal")
@@ -384,6 +575,7 @@ class ReceiptSplitterApp:
             
         except Exception as e:
             # 显示错误信息
+            self.preview_view = None
             self.preview_canvas.delete("all")
             self.preview_canvas.create_text(200, 100, text=f"无法生成预览:\n{str(e)}", anchor="center", fill="red")
             self.preview_canvas.configure(scrollregion=self.preview_canvas.bbox("all"))
@@ -394,6 +586,199 @@ class ReceiptSplitterApp:
             self.txt_extract.delete("1.0", tk.END)
             self.txt_extract.insert("1.0", f"文本提取失败: {str(e)}")
 
+    def _render_preview(self, reset_scroll=False, center=None):
+        """
+        按当前画布大小和缩放倍数重新渲染预览
+        
+        分辨率随画布宽度和缩放倍数变化。先在主线程渲染可见区域的低分辨率草图并放大显示，
+        再把可见区域的清晰分块交给后台线程渲染，完成后逐块覆盖在草图上。
+        
+        :param reset_scroll: 是否滚动回左上角（切换记录时）
+        :param center: 可选的(x比例, y比例)，缩放后保持该相对位置位于视图中心
+        """
+        item = self.preview_item
+        if not item or not self.doc:
+            return
+        page = self.doc[item['page_idx']]
+        crop_rect = fitz.Rect(item['rect']) & page.rect
+
+        canvas_width = self.preview_canvas.winfo_width()
+        canvas_height = self.preview_canvas.winfo_height()
+        if canvas_width < 50:  # 界面尚未完成布局
+            canvas_width, canvas_height = 600, 400
+        dpi = compute_preview_dpi(crop_rect.width, canvas_width, self.preview_zoom)
+        scale = dpi / 72.0
+
+        self.preview_generation += 1
+        self.preview_view = {
+            "generation": self.preview_generation,
+            "page_idx": item['page_idx'],
+            "crop_rect": crop_rect,
+            "dpi": dpi,
+            "width": int(round(crop_rect.width * scale)),
+            "height": int(round(crop_rect.height * scale)),
+            "canvas_width": canvas_width,
+        }
+        self.preview_tiles = {}
+        self.preview_canvas.delete("all")
+        self.preview_canvas.configure(scrollregion=(0, 0, self.preview_view['width'], self.preview_view['height']))
+
+        if reset_scroll:
+            self.preview_canvas.xview_moveto(0)
+            self.preview_canvas.yview_moveto(0)
+        elif center:
+            width, height = self.preview_view['width'], self.preview_view['height']
+            self.preview_canvas.xview_moveto(max(0.0, (center[0] * width - canvas_width / 2.0) / width))
+            self.preview_canvas.yview_moveto(max(0.0, (center[1] * height - canvas_height / 2.0) / height))
+
+        # 草图：可见区域按 dpi/factor 渲染，再放大factor倍，几乎立即显示
+        factor = draft_factor(dpi)
+        x0, y0, x1, y1 = self._visible_preview_region()
+        x0, y0 = x0 - x0 % factor, y0 - y0 % factor  # 对齐到放大倍数，保证草图与清晰分块位置一致
+        if x1 > x0 and y1 > y0:
+            clip = pixel_rect_to_clip(crop_rect, dpi, x0, y0, x1, y1)
+            draft = tk.PhotoImage(data=self.preview_cache.clip_ppm(item['page_idx'], clip, dpi / float(factor)))
+            if factor > 1:
+                draft = draft.zoom(factor, factor)
+            self.preview_image = draft
+            self.preview_image_ref = self.preview_image  # 保持引用
+            self.preview_image_container = self.preview_canvas.create_image(x0, y0, anchor="nw", image=draft)
+
+        if self.overlay_var.get():
+            self._draw_preview_overlay()
+        self._request_visible_tiles()
+
+    def _draw_preview_overlay(self):
+        """
+        在预览上画出调试叠加层（回单区域、锚点和字段位置）
+
+        叠加层是画布上带"overlay"标签的矩形，后台渲染的分块显示后重新置于顶层。
+        同一页上的相邻回单区域也画出，便于看出区域之间的重叠或遗漏。
+        """
+        view = self.preview_view
+        crop_rect = view['crop_rect']
+        scale = view['dpi'] / 72.0
+        try:
+            shapes = page_overlay_shapes(self.doc, view['page_idx'], self.preview_data)
+        except Exception as e:
+            self.log(f"调试叠加失败: {e}")
+            return
+        for kind, rect, label in shapes:
+            if not rect.intersects(crop_rect):
+                continue
+            color = "#%02x%02x%02x" % tuple(int(c * 255) for c in OVERLAY_COLORS[kind])
+            x0, y0 = (rect.x0 - crop_rect.x0) * scale, (rect.y0 - crop_rect.y0) * scale
+            x1, y1 = (rect.x1 - crop_rect.x0) * scale, (rect.y1 - crop_rect.y0) * scale
+            self.preview_canvas.create_rectangle(x0, y0, x1, y1, outline=color, width=2 if kind == SHAPE_RECEIPT else 1,
+                                                 tags="overlay")
+            if label:
+                if kind == SHAPE_RECEIPT:
+                    self.preview_canvas.create_text(x0 + 3, max(y0, 0) + 2, text=label, anchor="nw", fill=color,
+                                                    tags="overlay")
+                else:
+                    self.preview_canvas.create_text(x1 + 2, y1, text=label, anchor="sw", fill=color,
+                                                    font=("TkDefaultFont", 8), tags="overlay")
+
+    def _visible_preview_region(self, margin=0):
+        """
+        获取预览图像当前可见的像素区域
+
+        :param margin: 向四周扩展的像素数（提前渲染即将滚动进入视图的分块）
+        :return: 元组(x0, y0, x1, y1)，已限制在预览图像范围内
+        """
+        view = self.preview_view
+        x0 = int(self.preview_canvas.canvasx(0)) - margin
+        y0 = int(self.preview_canvas.canvasy(0)) - margin
+        x1 = x0 + max(self.preview_canvas.winfo_width(), 1) + 2 * margin
+        y1 = y0 + max(self.preview_canvas.winfo_height(), 1) + 2 * margin
+        return max(0, x0), max(0, y0), min(view['width'], x1), min(view['height'], y1)
+
+    def _request_visible_tiles(self):
+        """
+        将可见区域中尚未渲染的清晰分块提交给后台渲染线程
+        """
+        view = self.preview_view
+        if not view or not self.preview_renderer:
+            return
+
+        visible = self._visible_preview_region(margin=TILE_SIZE // 2)
+        visible_keys = set()
+        tasks = []
+        for col, row, pixel_rect in tiles_for_region(view['width'], view['height'], *visible):
+            visible_keys.add((col, row))
+            if (col, row) in self.preview_tiles:
+                continue
+            clip = pixel_rect_to_clip(view['crop_rect'], view['dpi'], *pixel_rect)
+            tasks.append(((col, row), view['page_idx'], clip, view['dpi']))
+
+        # 高倍缩放时只保留可见附近的分块，避免占用过多内存
+        if len(self.preview_tiles) > MAX_PREVIEW_TILES:
+            for key in [k for k in self.preview_tiles if k not in visible_keys]:
+                _, canvas_item = self.preview_tiles.pop(key)
+                self.preview_canvas.delete(canvas_item)
+
+        if tasks:
+            self.preview_renderer.submit(view['generation'], tasks)
+
+    def _on_preview_tile(self, generation, key, ppm_data):
+        """
+        显示后台线程渲染完成的清晰分块（在主线程中执行）
+
+        :param generation: 提交任务时的视图版本号，与当前视图不一致时丢弃
+        :param key: 分块编号(列, 行)
+        :param ppm_data: PPM格式的图片数据
+        """
+        if not self.preview_view or generation != self.preview_view['generation'] or key in self.preview_tiles:
+            return
+        image = tk.PhotoImage(data=ppm_data)
+        col, row = key
+        canvas_item = self.preview_canvas.create_image(col * TILE_SIZE, row * TILE_SIZE, anchor="nw", image=image)
+        self.preview_tiles[key] = (image, canvas_item)
+        # 调试叠加层保持在分块之上
+        self.preview_canvas.tag_raise("overlay")
+
+    def _schedule_tile_refresh(self):
+        """滚动后合并短时间内的多次请求，再补充渲染可见分块"""
+        if not self.preview_view or self._tile_refresh_job:
+            return
+
+        def refresh():
+            self._tile_refresh_job = None
+            self._request_visible_tiles()
+
+        self._tile_refresh_job = self.root.after(30, refresh)
+
+    def _on_preview_canvas_resize(self, event):
+        """预览区大小改变后，按新的宽度重新计算分辨率并渲染"""
+        if not self.preview_view or abs(event.width - self.preview_view['canvas_width']) < 20:
+            return
+        if self._preview_resize_job:
+            self.root.after_cancel(self._preview_resize_job)
+
+        def rerender():
+            self._preview_resize_job = None
+            self._render_preview()
+
+        self._preview_resize_job = self.root.after(150, rerender)
+
+    def zoom_preview(self, factor):
+        """
+        缩放预览，保持视图中心位置不变
+
+        :param factor: 相对当前缩放倍数的比例（如1.25放大，0.8缩小）
+        """
+        if not self.preview_view:
+            return
+        new_zoom = max(PREVIEW_MIN_ZOOM, min(PREVIEW_MAX_ZOOM, self.preview_zoom * factor))
+        if abs(new_zoom - self.preview_zoom) < 1e-6:
+            return
+        view = self.preview_view
+        center = ((self.preview_canvas.canvasx(0) + self.preview_canvas.winfo_width() / 2.0) / view['width'],
+                  (self.preview_canvas.canvasy(0) + self.preview_canvas.winfo_height() / 2.0) / view['height'])
+        self.preview_zoom = new_zoom
+        self._render_preview(center=center)
+        self.log(f"预览缩放: {int(round(new_zoom * 100))}%")
+
     def open_edit_window(self, event):
         """
         打开编辑窗口，允许用户修改回单信息
@@ -406,7 +791,7 @@ class ReceiptSplitterApp:
         item_id = self.tree.focus()
         if not item_id: return
         seq = int(self.tree.item(item_id, 'values')[0])
-        item_to_edit = next((item for item in self.preview_data if item['seq'] == seq), None)
+        item_to_edit = self.items_by_seq.get(seq)
         if not item_to_edit: return
 
         edit_win = tk.Toplevel(self.root)
@@ -477,7 +862,7 @@ class ReceiptSplitterApp:
         :param new_no: 新的回单编号
         :param new_amt: 新的金额（字符串格式，如"123.45"）
         """
-        cleaned_name = self.clean_filename(new_name)
+        cleaned_name = clean_filename(new_name)
         cleaned_amt = new_amt.replace(",", "").strip()
         
         # 验证金额格式
@@ -490,15 +875,20 @@ class ReceiptSplitterApp:
             messagebox.showwarning("警告", "金额格式不正确，应为数字（如：123.45）")
             return
         
-        for item in self.preview_data:
-            if item['seq'] == seq:
-                item['name'] = cleaned_name
-                item['no'] = new_no
-                item['amt'] = cleaned_amt
-                break
+        item = self.items_by_seq.get(seq)
+        if item is not None:
+            item['name'] = cleaned_name
+            item['no'] = new_no
+            item['amt'] = cleaned_amt
+            # 状态写入数据字典而不只是表格：后台复核和本方户名重新判断都会跳过手动修正过的记录
+            item['status'] = "已修正"
+            self.summary.update(item)
         self.tree.item(item_id, values=(seq, cleaned_name, new_no, cleaned_amt, "已修正"))
+        self._schedule_summary_refresh()
         edit_win.destroy()
         self.log(f"序号 {seq} 的记录已更新。")
+        self._refresh_scan_review()
+        self._invalidate_filter()
 
     def on_company_selected(self, event=None):
         """
@@ -523,9 +913,9 @@ class ReceiptSplitterApp:
         """
         确认选择的公司户名，更新预览列表
         
-        当用户点击"确认更新"按钮时调用，将所有匹配的记录的客户名称
-        更新为对应的收款方户名，并更新状态为"已更新"。
-        如果付款方是选中的公司户名，则将客户名称改为收款方户名。
+        当用户点击"确认更新"按钮时调用，将选中的户名加入本方户名列表并保存，
+        然后重新判断全部记录的客户名称：付款方为任一本方户名的记录，
+        客户名称改为对应的收款方户名，并更新状态为"已更新"。
         """
         selected_company = self.combo_local_company.get()
         default_text = "使用付款方户名作为客户名称（默认值）"
@@ -534,21 +924,10 @@ class ReceiptSplitterApp:
             messagebox.showwarning("提示", "请先选择电子回单本方公司户名（不能选择默认值）")
             return
         
-        # 更新所有匹配的记录
-        updated_count = 0
-        for item in self.preview_data:
-            # 如果付款方户名匹配选中的公司户名，则更新客户名称为收款方户名
-            if 'payer_name' in item and item['payer_name'] == selected_company:
-                if 'receiver_name' in item and item['receiver_name']:
-                    new_name = self.clean_filename(item['receiver_name'])
-                    item['name'] = new_name
-                    # 更新树视图
-                    if 'item_id' in item:
-                        current_values = list(self.tree.item(item['item_id'], 'values'))
-                        current_values[1] = new_name  # 更新客户名称
-                        current_values[4] = "已更新"  # 更新状态
-                        self.tree.item(item['item_id'], values=tuple(current_values))
-                    updated_count += 1
+        if selected_company not in self.own_companies:
+            self.own_companies.append(selected_company)
+            self._save_own_companies()
+        updated_count = self._apply_own_companies()
         
         if updated_count > 0:
             self.log(f"已更新 {updated_count} 条记录的客户名称和状态")
@@ -558,16 +937,103 @@ class ReceiptSplitterApp:
         else:
             messagebox.showinfo("提示", f"未找到付款方为'{selected_company}'的记录，无需更新。")
 
+    def _save_own_companies(self):
+        """保存本方户名列表（保存失败只记录日志，不影响本次使用）"""
+        try:
+            save_own_companies(self.own_companies)
+        except OSError as e:
+            self.log(f"无法保存本方户名列表: {e}")
+
+    def _apply_own_companies(self):
+        """
+        按当前本方户名列表重新判断全部记录的客户名称，并刷新树视图
+        
+        :return: 客户名称发生变化的记录数
+        """
+        changed = remap_counterparties(self.preview_data, self.own_companies)
+        for item in changed:
+            # 与表格显示保持一致，状态筛选和后台复核都按数据字典中的状态判断
+            item['status'] = "已更新"
+            self.summary.update(item)
+            if 'item_id' in item:
+                current_values = list(self.tree.item(item['item_id'], 'values'))
+                current_values[1] = item['name']  # 更新客户名称
+                current_values[4] = "已更新"  # 更新状态
+                self.tree.item(item['item_id'], values=tuple(current_values))
+        if changed:
+            self._invalidate_filter()
+            self._schedule_summary_refresh()
+        return len(changed)
+
+    def manage_own_companies(self):
+        """
+        编辑本方户名列表
+        
+        列出已保存的本方户名和当前文件中检测到的付款方户名，勾选（多选）后点击确定，
+        保存列表并重新判断全部记录的客户名称。
+        """
+        dialog = tk.Toplevel(self.root)
+        dialog.title("本方户名列表")
+        dialog.geometry("520x420")
+        dialog.transient(self.root)
+        dialog.grab_set()
+
+        ttk.Label(dialog, text="选中所有本方公司户名（可多选），付款方为其中任一户名时，以收款方户名作为客户名称：",
+                  wraplength=490).pack(fill="x", padx=10, pady=(10, 5))
+
+        list_frame = ttk.Frame(dialog)
+        list_frame.pack(fill="both", expand=True, padx=10)
+        listbox = tk.Listbox(list_frame, selectmode="multiple", exportselection=False)
+        list_scroll = ttk.Scrollbar(list_frame, orient="vertical", command=listbox.yview)
+        listbox.configure(yscrollcommand=list_scroll.set)
+        list_scroll.pack(side="right", fill="y")
+        listbox.pack(side="left", fill="both", expand=True)
+
+        names = list(self.own_companies) + [name for name in self.payer_names if name not in self.own_companies]
+        for idx, name in enumerate(names):
+            listbox.insert("end", name)
+            if name in self.own_companies:
+                listbox.selection_set(idx)
+
+        add_frame = ttk.Frame(dialog)
+        add_frame.pack(fill="x", padx=10, pady=5)
+        entry_new = ttk.Entry(add_frame)
+        entry_new.pack(side="left", fill="x", expand=True)
+
+        def add_name():
+            name = entry_new.get().strip()
+            if not name:
+                return
+            if name not in names:
+                names.append(name)
+                listbox.insert("end", name)
+            listbox.selection_set(names.index(name))
+            entry_new.delete(0, "end")
+
+        ttk.Button(add_frame, text="添加", command=add_name).pack(side="left", padx=(5, 0))
+
+        def confirm():
+            self.own_companies = [names[idx] for idx in listbox.curselection()]
+            self._save_own_companies()
+            dialog.destroy()
+            updated_count = self._apply_own_companies()
+            self.log(f"本方户名列表已保存（{len(self.own_companies)} 个），已更新 {updated_count} 条记录的客户名称")
+
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.pack(fill="x", padx=10, pady=(0, 10))
+        ttk.Button(btn_frame, text="确定", command=confirm).pack(side="right")
+        ttk.Button(btn_frame, text="取消", command=dialog.destroy).pack(side="right", padx=(0, 5))
+
     def log(self, message):
         """
         在状态栏显示日志消息
         
         在界面底部状态栏显示带时间戳的消息，用于向用户反馈程序运行状态。
+        不强制立即重绘，连续的多条消息在主线程空闲时合并为一次重绘。
         
         :param message: 要显示的日志消息字符串
         """
         self.lbl_status.config(text=f"[{datetime.now().strftime('%H:%M:%S')}] {message}")
-        self.root.update_idletasks()
 
     def load_file(self):
         """
@@ -586,65 +1052,27 @@ class ReceiptSplitterApp:
             pass
         self.source_file = file_path
         self.doc = fitz.open(file_path)
+        self.preview_cache = PageRasterCache(self.doc)
+        # 为新文件启动后台预览渲染线程
+        if self.preview_renderer:
+            self.preview_renderer.close()
+        self.preview_renderer = PreviewRenderer(
+            file_path, lambda generation, key, ppm: self.safe_gui_update(self._on_preview_tile, generation, key, ppm))
+        # 旧文件的复核结果不再需要
+        if self.verifier:
+            self.verifier.close()
+            self.verifier = None
+        self.preview_item = None
+        self.preview_view = None
         self.lbl_file.config(text=os.path.basename(file_path), foreground="black")
         # 显示公司户名选择区域（放在第二行，与"开始拆分导出"按钮分开，视觉上更清晰）
-        self.local_company_frame.grid(row=1, column=0, columnspan=3, padx=0, pady=(10, 0), sticky="ew")
+        self.local_company_frame.grid(row=1, column=0, columnspan=4, padx=0, pady=(10, 0), sticky="ew")
         # 确保确认按钮初始隐藏
         self.btn_confirm_company.grid_remove()
-        # 在主线程中获取公司户名，避免线程安全问题
-        local_company_name = self.combo_local_company.get().strip() if hasattr(self, 'combo_local_company') else ""
+        # 在主线程中复制本方户名列表，避免线程安全问题
+        own_companies = list(self.own_companies)
         self.log("正在分析文件，请稍候...")
-        threading.Thread(target=self.analyze_pdf, args=(local_company_name,), daemon=True).start()
-
-    def clean_filename(self, text):
-        """
-        清理文本，使其适合用作文件名
-        
-        去除换行符、回车符、制表符，以及Windows文件系统不允许的字符，
-        确保生成的文件名合法且可读。
-        
-        :param text: 原始文本字符串
-        :return: 清理后的文本字符串，去除非法字符和多余的空白
-        """
-        # 先去除换行符和回车符，再去除文件系统不允许的字符
-        text = text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-        # 将多个连续空格替换为单个空格
-        text = re.sub(r'\s+', ' ', text)
-        return re.sub(r'[\\/*?:"<>|]', "", text).strip()
-
-    def is_valid_abc_receipt(self, doc, check_limit=3):
-        """
-        极速检测是否为农行回单
-        
-        通过检查PDF前几页是否包含农行回单的特征关键词来判断。
-        关键词包括："中国农业银行"、"电子回单"、"回单编号"。
-        如果一页内匹配到2个以上关键词，判定为农行回单格式。
-        
-        :param doc: fitz.Document对象，要检查的PDF文档
-        :param check_limit: 最多检查前几页，默认3页
-        :return: 元组(bool, message)，(True, "验证通过") 或 (False, 错误信息)
-        """
-        # 1. 基础指纹关键词
-        fingerprints = ["中国农业银行", "电子回单", "回单编号"]
-
-        # 2. 如果文档总页数比限制少，则按实际页数检查
-        actual_limit = min(len(doc), check_limit)
-
-        found_any_feature = False
-        for i in range(actual_limit):
-            page_text = doc[i].get_text()
-            # 统计匹配到的关键词数量
-            match_count = sum(1 for word in fingerprints if word in page_text)
-
-            # 如果一页内匹配到2个以上关键词，基本可以判定是目标格式
-            if match_count >= 2:
-                found_any_feature = True
-                break
-
-        if not found_any_feature:
-            return False, f"在前 {actual_limit} 页中未检测到农行回单指纹标识。"
-
-        return True, "验证通过"
+        threading.Thread(target=self.analyze_pdf, args=(own_companies,), daemon=True).start()
 
     def analyze_pdf(self, local_company_name=""):
         """
@@ -654,383 +1082,42 @@ class ReceiptSplitterApp:
         然后提取每个回单的关键信息：客户名称、回单编号（20位数字）、金额等。
         
         流程：
-        1. 验证PDF是否为农行回单格式
+        1. 识别PDF是哪家银行的回单格式，选用对应的版式
         2. 逐页分析，识别回单区域（通过分隔线或标签位置）
-        3. 对每个回单区域提取：付款方/收款方户名、回单编号、金额
-        4. 根据本方公司户名判断客户名称（如果付款方是本公司，则用收款方作为客户）
+        3. 对每个回单区域提取：付款方/收款方户名、回单编号、金额（只用PyMuPDF，结果立即显示，
+           解析完成后再由后台线程用pdfplumber复核）
+        4. 根据本方公司户名判断客户名称（如果付款方是任一本方户名，则用收款方作为客户）
         5. 将提取的数据添加到预览列表
         
-        :param local_company_name: 本方公司户名，用于判断客户名称（在主线程中获取，避免线程安全问题）
+        :param local_company_name: 本方公司户名或户名列表，用于判断客户名称（在主线程中获取，避免线程安全问题）
         """
         # 使用线程安全的方式清空树视图
         self.safe_gui_update(self._clear_tree)
 
-        # --- 新增：指纹校验逻辑 ---
-        is_valid, msg = self.is_valid_abc_receipt(self.doc)
-        if not is_valid:
+        # --- 指纹识别：判断是哪家银行的回单，选用对应的版式 ---
+        layout, msg = detect_receipt_layout(self.doc)
+        if layout is None:
             self.safe_gui_update(self._show_analysis_error, msg)
             return
+        self.safe_gui_update(self.log, f"{msg}，正在分析...")
 
         try:
             total_receipts = 0
-            for page_idx, page in enumerate(self.doc):
-                width, height = page.rect.width, page.rect.height
-                paths = page.get_drawings()
-                separator_tops = [p['rect'].y0 for p in paths if p['dashes'] and p['rect'].width > width * 0.8 and p['rect'].height < 2]
-                boundaries = sorted(list(set([0] + separator_tops + [height])))
-                receipt_rects = [fitz.Rect(0, boundaries[i] + 2, width, boundaries[i+1] - 2) 
-                                for i in range(len(boundaries) - 1) 
-                                if boundaries[i+1] - boundaries[i] > 150]
-                
-                # 如果没有识别到分隔线，尝试基于"回单编号"标签位置来分割
-                if not receipt_rects or len(receipt_rects) == 1:
-                    all_words = page.get_text("words")
-                    receipt_no_labels = []
-                    for w in all_words:
-                        if "回单编号" in w[4]:
-                            w_rect = fitz.Rect(w[:4])
-                            receipt_no_labels.append(w_rect.y0)
-                    
-                    if len(receipt_no_labels) > 1:
-                        # 基于"回单编号"标签位置重新分割
-                        receipt_no_labels = sorted(set(receipt_no_labels))
-                        # 为每个回单编号标签创建区域（从标签上方50像素到下一个标签上方50像素）
-                        new_boundaries = [0]
-                        for label_y in receipt_no_labels:
-                            new_boundaries.append(label_y - 50)  # 标签上方50像素
-                        new_boundaries.append(height)
-                        new_boundaries = sorted(set(new_boundaries))
-                        
-                        # 创建新的回单区域
-                        receipt_rects = []
-                        for i in range(len(new_boundaries) - 1):
-                            if new_boundaries[i+1] - new_boundaries[i] > 150:
-                                receipt_rects.append(fitz.Rect(0, new_boundaries[i], width, new_boundaries[i+1]))
-                
-                if not receipt_rects and height > 150:
-                    receipt_rects.append(page.rect)
-                
-                # 确保回单区域按y坐标排序
-                receipt_rects.sort(key=lambda r: r.y0)
-
-                for crop_rect in receipt_rects:
-                    words = page.get_text("words", clip=crop_rect)
-                    if not words: continue
-
-                    def find_text_from_anchor(anchor_texts, search_width=300, x_offset=0, y_offset_v=3):
-                        """
-                        从锚点文本位置查找并提取后续的文本内容
-                        
-                        在PDF页面中查找指定的锚点文本（如"金额（小写）"），
-                        然后在其右侧的搜索区域内提取文本内容。
-                        
-                        :param anchor_texts: 锚点文本列表，按优先级顺序查找
-                        :param search_width: 搜索区域的宽度（像素），默认300
-                        :param x_offset: X轴偏移量，默认0
-                        :param y_offset_v: Y轴垂直方向的容差，默认3像素
-                        :return: 找到的文本内容字符串，如果未找到则返回None
-                        """
-                        for anchor_text in anchor_texts:
-                            anchor_words = [w for w in words if anchor_text in w[4]]
-                            if not anchor_words: continue
-
-                            anchor_rect = fitz.Rect(anchor_words[0][:4])
-                            search_rect = fitz.Rect(
-                                anchor_rect.x1 + x_offset,
-                                anchor_rect.y0 - y_offset_v,
-                                anchor_rect.x1 + search_width,
-                                anchor_rect.y1 + y_offset_v
-                            )
-
-                            found_words = [w for w in words if fitz.Rect(w[:4]).intersects(search_rect)]
-                            if not found_words: continue
-
-                            # 修复：按x坐标排序，确保正确的阅读顺序
-                            found_words.sort(key=itemgetter(0))
-                            return " ".join(w[4] for w in found_words)
-                        return None
-
-                    def extract_name_only(anchor_texts, search_width=250, stop_keywords=None):
-                        """
-                        精确提取户名，遇到停止关键词时停止
-                        
-                        从PDF页面中提取付款方或收款方的户名信息。
-                        通过查找锚点文本（如"付款方户名"），然后在同一行搜索户名，
-                        遇到停止关键词（如"账号"、"金额"）时停止提取。
-                        
-                        :param anchor_texts: 锚点文本列表，如["付款方户名", "付款方"]
-                        :param search_width: 搜索区域的宽度（像素），默认250
-                        :param stop_keywords: 停止关键词列表，遇到这些词时停止提取，默认包含"账号"、"金额"等
-                        :return: 提取到的户名字符串，如果未找到则返回None
-                        """
-                        if stop_keywords is None:
-                            stop_keywords = ["账号", "账户", "开户行", "金额", "日期", "摘要", "用途", "备注", "回单编号"]
-                        
-                        for anchor_text in anchor_texts:
-                            anchor_words = [w for w in words if anchor_text in w[4]]
-                            if not anchor_words:
-                                continue
-
-                            anchor_rect = fitz.Rect(anchor_words[0][:4])
-                            anchor_y = anchor_rect.y0
-                            
-                            # 查找同一行的冒号位置
-                            search_start_x = anchor_rect.x1
-                            colon_found = False
-                            for w in words:
-                                w_rect = fitz.Rect(w[:4])
-                                w_text = w[4]
-                                # 查找同一行的冒号
-                                if abs(w_rect.y0 - anchor_y) < 5 and ("：" in w_text or ":" in w_text):
-                                    if w_rect.x0 >= anchor_rect.x0:
-                                        search_start_x = w_rect.x1
-                                        colon_found = True
-                                        break
-
-                            # 如果没有找到冒号，从锚点文本结束位置开始
-                            if not colon_found:
-                                search_start_x = anchor_rect.x1
-
-                            # 在同一行搜索户名，遇到停止关键词时停止
-                            found_words = []
-                            for w in words:
-                                w_rect = fitz.Rect(w[:4])
-                                w_text = w[4].strip()
-                                
-                                # 检查是否在同一行（y坐标相近，允许小误差）
-                                if abs(w_rect.y0 - anchor_y) < 5:
-                                    # 检查是否在搜索范围内（在冒号之后）
-                                    if w_rect.x0 >= search_start_x and w_rect.x0 < search_start_x + search_width:
-                                        # 遇到停止关键词时停止（检查完整词，避免误判）
-                                        should_stop = False
-                                        for kw in stop_keywords:
-                                            # 检查是否是独立的词（前后是空格、标点或边界）
-                                            # 对于中文，使用更宽松的匹配
-                                            if kw in w_text:
-                                                # 检查是否是完整词（前后是标点、空格或边界）
-                                                kw_pos = w_text.find(kw)
-                                                if kw_pos >= 0:
-                                                    before = w_text[kw_pos-1] if kw_pos > 0 else ' '
-                                                    after = w_text[kw_pos+len(kw)] if kw_pos+len(kw) < len(w_text) else ' '
-                                                    # 如果前后是标点、空格或中文字符边界，认为是完整词
-                                                    if before in [' ', '，', ',', '。', '.', '：', ':', '、', '（', '(', '）', ')'] or \
-                                                       after in [' ', '，', ',', '。', '.', '：', ':', '、', '（', '(', '）', ')']:
-                                                        should_stop = True
-                                                        break
-                                        if should_stop:
-                                            break
-                                        
-                                        # 跳过冒号、空白和标点符号
-                                        if w_text and w_text not in ["：", ":", " ", "，", ",", "。", "."]:
-                                            found_words.append(w)
-                            
-                            if found_words:
-                                # 按x坐标排序
-                                found_words.sort(key=itemgetter(0))
-                                # 提取文本并清理
-                                name_text = " ".join(w[4] for w in found_words)
-                                # 移除开头的冒号、空格等
-                                name_text = re.sub(r'^[：:\s，,。.]+', '', name_text)
-                                # 移除"户名 "或"户名"前缀
-                                name_text = re.sub(r'^户名\s*', '', name_text)
-                                # 再次检查停止关键词，确保截断
-                                for kw in stop_keywords:
-                                    if kw in name_text:
-                                        kw_pos = name_text.find(kw)
-                                        if kw_pos >= 0:
-                                            # 检查是否是完整词
-                                            before = name_text[kw_pos-1] if kw_pos > 0 else ' '
-                                            after = name_text[kw_pos+len(kw)] if kw_pos+len(kw) < len(name_text) else ' '
-                                            if before in [' ', '，', ',', '。', '.', '：', ':', '、', '（', '(', '）', ')'] or \
-                                               after in [' ', '，', ',', '。', '.', '：', ':', '、', '（', '(', '）', ')']:
-                                                name_text = name_text[:kw_pos].strip()
-                                                break
-                                # 清理末尾的标点
-                                name_text = re.sub(r'[，,。.\s]+$', '', name_text)
-                                if name_text:
-                                    return name_text.strip()
-                        
-                        return None
-
-                    # --- 数据提取与清洗 ---
-                    payer_name_text = extract_name_only(["付款方户名", "付款方", "户名"], search_width=200) or ""
-                    # 清理换行符和多余空格
-                    payer_name = payer_name_text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-                    payer_name = re.sub(r'\s+', ' ', payer_name).strip() or "未知付款方"
-
-                    receiver_name_text = extract_name_only(["收款方户名", "收款方", "户名"], search_width=200) or ""
-                    # 清理换行符和多余空格
-                    receiver_name = receiver_name_text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-                    receiver_name = re.sub(r'\s+', ' ', receiver_name).strip() or "未知收款方"
-
-                    def extract_receipt_no_with_pdfplumber(page_idx, crop_rect):
-                        """
-                        使用pdfplumber提取回单编号，严格匹配20位数字
-                        
-                        优先使用pdfplumber库从表格中提取回单编号，如果表格提取失败，
-                        则使用文本提取方式，通过正则表达式匹配20位数字。
-                        
-                        :param page_idx: PDF页面索引（从0开始）
-                        :param crop_rect: 裁剪区域的矩形坐标（fitz.Rect对象）
-                        :return: 20位数字的回单编号字符串，如果未找到则返回None
-                        """
-                        try:
-                            with pdfplumber.open(self.source_file) as pdf:
-                                if page_idx >= len(pdf.pages):
-                                    return None
-                                
-                                page = pdf.pages[page_idx]
-
-                                # 直接使用原始坐标，pdfplumber 也是默认左上角坐标系
-                                bbox = (crop_rect.x0, crop_rect.y0, crop_rect.x1, crop_rect.y1)
-                                
-                                cropped_page = page.crop(bbox)
-                                
-                                # 方法1：提取表格
-                                tables = cropped_page.extract_tables()
-                                if tables:
-                                    for table in tables:
-                                        for row in table:
-                                            row_text = " ".join([str(cell) if cell else "" for cell in row])
-                                            if "回单编号" in row_text:
-                                                for cell in row:
-                                                    if cell:
-                                                        cell_text = str(cell).strip()
-                                                        match = RECEIPT_NO_REGEX_20.search(cell_text)
-                                                        if match:
-                                                            return match.group(1)
-                                
-                                # 方法2：如果表格提取失败，使用文本提取
-                                text = cropped_page.extract_text()
-                                if text:
-                                    match = RECEIPT_NO_LABEL_REGEX_20.search(text)
-                                    if match:
-                                        return match.group(1)
-                        except Exception:
-                            pass
-                        
-                        return None
-                    
-                    def extract_receipt_no_with_pymupdf(anchor_texts, search_width=250, stop_keywords=None):
-                        """
-                        使用PyMuPDF提取回单编号，严格匹配20位数字
-                        
-                        从PDF页面中查找"回单编号"标签，然后在其右侧搜索区域内
-                        提取数字，组合成20位数字的回单编号。
-                        如果找到的数字长度不是20位，则返回None。
-                        
-                        :param anchor_texts: 锚点文本列表，通常为["回单编号"]
-                        :param search_width: 搜索区域的宽度（像素），默认250
-                        :param stop_keywords: 停止关键词列表，遇到这些词时停止搜索，默认包含"付款方"、"收款方"等
-                        :return: 20位数字的回单编号字符串，如果未找到或长度不正确则返回None
-                        """
-                        if stop_keywords is None:
-                            stop_keywords = ["付款方", "收款方", "账号", "账户", "开户行", "金额", "日期"]
-                        
-                        for anchor_text in anchor_texts:
-                            anchor_words = [w for w in words if anchor_text in w[4]]
-                            if not anchor_words:
-                                continue
-
-                            anchor_words.sort(key=lambda w: (w[1], w[0]))
-                            anchor_word = anchor_words[0]
-                            
-                            anchor_rect = fitz.Rect(anchor_word[:4])
-                            anchor_y = anchor_rect.y0
-                            
-                            y_tolerance = 3
-                            
-                            search_start_x = anchor_rect.x1
-                            for w in words:
-                                w_rect = fitz.Rect(w[:4])
-                                if abs(w_rect.y0 - anchor_y) < y_tolerance and (":" in w[4] or "：" in w[4]):
-                                    if w_rect.x0 >= anchor_rect.x0:
-                                        search_start_x = w_rect.x1
-                                        break
-
-                            found_words = []
-                            for w in words:
-                                w_rect = fitz.Rect(w[:4])
-                                w_text = w[4].strip()
-                                
-                                if abs(w_rect.y0 - anchor_y) > y_tolerance:
-                                    continue
-                                
-                                if w_rect.x0 >= search_start_x and w_rect.x0 < search_start_x + search_width:
-                                    if any(kw in w_text for kw in stop_keywords):
-                                        break
-                                    
-                                    if w_text and re.match(r'^\d+$', w_text):
-                                        found_words.append(w)
-                            
-                            if found_words:
-                                found_words.sort(key=itemgetter(0))
-                                no_text = "".join(w[4] for w in found_words)
-                                no_text_clean = re.sub(r'[^\d]', '', no_text)
-                                
-                                if len(no_text_clean) == 20:
-                                    return no_text_clean
-                        
-                        return None
-
-                    # --- 提取流程 ---
-                    # 1. 优先使用pdfplumber
-                    r_no_text = extract_receipt_no_with_pdfplumber(page_idx, crop_rect)
-                    
-                    # 2. 如果失败，使用PyMuPDF
-                    if not r_no_text:
-                        r_no_text = extract_receipt_no_with_pymupdf(["回单编号"], search_width=250)
-                    
-                    # 3. 最后手段：在区域文本中直接搜索
-                    if not r_no_text:
-                        crop_text = page.get_text(clip=crop_rect)
-                        if crop_text:
-                            match = RECEIPT_NO_LABEL_REGEX_20.search(crop_text)
-                            if match:
-                                r_no_text = match.group(1)
-                    
-                    # 清理回单编号中的换行符和空格
-                    if r_no_text:
-                        r_no = r_no_text.replace('\n', '').replace('\r', '').replace('\t', '').replace(' ', '').strip()
-                    else:
-                        r_no = "未知编号"
-
-                    r_amt_text = find_text_from_anchor(["金额（小写）"], search_width=150) or ""
-                    # 清理换行符和多余空格
-                    r_amt_text = r_amt_text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-                    r_amt_match = re.search(r'([0-9,]+\.\d{2})', r_amt_text)
-                    r_amt = r_amt_match.group(1).replace(",", "") if r_amt_match else "0.00"
-
-                    if r_amt == "0.00":
-                        full_text = page.get_text(clip=crop_rect)
-                        # 清理换行符
-                        full_text = full_text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
-                        amt_match = re.search(r'([0-9,]+\.\d{2})', full_text)
-                        if amt_match: r_amt = amt_match.group(1).replace(",", "")
-
-                    r_name = payer_name
-                    if local_company_name and local_company_name in payer_name:
-                        r_name = receiver_name
-                    
-                    total_receipts += 1
-                    # 存储付款方和收款方户名信息
-                    item_data = {
-                        "page_idx": page_idx, 
-                        "rect": list(crop_rect), 
-                        "name": self.clean_filename(r_name), 
-                        "no": r_no, 
-                        "amt": r_amt, 
-                        "seq": total_receipts,
-                        "payer_name": payer_name,  # 存储原始付款方户名
-                        "receiver_name": receiver_name  # 存储原始收款方户名
-                    }
-                    
-                    status = "正常" if "未知" not in r_name and "未知" not in r_no else "需核对"
-                    # 使用线程安全的方式插入数据和更新preview_data
-                    self.safe_gui_update(self._insert_tree_item_with_data, item_data, total_receipts, r_no, r_amt, status)
+            for item_data in analyze_document(self.doc, self.source_file, local_company_name, layout=layout,
+                                              speculative=True):
+                total_receipts = item_data["seq"]
+                # 标记以前已导出过的回单
+                if self.export_index and not item_data.get("duplicate_of"):
+                    existing = self.export_index.lookup(item_data["no"], item_data.get("content_hash"))
+                    if existing:
+                        item_data["status"] = "已导出"
+                        item_data["exported_path"] = existing["output_path"]
+                # 使用线程安全的方式插入数据和更新preview_data
+                self.safe_gui_update(self._insert_tree_item_with_data, item_data, total_receipts,
+                                     item_data["no"], item_data["amt"], item_data["status"])
 
             # 使用线程安全的方式更新状态
-            self.safe_gui_update(self._update_analysis_complete, total_receipts)
+            self.safe_gui_update(self._update_analysis_complete, total_receipts, layout)
 
         except Exception as e:
             error_msg = str(e)
@@ -1043,13 +1130,26 @@ class ReceiptSplitterApp:
         清空所有已解析的回单数据，重置界面状态。
         用于在加载新文件前清理旧数据。
         """
+        # 筛选时隐藏（detach）的行不在get_children中，按preview_data删除
+        item_ids = [item['item_id'] for item in self.preview_data if 'item_id' in item]
         self.preview_data = []
+        self.items_by_seq = {}
+        self.filter_index = None
+        self.summary.clear()
+        self._schedule_summary_refresh()
         self.payer_names = []
         self.receiver_names_map = {}
         self.combo_local_company.set("")
         self.combo_local_company['values'] = []
         # 隐藏确认按钮
         self.btn_confirm_company.grid_remove()
+        self.btn_export_records.config(state="disabled")
+        self.btn_summary.config(state="disabled")
+        self.btn_thumbnails.config(state="disabled")
+        self._close_thumbnail_view()
+        self.btn_review_scanned.grid_remove()
+        self.lbl_filter_count.config(text="")
+        self.tree.delete(*[item_id for item_id in item_ids if self.tree.exists(item_id)])
         for item in self.tree.get_children():
             self.tree.delete(item)
 
@@ -1084,11 +1184,15 @@ class ReceiptSplitterApp:
         final_amt = item_data.get('amt', amount) if item_data.get('amt') else amount
         
         self.preview_data.append(item_data)
+        self.items_by_seq[seq] = item_data
+        self.filter_index = None
+        self.summary.update(item_data)
+        self._schedule_summary_refresh()
         # 将item_id存储到item_data中，方便后续查找
         item_id = self.tree.insert("", "end", values=(seq, final_name, final_no, final_amt, status))
         item_data['item_id'] = item_id
 
-    def _update_analysis_complete(self, total_receipts):
+    def _update_analysis_complete(self, total_receipts, layout=None):
         """
         更新分析完成状态（在主线程中执行）
         
@@ -1096,8 +1200,10 @@ class ReceiptSplitterApp:
         1. 提取所有唯一的付款方户名，填充到下拉列表
         2. 更新状态栏显示分析结果
         3. 启用"开始拆分导出"按钮
+        4. 启动后台复核线程，逐条交叉校验回单编号和字段格式
         
         :param total_receipts: 总共识别到的回单数量
+        :param layout: 本次解析使用的版式（CompiledLayout对象），复核时使用同一版式
         """
         # 提取所有唯一的付款方户名
         payer_names_set = set()
@@ -1115,13 +1221,543 @@ class ReceiptSplitterApp:
         # 确保确认按钮隐藏
         self.btn_confirm_company.grid_remove()
         
-        if self.payer_names:
+        duplicate_count = sum(1 for item in self.preview_data if item.get('duplicate_of'))
+        scanned_count = len(self._refresh_scan_review())
+        if scanned_count:
+            self.log(f"解析完成，共发现 {total_receipts} 条回单，其中 {scanned_count} 条位于没有文字的扫描页上，"
+                     f"请点击\"核对扫描件\"逐条核对修改。")
+        elif duplicate_count:
+            self.log(f"解析完成，共发现 {total_receipts} 条回单，其中 {duplicate_count} 条位于重复页上（导出时跳过）。")
+        elif self.payer_names:
             self.log(f"解析完成，共发现 {total_receipts} 条回单。检测到 {len(self.payer_names)} 个不同的付款方户名。可选择本方公司户名进行更新，或使用默认值。")
         else:
             self.log(f"解析完成，共发现 {total_receipts} 条回单。请核对后点击开始拆分。")
         
         if total_receipts > 0:
             self.btn_process.config(state="normal")
+            self.btn_export_records.config(state="normal")
+            self.btn_summary.config(state="normal")
+            self.btn_thumbnails.config(state="normal")
+        # 解析过程中新增的行按当前筛选条件和排序重新显示
+        self.apply_filter()
+
+        # 解析全部完成后才开始复核，复核不与解析争抢CPU
+        if self.verifier:
+            self.verifier.close()
+        verifier = ReceiptVerifier(
+            self.source_file,
+            lambda seq, problems, no: self.safe_gui_update(self._on_receipt_verified, verifier, seq, problems, no),
+            layout)
+        self.verifier = verifier
+        verifier.submit(self.preview_data)
+
+    def _refresh_scan_review(self):
+        """
+        更新扫描件核对队列（在主线程中执行）
+
+        状态仍为"扫描件"的回单在核对队列中，修改保存后（状态变为"已修正"）自动移出。
+        队列不为空时显示"核对扫描件"按钮及剩余数量。
+
+        :return: 待核对的扫描件回单列表（按序号排列）
+        """
+        pending = [item for item in self.preview_data if item.get('status') == STATUS_SCANNED]
+        if pending:
+            self.btn_review_scanned.config(text=f"核对扫描件 ({len(pending)})")
+            self.btn_review_scanned.grid()
+        else:
+            self.btn_review_scanned.grid_remove()
+        return pending
+
+    def review_next_scanned(self):
+        """
+        选中下一条待核对的扫描件
+
+        从当前选中的回单之后开始查找，到末尾后从头开始，
+        选中后右侧显示原图，用户对照原图双击修改字段。
+        """
+        pending = self._refresh_scan_review()
+        if not pending:
+            self.log("没有待核对的扫描件。")
+            return
+        current_seq = 0
+        focus_id = self.tree.focus()
+        if focus_id:
+            try:
+                current_seq = int(self.tree.item(focus_id, 'values')[0])
+            except (ValueError, IndexError):
+                pass
+        item = next((item for item in pending if item['seq'] > current_seq), pending[0])
+        if not self._select_receipt(item):
+            return
+        self.log(f"扫描件待核对 {len(pending)} 条：请对照预览双击修改序号 {item['seq']} 的客户名称、回单编号和金额。")
+
+    def _select_receipt(self, item):
+        """
+        在列表中选中一条回单并滚动到可见位置（触发预览）
+
+        :param item: 回单数据字典
+        :return: 是否选中成功
+        """
+        item_id = item.get('item_id')
+        if not item_id or not self.tree.exists(item_id):
+            return False
+        if item_id not in self.tree.get_children():
+            # 被筛选隐藏的回单无法选中，先清除筛选条件
+            self.clear_filter()
+        self.tree.see(item_id)
+        self.tree.selection_set(item_id)
+        self.tree.focus(item_id)
+        return True
+
+    def open_archive_search(self):
+        """
+        打开归档检索窗口
+
+        在全文检索索引中查找以前导出的回单（客户名称、回单编号、户名或回单正文中的文字），
+        可按回单日期前缀（如2024-03）和回单编号前缀缩小范围，输入停顿后自动检索。
+        双击结果打开对应的文件。
+        """
+        if self.archive_window is not None and self.archive_window.winfo_exists():
+            self.archive_window.lift()
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("归档检索")
+        window.geometry("900x500")
+        window.transient(self.root)
+
+        query_frame = ttk.Frame(window)
+        query_frame.pack(fill="x", padx=10, pady=(10, 5))
+        self.archive_text_var = tk.StringVar()
+        self.archive_date_var = tk.StringVar()
+        self.archive_no_var = tk.StringVar()
+        ttk.Label(query_frame, text="检索词:").pack(side="left")
+        entry_text = ttk.Entry(query_frame, textvariable=self.archive_text_var, width=30)
+        entry_text.pack(side="left", padx=(5, 15))
+        ttk.Label(query_frame, text="日期:").pack(side="left")
+        ttk.Entry(query_frame, textvariable=self.archive_date_var, width=12).pack(side="left", padx=(5, 15))
+        ttk.Label(query_frame, text="回单编号:").pack(side="left")
+        ttk.Entry(query_frame, textvariable=self.archive_no_var, width=22).pack(side="left", padx=5)
+        for var in (self.archive_text_var, self.archive_date_var, self.archive_no_var):
+            var.trace_add("write", lambda *args: self._schedule_archive_search())
+
+        list_frame = ttk.Frame(window)
+        list_frame.pack(fill="both", expand=True, padx=10, pady=5)
+        columns = ("date", "name", "receipt_no", "amount", "path")
+        tree = ttk.Treeview(list_frame, columns=columns, show="headings")
+        for column, title, width in (("date", "日期", 90), ("name", "客户名称", 180), ("receipt_no", "回单编号", 170),
+                                     ("amount", "金额", 90), ("path", "文件", 340)):
+            tree.heading(column, text=title)
+            tree.column(column, width=width, anchor="e" if column == "amount" else "w")
+        scroll = ttk.Scrollbar(list_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        tree.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="right", fill="y")
+        tree.bind("<Double-1>", lambda event: self._open_archived_file())
+
+        self.lbl_archive_status = ttk.Label(window, text="", anchor="w")
+        self.lbl_archive_status.pack(fill="x", padx=10, pady=(0, 10))
+
+        def on_close():
+            if self._archive_search_job is not None:
+                self.root.after_cancel(self._archive_search_job)
+                self._archive_search_job = None
+            self.archive_window = None
+            self.archive_tree = None
+            window.destroy()
+
+        window.protocol("WM_DELETE_WINDOW", on_close)
+        self.archive_window = window
+        self.archive_tree = tree
+        entry_text.focus_set()
+        self._run_archive_search()
+
+    def _schedule_archive_search(self):
+        """输入停顿后再检索（连续输入只检索一次）"""
+        if self._archive_search_job is not None:
+            self.root.after_cancel(self._archive_search_job)
+        self._archive_search_job = self.root.after(ARCHIVE_SEARCH_DELAY, self._run_archive_search)
+
+    def _run_archive_search(self):
+        """按检索窗口中的条件检索并显示结果（在主线程中执行，索引查询只需几毫秒）"""
+        self._archive_search_job = None
+        if self.archive_window is None or self.archive is None:
+            return
+        started = time.perf_counter()
+        try:
+            results = self.archive.search(self.archive_text_var.get().strip(),
+                                          no_prefix=self.archive_no_var.get().strip(),
+                                          date_prefix=self.archive_date_var.get().strip())
+        except Exception as e:
+            self.lbl_archive_status.config(text=f"检索出错: {e}")
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        tree = self.archive_tree
+        tree.delete(*tree.get_children())
+        for row in results:
+            tree.insert("", "end", values=(row["receipt_date"] or "", row["name"], row["receipt_no"], row["amount"],
+                                           row["output_path"]))
+        self.lbl_archive_status.config(
+            text=f"找到 {len(results)} 条（用时 {elapsed:.0f} 毫秒），索引中共 {self.archive.count()} 张回单。双击打开文件")
+
+    def _open_archived_file(self):
+        """打开检索结果中选中的文件（对象存储中的文件只显示地址）"""
+        item_id = self.archive_tree.focus()
+        if not item_id:
+            return
+        path = self.archive_tree.item(item_id, "values")[4]
+        if "://" in path or not os.path.exists(path):
+            self.log(f"文件不在本机: {path}")
+            return
+        try:
+            os.startfile(path)
+        except Exception as e:
+            self.log(f"无法打开文件: {str(e)}")
+
+    def open_thumbnail_view(self):
+        """
+        打开缩略图总览窗口
+
+        把全部回单（重复页除外）以小图排成网格，"需核对"和"扫描件"用红框标出，
+        便于快速发现切错的回单。缩略图在多个工作进程中并行渲染，渲染完一张显示一张。
+        单击缩略图在主列表中选中该回单。
+        """
+        if self.thumbnail_window is not None and self.thumbnail_window.winfo_exists():
+            self.thumbnail_window.lift()
+            return
+        items = [item for item in self.preview_data if not item.get('duplicate_of')]
+        if not items or not self.doc:
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title(f"缩略图总览 - {os.path.basename(self.source_file)}")
+        window.geometry("900x640")
+
+        toolbar = ttk.Frame(window)
+        toolbar.pack(fill="x", padx=10, pady=(10, 5))
+        highlighted = sum(1 for item in items if item.get('status') in HIGHLIGHT_STATUSES)
+        summary_text = f"共 {len(items)} 条回单，红框 {highlighted} 条需核对（单击缩略图在列表中选中）"
+        ttk.Label(toolbar, text=summary_text).pack(side="left")
+        ttk.Button(toolbar, text="导出总览...", command=self.export_contact_sheet).pack(side="right")
+
+        canvas_frame = ttk.Frame(window)
+        canvas_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        canvas = tk.Canvas(canvas_frame, bg="white", highlightthickness=0)
+        scroll = ttk.Scrollbar(canvas_frame, orient="vertical", command=canvas.yview)
+        canvas.configure(yscrollcommand=scroll.set)
+        canvas.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="right", fill="y")
+
+        # 单元格大小按缩略图分辨率和最扁长的回单比例统一
+        cell_width = cell_height = 0
+        for item in items:
+            clip = fitz.Rect(item['rect']) & self.doc[item['page_idx']].rect
+            cell_width = max(cell_width, int(clip.width * THUMBNAIL_DPI / 72.0) + 1)
+            cell_height = max(cell_height, int(clip.height * THUMBNAIL_DPI / 72.0) + 1)
+        columns = max(1, (880 - THUMBNAIL_GAP) // (cell_width + THUMBNAIL_GAP))
+        row_height = cell_height + THUMBNAIL_LABEL_HEIGHT + THUMBNAIL_GAP
+
+        self.thumbnail_generation += 1
+        self.thumbnail_cells = {}
+        self.thumbnail_images = {}
+        for index, item in enumerate(items):
+            row, col = divmod(index, columns)
+            x = THUMBNAIL_GAP + col * (cell_width + THUMBNAIL_GAP)
+            y = THUMBNAIL_GAP + row * row_height
+            tag = f"cell{item['seq']}"
+            highlight = item.get('status') in HIGHLIGHT_STATUSES
+            canvas.create_rectangle(x, y, x + cell_width, y + cell_height, fill="#f0f0f0",
+                                    outline="red" if highlight else "gray", width=2 if highlight else 1,
+                                    tags=(tag, "outline"))
+            canvas.create_text(x, y + cell_height + 2, text=thumbnail_label(item), anchor="nw",
+                               fill="red" if highlight else "black", font=("TkDefaultFont", 8), tags=(tag,))
+            canvas.tag_bind(tag, "<Button-1>", lambda event, data=item: self._select_receipt(data))
+            self.thumbnail_cells[item['seq']] = (x, y)
+        rows = (len(items) + columns - 1) // columns
+        canvas.configure(scrollregion=(0, 0, THUMBNAIL_GAP + columns * (cell_width + THUMBNAIL_GAP),
+                                       THUMBNAIL_GAP + rows * row_height))
+        canvas.bind("<MouseWheel>", lambda event: canvas.yview_scroll(int(-1 * (event.delta / 120)), "units"))
+        canvas.bind("<Button-4>", lambda event: canvas.yview_scroll(-1, "units"))
+        canvas.bind("<Button-5>", lambda event: canvas.yview_scroll(1, "units"))
+
+        window.protocol("WM_DELETE_WINDOW", self._close_thumbnail_view)
+        self.thumbnail_window = window
+        self.thumbnail_canvas = canvas
+
+        # 后台线程并行渲染，结果逐张交回主线程
+        generation = self.thumbnail_generation
+        stop = threading.Event()
+        self._thumbnail_stop = stop
+        source_file = self.source_file
+        tasks = [{'seq': item['seq'], 'page_idx': item['page_idx'], 'rect': list(item['rect'])} for item in items]
+
+        def worker():
+            try:
+                for seq, ppm in iter_thumbnails(source_file, tasks):
+                    if stop.is_set():
+                        break
+                    self.safe_gui_update(self._on_thumbnail, generation, seq, ppm)
+            except Exception as e:
+                self.safe_gui_update(self.log, f"缩略图渲染失败: {e}")
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def _on_thumbnail(self, generation, seq, ppm_data):
+        """
+        显示一张渲染完成的缩略图（在主线程中执行）
+
+        :param generation: 总览版本号，与当前窗口不一致时丢弃
+        :param seq: 回单序号
+        :param ppm_data: PPM格式的图片数据
+        """
+        if generation != self.thumbnail_generation or self.thumbnail_canvas is None:
+            return
+        position = self.thumbnail_cells.get(seq)
+        if position is None:
+            return
+        image = tk.PhotoImage(data=ppm_data)
+        self.thumbnail_images[seq] = image
+        self.thumbnail_canvas.create_image(position[0], position[1], anchor="nw", image=image, tags=(f"cell{seq}",))
+        # 红框保持在图片上方
+        self.thumbnail_canvas.tag_raise("outline")
+
+    def _close_thumbnail_view(self):
+        """关闭缩略图总览窗口并停止后台渲染"""
+        if self._thumbnail_stop is not None:
+            self._thumbnail_stop.set()
+            self._thumbnail_stop = None
+        self.thumbnail_generation += 1
+        if self.thumbnail_window is not None and self.thumbnail_window.winfo_exists():
+            self.thumbnail_window.destroy()
+        self.thumbnail_window = None
+        self.thumbnail_canvas = None
+        self.thumbnail_cells = {}
+        self.thumbnail_images = {}
+
+    def export_contact_sheet(self):
+        """将缩略图总览导出为PDF（A4分页）或PNG图片"""
+        if not self.doc or not self.preview_data:
+            return
+        source_stem = os.path.splitext(os.path.basename(self.source_file))[0]
+        output_path = filedialog.asksaveasfilename(
+            parent=self.thumbnail_window, title="导出缩略图总览", initialfile=f"{source_stem}_总览.pdf",
+            defaultextension=".pdf", filetypes=[("PDF", "*.pdf"), ("PNG", "*.png")])
+        if not output_path:
+            return
+        try:
+            paths = write_contact_sheet(self.doc, list(self.preview_data), output_path)
+        except Exception as e:
+            messagebox.showerror("错误", f"导出缩略图总览失败: {e}", parent=self.thumbnail_window)
+            return
+        self.log(f"已导出缩略图总览至 {', '.join(os.path.basename(path) for path in paths)}")
+
+    def _filter_conditions(self):
+        """
+        读取筛选栏中的条件（无法识别的金额和页码视为未填写）
+
+        :return: 字典，键与ReceiptFilterIndex.query的参数一致
+        """
+        status = self.filter_status_var.get()
+        page = self.filter_page_var.get().strip()
+        amt_min = self.filter_amt_min_var.get().strip()
+        amt_max = self.filter_amt_max_var.get().strip()
+        return {
+            "name": self.filter_name_var.get().strip(),
+            "no_prefix": self.filter_no_var.get().strip(),
+            "amt_min": parse_amount(amt_min) if amt_min else None,
+            "amt_max": parse_amount(amt_max) if amt_max else None,
+            "status": "" if status == FILTER_STATUS_OPTIONS[0] else status,
+            # 界面中的页码从1开始
+            "page_idx": int(page) - 1 if page.isdigit() and int(page) > 0 else None,
+        }
+
+    def apply_filter(self):
+        """
+        按筛选栏的条件和当前排序重新显示列表（在主线程中执行）
+
+        索引只在回单数据变化后重建一次；显示时用set_children一次性替换列表中的行，
+        不符合条件的行被隐藏（detach）而不是删除。
+        """
+        self._filter_refresh_job = None
+        if not self.preview_data:
+            return
+        if self.filter_index is None:
+            self.filter_index = ReceiptFilterIndex(self.preview_data)
+        conditions = self._filter_conditions()
+        results = self.filter_index.query(sort_by=self.sort_column, reverse=self.sort_reverse, **conditions)
+        self.tree.set_children("", *[item['item_id'] for item in results if 'item_id' in item])
+        if any(value not in ("", None) for value in conditions.values()):
+            self.lbl_filter_count.config(text=f"{len(results)} / {len(self.preview_data)}")
+        else:
+            self.lbl_filter_count.config(text="")
+
+    def clear_filter(self):
+        """清除所有筛选条件，显示全部回单"""
+        for var in (self.filter_name_var, self.filter_no_var, self.filter_amt_min_var, self.filter_amt_max_var,
+                    self.filter_page_var):
+            var.set("")
+        self.filter_status_var.set(FILTER_STATUS_OPTIONS[0])
+        self.apply_filter()
+
+    def sort_tree_by(self, column):
+        """
+        按列排序（再次点击同一列切换升序/降序）
+
+        :param column: Treeview的列名
+        """
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column, self.sort_reverse = column, False
+        for name, title in self.column_titles.items():
+            arrow = (" ▼" if self.sort_reverse else " ▲") if name == column else ""
+            self.tree.heading(name, text=title + arrow)
+        self.apply_filter()
+
+    def _invalidate_filter(self):
+        """
+        回单数据已修改：丢弃筛选索引，稍后按当前条件重新筛选
+
+        后台复核等连续修改时，FILTER_REFRESH_DELAY内的多次修改只重建一次索引。
+        """
+        self.filter_index = None
+        if self._filter_refresh_job is None:
+            self._filter_refresh_job = self.root.after(FILTER_REFRESH_DELAY, self.apply_filter)
+
+    def open_summary_window(self):
+        """
+        打开客户汇总窗口
+
+        按客户名称和收付方向列出回单笔数和金额合计（Decimal精确计算，重复页不计入），
+        窗口打开期间随回单的新增、修改和客户名称更新自动刷新，可导出为CSV与账簿核对。
+        """
+        if self.summary_window is not None and self.summary_window.winfo_exists():
+            self.summary_window.lift()
+            return
+
+        window = tk.Toplevel(self.root)
+        window.title("客户汇总")
+        window.geometry("560x420")
+        window.transient(self.root)
+
+        list_frame = ttk.Frame(window)
+        list_frame.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+        columns = ("name", "direction", "count", "amount")
+        tree = ttk.Treeview(list_frame, columns=columns, show="headings")
+        tree.heading("name", text="客户名称")
+        tree.heading("direction", text="方向")
+        tree.heading("count", text="笔数")
+        tree.heading("amount", text="金额合计")
+        tree.column("name", width=240)
+        tree.column("direction", width=60, anchor="center")
+        tree.column("count", width=60, anchor="e")
+        tree.column("amount", width=120, anchor="e")
+        scroll = ttk.Scrollbar(list_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scroll.set)
+        tree.pack(side="left", fill="both", expand=True)
+        scroll.pack(side="right", fill="y")
+
+        bottom = ttk.Frame(window)
+        bottom.pack(fill="x", padx=10, pady=(0, 10))
+        self.lbl_summary_total = ttk.Label(bottom, text="", anchor="w")
+        self.lbl_summary_total.pack(side="left", fill="x", expand=True)
+        ttk.Button(bottom, text="导出汇总...", command=self.export_summary).pack(side="right")
+
+        def on_close():
+            self.summary_window = None
+            self.summary_tree = None
+            window.destroy()
+
+        window.protocol("WM_DELETE_WINDOW", on_close)
+        self.summary_window = window
+        self.summary_tree = tree
+        self._refresh_summary_window()
+
+    def _schedule_summary_refresh(self):
+        """汇总窗口打开时，稍后刷新一次（连续修改只刷新一次）"""
+        if self.summary_window is None or self._summary_refresh_job is not None:
+            return
+        self._summary_refresh_job = self.root.after(SUMMARY_REFRESH_DELAY, self._refresh_summary_window)
+
+    def _refresh_summary_window(self):
+        """
+        刷新汇总窗口（在主线程中执行）
+
+        只重绘汇总行（每个客户和方向一行），与回单数量无关。
+        """
+        self._summary_refresh_job = None
+        if self.summary_tree is None:
+            return
+        self.summary_tree.delete(*self.summary_tree.get_children())
+        for name, direction, count, amount in self.summary.rows():
+            self.summary_tree.insert("", "end", values=(name, direction, count, f"{amount:,.2f}"))
+        totals = self.summary.direction_totals()
+        parts = []
+        for direction in (DIRECTION_RECEIVE, DIRECTION_PAY):
+            if direction in totals:
+                count, amount = totals[direction]
+                parts.append(f"{direction} {count} 笔，合计 {amount:,.2f}")
+        if self.summary.unparsed:
+            parts.append(f"{len(self.summary.unparsed)} 笔金额无法识别（按0计入）")
+        self.lbl_summary_total.config(text="；".join(parts))
+
+    def export_summary(self):
+        """将客户汇总导出为CSV文件"""
+        source_stem = os.path.splitext(os.path.basename(self.source_file))[0] if self.source_file else "回单"
+        output_path = filedialog.asksaveasfilename(
+            parent=self.summary_window, title="导出客户汇总", initialfile=f"{source_stem}_客户汇总.csv",
+            defaultextension=".csv", filetypes=[("CSV", "*.csv")])
+        if not output_path:
+            return
+        try:
+            count = write_summary_csv(self.summary, output_path)
+        except OSError as e:
+            messagebox.showerror("错误", f"导出客户汇总失败: {e}", parent=self.summary_window)
+            return
+        self.log(f"已导出 {count} 行客户汇总至 {os.path.basename(output_path)}")
+
+    def _on_receipt_verified(self, verifier, seq, problems, plumber_no):
+        """
+        处理一条回单的复核结果（在主线程中执行）
+        
+        PyMuPDF未能提取到回单编号而pdfplumber提取到时，直接采用pdfplumber的结果，
+        补上编号后没有其他问题的回单状态由"需核对"恢复为"正常"（与先用pdfplumber提取时的结果一致）；
+        仍有问题的回单状态由"正常"改为"需核对"，问题说明在选中该回单时显示在状态栏。
+        用户已手动修正过的回单不再改动；其他状态（"已更新"、"已导出"、"重复页"等）保持不变，
+        问题说明只记录在verify_notes中。
+        回单按序号直接查找；只有编号或状态确实改变时才刷新该行并安排重新筛选（多次修改合并为一次）。
+        
+        :param verifier: 产生该结果的ReceiptVerifier对象（已不是当前复核线程时忽略结果）
+        :param seq: 回单序号
+        :param problems: 问题说明列表
+        :param plumber_no: pdfplumber提取到的回单编号，未提取到为None
+        """
+        if verifier is not self.verifier:
+            return
+        item = self.items_by_seq.get(seq)
+        if item is None or item.get('status') == "已修正":
+            return
+
+        before = (item.get('no'), item.get('status'))
+        if item.get('no') == "未知编号" and plumber_no:
+            item['no'] = plumber_no
+            problems = [p for p in problems if p != "回单编号格式不正确"]
+            if not problems and item.get('status') == "需核对":
+                item['status'] = "正常"
+                item.pop('verify_notes', None)
+        if problems:
+            item['verify_notes'] = problems
+            if item.get('status') == "正常":
+                item['status'] = "需核对"
+        if (item.get('no'), item.get('status')) == before:
+            return
+
+        if 'item_id' in item and self.tree.exists(item['item_id']):
+            current_values = list(self.tree.item(item['item_id'], 'values'))
+            current_values[2] = item['no']
+            current_values[4] = item['status']
+            self.tree.item(item['item_id'], values=tuple(current_values))
+        self._invalidate_filter()
 
     def _show_analysis_error(self, error_msg):
         """
@@ -1138,17 +1774,129 @@ class ReceiptSplitterApp:
         """
         开始拆分和导出处理流程
         
-        弹出目录选择对话框让用户选择保存位置，然后在后台线程中
-        执行PDF拆分和保存操作。处理过程中会显示进度条。
+        弹出目录选择对话框让用户选择保存位置（勾选"上传到对象存储"时输入存储地址），
+        然后在后台线程中执行PDF拆分和保存操作。处理过程中会显示进度条。
         """
+        if not self._confirm_unverified_export():
+            return
+        if self.upload_var.get():
+            self.start_upload()
+            return
         output_dir = filedialog.askdirectory(title="选择保存位置")
         if not output_dir: return
         self.btn_process.config(state="disabled")
         self.progress_bar['value'] = 0
         self.progress_bar['maximum'] = len(self.preview_data)
-        threading.Thread(target=self.process_and_save, args=(output_dir,), daemon=True).start()
+        # 在主线程中读取导出选项，避免线程安全问题
+        duplicate_mode = DUPLICATE_MODE_OPTIONS.get(self.combo_duplicate_mode.get(), DUPLICATE_SKIP)
+        export_mode = EXPORT_MODE_OPTIONS.get(self.combo_export_mode.get(), EXPORT_MODE_CROPBOX)
+        trim = self.trim_var.get()
+        shard_by = SHARD_OPTIONS.get(self.combo_shard.get(), SHARD_NONE)
+        dry_run = self.dry_run_var.get()
+
+        # 同一文件导出到同一目录时，检查上次是否中断
+        journal = None
+        if export_mode != EXPORT_MODE_COMBINED and export_mode not in PRINT_PER_PAGE:
+            journal = load_export_journal(self.source_file, output_dir)
+        if journal is not None and journal.done_count():
+            answer = messagebox.askyesnocancel(
+                "继续导出", f"该文件上次导出到此目录时中断，已完成 {journal.done_count()} 张回单。\n\n"
+                           f"是 - 从中断处继续（沿用上次的导出设置）\n否 - 重新开始导出")
+            if answer is None:
+                self._reset_processing_ui()
+                return
+            if answer:
+                # 沿用上次的导出设置，保证文件名和子文件夹与已导出的部分一致
+                export_mode = journal.header.get("export_mode", export_mode)
+                trim = journal.header.get("trim", trim)
+                shard_by = journal.header.get("shard_by", shard_by)
+                duplicate_mode = journal.header.get("duplicate_mode", duplicate_mode)
+                self.log(f"从中断处继续导出，跳过已完成的 {journal.done_count()} 张回单")
+            else:
+                journal = None
+        else:
+            journal = None
+
+        threading.Thread(target=self.process_and_save,
+                         args=(output_dir, duplicate_mode, export_mode, trim, shard_by, dry_run, journal),
+                         daemon=True).start()
+
+    def _confirm_unverified_export(self):
+        """
+        后台复核尚未完成时提醒用户
+
+        未复核的回单编号只由PyMuPDF提取，尚未经过pdfplumber交叉校验。
+
+        :return: 是否继续导出
+        """
+        pending = self.verifier.pending_count() if self.verifier else 0
+        if not pending:
+            return True
+        return messagebox.askyesno(
+            "复核尚未完成", f"后台复核尚未完成，还有 {pending} 张回单未经交叉校验，"
+                          f"其回单编号可能有误且不会标记为\"需核对\"。\n\n"
+                          f"是 - 仍然导出\n否 - 等待复核完成后再导出", icon="warning")
+
+    def start_upload(self):
+        """
+        开始拆分并上传到对象存储
 
-    def process_and_save(self, output_dir):
+        访问密钥和服务地址按boto3的默认方式读取（环境变量或~/.aws配置文件）。
+        不支持预演和中断后继续。
+        """
+        target = simpledialog.askstring("上传到对象存储", "存储地址（s3://存储桶/前缀）：",
+                                        initialvalue=self.s3_target, parent=self.root)
+        if not target:
+            return
+        target = target.strip()
+        try:
+            parse_s3_url(target)
+        except ValueError as e:
+            messagebox.showerror("地址错误", str(e))
+            return
+        if self.dry_run_var.get():
+            messagebox.showinfo("提示", "预演只支持导出到本地文件夹，请取消勾选\"仅预演\"或\"上传到对象存储\"")
+            return
+        self.s3_target = target
+        self.btn_process.config(state="disabled")
+        self.progress_bar['value'] = 0
+        self.progress_bar['maximum'] = len(self.preview_data)
+        duplicate_mode = DUPLICATE_MODE_OPTIONS.get(self.combo_duplicate_mode.get(), DUPLICATE_SKIP)
+        export_mode = EXPORT_MODE_OPTIONS.get(self.combo_export_mode.get(), EXPORT_MODE_CROPBOX)
+        trim = self.trim_var.get()
+        shard_by = SHARD_OPTIONS.get(self.combo_shard.get(), SHARD_NONE)
+        threading.Thread(target=self.process_and_upload,
+                         args=(target, duplicate_mode, export_mode, trim, shard_by), daemon=True).start()
+
+    def export_records(self):
+        """
+        导出回单明细数据
+        
+        将当前列表中的全部字段（含手工修改后的值）写入JSON Lines、CSV或SQLite文件，
+        供财务系统直接导入。写入在后台线程中进行。
+        """
+        if not self.preview_data:
+            return
+        source_stem = os.path.splitext(os.path.basename(self.source_file))[0]
+        output_path = filedialog.asksaveasfilename(
+            title="导出明细数据", initialfile=f"{source_stem}_明细.csv", defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"), ("JSON", "*.json"), ("SQLite", "*.sqlite3")])
+        if not output_path:
+            return
+        items = list(self.preview_data)
+        source_file = self.source_file
+
+        def worker():
+            try:
+                count = write_records(items, output_path, source_file)
+                self.safe_gui_update(self.log, f"已导出 {count} 条明细数据至 {os.path.basename(output_path)}")
+            except Exception as e:
+                self.safe_gui_update(self._show_export_error, str(e))
+
+        threading.Thread(target=worker, daemon=True).start()
+
+    def process_and_save(self, output_dir, duplicate_mode=DUPLICATE_SKIP, export_mode=EXPORT_MODE_CROPBOX, trim=False,
+                         shard_by=SHARD_NONE, dry_run=False, journal=None):
         """
         处理所有回单并保存为独立的PDF文件
         
@@ -1157,69 +1905,58 @@ class ReceiptSplitterApp:
         同时生成CSV格式的处理日志文件，记录每个文件的处理状态。
         
         :param output_dir: 输出目录路径，拆分后的PDF文件和日志文件将保存在此目录
+        :param duplicate_mode: 已导出过的回单的处理方式（跳过、创建链接或重新导出）
+        :param export_mode: 导出方式（整页裁剪、仅回单区域或合并为一个PDF）
+        :param trim: 是否删除回单区域以外的内容（整页裁剪方式下无效）
+        :param shard_by: 子文件夹分组方式（不分、按客户名称或按回单日期）
+        :param dry_run: 为True时只生成并显示导出计划，不写入任何文件
+        :param journal: 可选，上次中断的导出进度日志（ExportJournal），提供时从中断处继续
         """
         # 检查文档是否有效
         if not self.doc or self.source_file == "":
             self.safe_gui_update(self._show_export_error, "文档未加载或已被关闭，请重新选择PDF文件")
             return
         
-        log_filename = f"log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        log_filepath = os.path.join(output_dir, log_filename)
-        log_header = ["原文件名", "拆分后文件名", "生成时间", "状态"]
-
         try:
-            with open(log_filepath, 'w', newline='', encoding='utf-8-sig') as log_file:
-                writer = csv.writer(log_file)
-                writer.writerow(log_header)
-
-                success_count = 0
-                total_files = len(self.preview_data)
-                source_basename = os.path.basename(self.source_file)
-
-                for item in self.preview_data:
-                    # 确保文件名安全（使用clean_filename处理）
-                    safe_name = self.clean_filename(item.get('name', '未知'))
-                    safe_no = item.get('no', '未知编号').replace('\\', '_').replace('/', '_')
-                    safe_amt = item.get('amt', '0.00').replace('\\', '_').replace('/', '_')
-                    filename = f"{safe_name}_{safe_no}_{safe_amt}.pdf"
-                    save_path = os.path.join(output_dir, filename)
-                    
-                    try:
-                        # 检查文档是否仍然有效
-                        if not self.doc:
-                            raise Exception("文档已被关闭")
-                        
-                        counter = 1
-                        while os.path.exists(save_path):
-                            filename = f"{safe_name}_{safe_no}_{safe_amt}_{counter}.pdf"
-                            save_path = os.path.join(output_dir, filename)
-                            counter += 1
-                        
-                        # 验证页面索引有效性
-                        if item['page_idx'] >= len(self.doc):
-                            raise Exception(f"页面索引 {item['page_idx']} 超出文档范围")
-                        
-                        new_doc = fitz.open()
-                        new_doc.insert_pdf(self.doc, from_page=item['page_idx'], to_page=item['page_idx'])
-                        new_page = new_doc[0]
-                        new_page.set_cropbox(fitz.Rect(item['rect']))
-                        new_doc.save(save_path)
-                        new_doc.close()
-                        
-                        writer.writerow([source_basename, filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "成功"])
-                        success_count += 1
-
-                    except Exception as item_error:
-                        error_msg = f"失败: {str(item_error)}"
-                        writer.writerow([source_basename, filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), error_msg])
-
-                    finally:
-                        # 使用线程安全的方式更新进度
-                        current_progress = self.progress_bar['value'] + 1
-                        self.safe_gui_update(self._update_progress, current_progress, total_files)
-
-                # 使用线程安全的方式显示完成消息
-                self.safe_gui_update(self._show_completion_message, success_count, log_filename, output_dir)
+            # 进度计数保存在后台线程中，每秒只向界面提交几次
+            on_progress = ProgressThrottle(
+                lambda done, total: self.safe_gui_update(self._update_progress, done, total))
+
+            if export_mode == EXPORT_MODE_COMBINED:
+                source_stem = os.path.splitext(os.path.basename(self.source_file))[0]
+                output_filename = f"{source_stem}_合并_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+                placed = export_combined(self.doc, list(self.preview_data), os.path.join(output_dir, output_filename),
+                                         trim=trim, progress_callback=on_progress)
+                self.safe_gui_update(self._show_combined_message, placed, output_filename, output_dir)
+                return
+
+            if export_mode in PRINT_PER_PAGE:
+                # 打印排版：全部回单排入一个PDF，"子文件夹"选项用作分组（每组从新的一页开始）
+                source_stem = os.path.splitext(os.path.basename(self.source_file))[0]
+                output_filename = f"{source_stem}_打印_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+                placed, page_count = write_print_pdf(self.doc, list(self.preview_data),
+                                                     os.path.join(output_dir, output_filename),
+                                                     PRINT_PER_PAGE[export_mode], group_by=shard_by, trim=trim,
+                                                     progress_callback=on_progress)
+                self.safe_gui_update(self._show_combined_message, placed, output_filename, output_dir, page_count)
+                return
+
+            # 先生成导出计划：每个目标文件夹只列一次目录，重名在内存中解决
+            plan = plan_export(self.doc, self.source_file, list(self.preview_data), output_dir,
+                               export_index=self.export_index, duplicate_mode=duplicate_mode, shard_by=shard_by,
+                               journal=journal)
+            if dry_run:
+                self.safe_gui_update(self._show_export_plan, plan)
+                return
+
+            success_count, skipped_count, log_filename = export_receipts(
+                self.doc, self.source_file, list(self.preview_data), output_dir, progress_callback=on_progress,
+                export_index=self.export_index, duplicate_mode=duplicate_mode, export_mode=export_mode, trim=trim,
+                plan=plan, journal=journal, archive=self.archive)
+
+            # 使用线程安全的方式显示完成消息
+            self.safe_gui_update(self._show_completion_message, success_count, log_filename, output_dir,
+                                 skipped_count)
 
         except Exception as e:
             error_msg = str(e)
@@ -1229,19 +1966,102 @@ class ReceiptSplitterApp:
             # 使用线程安全的方式重置按钮和进度条
             self.safe_gui_update(self._reset_processing_ui)
 
+    def process_and_upload(self, target, duplicate_mode=DUPLICATE_SKIP, export_mode=EXPORT_MODE_CROPBOX, trim=False,
+                           shard_by=SHARD_NONE):
+        """
+        处理所有回单并上传到对象存储（在后台线程中执行）
+
+        回单PDF在内存中生成后交给上传线程池，不写本地临时文件；合并导出的大文件自动分块上传。
+        对象存储不支持链接，已导出过的回单在"创建链接"方式下也跳过。
+
+        :param target: 存储地址，如 s3://bucket/回单/2024-03
+        :param duplicate_mode: 已导出过的回单的处理方式
+        :param export_mode: 导出方式（整页裁剪、仅回单区域或合并为一个PDF）
+        :param trim: 是否删除回单区域以外的内容（整页裁剪方式下无效）
+        :param shard_by: 子文件夹分组方式（对象名前缀）
+        """
+        if not self.doc or self.source_file == "":
+            self.safe_gui_update(self._show_export_error, "文档未加载或已被关闭，请重新选择PDF文件")
+            return
+
+        sink = None
+        try:
+            on_progress = ProgressThrottle(
+                lambda done, total: self.safe_gui_update(self._update_progress, done, total))
+            bucket, prefix = parse_s3_url(target)
+            sink = S3Sink(bucket, prefix)
+
+            if export_mode == EXPORT_MODE_COMBINED:
+                source_stem = os.path.splitext(os.path.basename(self.source_file))[0]
+                output_filename = f"{source_stem}_合并_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+                placed = export_combined_to_sink(self.doc, list(self.preview_data), sink, output_filename,
+                                                 trim=trim, progress_callback=on_progress)
+                self.safe_gui_update(self._show_upload_message,
+                                     f"{placed} 张回单已合并上传" + self._unplaced_note(placed),
+                                     sink.location(output_filename))
+                return
+
+            if export_mode in PRINT_PER_PAGE:
+                source_stem = os.path.splitext(os.path.basename(self.source_file))[0]
+                output_filename = f"{source_stem}_打印_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+                out_doc, placed = build_print_document(self.doc, list(self.preview_data), PRINT_PER_PAGE[export_mode],
+                                                       group_by=shard_by, trim=trim, progress_callback=on_progress)
+                try:
+                    page_count = len(out_doc)
+                    write_document_to_sink(out_doc, sink, output_filename)
+                finally:
+                    out_doc.close()
+                self.safe_gui_update(self._show_upload_message,
+                                     f"{placed} 张回单排版为 {page_count} 页已上传" + self._unplaced_note(placed),
+                                     sink.location(output_filename))
+                return
+
+            success_count, skipped_count, failed_count, log_filename = export_to_sink(
+                self.doc, self.source_file, list(self.preview_data), sink, progress_callback=on_progress,
+                export_index=self.export_index, duplicate_mode=duplicate_mode, export_mode=export_mode, trim=trim,
+                shard_by=shard_by, archive=self.archive)
+            message = f"成功上传 {success_count} 个文件，跳过 {skipped_count} 个"
+            if failed_count:
+                message += f"，失败 {failed_count} 个（详见日志）"
+            self.safe_gui_update(self._show_upload_message, message, sink.location(log_filename), failed_count > 0)
+
+        except Exception as e:
+            self.safe_gui_update(self._show_export_error, str(e))
+
+        finally:
+            if sink is not None:
+                sink.close()
+            self.safe_gui_update(self._reset_processing_ui)
+
+    def _show_upload_message(self, message, location, has_failures=False):
+        """
+        显示上传完成消息（在主线程中执行）
+
+        :param message: 结果说明（上传、跳过和失败的数量）
+        :param location: 日志文件（合并导出时为合并文件）的存储地址
+        :param has_failures: 是否有回单生成或上传失败
+        """
+        self.log(f"上传完成！{message}。{location}")
+        if has_failures:
+            messagebox.showwarning("上传完成", f"{message}。\n{location}")
+        else:
+            messagebox.showinfo("上传完成", f"{message}。\n{location}")
+
     def _update_progress(self, current, total):
         """
         更新进度条（在主线程中执行）
         
         更新导出进度条的显示，同时更新状态栏消息。
+        后台线程通过ProgressThrottle限频调用，每秒最多几次。
         
         :param current: 当前已处理的文件数量
         :param total: 总共需要处理的文件数量
         """
+        self.progress_bar['maximum'] = total
         self.progress_bar['value'] = current
         self.log(f"正在导出... ({current}/{total})")
 
-    def _show_completion_message(self, success_count, log_filename, output_dir):
+    def _show_completion_message(self, success_count, log_filename, output_dir, skipped_count=0):
         """
         显示完成消息（在主线程中执行）
         
@@ -1250,15 +2070,76 @@ class ReceiptSplitterApp:
         :param success_count: 成功导出的文件数量
         :param log_filename: 生成的日志文件名
         :param output_dir: 输出目录路径
+        :param skipped_count: 因已导出过而跳过或链接的回单数量
         """
-        self.log(f"处理完成！成功导出 {success_count} 个文件。日志已保存至 {log_filename}")
-        messagebox.showinfo("成功", f"已成功拆分并保存 {success_count} 个回单文件！\n日志文件已生成：{log_filename}")
+        skipped_text = f"，{skipped_count} 个已导出过的回单未重复生成" if skipped_count else ""
+        manifest = manifest_filename(log_filename)
+        self.log(f"处理完成！成功导出 {success_count} 个文件{skipped_text}。日志已保存至 {log_filename}，"
+                 f"完整性清单 {manifest}")
+        messagebox.showinfo("成功", f"已成功拆分并保存 {success_count} 个回单文件{skipped_text}！\n"
+                                  f"日志文件已生成：{log_filename}\n完整性清单（SHA-256）：{manifest}")
         # 添加异常处理
         try:
             os.startfile(output_dir)
         except Exception as e:
             self.log(f"无法打开文件夹: {str(e)}")
 
+    def _show_export_plan(self, plan):
+        """
+        显示导出计划（预演模式，在主线程中执行）
+        
+        :param plan: receipt_core.ExportPlan对象
+        """
+        plan_win = tk.Toplevel(self.root)
+        plan_win.title("导出计划（预演，未写入任何文件）")
+        plan_win.geometry("800x500")
+        plan_win.transient(self.root)
+
+        txt_plan = tk.Text(plan_win, wrap="none", font=("Microsoft YaHei", 10))
+        plan_scroll = ttk.Scrollbar(plan_win, orient="vertical", command=txt_plan.yview)
+        txt_plan.configure(yscrollcommand=plan_scroll.set)
+        plan_scroll.pack(side="right", fill="y")
+        txt_plan.pack(side="left", fill="both", expand=True)
+        txt_plan.insert("1.0", plan.format_text())
+        txt_plan.config(state="disabled")
+
+        if plan.has_enough_space():
+            self.log(f"预演完成：将生成 {plan.count('write')} 个文件，未写入任何文件。")
+        else:
+            self.log("预演完成：输出目录所在磁盘空间不足！")
+
+    def _unplaced_note(self, placed_count):
+        """
+        合并导出和打印排版跳过了无法放置的回单时，附加在完成消息后的说明
+
+        :param placed_count: 成功放入的回单数量
+        :return: 说明文字，全部放入时为空字符串（重复页上的回单本来就不放入，不计为跳过）
+        """
+        skipped_count = sum(1 for item in self.preview_data if not item.get('duplicate_of')) - placed_count
+        return f"（{skipped_count} 张无法放入，已跳过）" if skipped_count > 0 else ""
+
+    def _show_combined_message(self, placed_count, output_filename, output_dir, page_count=None):
+        """
+        显示合并导出或打印排版完成消息（在主线程中执行）
+        
+        :param placed_count: 合并进PDF的回单数量
+        :param output_filename: 合并后的文件名
+        :param output_dir: 输出目录路径
+        :param page_count: 打印排版的页数，合并导出时为None
+        """
+        note = self._unplaced_note(placed_count)
+        if page_count is None:
+            self.log(f"处理完成！{placed_count} 张回单已合并导出至 {output_filename}{note}")
+            messagebox.showinfo("成功", f"已将 {placed_count} 张回单合并为一个PDF文件：\n{output_filename}{note}")
+        else:
+            self.log(f"处理完成！{placed_count} 张回单已排版为 {page_count} 页，保存至 {output_filename}{note}")
+            messagebox.showinfo("成功", f"已将 {placed_count} 张回单排版为 {page_count} 页A4（可一次打印）：\n"
+                                      f"{output_filename}{note}")
+        try:
+            os.startfile(output_dir)
+        except Exception as e:
+            self.log(f"无法打开文件夹: {str(e)}")
+
     def _show_export_error(self, error_msg):
         """
         显示导出错误（在主线程中执行）
@@ -1282,6 +2163,8 @@ class ReceiptSplitterApp:
 
 
 if __name__ == "__main__":
+    # 打包为exe后，缩略图渲染的工作进程需要
+    multiprocessing.freeze_support()
     root = tk.Tk()
     style = ttk.Style()
     style.theme_use('clam')
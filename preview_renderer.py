@@ -0,0 +1,246 @@
+"""
+回单预览的后台渲染
+
+图形界面先在主线程显示一张低分辨率草图，再由本模块的后台线程按目标分辨率
+分块（tile）渲染可见区域，渲染结果通过回调交回主线程显示。
+后台线程使用自己打开的文档对象，不与界面和分析线程共用同一个fitz.Document。
+
+同一页面上的几张回单共用一次整页渲染（PageRasterCache）：页面按某个分辨率只渲染一次，
+各回单和各分块都是从这张整页图中按行切出的片段，在同一页的回单之间切换时不再重新渲染。
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+
+# 预览分辨率的上下限
+PREVIEW_MIN_DPI = 36
+PREVIEW_MAX_DPI = 600
+# 草图的目标分辨率（草图按整数倍放大到目标尺寸）
+DRAFT_DPI = 50
+# 分块大小（像素）。分块较小可以让每次渲染调用很快返回，界面保持流畅
+TILE_SIZE = 512
+# 整页渲染缓存的页数
+PAGE_CACHE_PAGES = 4
+# 整页渲染的最大像素数（约18MB）；高倍缩放时整页图过大，改为只渲染所需区域
+PAGE_CACHE_MAX_PIXELS = 6 * 1000 * 1000
+
+
+def compute_preview_dpi(clip_width, canvas_width, zoom=1.0):
+    """
+    根据画布宽度和缩放倍数计算预览分辨率
+
+    缩放倍数为1时回单宽度恰好铺满画布。
+
+    :param clip_width: 回单区域宽度（PDF点，1/72英寸）
+    :param canvas_width: 画布宽度（像素）
+    :param zoom: 缩放倍数
+    :return: 分辨率（DPI，整数）
+    """
+    if clip_width <= 0:
+        return PREVIEW_MIN_DPI
+    dpi = canvas_width * 72.0 / clip_width * zoom
+    return int(max(PREVIEW_MIN_DPI, min(PREVIEW_MAX_DPI, dpi)))
+
+
+def draft_factor(dpi):
+    """
+    草图的放大倍数：草图以 dpi / factor 渲染，再放大factor倍显示
+
+    :param dpi: 目标分辨率
+    :return: 整数倍数（>=1）
+    """
+    return max(1, int(math.ceil(dpi / float(DRAFT_DPI))))
+
+
+def pixel_rect_to_clip(crop_rect, dpi, x0, y0, x1, y1):
+    """
+    将预览图像上的像素区域换算为PDF页面上的裁剪区域
+
+    :param crop_rect: 回单区域（fitz.Rect）
+    :param dpi: 预览分辨率
+    :param x0, y0, x1, y1: 预览图像上的像素坐标
+    :return: fitz.Rect（已限制在回单区域内）
+    """
+    scale = dpi / 72.0
+    clip = fitz.Rect(crop_rect.x0 + x0 / scale, crop_rect.y0 + y0 / scale,
+                     crop_rect.x0 + x1 / scale, crop_rect.y0 + y1 / scale)
+    return clip & crop_rect
+
+
+def tiles_for_region(width, height, x0, y0, x1, y1, tile_size=TILE_SIZE):
+    """
+    列出与可见区域相交的分块
+
+    :param width, height: 完整预览图像的像素尺寸
+    :param x0, y0, x1, y1: 可见区域（像素）
+    :return: 分块列表，每项为 (列号, 行号, 像素区域(x0, y0, x1, y1))
+    """
+    tiles = []
+    col_start = max(0, int(x0 // tile_size))
+    row_start = max(0, int(y0 // tile_size))
+    col_end = min(int(math.ceil(width / float(tile_size))), int(math.ceil(x1 / float(tile_size))))
+    row_end = min(int(math.ceil(height / float(tile_size))), int(math.ceil(y1 / float(tile_size))))
+    for row in range(row_start, row_end):
+        for col in range(col_start, col_end):
+            tiles.append((col, row, (col * tile_size, row * tile_size,
+                                     min(width, (col + 1) * tile_size), min(height, (row + 1) * tile_size))))
+    return tiles
+
+
+def render_clip_ppm(page, clip, dpi):
+    """
+    渲染页面的一部分，返回PPM格式的图片数据（tk.PhotoImage可直接使用）
+
+    :param page: fitz.Page对象
+    :param clip: 页面上的裁剪区域（fitz.Rect）
+    :param dpi: 分辨率，可以是小数（草图按目标分辨率的整数分之一渲染）
+    :return: PPM格式的图片数据
+    """
+    scale = dpi / 72.0
+    return page.get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip).tobytes("ppm")
+
+
+class PageRasterCache:
+    """
+    整页渲染缓存
+
+    页面按(页面索引, 分辨率)整页渲染一次并保留最近使用的几页，回单区域和分块从整页图中切出：
+    每行像素是整页图缓冲区的memoryview切片（不复制），只在拼成PPM数据时复制一次。
+    整页图超过PAGE_CACHE_MAX_PIXELS时不缓存，直接渲染所需区域。
+    一个缓存对象只在一个线程中使用。
+    """
+
+    def __init__(self, doc, max_pages=PAGE_CACHE_PAGES, max_pixels=PAGE_CACHE_MAX_PIXELS):
+        """
+        :param doc: fitz.Document对象
+        :param max_pages: 最多缓存的整页图数量
+        :param max_pixels: 可缓存的整页图最大像素数
+        """
+        self.doc = doc
+        self.max_pages = max_pages
+        self.max_pixels = max_pixels
+        self._pages = OrderedDict()  # (页面索引, 分辨率) -> fitz.Pixmap
+
+    def page_pixmap(self, page_idx, dpi):
+        """
+        :param page_idx: 页面索引
+        :param dpi: 分辨率
+        :return: 整页的fitz.Pixmap（RGB，无透明通道），整页图过大时返回None
+        """
+        key = (page_idx, dpi)
+        pix = self._pages.get(key)
+        if pix is not None:
+            self._pages.move_to_end(key)
+            return pix
+        page = self.doc[page_idx]
+        scale = dpi / 72.0
+        if page.rect.width * scale * page.rect.height * scale > self.max_pixels:
+            return None
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False)
+        self._pages[key] = pix
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+        return pix
+
+    def clip_ppm(self, page_idx, clip, dpi):
+        """
+        页面一部分的PPM格式图片数据
+
+        图片尺寸和像素位置与render_clip_ppm一致；整页渲染和单独渲染的抗锯齿边缘可能有轻微的像素值差异。
+
+        :param page_idx: 页面索引
+        :param clip: 页面上的裁剪区域（fitz.Rect）
+        :param dpi: 分辨率
+        :return: PPM格式的图片数据
+        """
+        pix = self.page_pixmap(page_idx, dpi)
+        if pix is None:
+            return render_clip_ppm(self.doc[page_idx], clip, dpi)
+        scale = dpi / 72.0
+        # 与get_pixmap(clip=...)相同的取整方式，切出的像素与单独渲染时对齐
+        area = (fitz.Rect(clip) * fitz.Matrix(scale, scale)).round() & pix.irect
+        if area.is_empty:
+            return render_clip_ppm(self.doc[page_idx], clip, dpi)
+        samples = pix.samples_mv
+        row_bytes = area.width * pix.n
+        first = (area.y0 - pix.y) * pix.stride + (area.x0 - pix.x) * pix.n
+        rows = [samples[offset:offset + row_bytes]
+                for offset in range(first, first + area.height * pix.stride, pix.stride)]
+        header = f"P6\n{area.width} {area.height}\n255\n".encode("ascii")
+        return header + b"".join(rows)
+
+    def clear(self):
+        """释放缓存的整页图"""
+        self._pages.clear()
+
+
+class PreviewRenderer:
+    """
+    预览分块的后台渲染线程
+
+    每次submit都会替换尚未渲染的旧任务（用户快速切换记录、缩放或滚动时，过期的分块不再渲染）。
+    渲染完成后在后台线程中调用 on_result(generation, key, ppm_bytes)，
+    调用方负责把结果转交给主线程。
+    """
+
+    def __init__(self, source_file, on_result):
+        """
+        :param source_file: PDF文件路径
+        :param on_result: 渲染结果回调，参数为(generation, key, ppm_bytes)
+        """
+        self.source_file = source_file
+        self.on_result = on_result
+        self._cond = threading.Condition()
+        self._pending = None  # (generation, [(key, page_idx, clip, dpi), ...])
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, generation, tasks):
+        """
+        提交一组分块渲染任务（替换尚未渲染的旧任务）
+
+        :param generation: 视图版本号，结果回调时原样传回
+        :param tasks: 任务列表，每项为 (key, page_idx, clip, dpi)
+        """
+        with self._cond:
+            self._pending = (generation, list(tasks))
+            self._cond.notify()
+
+    def close(self):
+        """停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify()
+
+    def _run(self):
+        doc = None
+        try:
+            doc = fitz.open(self.source_file)
+            cache = PageRasterCache(doc)
+            while True:
+                with self._cond:
+                    while self._pending is None and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        return
+                    generation, tasks = self._pending
+                    self._pending = None
+
+                for key, page_idx, clip, dpi in tasks:
+                    # 有新的任务提交时放弃剩余的旧分块
+                    if self._pending is not None or self._closed:
+                        break
+                    try:
+                        ppm = cache.clip_ppm(page_idx, clip, dpi)
+                    except Exception:
+                        continue
+                    self.on_result(generation, key, ppm)
+        except Exception:
+            pass
+        finally:
+            if doc is not None:
+                doc.close()
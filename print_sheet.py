@@ -0,0 +1,198 @@
+"""
+回单打印排版
+
+把回单区域按每张A4纸2张或3张排版到一个PDF中，整月的回单只需提交一次打印任务，
+不再需要逐个打印数千个单张回单文件：
+- 回单以矢量方式放置（show_pdf_page），来自同一源页面的回单共用同一个XObject
+- 每张回单上方标注序号、回单编号和金额，相邻回单之间画裁切虚线
+- 可按客户名称或回单日期分组，每组从新的一页开始，便于按客户装订
+
+命令行用法：
+    python print_sheet.py 回单.pdf --per-page 3 --group counterparty -o 回单_打印.pdf
+"""
+import argparse
+import os
+import sys
+
+import fitz  # PyMuPDF
+
+from contact_sheet import thumbnail_label
+from receipt_core import (SHARD_BY_COUNTERPARTY, SHARD_BY_DATE, SHARD_NONE, analyze_document, detect_receipt_layout,
+                          open_document, shard_dirname, trim_page_to_clip)
+
+# 每页可放置的回单数
+PER_PAGE_OPTIONS = (2, 3)
+# 默认每页回单数
+DEFAULT_PER_PAGE = 3
+
+# 页面排版（单位：PDF点）
+PRINT_MARGIN = 18
+PRINT_LABEL_HEIGHT = 10
+PRINT_FONT_SIZE = 7
+# 裁切线颜色和虚线样式
+CUT_LINE_COLOR = (0.6, 0.6, 0.6)
+CUT_LINE_DASHES = "[3 3] 0"
+
+
+def group_print_items(items, group_by=SHARD_NONE):
+    """
+    按打印顺序分组
+
+    重复页上的回单（带duplicate_of）不打印。分组时组内保持原顺序，组按名称排序。
+
+    :param items: 回单数据字典列表
+    :param group_by: SHARD_NONE（不分组）/ SHARD_BY_COUNTERPARTY / SHARD_BY_DATE
+    :return: 列表，每项为 (组名, 回单数据字典列表)；不分组时只有一组，组名为空字符串
+    """
+    items = [item for item in items if not item.get('duplicate_of')]
+    if group_by == SHARD_NONE:
+        return [("", items)] if items else []
+    groups = {}
+    for item in items:
+        groups.setdefault(shard_dirname(item, group_by), []).append(item)
+    return sorted(groups.items())
+
+
+def _cell_rects(page_rect, per_page):
+    """
+    :return: 每个回单位置的 (标注区域, 回单区域) 列表，自上而下
+    """
+    cell_height = (page_rect.height - 2 * PRINT_MARGIN) / per_page
+    cells = []
+    for index in range(per_page):
+        y0 = PRINT_MARGIN + index * cell_height
+        label = fitz.Rect(PRINT_MARGIN, y0, page_rect.width - PRINT_MARGIN, y0 + PRINT_LABEL_HEIGHT)
+        body = fitz.Rect(PRINT_MARGIN, label.y1, page_rect.width - PRINT_MARGIN, y0 + cell_height - 2)
+        cells.append((label, body))
+    return cells
+
+
+def _fit_rect(box, width, height):
+    """
+    回单在位置内的放置区域：能放下时保持原尺寸（按实际大小打印），放不下时等比缩小；水平居中、靠上
+
+    :return: fitz.Rect
+    """
+    scale = min(1.0, box.width / width, box.height / height)
+    x0 = box.x0 + (box.width - width * scale) / 2
+    return fitz.Rect(x0, box.y0, x0 + width * scale, box.y0 + height * scale)
+
+
+def build_print_document(doc, items, per_page=DEFAULT_PER_PAGE, group_by=SHARD_NONE, trim=False,
+                         progress_callback=None):
+    """
+    生成打印排版文档（不保存）
+
+    某张回单无法放置（如页面索引超出范围、区域无效）时跳过该回单，其位置留空，其余回单照常排版；
+    跳过的回单同样计入进度，调用方可按返回的成功数量与回单数量之差提示。
+
+    :param doc: 源fitz.Document对象
+    :param items: 回单数据字典列表
+    :param per_page: 每页的回单数（2或3）
+    :param group_by: 分组方式，每组从新的一页开始，SHARD_NONE / SHARD_BY_COUNTERPARTY / SHARD_BY_DATE
+    :param trim: 是否删除每张回单区域以外的内容（此时每张回单使用独立的XObject）
+    :param progress_callback: 可选的进度回调，参数为(已处理数量, 总数量)
+    :return: 元组(新的fitz.Document对象, 成功放入的回单数量)，调用方负责关闭文档
+    """
+    if per_page not in PER_PAGE_OPTIONS:
+        raise ValueError(f"每页回单数只能是 {' 或 '.join(str(n) for n in PER_PAGE_OPTIONS)}")
+    groups = group_print_items(items, group_by)
+    total = sum(len(group_items) for _, group_items in groups)
+    paper = fitz.paper_rect("a4")
+    cells = _cell_rects(paper, per_page)
+
+    out_doc = fitz.open()
+    placed = 0
+    done = 0
+    try:
+        for _, group_items in groups:
+            for start in range(0, len(group_items), per_page):
+                page = out_doc.new_page(width=paper.width, height=paper.height)
+                page_items = group_items[start:start + per_page]
+                for index, item in enumerate(page_items):
+                    label_rect, body_rect = cells[index]
+                    try:
+                        if item['page_idx'] >= len(doc):
+                            raise Exception(f"页面索引 {item['page_idx']} 超出文档范围")
+                        clip = fitz.Rect(item['rect']) & doc[item['page_idx']].rect
+                        target = _fit_rect(body_rect, clip.width, clip.height)
+                        if trim:
+                            scratch = trim_page_to_clip(doc, item['page_idx'], clip)
+                            try:
+                                page.show_pdf_page(target, scratch, 0, clip=clip)
+                            finally:
+                                scratch.close()
+                        else:
+                            page.show_pdf_page(target, doc, item['page_idx'], clip=clip)
+                        page.insert_text((target.x0, label_rect.y1 - 2), thumbnail_label(item),
+                                         fontsize=PRINT_FONT_SIZE)
+                        placed += 1
+                    except Exception:
+                        pass  # 跳过无法放置的回单，不影响整份打印文档
+                    finally:
+                        done += 1
+                        if progress_callback:
+                            progress_callback(done, total)
+                    # 与下一张回单之间的裁切线
+                    if index < len(page_items) - 1:
+                        y = cells[index + 1][0].y0 - 1
+                        page.draw_line((0, y), (paper.width, y), color=CUT_LINE_COLOR, width=0.5,
+                                       dashes=CUT_LINE_DASHES)
+    except Exception:
+        out_doc.close()
+        raise
+    return out_doc, placed
+
+
+def write_print_pdf(doc, items, output_path, per_page=DEFAULT_PER_PAGE, group_by=SHARD_NONE, trim=False,
+                    progress_callback=None):
+    """
+    生成打印排版PDF文件
+
+    :param doc: 源fitz.Document对象
+    :param items: 回单数据字典列表
+    :param output_path: 输出文件路径
+    :param per_page: 每页的回单数（2或3）
+    :param group_by: 分组方式，每组从新的一页开始
+    :param trim: 是否删除每张回单区域以外的内容
+    :param progress_callback: 可选的进度回调，参数为(已处理数量, 总数量)
+    :return: 元组(成功放入的回单数量, 页数)
+    """
+    out_doc, placed = build_print_document(doc, items, per_page, group_by, trim, progress_callback)
+    try:
+        page_count = len(out_doc)
+        out_doc.save(output_path, garbage=3, deflate=True)
+    finally:
+        out_doc.close()
+    return placed, page_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将回单按每页2张或3张排版为一个可直接打印的PDF")
+    parser.add_argument("pdf_file", help="回单PDF文件")
+    parser.add_argument("-o", "--output", default=None, help="输出文件路径，默认为源文件名加\"_打印\"")
+    parser.add_argument("--per-page", type=int, choices=PER_PAGE_OPTIONS, default=DEFAULT_PER_PAGE,
+                        help="每页回单数")
+    parser.add_argument("--group", choices=["none", SHARD_BY_COUNTERPARTY, SHARD_BY_DATE], default="none",
+                        help="按客户名称或回单日期分组，每组从新的一页开始")
+    parser.add_argument("--trim", action="store_true", help="删除回单区域以外的内容")
+    parser.add_argument("--company", action="append", default=[], help="本方公司户名（可重复指定）")
+    args = parser.parse_args()
+
+    doc = open_document(args.pdf_file)
+    try:
+        layout, msg = detect_receipt_layout(doc)
+        if layout is None:
+            print(f"{args.pdf_file}: {msg}", file=sys.stderr)
+            sys.exit(1)
+        items = list(analyze_document(doc, args.pdf_file, args.company, layout=layout))
+        output = args.output or f"{os.path.splitext(args.pdf_file)[0]}_打印.pdf"
+        group_by = SHARD_NONE if args.group == "none" else args.group
+        placed, page_count = write_print_pdf(doc, items, output, args.per_page, group_by, args.trim)
+        print(f"{placed} 张回单排版为 {page_count} 页 -> {output}")
+    finally:
+        doc.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+基于低分辨率渲染图的回单分隔线识别
+
+部分对账单的虚线分隔线不是矢量虚线：分隔线画在背景图片中，或者由大量很短的线段拼成，
+get_drawings()找不到带虚线样式的长线条。本模块把页面以低分辨率渲染一次（灰度），
+用NumPy按行统计墨迹，向量化地找出：
+- 横向虚线：墨迹横跨页面大部分宽度、由许多短段组成（实线表格边框只有一段，不会被误认）、
+  且只有一两个像素高的行
+- 空白带：整行没有墨迹的连续区域，用于没有分隔线时在相邻两个"回单编号"标签之间确定边界
+
+未安装NumPy时本模块的函数返回空结果，调用方退回原有的切分方式。
+"""
+import fitz  # PyMuPDF
+
+try:
+    import numpy
+except ImportError:  # NumPy为可选依赖
+    numpy = None
+
+# 渲染分辨率（DPI）：A4页面约400x560像素
+RASTER_DPI = 48
+# 灰度值小于该值的像素视为墨迹（细线在低分辨率下经抗锯齿后颜色很浅，阈值取得宽一些）
+INK_THRESHOLD = 235
+# 分隔线横跨页面宽度的最小比例
+RULE_MIN_EXTENT = 0.8
+# 分隔线所在行的墨迹占比范围（虚线的短段在低分辨率下经抗锯齿后较淡，下限取得低一些；实线接近全部）
+RULE_MIN_COVERAGE = 0.1
+RULE_MAX_COVERAGE = 0.9
+# 分隔线所在行的最少墨迹段数（虚线由许多短段组成）
+RULE_MIN_DASHES = 12
+# 分隔线的最大粗细（PDF点）
+RULE_MAX_THICKNESS = 3.0
+# 作为回单边界的空白带最小高度（PDF点）
+GAP_MIN_HEIGHT = 12.0
+
+
+class PageRaster:
+    """
+    页面的低分辨率墨迹图，同一页面上的分隔线和空白带识别共用一次渲染
+
+    墨迹按行预先统计为一维数组，之后的查找都是数组运算。
+    """
+
+    def __init__(self, page, dpi=RASTER_DPI):
+        """
+        :param page: fitz.Page对象
+        :param dpi: 渲染分辨率
+        """
+        pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+        gray = numpy.frombuffer(pix.samples_mv, dtype=numpy.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+        ink = gray < INK_THRESHOLD
+        self.height, self.width = ink.shape
+        # 每个像素行对应的PDF点数
+        self.scale = page.rect.height / float(self.height)
+        self.y_offset = page.rect.y0
+
+        has_ink = ink.any(axis=1)
+        first = ink.argmax(axis=1)
+        last = self.width - 1 - ink[:, ::-1].argmax(axis=1)
+        self.row_extent = numpy.where(has_ink, last - first + 1, 0) / float(self.width)
+        self.row_coverage = ink.mean(axis=1)
+        # 每行的墨迹段数 = 由空白变为墨迹的次数
+        self.row_runs = (ink[:, 1:] & ~ink[:, :-1]).sum(axis=1) + ink[:, 0]
+        self.row_blank = ~has_ink
+
+    def _to_points(self, row):
+        return self.y_offset + row * self.scale
+
+    def rule_positions(self):
+        """
+        横向虚线的位置
+
+        :return: 分隔线中心的y坐标列表（PDF点），按从上到下排序
+        """
+        candidate = ((self.row_extent >= RULE_MIN_EXTENT) &
+                     (self.row_coverage >= RULE_MIN_COVERAGE) &
+                     (self.row_coverage <= RULE_MAX_COVERAGE) &
+                     (self.row_runs >= RULE_MIN_DASHES))
+        max_rows = max(1, int(round(RULE_MAX_THICKNESS / self.scale)))
+        return [self._to_points((start + end) / 2.0) for start, end in _runs(candidate) if end - start <= max_rows]
+
+    def gap_bands(self, min_height=GAP_MIN_HEIGHT):
+        """
+        页面内部的空白带（不含贴着页面上下边缘的空白）
+
+        :param min_height: 空白带的最小高度（PDF点）
+        :return: 列表，每项为 (上边界y, 下边界y)（PDF点），按从上到下排序
+        """
+        min_rows = max(1, int(round(min_height / self.scale)))
+        return [(self._to_points(start), self._to_points(end)) for start, end in _runs(self.row_blank)
+                if end - start >= min_rows and start > 0 and end < self.height]
+
+
+def _runs(flags):
+    """
+    :param flags: 一维布尔数组
+    :return: 连续为True的区间列表 [(起始下标, 结束下标（不含）), ...]
+    """
+    padded = numpy.concatenate(([False], flags, [False]))
+    edges = numpy.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def render_page_raster(page, dpi=RASTER_DPI):
+    """
+    :param page: fitz.Page对象
+    :param dpi: 渲染分辨率
+    :return: PageRaster对象，未安装NumPy时返回None
+    """
+    if numpy is None:
+        return None
+    return PageRaster(page, dpi)
+
+
+def boundaries_between_labels(raster, label_tops):
+    """
+    在相邻两个标签之间的最高空白带中点处切分
+
+    空白带按渲染图的像素行计算，边缘可能比标签文字框的上边缘多出不到一行（文字框包含字形上方的留白），
+    因此先把空白带截到两个标签之间再比较。
+
+    :param raster: PageRaster对象
+    :param label_tops: 各回单中切分标签（如"回单编号"）上边缘的y坐标，已排序
+    :return: 边界y坐标列表（比标签数少一个）；任意两个相邻标签之间没有空白带时返回None
+    """
+    bands = raster.gap_bands()
+    boundaries = []
+    for upper, lower in zip(label_tops, label_tops[1:]):
+        between = []
+        for y0, y1 in bands:
+            y0, y1 = max(y0, upper), min(y1, lower)
+            if y1 > y0:
+                between.append((y1 - y0, (y0 + y1) / 2.0))
+        if not between:
+            return None
+        boundaries.append(max(between)[1])
+    return boundaries
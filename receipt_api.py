@@ -0,0 +1,216 @@
+"""
+回单拆分的Python库接口
+
+不依赖图形界面（不需要Tk），供其他Python程序直接调用：
+- iter_receipts：逐页解析PDF，惰性地产出ReceiptRecord。调用方可以随时停止迭代，
+  也可以把记录交给自己的工作线程处理，内存占用与回单数量无关
+- crop_record / save_record：单独裁剪或保存一张回单
+
+用法：
+    from receipt_api import iter_receipts, save_record
+
+    for record in iter_receipts("回单.pdf", own_companies=["本方公司户名"]):
+        print(record.seq, record.name, record.no, record.amt)
+        if record.duplicate_of is None:
+            save_record("回单.pdf", record, "输出目录")
+"""
+import os
+
+import fitz  # PyMuPDF
+
+from receipt_core import (EXPORT_MODE_CLIP, EXPORT_MODE_CROPBOX, analyze_document, build_receipt_filename,
+                          crop_receipt, detect_receipt_layout, get_layouts, open_document, save_pdf_atomic)
+
+
+class ReceiptFormatError(Exception):
+    """PDF不是可识别的银行回单，或指定的版式不存在"""
+
+
+class ReceiptRecord:
+    """
+    一张回单的解析结果
+
+    使用__slots__，每条记录只占用固定的少量内存；字段与analyze_document产出的字典一致：
+    - seq: 回单序号（从1开始）
+    - page_idx: 所在页面索引（从0开始）
+    - rect: 回单区域 (x0, y0, x1, y1)，单位为PDF点
+    - name: 客户名称（已清理为可用作文件名的文字）
+    - no: 回单编号
+    - amt: 金额字符串（如"1234.56"）
+    - date: 回单日期（YYYY-MM-DD），未识别到时为空字符串
+    - payer_name / receiver_name: 付款方 / 收款方户名
+    - status: 状态（"正常"、"需核对"、"重复页"）
+    - bank: 版式名（如"abc"）
+    - content_hash: 回单内容指纹
+    - duplicate_of: 重复页上的回单为原回单的序号，否则为None
+    """
+    __slots__ = ("seq", "page_idx", "rect", "name", "no", "amt", "date", "payer_name", "receiver_name",
+                 "status", "bank", "content_hash", "duplicate_of")
+
+    def __init__(self, seq, page_idx, rect, name, no, amt, date="", payer_name="", receiver_name="",
+                 status="", bank="", content_hash="", duplicate_of=None):
+        self.seq = int(seq)
+        self.page_idx = int(page_idx)
+        self.rect = tuple(float(v) for v in rect)
+        self.name = name
+        self.no = no
+        self.amt = amt
+        self.date = date
+        self.payer_name = payer_name
+        self.receiver_name = receiver_name
+        self.status = status
+        self.bank = bank
+        self.content_hash = content_hash
+        self.duplicate_of = duplicate_of
+
+    @classmethod
+    def from_item(cls, item):
+        """
+        由回单数据字典创建记录
+
+        :param item: analyze_document产出的回单数据字典
+        :return: ReceiptRecord对象
+        """
+        return cls(item["seq"], item["page_idx"], item["rect"], item.get("name", ""), item.get("no", ""),
+                   item.get("amt", ""), item.get("date", ""), item.get("payer_name", ""),
+                   item.get("receiver_name", ""), item.get("status", ""), item.get("bank", ""),
+                   item.get("content_hash", ""), item.get("duplicate_of"))
+
+    def to_dict(self):
+        """
+        转换为回单数据字典（可直接传给receipt_core和record_export中的函数）
+
+        :return: 字典
+        """
+        item = {field: getattr(self, field) for field in self.__slots__}
+        item["rect"] = list(self.rect)
+        if item["duplicate_of"] is None:
+            del item["duplicate_of"]
+        return item
+
+    def __repr__(self):
+        return (f"ReceiptRecord(seq={self.seq}, page_idx={self.page_idx}, name={self.name!r}, "
+                f"no={self.no!r}, amt={self.amt!r}, status={self.status!r})")
+
+
+def _read_source(source):
+    """
+    统一PDF来源：路径和bytes原样返回，文件对象尽量换成文件路径
+
+    磁盘上的文件打开后得到的文件对象（如open(path, "rb")）按其路径重新打开，由PyMuPDF按需读取页面，
+    不把整个文件读入内存；没有对应磁盘文件的文件对象（如io.BytesIO、网络流）只能把全部内容读入内存。
+
+    :param source: PDF文件路径、文件内容（bytes）或以二进制方式打开的文件对象
+    :return: 文件路径或bytes
+    """
+    if hasattr(source, "read"):
+        name = getattr(source, "name", None)
+        if isinstance(name, str) and os.path.isfile(name):
+            return name
+        return source.read()
+    if isinstance(source, os.PathLike):
+        return os.fspath(source)
+    return source
+
+
+def _resolve_layout(layout):
+    """
+    :param layout: None、版式名（如"abc"）或CompiledLayout对象
+    :return: CompiledLayout对象，None原样返回（表示自动识别）
+    """
+    if layout is None or not isinstance(layout, str):
+        return layout
+    layouts = get_layouts()
+    if layout not in layouts:
+        raise ReceiptFormatError(f"未知的回单版式: {layout}（可用: {', '.join(sorted(layouts))}）")
+    return layouts[layout]
+
+
+def iter_receipts(source, own_companies=(), layout=None, fast_path=True, skip_duplicate_pages=True):
+    """
+    逐页解析PDF，依次产出回单记录
+
+    这是一个生成器：文档在第一次迭代时打开，迭代结束或调用方提前停止（break、
+    生成器被关闭或回收）时自动关闭。
+
+    :param source: PDF文件路径、文件内容（bytes）或以二进制方式打开的文件对象
+                   （磁盘文件按路径读取；其他文件对象的内容会全部读入内存）
+    :param own_companies: 本方公司户名（单个户名、户名列表或CompanyMatcher），付款方为本方时客户名称取收款方
+    :param layout: 可选，版式名或CompiledLayout对象；不指定时按前几页内容自动识别银行
+    :param fast_path: 是否先整页扫描回单编号和金额（见analyze_document）
+    :param skip_duplicate_pages: 是否复用重复页的解析结果（重复页上的回单duplicate_of不为None）。
+                                 复用需要按页面指纹保留已解析页的结果，处理极大的文件且确定没有重复页时
+                                 可传False，内存占用不随页数增长
+    :return: 生成器，产出ReceiptRecord
+    :raises ReceiptFormatError: PDF无法打开、不是可识别的银行回单或版式不存在
+    """
+    source = _read_source(source)
+    layout = _resolve_layout(layout)
+    try:
+        doc = open_document(source)
+    except Exception as e:
+        raise ReceiptFormatError(f"无法打开PDF文件: {e}")
+    try:
+        if layout is None:
+            layout, msg = detect_receipt_layout(doc)
+            if layout is None:
+                raise ReceiptFormatError(msg)
+        for item in analyze_document(doc, source, own_companies, fast_path=fast_path, layout=layout,
+                                     skip_duplicate_pages=skip_duplicate_pages):
+            yield ReceiptRecord.from_item(item)
+    finally:
+        doc.close()
+
+
+def crop_record(source, record, export_mode=EXPORT_MODE_CROPBOX, trim=False):
+    """
+    将一张回单裁剪为新的PDF文档
+
+    :param source: 已打开的fitz.Document对象（处理多张回单时建议复用），或PDF文件路径/bytes/文件对象
+    :param record: ReceiptRecord对象或回单数据字典
+    :param export_mode: EXPORT_MODE_CROPBOX（整页复制+裁剪框）或 EXPORT_MODE_CLIP（只放置回单区域）
+    :param trim: 仅EXPORT_MODE_CLIP有效，是否删除回单区域以外的内容
+    :return: 只包含该回单的新fitz.Document对象（调用方负责关闭）
+    """
+    item = record.to_dict() if isinstance(record, ReceiptRecord) else record
+    if isinstance(source, fitz.Document):
+        return crop_receipt(source, item, export_mode, trim)
+    doc = open_document(_read_source(source))
+    try:
+        return crop_receipt(doc, item, export_mode, trim)
+    finally:
+        doc.close()
+
+
+def save_record(source, record, output, export_mode=EXPORT_MODE_CROPBOX, trim=False):
+    """
+    将一张回单保存为PDF文件
+
+    先写入临时文件再改名，中断时不会留下写了一半的文件。
+
+    :param source: 已打开的fitz.Document对象，或PDF文件路径/bytes/文件对象
+    :param record: ReceiptRecord对象或回单数据字典
+    :param output: 输出目录（按"客户名称_回单编号_金额.pdf"命名，重名时追加序号）或完整的文件路径
+    :param export_mode: EXPORT_MODE_CROPBOX 或 EXPORT_MODE_CLIP
+    :param trim: 仅EXPORT_MODE_CLIP有效，是否删除回单区域以外的内容
+    :return: 保存的文件路径
+    """
+    item = record.to_dict() if isinstance(record, ReceiptRecord) else record
+    if os.path.isdir(output):
+        counter = 0
+        save_path = os.path.join(output, build_receipt_filename(item))
+        while os.path.exists(save_path):
+            counter += 1
+            save_path = os.path.join(output, build_receipt_filename(item, counter))
+    else:
+        save_path = output
+
+    new_doc = crop_record(source, item, export_mode, trim)
+    try:
+        if export_mode == EXPORT_MODE_CLIP:
+            save_pdf_atomic(new_doc, save_path, garbage=3, deflate=True)
+        else:
+            save_pdf_atomic(new_doc, save_path)
+    finally:
+        new_doc.close()
+    return save_path
@@ -0,0 +1,301 @@
+"""
+已导出回单的全文检索归档索引
+
+每张导出的回单把字段（客户名称、回单编号、金额、日期、付款方/收款方户名）、回单区域的文字
+（与界面预览中"可复制文本"相同）、源文件、页码和输出路径写入本机SQLite数据库，
+并建立FTS5全文索引（trigram分词，中文任意三个字以上的片段都能检索）。
+导出时逐张增量写入，多年的归档也能在毫秒级查到：
+- 某个回单编号在哪个文件里
+- 某个客户在某个月的全部回单
+- 回单正文中出现某段文字（如摘要、账号）的回单
+
+SQLite不支持FTS5或trigram分词时退回普通的LIKE查询（结果相同，只是较慢）。
+
+命令行用法：
+    python receipt_archive.py search 上海乙 --month 2024-03
+    python receipt_archive.py search --no 1234567890 --min 1000 --max 5000
+    python receipt_archive.py index D:/回单归档      # 为本功能上线前导出的文件补建索引
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+from receipt_core import (APP_DATA_DIR, analyze_document, detect_receipt_layout, open_document,
+                          receipt_clean_text)
+from receipt_filter import parse_amount
+
+# 默认归档索引文件位置
+DEFAULT_ARCHIVE_PATH = os.path.join(APP_DATA_DIR, "archive_index.sqlite3")
+# 检索结果的默认条数上限
+DEFAULT_SEARCH_LIMIT = 500
+# trigram分词的最短检索词长度，更短的词改用LIKE匹配
+MIN_FTS_TERM_LENGTH = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archived_receipts (
+    id            INTEGER PRIMARY KEY,
+    output_path   TEXT NOT NULL UNIQUE,
+    name          TEXT,
+    receipt_no    TEXT,
+    amount        TEXT,
+    amount_value  REAL,
+    receipt_date  TEXT,
+    payer_name    TEXT,
+    receiver_name TEXT,
+    bank          TEXT,
+    content_hash  TEXT,
+    source_file   TEXT,
+    page_idx      INTEGER,
+    rect          TEXT,
+    body          TEXT,
+    exported_at   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_archive_receipt_no ON archived_receipts (receipt_no);
+CREATE INDEX IF NOT EXISTS idx_archive_name_date ON archived_receipts (name, receipt_date);
+CREATE INDEX IF NOT EXISTS idx_archive_date ON archived_receipts (receipt_date);
+CREATE INDEX IF NOT EXISTS idx_archive_amount ON archived_receipts (amount_value);
+"""
+
+# 外部内容FTS5表：正文只在archived_receipts中存一份，由触发器同步索引
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS archive_fts USING fts5(
+    name, receipt_no, payer_name, receiver_name, body,
+    content='archived_receipts', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS archive_fts_insert AFTER INSERT ON archived_receipts BEGIN
+    INSERT INTO archive_fts (rowid, name, receipt_no, payer_name, receiver_name, body)
+    VALUES (new.id, new.name, new.receipt_no, new.payer_name, new.receiver_name, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS archive_fts_delete AFTER DELETE ON archived_receipts BEGIN
+    INSERT INTO archive_fts (archive_fts, rowid, name, receipt_no, payer_name, receiver_name, body)
+    VALUES ('delete', old.id, old.name, old.receipt_no, old.payer_name, old.receiver_name, old.body);
+END;
+CREATE TRIGGER IF NOT EXISTS archive_fts_update AFTER UPDATE ON archived_receipts BEGIN
+    INSERT INTO archive_fts (archive_fts, rowid, name, receipt_no, payer_name, receiver_name, body)
+    VALUES ('delete', old.id, old.name, old.receipt_no, old.payer_name, old.receiver_name, old.body);
+    INSERT INTO archive_fts (rowid, name, receipt_no, payer_name, receiver_name, body)
+    VALUES (new.id, new.name, new.receipt_no, new.payer_name, new.receiver_name, new.body);
+END;
+"""
+
+# 不使用全文索引时，检索词在这些列中做子串匹配
+_TEXT_COLUMNS = ("name", "receipt_no", "payer_name", "receiver_name", "body")
+
+
+def _escape_like(text):
+    """转义LIKE中的通配符（配合 ESCAPE '\\' 使用）"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class ArchiveIndex:
+    """
+    已导出回单的全文检索索引
+
+    同一连接可以被导出线程和界面线程共用，内部用锁串行化访问。
+    同一输出路径再次导出时覆盖原记录。
+    """
+
+    def __init__(self, path=DEFAULT_ARCHIVE_PATH):
+        """
+        :param path: SQLite数据库文件路径，目录不存在时自动创建
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            # WAL模式下逐张提交的开销很小，导出时可以每张回单提交一次
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+            try:
+                self._conn.executescript(_FTS_SCHEMA)
+                self.full_text = True
+            except sqlite3.OperationalError:
+                # SQLite版本过旧（没有FTS5或trigram分词）
+                self.full_text = False
+
+    def add(self, item, output_path, source_file, text=""):
+        """
+        记录一张已导出的回单
+
+        :param item: 回单数据字典
+        :param output_path: 导出文件的完整路径，或对象存储地址
+        :param source_file: 源PDF文件路径
+        :param text: 回单区域的文字（见receipt_clean_text）
+        """
+        if "://" not in output_path:
+            output_path = os.path.abspath(output_path)
+        rect = item.get("rect") or ()
+        row = (output_path, item.get("name", ""), item.get("no", ""), item.get("amt", ""),
+               parse_amount(item.get("amt", "")), item.get("date", ""), item.get("payer_name", ""),
+               item.get("receiver_name", ""), item.get("bank", ""), item.get("content_hash", ""),
+               source_file if isinstance(source_file, str) else "", item.get("page_idx"),
+               ",".join(f"{v:.1f}" for v in rect), text, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        with self._lock, self._conn:
+            # 先删除再插入（INSERT OR REPLACE不会触发删除触发器，全文索引中会残留旧记录）
+            self._conn.execute("DELETE FROM archived_receipts WHERE output_path = ?", (output_path,))
+            self._conn.execute(
+                "INSERT INTO archived_receipts (output_path, name, receipt_no, amount, amount_value, receipt_date, "
+                "payer_name, receiver_name, bank, content_hash, source_file, page_idx, rect, body, exported_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+
+    def contains(self, output_path):
+        """:return: 该输出路径是否已在索引中"""
+        if "://" not in output_path:
+            output_path = os.path.abspath(output_path)
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM archived_receipts WHERE output_path = ?",
+                                      (output_path,)).fetchone() is not None
+
+    def count(self):
+        """:return: 索引中的回单数量"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM archived_receipts").fetchone()[0]
+
+    def search(self, text="", name="", no_prefix="", date_prefix="", amt_min=None, amt_max=None,
+               limit=DEFAULT_SEARCH_LIMIT):
+        """
+        检索已导出的回单
+
+        所有条件同时满足（空条件不限制），结果按回单日期从新到旧排列。
+
+        :param text: 全文检索词，空格分隔的多个词须同时出现（客户名称、回单编号、户名或回单正文中）
+        :param name: 客户名称（子串）
+        :param no_prefix: 回单编号前缀
+        :param date_prefix: 回单日期前缀，如"2024"、"2024-03"、"2024-03-15"
+        :param amt_min: 金额下限（含）
+        :param amt_max: 金额上限（含）
+        :param limit: 最多返回的条数
+        :return: 记录字典列表（output_path、name、receipt_no、amount、receipt_date、payer_name、
+                 receiver_name、source_file、page_idx、body等）
+        """
+        clauses = []
+        params = []
+        fts_terms = []
+        for term in text.split():
+            if self.full_text and len(term) >= MIN_FTS_TERM_LENGTH:
+                fts_terms.append('"' + term.replace('"', '""') + '"')
+            else:
+                pattern = f"%{_escape_like(term)}%"
+                clauses.append("(" + " OR ".join(f"{column} LIKE ? ESCAPE '\\'" for column in _TEXT_COLUMNS) + ")")
+                params.extend([pattern] * len(_TEXT_COLUMNS))
+        if fts_terms:
+            clauses.insert(0, "id IN (SELECT rowid FROM archive_fts WHERE archive_fts MATCH ?)")
+            params.insert(0, " AND ".join(fts_terms))
+        if name:
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            params.append(f"%{_escape_like(name)}%")
+        # 前缀条件写成区间比较，可以使用索引（LIKE默认不区分大小写，用不上普通索引）
+        if no_prefix:
+            clauses.append("receipt_no >= ? AND receipt_no < ?")
+            params.extend([no_prefix, no_prefix + "\uffff"])
+        if date_prefix:
+            clauses.append("receipt_date >= ? AND receipt_date < ?")
+            params.extend([date_prefix, date_prefix + "\uffff"])
+        if amt_min is not None:
+            clauses.append("amount_value >= ?")
+            params.append(amt_min)
+        if amt_max is not None:
+            clauses.append("amount_value <= ?")
+            params.append(amt_max)
+
+        sql = "SELECT * FROM archived_receipts"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY receipt_date DESC, id DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+def index_directory(archive, directory, progress_callback=None):
+    """
+    为目录（含子目录）中已有的拆分后回单文件补建索引
+
+    已在索引中的文件跳过；每个文件按版式解析出第一张回单的字段和文字。
+
+    :param archive: ArchiveIndex对象
+    :param directory: 归档目录
+    :param progress_callback: 可选的进度回调，参数为(已处理数量, 总数量)
+    :return: 元组(新加入索引的文件数, 无法识别的文件数)
+    """
+    paths = []
+    for folder, _, filenames in os.walk(directory):
+        paths.extend(os.path.join(folder, filename) for filename in filenames
+                     if filename.lower().endswith(".pdf"))
+    added = 0
+    unrecognized = 0
+    for done, path in enumerate(sorted(paths), 1):
+        try:
+            if archive.contains(path):
+                continue
+            doc = open_document(path)
+            try:
+                layout, _ = detect_receipt_layout(doc)
+                item = next(analyze_document(doc, path, layout=layout, speculative=True), None) if layout else None
+                if item is None:
+                    unrecognized += 1
+                    continue
+                archive.add(item, path, "", receipt_clean_text(doc[item["page_idx"]], item["rect"]))
+                added += 1
+            finally:
+                doc.close()
+        except Exception:
+            unrecognized += 1
+        finally:
+            if progress_callback:
+                progress_callback(done, len(paths))
+    return added, unrecognized
+
+
+def main():
+    parser = argparse.ArgumentParser(description="检索已导出的回单（全文索引）")
+    parser.add_argument("--db", default=DEFAULT_ARCHIVE_PATH, help="归档索引文件路径")
+    subparsers = parser.add_subparsers(dest="command")
+
+    search_parser = subparsers.add_parser("search", help="检索回单")
+    search_parser.add_argument("text", nargs="*", help="检索词（客户名称、回单编号、户名或正文中的文字）")
+    search_parser.add_argument("--name", default="", help="客户名称")
+    search_parser.add_argument("--no", default="", help="回单编号前缀")
+    search_parser.add_argument("--month", default="", help="回单日期前缀，如 2024-03")
+    search_parser.add_argument("--min", type=float, default=None, help="金额下限")
+    search_parser.add_argument("--max", type=float, default=None, help="金额上限")
+    search_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="最多显示的条数")
+
+    index_parser = subparsers.add_parser("index", help="为已有的归档目录补建索引")
+    index_parser.add_argument("directory", help="归档目录")
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        sys.exit(1)
+
+    archive = ArchiveIndex(args.db)
+    try:
+        if args.command == "index":
+            added, unrecognized = index_directory(archive, args.directory)
+            print(f"新加入索引 {added} 个文件，无法识别 {unrecognized} 个，索引中共 {archive.count()} 张回单")
+            return
+        results = archive.search(" ".join(args.text), name=args.name, no_prefix=args.no, date_prefix=args.month,
+                                 amt_min=args.min, amt_max=args.max, limit=args.limit)
+        for row in results:
+            print(f"{row['receipt_date'] or '-':10}  {row['name']}  {row['receipt_no']}  {row['amount']}  "
+                  f"{row['output_path']}")
+        print(f"共 {len(results)} 条", file=sys.stderr)
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    main()
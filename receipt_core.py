@@ -0,0 +1,1584 @@
+"""
+回单解析与拆分核心逻辑
+
+本模块不依赖tkinter，供图形界面(main.py)和本地HTTP拆分服务(receipt_service.py)共同调用：
+- 识别每页中的回单区域
+- 提取回单信息（客户名称、回单编号、金额等）
+- 将回单裁剪为独立的PDF文件
+"""
+import bisect
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+from operator import itemgetter
+
+import fitz  # PyMuPDF
+import pdfplumber  # 用于表格提取
+
+from raster_separators import boundaries_between_labels, render_page_raster
+from receipt_layout import DEFAULT_LAYOUT, BankClassifier, WordIndex, load_all_layouts
+from receipt_manifest import (MANIFEST_HEADER, bytes_sha256, file_sha256, manifest_filename, manifest_row,
+                              source_sha256)
+
+# --- Pre-compiled Regular Expressions for Performance and Maintainability ---
+# Regex for a 20-digit receipt number
+RECEIPT_NO_REGEX_20 = re.compile(r'(\d{20})')
+# Regex for finding a 20-digit number after the label
+RECEIPT_NO_LABEL_REGEX_20 = re.compile(r'回单编号[：:\s]*(\d{20})')
+# Regex for an amount with two decimals (thousands separators allowed)
+AMOUNT_REGEX = re.compile(r'([0-9,]+\.\d{2})')
+# Regex for the amount after the "金额（小写）" label
+AMOUNT_LABEL_REGEX = re.compile(r'金额（小写）[：:\s]*([0-9,]+\.\d{2})')
+# Regex for a normalised amount value (no thousands separators)
+AMOUNT_VALUE_REGEX = re.compile(r'^\d+\.\d{2}$')
+# Regex for a date such as 2024-03-15 / 2024年03月15日 / 2024/3/15
+DATE_REGEX = re.compile(r'(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})')
+
+# 与前面某页内容完全相同的页面上的回单状态
+STATUS_DUPLICATE_PAGE = "重复页"
+# 没有文字层的扫描页上的回单状态（字段无法提取，需人工核对）
+STATUS_SCANNED = "扫描件"
+
+# 页面类型
+PAGE_TEXT = "text"    # 有文字层，走正常的文字提取流程
+PAGE_IMAGE = "image"  # 只有图片（扫描件），按图片位置切分
+# 图片覆盖页面面积的比例达到该值且页面没有字体时，视为扫描页
+IMAGE_PAGE_MIN_COVERAGE = 0.5
+
+# 导出日志的表头
+LOG_HEADER = ["原文件名", "拆分后文件名", "生成时间", "状态"]
+
+# 本地数据目录（导出索引等跨运行的数据保存在这里）
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".abc_receipt_splitter")
+
+# 用户修改过的版式文件目录（优先于内置版式）
+USER_LAYOUT_DIR = os.path.join(APP_DATA_DIR, "layouts")
+
+# 本方公司户名列表（每行一个户名）
+OWN_COMPANIES_PATH = os.path.join(APP_DATA_DIR, "own_companies.txt")
+
+# 遇到已导出过的回单时的处理方式
+DUPLICATE_SKIP = "skip"      # 跳过，不再写文件
+DUPLICATE_LINK = "link"      # 在输出目录中创建指向已有文件的硬链接
+DUPLICATE_EXPORT = "export"  # 照常重新导出
+
+# 回单PDF的生成方式
+EXPORT_MODE_CROPBOX = "cropbox"  # 复制整页，用裁剪框只显示回单区域（相邻回单的内容仍在文件中）
+EXPORT_MODE_CLIP = "clip"        # 用show_pdf_page只放置回单区域，页面大小等于回单大小
+
+# 导出时按子文件夹分组的方式
+SHARD_NONE = ""                      # 全部放在输出目录中
+SHARD_BY_COUNTERPARTY = "counterparty"  # 按客户名称分子文件夹
+SHARD_BY_DATE = "date"               # 按回单日期分子文件夹
+
+# 导出进度日志的文件名前缀（保存在输出目录中，导出全部成功后自动删除）
+JOURNAL_PREFIX = ".export_journal_"
+# 写入中的临时文件后缀，写完后改名为正式文件名
+PARTIAL_SUFFIX = ".part"
+
+
+def clean_filename(text):
+    """
+    清理文本，使其适合用作文件名
+    
+    去除换行符、回车符、制表符，以及Windows文件系统不允许的字符，
+    确保生成的文件名合法且可读。
+    
+    :param text: 原始文本字符串
+    :return: 清理后的文本字符串，去除非法字符和多余的空白
+    """
+    # 先去除换行符和回车符，再去除文件系统不允许的字符
+    text = text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
+    # 将多个连续空格替换为单个空格
+    text = re.sub(r'\s+', ' ', text)
+    return re.sub(r'[\\/*?:"<>|]', "", text).strip()
+
+
+_layouts = None
+_bank_classifier = None
+
+
+def get_layouts():
+    """
+    全部回单版式（内置版式和用户版式），首次使用时加载并编译，之后复用
+
+    :return: 字典 {版式名: CompiledLayout}
+    """
+    global _layouts
+    if _layouts is None:
+        _layouts = load_all_layouts([USER_LAYOUT_DIR])
+    return _layouts
+
+
+def get_default_layout():
+    """
+    默认（农行）版式
+
+    :return: CompiledLayout对象
+    """
+    return get_layouts()[DEFAULT_LAYOUT]
+
+
+def detect_receipt_layout(doc, check_limit=3):
+    """
+    识别PDF文档是哪家银行的回单
+
+    所有银行的指纹关键词合并为一个正则表达式，前几页的文字各只扫描一次。
+
+    :param doc: fitz.Document对象
+    :param check_limit: 最多检查前几页，默认3页
+    :return: 元组(CompiledLayout或None, 说明文字)
+    """
+    global _bank_classifier
+    if _bank_classifier is None:
+        _bank_classifier = BankClassifier(get_layouts().values())
+    return _bank_classifier.classify(doc, check_limit)
+
+
+class CompanyMatcher:
+    """
+    本方公司户名匹配器
+
+    集团下有多个法人主体时，把全部本方户名编译为一个正则表达式（多选一），
+    判断付款方是否为本方只需扫描一次户名文本，与户名数量无关。
+    匹配规则与单个户名时相同：付款方户名中包含任一本方户名即视为本方付款。
+    """
+
+    def __init__(self, names=()):
+        """
+        :param names: 本方公司户名的可迭代对象
+        """
+        # 长的户名排在前面，避免被其中包含的短户名抢先匹配
+        self.names = sorted({name.strip() for name in names if name and name.strip()}, key=lambda n: (-len(n), n))
+        self._regex = re.compile("|".join(re.escape(name) for name in self.names)) if self.names else None
+
+    @classmethod
+    def coerce(cls, value):
+        """
+        将单个户名、户名列表或匹配器统一转换为匹配器
+
+        :param value: 字符串、字符串列表、CompanyMatcher或None
+        :return: CompanyMatcher对象
+        """
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, str):
+            value = [value]
+        return cls(value or ())
+
+    def __bool__(self):
+        return self._regex is not None
+
+    def matches(self, text):
+        """户名中是否包含任一本方户名"""
+        return self._regex is not None and bool(text) and self._regex.search(text) is not None
+
+    def counterparty(self, payer_name, receiver_name):
+        """
+        判断客户名称：付款方是本方时取收款方户名，否则取付款方户名
+
+        :param payer_name: 付款方户名
+        :param receiver_name: 收款方户名
+        :return: 客户名称（未清理）
+        """
+        if receiver_name and self.matches(payer_name):
+            return receiver_name
+        return payer_name
+
+
+def load_own_companies(path=OWN_COMPANIES_PATH):
+    """
+    读取保存的本方公司户名列表
+
+    :param path: 列表文件路径
+    :return: 户名列表，文件不存在时返回空列表
+    """
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def save_own_companies(names, path=OWN_COMPANIES_PATH):
+    """
+    保存本方公司户名列表
+
+    :param names: 户名列表
+    :param path: 列表文件路径
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for name in names:
+            f.write(name.strip() + "\n")
+
+
+def remap_counterparties(items, own_companies):
+    """
+    本方户名列表变化后，重新判断全部回单的客户名称
+
+    同一付款方户名只匹配一次，结果对所有使用该户名的回单复用。
+    手工修改过的回单（状态为"已修正"）保持不变。
+
+    :param items: 回单数据字典列表（原地修改name字段）
+    :param own_companies: 本方户名列表或CompanyMatcher
+    :return: 客户名称发生变化的回单列表
+    """
+    matcher = CompanyMatcher.coerce(own_companies)
+    payer_is_own = {}
+    changed = []
+    for item in items:
+        if item.get('status') == "已修正":
+            continue
+        payer_name = item.get('payer_name', "")
+        if payer_name not in payer_is_own:
+            payer_is_own[payer_name] = matcher.matches(payer_name)
+        receiver_name = item.get('receiver_name', "")
+        new_name = clean_filename(receiver_name if payer_is_own[payer_name] and receiver_name else payer_name)
+        if new_name != item.get('name'):
+            item['name'] = new_name
+            changed.append(item)
+    return changed
+
+
+def is_valid_abc_receipt(doc, check_limit=3):
+    """
+    极速检测是否为农行回单
+    
+    通过检查PDF前几页是否包含农行回单的特征关键词来判断（关键词见layouts/abc.json）。
+    需要同时支持其他银行时请使用detect_receipt_layout。
+    
+    :param doc: fitz.Document对象，要检查的PDF文档
+    :param check_limit: 最多检查前几页，默认3页
+    :return: 元组(bool, message)，(True, "验证通过") 或 (False, 错误信息)
+    """
+    layout, _ = detect_receipt_layout(doc, check_limit)
+    if layout is not None and layout.name == DEFAULT_LAYOUT:
+        return True, "验证通过"
+    return False, f"在前 {min(len(doc), check_limit)} 页中未检测到农行回单指纹标识。"
+
+
+def receipt_content_hash(words):
+    """
+    计算回单内容指纹
+
+    使用回单区域内按阅读顺序排列的文字计算SHA-256，与所在PDF文件无关，
+    同一张回单出现在不同的对账单下载文件中时指纹相同。
+
+    :param words: page.get_text("words", clip=...) 的结果
+    :return: 十六进制指纹字符串
+    """
+    text = " ".join(w[4].strip() for w in words if w[4].strip())
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def extract_receipt_date(words):
+    """
+    提取回单上的第一个日期
+
+    :param words: page.get_text("words", clip=...) 的结果
+    :return: "YYYY-MM-DD" 格式的日期字符串，未找到返回空字符串
+    """
+    for w in words:
+        match = DATE_REGEX.search(w[4])
+        if match:
+            year, month, day = match.groups()
+            return f"{year}-{int(month):02d}-{int(day):02d}"
+    return ""
+
+
+def open_document(source):
+    """
+    打开PDF文档
+    
+    :param source: PDF文件路径，或PDF文件内容（bytes）
+    :return: fitz.Document对象
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=bytes(source), filetype="pdf")
+    return fitz.open(source)
+
+
+def open_pdfplumber(source):
+    """
+    用pdfplumber打开PDF，source可以是文件路径或PDF文件内容（bytes）
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return pdfplumber.open(io.BytesIO(source))
+    return pdfplumber.open(source)
+
+
+def split_at_separators(separator_ys, width, height):
+    """
+    按分隔线位置把页面切分为回单区域（高度不超过150点的区域忽略）
+
+    :param separator_ys: 分隔线的y坐标列表
+    :param width: 页面宽度
+    :param height: 页面高度
+    :return: 回单区域列表（fitz.Rect对象），每个区域上下各留出2点
+    """
+    boundaries = sorted(list(set([0] + separator_ys + [height])))
+    return [fitz.Rect(0, boundaries[i] + 2, width, boundaries[i+1] - 2)
+            for i in range(len(boundaries) - 1)
+            if boundaries[i+1] - boundaries[i] > 150]
+
+
+def find_receipt_rects(page, split_label="回单编号"):
+    """
+    识别页面中的回单区域
+    
+    优先通过虚线分隔线定位回单边界；页面中没有矢量虚线时（分隔线画在图片中或由许多短线段拼成），
+    在低分辨率渲染图上查找虚线（见raster_separators.py）；仍然没有识别到分隔线时，
+    基于"回单编号"标签位置来分割，相邻两个标签之间有空白带时在空白带中间切分。
+    
+    :param page: fitz.Page对象
+    :param split_label: 没有分隔线时用于切分的标签文字（由版式定义）
+    :return: 按y坐标排序的回单区域列表（fitz.Rect对象）
+    """
+    width, height = page.rect.width, page.rect.height
+    paths = page.get_drawings()
+    # 描边线条的dashes不为空（实线为"[] 0"），横跨页面的细线（虚线或实线）都作为分隔线
+    separator_tops = [p['rect'].y0 for p in paths
+                      if p['dashes'] and p['rect'].width > width * 0.8 and p['rect'].height < 2]
+    receipt_rects = split_at_separators(separator_tops, width, height)
+
+    # 没有矢量虚线时渲染一次页面，在渲染图上查找虚线（渲染结果也用于下面的空白带查找）
+    raster = None
+    if len(receipt_rects) <= 1:
+        raster = render_page_raster(page)
+        if raster is not None:
+            raster_rects = split_at_separators(raster.rule_positions(), width, height)
+            if len(raster_rects) > 1:
+                receipt_rects = raster_rects
+
+    # 如果没有识别到分隔线，尝试基于"回单编号"标签位置来分割
+    if not receipt_rects or len(receipt_rects) == 1:
+        all_words = page.get_text("words")
+        receipt_no_labels = []
+        for w in all_words:
+            if split_label in w[4]:
+                w_rect = fitz.Rect(w[:4])
+                receipt_no_labels.append(w_rect.y0)
+
+        if len(receipt_no_labels) > 1:
+            # 基于"回单编号"标签位置重新分割
+            receipt_no_labels = sorted(set(receipt_no_labels))
+            gap_boundaries = boundaries_between_labels(raster, receipt_no_labels) if raster is not None else None
+            if gap_boundaries is not None:
+                # 在相邻两个标签之间的空白带中间切分
+                new_boundaries = sorted(set([0] + gap_boundaries + [height]))
+            else:
+                # 为每个回单编号标签创建区域（从标签上方50像素到下一个标签上方50像素）
+                new_boundaries = [0]
+                for label_y in receipt_no_labels:
+                    new_boundaries.append(label_y - 50)  # 标签上方50像素
+                new_boundaries.append(height)
+                new_boundaries = sorted(set(new_boundaries))
+
+            # 创建新的回单区域
+            receipt_rects = []
+            for i in range(len(new_boundaries) - 1):
+                if new_boundaries[i+1] - new_boundaries[i] > 150:
+                    receipt_rects.append(fitz.Rect(0, new_boundaries[i], width, new_boundaries[i+1]))
+
+    if not receipt_rects and height > 150:
+        receipt_rects.append(page.rect)
+
+    # 确保回单区域按y坐标排序
+    receipt_rects.sort(key=lambda r: r.y0)
+
+    return receipt_rects
+
+
+def group_word_rows(words, y_tolerance=3):
+    """
+    将单词按行分组
+
+    y坐标相差小于容差的单词视为同一行，行内按x坐标排序后用空格连接。
+
+    :param words: page.get_text("words") 的结果
+    :param y_tolerance: 同一行的y坐标容差
+    :return: 列表，每项为 (行中心y坐标, 行文本)
+    """
+    rows = []
+    current = []
+    for w in sorted(words, key=itemgetter(1, 0)):
+        if current and abs(w[1] - current[0][1]) >= y_tolerance:
+            rows.append(current)
+            current = []
+        current.append(w)
+    if current:
+        rows.append(current)
+
+    result = []
+    for row in rows:
+        row.sort(key=itemgetter(0))
+        y_center = (row[0][1] + row[0][3]) / 2.0
+        result.append((y_center, " ".join(w[4] for w in row)))
+    return result
+
+
+def sweep_page_fields(page, receipt_rects, words=None, layout=None):
+    """
+    整页一次性扫描回单编号和金额（快速路径）
+
+    对整页文字按行做一次正则匹配，再按y坐标把每个匹配归属到对应的回单区域。
+    一个区域内恰好只有一个匹配时视为已确定；没有匹配或有多个匹配的区域留给逐区域的提取逻辑处理。
+
+    :param page: fitz.Page对象
+    :param receipt_rects: 页面中的回单区域列表（按y坐标排序）
+    :param words: 可选，已提取的整页单词，避免重复提取
+    :param layout: 可选，CompiledLayout对象，使用其中各字段的标签正则，默认使用农行版式
+    :return: 字典 {区域序号: {"no": 回单编号, "amt": 金额}}，只包含已确定的字段
+    """
+    layout = layout or get_default_layout()
+    label_patterns = [(field, regex) for field, regex in layout.label_patterns.items() if field in ("no", "amt")]
+    if words is None:
+        words = page.get_text("words")
+    tops = [rect.y0 for rect in receipt_rects]
+
+    def rect_index(y):
+        idx = bisect.bisect_right(tops, y) - 1
+        if idx >= 0 and y < receipt_rects[idx].y1:
+            return idx
+        return None
+
+    found = {}
+    for y_center, text in group_word_rows(words):
+        idx = rect_index(y_center)
+        if idx is None:
+            continue
+        for field, regex in label_patterns:
+            for match in regex.finditer(text):
+                found.setdefault(idx, {}).setdefault(field, []).append(match.group(1))
+
+    resolved = {}
+    for idx, fields in found.items():
+        values = {}
+        for field, matches in fields.items():
+            if len(matches) == 1:
+                values[field] = layout.clean_label_value(field, matches[0])
+        if values:
+            resolved[idx] = values
+    return resolved
+
+
+def extract_receipt_no_with_pdfplumber(pdf, page_idx, crop_rect, layout=None):
+    """
+    使用pdfplumber提取回单编号，严格匹配20位数字
+
+    优先使用pdfplumber库从表格中提取回单编号，如果表格提取失败，
+    则使用文本提取方式，通过正则表达式匹配20位数字。
+
+    :param pdf: 已打开的pdfplumber.PDF对象
+    :param page_idx: PDF页面索引（从0开始）
+    :param crop_rect: 裁剪区域的矩形坐标（fitz.Rect对象或[x0, y0, x1, y1]）
+    :param layout: 可选，CompiledLayout对象，默认使用农行版式
+    :return: 20位数字的回单编号字符串，如果未找到则返回None
+    """
+    layout = layout or get_default_layout()
+    no_field = layout.fields.get("no")
+    row_labels = no_field.anchors if no_field is not None else ("回单编号",)
+    no_label_regex = layout.label_patterns.get("no", RECEIPT_NO_LABEL_REGEX_20)
+    try:
+        if page_idx >= len(pdf.pages):
+            return None
+
+        page = pdf.pages[page_idx]
+
+        # 直接使用原始坐标，pdfplumber 也是默认左上角坐标系
+        bbox = tuple(crop_rect)
+
+        cropped_page = page.crop(bbox)
+
+        # 方法1：提取表格
+        tables = cropped_page.extract_tables()
+        if tables:
+            for table in tables:
+                for row in table:
+                    row_text = " ".join([str(cell) if cell else "" for cell in row])
+                    if any(label in row_text for label in row_labels):
+                        for cell in row:
+                            if cell:
+                                cell_text = str(cell).strip()
+                                match = RECEIPT_NO_REGEX_20.search(cell_text)
+                                if match:
+                                    return match.group(1)
+
+        # 方法2：如果表格提取失败，使用文本提取
+        text = cropped_page.extract_text()
+        if text:
+            match = no_label_regex.search(text)
+            if match:
+                return match.group(1)
+    except Exception:
+        pass
+
+    return None
+
+
+def check_receipt_fields(item, layout=None):
+    """
+    按规则检查回单字段是否合理
+
+    - 回单编号符合版式的校验规则（农行为20位数字）
+    - 金额为两位小数且不为0.00（0.00表示未找到金额）
+    - 付款方和收款方户名不为空
+
+    :param item: 回单数据字典
+    :param layout: 可选，CompiledLayout对象，默认使用农行版式
+    :return: 问题说明列表，没有问题时为空列表
+    """
+    layout = layout or get_default_layout()
+    problems = []
+    no_field = layout.fields.get("no")
+    validator = getattr(no_field, "validator", None)
+    receipt_no = item.get("no") or ""
+    if validator is not None and not validator.fullmatch(receipt_no):
+        problems.append("回单编号格式不正确")
+    amount = item.get("amt") or ""
+    if not AMOUNT_VALUE_REGEX.match(amount) or amount == (layout.defaults.get("amt") or "0.00"):
+        problems.append("金额格式不正确或未找到金额")
+    for field, label in (("payer_name", "付款方户名"), ("receiver_name", "收款方户名")):
+        value = item.get(field) or ""
+        if not value or value == layout.defaults.get(field):
+            problems.append(f"{label}为空")
+    return problems
+
+
+def verify_receipt(item, pdf, layout=None):
+    """
+    用pdfplumber重新提取回单编号并与已有结果比对，同时做规则检查
+
+    :param item: 回单数据字典（需包含page_idx、rect、no、amt、payer_name、receiver_name）
+    :param pdf: 已打开的pdfplumber.PDF对象
+    :param layout: 可选，CompiledLayout对象，默认使用农行版式
+    :return: 元组(问题说明列表, pdfplumber提取的回单编号或None)
+    """
+    problems = check_receipt_fields(item, layout)
+    plumber_no = extract_receipt_no_with_pdfplumber(pdf, item["page_idx"], item["rect"], layout)
+    receipt_no = item.get("no") or ""
+    if plumber_no and receipt_no != plumber_no and (layout or get_default_layout()).defaults.get("no") != receipt_no:
+        problems.append(f"两种方式提取的回单编号不一致（{receipt_no} / {plumber_no}）")
+    return problems, plumber_no
+
+
+def extract_receipt_fields(page, page_idx, crop_rect, source, local_company_name="", fast_fields=None, layout=None,
+                           use_pdfplumber=True):
+    """
+    从单个回单区域中提取关键信息
+    
+    提取付款方/收款方户名、回单编号（20位数字）、金额，
+    并根据本方公司户名判断客户名称（如果付款方是本公司，则用收款方作为客户）。
+    各字段的锚点、搜索范围和停止词由版式描述文件定义（见receipt_layout.py）。
+    
+    :param page: fitz.Page对象
+    :param page_idx: PDF页面索引（从0开始）
+    :param crop_rect: 回单区域（fitz.Rect对象）
+    :param source: PDF文件路径或文件内容（bytes），供pdfplumber使用
+    :param local_company_name: 本方公司户名（单个户名、户名列表或CompanyMatcher），用于判断客户名称
+    :param fast_fields: 可选，整页扫描已确定的字段 {"no": ..., "amt": ...}，已确定的字段不再逐区域提取
+    :param layout: 可选，CompiledLayout对象，默认使用农行版式
+    :param use_pdfplumber: 是否用pdfplumber提取回单编号。为False时只用PyMuPDF（推测模式），
+                           结果由后台复核线程用pdfplumber和规则检查补做
+    :return: 回单数据字典（不含seq），如果区域内没有文字则返回None
+    """
+    fast_fields = fast_fields or {}
+    layout = layout or get_default_layout()
+    words = page.get_text("words", clip=crop_rect)
+    if not words:
+        return None
+    index = WordIndex(words)
+    no_label_regex = layout.label_patterns.get("no", RECEIPT_NO_LABEL_REGEX_20)
+
+    # --- 数据提取与清洗 ---
+    payer_name_text = layout.extract("payer_name", index) or ""
+    # 清理换行符和多余空格
+    payer_name = payer_name_text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
+    payer_name = re.sub(r'\s+', ' ', payer_name).strip() or layout.defaults.get("payer_name") or "未知付款方"
+
+    receiver_name_text = layout.extract("receiver_name", index) or ""
+    # 清理换行符和多余空格
+    receiver_name = receiver_name_text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
+    receiver_name = re.sub(r'\s+', ' ', receiver_name).strip() or layout.defaults.get("receiver_name") or "未知收款方"
+
+    # --- 提取流程 ---
+    # 0. 整页扫描已确定的编号直接使用
+    r_no_text = fast_fields.get("no")
+
+    # 1. 优先使用pdfplumber（推测模式下跳过，由后台复核线程补做，见receipt_verifier.py）
+    if not r_no_text and use_pdfplumber:
+        try:
+            with open_pdfplumber(source) as pdf:
+                r_no_text = extract_receipt_no_with_pdfplumber(pdf, page_idx, crop_rect, layout)
+        except Exception:
+            pass
+
+    # 2. 如果失败，按版式从单词位置提取
+    if not r_no_text:
+        r_no_text = layout.extract("no", index)
+
+    # 3. 最后手段：在区域文本中直接搜索
+    if not r_no_text:
+        crop_text = page.get_text(clip=crop_rect)
+        if crop_text:
+            match = no_label_regex.search(crop_text)
+            if match:
+                r_no_text = match.group(1)
+
+    # 清理回单编号中的换行符和空格
+    if r_no_text:
+        r_no = r_no_text.replace('\n', '').replace('\r', '').replace('\t', '').replace(' ', '').strip()
+    else:
+        r_no = layout.defaults.get("no") or "未知编号"
+
+    default_amt = layout.defaults.get("amt") or "0.00"
+    if fast_fields.get("amt"):
+        r_amt = fast_fields["amt"]
+    else:
+        r_amt = layout.extract("amt", index) or default_amt
+
+    if r_amt == default_amt:
+        full_text = page.get_text(clip=crop_rect)
+        # 清理换行符
+        full_text = full_text.replace('\n', ' ').replace('\r', ' ').replace('\t', ' ')
+        amt_match = AMOUNT_REGEX.search(full_text)
+        if amt_match: r_amt = amt_match.group(1).replace(",", "")
+
+    r_name = payer_name
+    if CompanyMatcher.coerce(local_company_name).matches(payer_name):
+        r_name = receiver_name
+
+    item_data = {
+        "page_idx": page_idx, 
+        "rect": list(crop_rect), 
+        "name": clean_filename(r_name), 
+        "no": r_no, 
+        "amt": r_amt, 
+        "payer_name": payer_name,  # 存储原始付款方户名
+        "receiver_name": receiver_name,  # 存储原始收款方户名
+        "date": extract_receipt_date(words),
+        "content_hash": receipt_content_hash(words)
+    }
+    item_data["status"] = "正常" if "未知" not in r_name and "未知" not in r_no else "需核对"
+    return item_data
+
+
+def page_fingerprint(page, images=None):
+    """
+    页面内容指纹（不提取文字，开销很小）
+
+    页面尺寸、字体、图片和内容流完全相同的页面视为重复页。
+    合并或重叠下载的对账单中常有整页重复。
+
+    :param page: fitz.Page对象
+    :param images: 可选，page.get_image_info(hashes=True)的结果（调用方已获取时传入，避免重复计算）
+    :return: 十六进制字符串
+    """
+    if images is None:
+        images = page.get_image_info(hashes=True)
+    digest = hashlib.sha256()
+    digest.update(repr(tuple(page.rect)).encode("utf-8"))
+    for font in page.get_fonts():
+        # 不含xref：同一内容在不同文件位置时xref不同
+        digest.update(repr(font[1:6]).encode("utf-8"))
+    # 扫描页的内容流通常只有一句"画图片"，必须加上图片内容才能区分不同的扫描页
+    for info in images:
+        digest.update(info["digest"])
+    digest.update(page.read_contents())
+    return digest.hexdigest()
+
+
+def classify_page(page, images=None, min_coverage=IMAGE_PAGE_MIN_COVERAGE):
+    """
+    判断页面是否为没有文字层的扫描页（只读取页面资源和图片位置，不提取文字）
+
+    页面没有使用任何字体、且图片覆盖了页面的大部分面积时视为扫描页。
+    扫描页不再识别分隔线、提取文字和运行pdfplumber，这些步骤在扫描页上不可能得到结果。
+
+    :param page: fitz.Page对象
+    :param images: 可选，page.get_image_info(hashes=True)的结果
+    :param min_coverage: 图片覆盖面积占页面面积的最小比例
+    :return: 元组(页面类型, 页面内的图片区域列表)，页面类型为PAGE_TEXT或PAGE_IMAGE
+    """
+    if page.get_fonts():
+        return PAGE_TEXT, []
+    if images is None:
+        images = page.get_image_info(hashes=True)
+    page_rect = page.rect
+    image_rects = [fitz.Rect(info["bbox"]) & page_rect for info in images]
+    image_rects = [rect for rect in image_rects if not rect.is_empty]
+    covered = sum(rect.width * rect.height for rect in image_rects)
+    if not image_rects or covered < page_rect.width * page_rect.height * min_coverage:
+        return PAGE_TEXT, []
+    return PAGE_IMAGE, image_rects
+
+
+def find_image_receipt_rects(page, image_rects, learned_rects=None):
+    """
+    切分扫描页上的回单区域
+
+    每张回单单独一张图片时按图片位置切分；整页只有一张图片时，先在渲染图上查找图片中的虚线分隔线，
+    找不到时沿用同一文件中相同尺寸的文字页上识别到的回单区域，没有可沿用的区域时整张图片作为一张回单。
+
+    :param page: fitz.Page对象
+    :param image_rects: classify_page返回的图片区域列表
+    :param learned_rects: 可选，相同尺寸的文字页上识别到的回单区域列表
+    :return: 按y坐标排序的回单区域列表（fitz.Rect对象）
+    """
+    receipt_rects = [rect for rect in image_rects if rect.height > 150]
+    if len(receipt_rects) <= 1:
+        raster = render_page_raster(page)
+        if raster is not None:
+            raster_rects = split_at_separators(raster.rule_positions(), page.rect.width, page.rect.height)
+            # 图片中的分隔线可能较淡而漏掉一部分，找到的区域比可沿用的区域少时不采用
+            if len(raster_rects) > 1 and len(raster_rects) >= len(learned_rects or ()):
+                receipt_rects = raster_rects
+    if len(receipt_rects) <= 1 and learned_rects:
+        receipt_rects = [fitz.Rect(rect) for rect in learned_rects]
+    if not receipt_rects:
+        receipt_rects = [page.rect]
+    receipt_rects.sort(key=lambda r: (r.y0, r.x0))
+    return receipt_rects
+
+
+def scanned_receipt_item(page_idx, crop_rect, images, layout=None):
+    """
+    为扫描页上的回单生成数据字典
+
+    扫描件没有文字，字段使用版式的默认值，状态为"扫描件"，由用户在界面中核对修改。
+    内容指纹由回单区域内的图片内容和区域位置计算。
+
+    :param page_idx: PDF页面索引（从0开始）
+    :param crop_rect: 回单区域（fitz.Rect对象）
+    :param images: page.get_image_info(hashes=True)的结果
+    :param layout: 可选，CompiledLayout对象，默认使用农行版式
+    :return: 回单数据字典（不含seq）
+    """
+    layout = layout or get_default_layout()
+    payer_name = layout.defaults.get("payer_name") or "未知付款方"
+    digest = hashlib.sha256(b"scan")
+    for info in images:
+        if fitz.Rect(info["bbox"]).intersects(crop_rect):
+            digest.update(info["digest"])
+    digest.update(repr(tuple(round(v) for v in crop_rect)).encode("utf-8"))
+    return {
+        "page_idx": page_idx,
+        "rect": list(crop_rect),
+        "name": clean_filename(payer_name),
+        "no": layout.defaults.get("no") or "未知编号",
+        "amt": layout.defaults.get("amt") or "0.00",
+        "payer_name": payer_name,
+        "receiver_name": layout.defaults.get("receiver_name") or "未知收款方",
+        "date": "",
+        "content_hash": digest.hexdigest(),
+        "status": STATUS_SCANNED,
+    }
+
+
+def analyze_document(doc, source, local_company_name="", fast_path=True, layout=None, skip_duplicate_pages=True,
+                     speculative=False):
+    """
+    逐页分析PDF文档，依次产出识别到的回单数据
+    
+    这是一个生成器：每识别到一个回单就产出一个数据字典，
+    调用方可以边分析边展示结果。
+    
+    :param doc: fitz.Document对象
+    :param source: PDF文件路径或文件内容（bytes），供pdfplumber使用
+    :param local_company_name: 本方公司户名（单个户名、户名列表或CompanyMatcher），用于判断客户名称
+    :param fast_path: 是否先整页扫描回单编号和金额，只对未能确定的区域运行逐区域提取
+    :param layout: 可选，CompiledLayout对象（见detect_receipt_layout），默认使用农行版式
+    :param skip_duplicate_pages: 是否复用重复页的解析结果。重复页上的回单直接复制前一页的结果，
+                                 状态标记为"重复页"，duplicate_of为原回单的序号
+    :param speculative: 推测模式：只用PyMuPDF提取，不运行较慢的pdfplumber，
+                        调用方随后用ReceiptVerifier在后台复核（见receipt_verifier.py）
+    :return: 生成器，产出回单数据字典，包含page_idx、rect、name、no、amt、seq、
+             payer_name、receiver_name、status、bank（版式名），重复页的回单另有duplicate_of。
+             没有文字层的扫描页按图片位置切分，回单状态为"扫描件"，字段为默认值
+    """
+    # 本方户名只编译一次
+    own_companies = CompanyMatcher.coerce(local_company_name)
+    layout = layout or get_default_layout()
+    total_receipts = 0
+    seen_pages = {}  # {页面指纹: 该页回单数据的副本列表}
+    learned_rects = {}  # {页面尺寸: 该尺寸的文字页上识别到的回单区域}，用于切分整页扫描的页面
+    for page_idx, page in enumerate(doc):
+        images = page.get_image_info(hashes=True)
+        fingerprint = page_fingerprint(page, images) if skip_duplicate_pages else None
+        if fingerprint in seen_pages:
+            # 重复页：不再识别分隔线和提取字段，直接复用前一页的结果
+            for original in seen_pages[fingerprint]:
+                total_receipts += 1
+                item_data = dict(original)
+                item_data.update(page_idx=page_idx, rect=list(original["rect"]), seq=total_receipts,
+                                 status=STATUS_DUPLICATE_PAGE, duplicate_of=original["seq"])
+                yield item_data
+            continue
+
+        page_items = []
+        page_type, image_rects = classify_page(page, images)
+        size_key = (round(page.rect.width), round(page.rect.height))
+        if page_type == PAGE_IMAGE:
+            # 扫描页：不运行文字提取流程，按图片位置切分
+            receipt_rects = find_image_receipt_rects(page, image_rects, learned_rects.get(size_key))
+            page_results = (scanned_receipt_item(page_idx, crop_rect, images, layout)
+                            for crop_rect in receipt_rects)
+        else:
+            receipt_rects = find_receipt_rects(page, layout.split_label)
+            if len(receipt_rects) > 1:
+                learned_rects[size_key] = receipt_rects
+            swept = sweep_page_fields(page, receipt_rects, layout=layout) if fast_path else {}
+            page_results = (extract_receipt_fields(page, page_idx, crop_rect, source, own_companies,
+                                                   fast_fields=swept.get(rect_idx), layout=layout,
+                                                   use_pdfplumber=not speculative)
+                            for rect_idx, crop_rect in enumerate(receipt_rects))
+        for item_data in page_results:
+            if item_data is None:
+                continue
+            total_receipts += 1
+            item_data["seq"] = total_receipts
+            item_data["bank"] = layout.name
+            # 保存副本：调用方可能修改产出的字典
+            page_items.append(dict(item_data))
+            yield item_data
+        if fingerprint is not None:
+            seen_pages[fingerprint] = page_items
+
+
+def receipt_clean_text(page, rect):
+    """
+    提取回单区域内的文字（去除每行首尾空白和空行），与界面预览中的可复制文本相同
+
+    :param page: fitz.Page对象
+    :param rect: 回单区域
+    :return: 多行文本，没有文字时返回空字符串
+    """
+    raw_text = page.get_text("text", clip=fitz.Rect(rect) & page.rect)
+    if not raw_text or not raw_text.strip():
+        return ""
+    return "\n".join(line.strip() for line in raw_text.split('\n') if line.strip())
+
+
+def build_receipt_filename(item, counter=0):
+    """
+    根据回单数据生成拆分后的文件名
+    
+    文件名格式：客户名称_回单编号_金额.pdf，重名时追加序号（如：_1）。
+    
+    :param item: 回单数据字典
+    :param counter: 重名序号，0表示不追加
+    :return: 文件名字符串
+    """
+    # 确保文件名安全（使用clean_filename处理）
+    safe_name = clean_filename(item.get('name', '未知'))
+    safe_no = item.get('no', '未知编号').replace('\\', '_').replace('/', '_')
+    safe_amt = item.get('amt', '0.00').replace('\\', '_').replace('/', '_')
+    if counter:
+        return f"{safe_name}_{safe_no}_{safe_amt}_{counter}.pdf"
+    return f"{safe_name}_{safe_no}_{safe_amt}.pdf"
+
+
+def trim_page_to_clip(doc, page_idx, clip):
+    """
+    复制一页并删除回单区域以外的内容
+
+    对回单区域以外的部分应用涂黑（redaction），真正移除其中的文字、图片和线条，
+    避免相邻回单的数据残留在拆分后的文件中。
+
+    :param doc: 源fitz.Document对象
+    :param page_idx: 页面索引
+    :param clip: 需要保留的区域（fitz.Rect）
+    :return: 只包含裁剪后页面的临时fitz.Document对象（调用方负责关闭）
+    """
+    scratch = fitz.open()
+    scratch.insert_pdf(doc, from_page=page_idx, to_page=page_idx)
+    page = scratch[0]
+    page_rect = page.rect
+    clip = fitz.Rect(clip) & page_rect
+    outside = [
+        fitz.Rect(page_rect.x0, page_rect.y0, page_rect.x1, clip.y0),  # 上方
+        fitz.Rect(page_rect.x0, clip.y1, page_rect.x1, page_rect.y1),  # 下方
+        fitz.Rect(page_rect.x0, clip.y0, clip.x0, clip.y1),            # 左侧
+        fitz.Rect(clip.x1, clip.y0, page_rect.x1, clip.y1),            # 右侧
+    ]
+    for rect in outside:
+        if not rect.is_empty:
+            page.add_redact_annot(rect, fill=False)
+    page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_PIXELS)
+    return scratch
+
+
+def place_receipt(target_doc, doc, item, trim=False):
+    """
+    在目标文档中新建一页，只放置回单区域
+
+    使用show_pdf_page将源页面作为XObject引用：同一目标文档中来自同一源页面的多张回单
+    共用同一个XObject和字体，不会重复复制。
+
+    :param target_doc: 目标fitz.Document对象
+    :param doc: 源fitz.Document对象
+    :param item: 回单数据字典（需包含page_idx和rect）
+    :param trim: 是否先删除回单区域以外的内容（此时每张回单使用独立的XObject）
+    :return: 新建的fitz.Page对象
+    """
+    # 验证页面索引有效性
+    if item['page_idx'] >= len(doc):
+        raise Exception(f"页面索引 {item['page_idx']} 超出文档范围")
+
+    clip = fitz.Rect(item['rect']) & doc[item['page_idx']].rect
+    new_page = target_doc.new_page(width=clip.width, height=clip.height)
+    if trim:
+        scratch = trim_page_to_clip(doc, item['page_idx'], clip)
+        try:
+            new_page.show_pdf_page(new_page.rect, scratch, 0, clip=clip)
+        finally:
+            scratch.close()
+    else:
+        new_page.show_pdf_page(new_page.rect, doc, item['page_idx'], clip=clip)
+    return new_page
+
+
+def crop_receipt(doc, item, export_mode=EXPORT_MODE_CROPBOX, trim=False):
+    """
+    将单个回单裁剪为新的PDF文档
+    
+    :param doc: 源fitz.Document对象
+    :param item: 回单数据字典（需包含page_idx和rect）
+    :param export_mode: EXPORT_MODE_CROPBOX（整页复制+裁剪框）或 EXPORT_MODE_CLIP（只放置回单区域）
+    :param trim: 仅EXPORT_MODE_CLIP有效，是否删除回单区域以外的内容
+    :return: 只包含该回单的新fitz.Document对象（调用方负责关闭）
+    """
+    # 验证页面索引有效性
+    if item['page_idx'] >= len(doc):
+        raise Exception(f"页面索引 {item['page_idx']} 超出文档范围")
+
+    new_doc = fitz.open()
+    if export_mode == EXPORT_MODE_CLIP:
+        place_receipt(new_doc, doc, item, trim=trim)
+        return new_doc
+
+    new_doc.insert_pdf(doc, from_page=item['page_idx'], to_page=item['page_idx'])
+    new_page = new_doc[0]
+    new_page.set_cropbox(fitz.Rect(item['rect']))
+    return new_doc
+
+
+def export_combined(doc, items, output_path, trim=False, progress_callback=None):
+    """
+    将所有回单合并导出为一个PDF，每张回单一页
+
+    来自同一源页面的回单共用同一个XObject和字体资源，文件比逐张复制整页小得多。
+    重复页上的回单（带duplicate_of）不放入。
+
+    :param doc: 源fitz.Document对象
+    :param items: 回单数据字典列表
+    :param output_path: 输出文件完整路径
+    :param trim: 是否删除每张回单区域以外的内容
+    :param progress_callback: 可选的进度回调，参数为(已处理数量, 总数量)
+    :return: 成功放入的回单数量
+    """
+    out_doc, placed = build_combined_document(doc, items, trim, progress_callback)
+    try:
+        out_doc.save(output_path, garbage=3, deflate=True)
+    finally:
+        out_doc.close()
+    return placed
+
+
+def build_combined_document(doc, items, trim=False, progress_callback=None):
+    """
+    生成合并文档（不保存），每张回单一页，重复页上的回单不放入
+
+    某张回单无法放置（如页面索引超出范围、区域无效）时跳过该回单，其余回单照常合并；
+    跳过的回单同样计入进度，调用方可按返回的成功数量与回单数量之差提示。
+
+    :param doc: 源fitz.Document对象
+    :param items: 回单数据字典列表
+    :param trim: 是否删除每张回单区域以外的内容
+    :param progress_callback: 可选的进度回调，参数为(已处理数量, 总数量)
+    :return: 元组(新的fitz.Document对象, 成功放入的回单数量)，调用方负责关闭文档
+    """
+    items = [item for item in items if not item.get('duplicate_of')]
+    out_doc = fitz.open()
+    placed = 0
+    try:
+        for done, item in enumerate(items, 1):
+            page_count = len(out_doc)
+            try:
+                place_receipt(out_doc, doc, item, trim=trim)
+                placed += 1
+            except Exception:
+                # 跳过无法放置的回单，不影响整个合并文档；已新建的空白页一并删除
+                if len(out_doc) > page_count:
+                    out_doc.delete_page(-1)
+            finally:
+                if progress_callback:
+                    progress_callback(done, len(items))
+    except Exception:
+        out_doc.close()
+        raise
+    return out_doc, placed
+
+
+def journal_key(item):
+    """
+    回单在导出进度日志中的标识（页码、区域位置和内容指纹）
+
+    :param item: 回单数据字典
+    :return: 字符串
+    """
+    rect = item.get('rect') or (0, 0, 0, 0)
+    return f"{item.get('page_idx')}:{rect[0]:.1f},{rect[1]:.1f}:{item.get('content_hash', '')}"
+
+
+def export_journal_path(source_file, output_dir, source_hash=None):
+    """
+    某个源文件导出到某个目录时使用的进度日志路径
+
+    按源文件内容的SHA-256区分：同名、同样大小的不同对账单（如同一银行每月下载的文件）
+    使用不同的进度日志；同一文件改名或移动后仍能找到上次的进度。
+
+    :param source_file: 源文件路径
+    :param output_dir: 输出目录路径
+    :param source_hash: 可选，已计算好的源文件SHA-256
+    :return: 进度日志文件的完整路径
+    """
+    if source_hash is None:
+        source_hash = source_sha256(source_file)
+    # 源文件不可读时退回按完整路径区分
+    key = source_hash or os.path.abspath(source_file)
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(output_dir, f"{JOURNAL_PREFIX}{digest}.jsonl")
+
+
+class ExportJournal:
+    """
+    导出进度日志（只追加的JSON Lines文件）
+
+    第一行记录导出设置和日志文件名；每张回单开始写入前追加一条"begin"，
+    文件改名为正式文件名后追加一条"done"，每条都立即刷新到磁盘。
+    导出中断（程序崩溃、电脑休眠）后可以据此从中断处继续：
+    已完成的回单不再重新生成，写了一半的回单按原文件名重新写入，不会产生 _1 重复文件。
+    """
+
+    def __init__(self, path, header=None, states=None):
+        """
+        :param path: 进度日志文件路径
+        :param header: 第一行的导出设置
+        :param states: {journal_key: 最后一条记录}
+        """
+        self.path = path
+        self.header = header or {}
+        self.states = states or {}
+        self._file = None
+
+    @classmethod
+    def load(cls, path):
+        """
+        读取已有的进度日志
+
+        :param path: 进度日志文件路径
+        :return: ExportJournal对象，文件不存在或无效时返回None
+        """
+        if not os.path.exists(path):
+            return None
+        header = None
+        states = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 中断时最后一行可能只写了一半
+                    continue
+                if record.get("event") == "start":
+                    header = record
+                elif record.get("key"):
+                    states[record["key"]] = record
+        if header is None:
+            return None
+        return cls(path, header, states)
+
+    @classmethod
+    def create(cls, path, header):
+        """
+        新建进度日志（覆盖同名的旧日志）
+
+        :param path: 进度日志文件路径
+        :param header: 导出设置（日志文件名、导出方式等）
+        :return: ExportJournal对象
+        """
+        journal = cls(path, dict(header, event="start"))
+        journal._file = open(path, "w", encoding="utf-8")
+        journal._append(journal.header)
+        return journal
+
+    def done_count(self):
+        """已完成的回单数量"""
+        return sum(1 for record in self.states.values() if record["event"] == "done")
+
+    def state(self, item):
+        """
+        回单在日志中的最后一条记录
+
+        :param item: 回单数据字典
+        :return: 记录字典（event、filename、action），没有记录时返回None
+        """
+        return self.states.get(journal_key(item))
+
+    def record(self, event, item, filename, action=""):
+        """
+        追加一条记录并立即刷新到磁盘
+
+        :param event: "begin" 或 "done"
+        :param item: 回单数据字典
+        :param filename: 相对输出目录的文件名
+        :param action: 计划项的处理方式
+        """
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        record = {"event": event, "key": journal_key(item), "filename": filename, "action": action}
+        self.states[record["key"]] = record
+        self._append(record)
+
+    def _append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self._file.write("\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """关闭日志文件"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """导出全部完成后删除进度日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def load_export_journal(source_file, output_dir):
+    """
+    查找上次未完成的导出
+
+    进度日志中记录的源文件SHA-256与当前源文件不一致时不视为同一次导出。
+
+    :param source_file: 源文件路径
+    :param output_dir: 输出目录路径
+    :return: ExportJournal对象，没有未完成的导出时返回None
+    """
+    source_hash = source_sha256(source_file)
+    try:
+        journal = ExportJournal.load(export_journal_path(source_file, output_dir, source_hash))
+    except (OSError, ValueError):
+        return None
+    if journal is None or journal.header.get("source_sha256") != source_hash:
+        return None
+    return journal
+
+
+def write_bytes_atomic(data, save_path):
+    """
+    先写入临时文件并刷新到磁盘，再改名为正式文件名
+
+    断电或程序崩溃后，正式文件名下不会出现写了一半的文件。
+
+    :param data: 文件内容（bytes）
+    :param save_path: 目标文件路径
+    """
+    temp_path = save_path + PARTIAL_SUFFIX
+    with open(temp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, save_path)
+
+
+def save_pdf_atomic(pdf_doc, save_path, **save_options):
+    """
+    先写入临时文件再改名，中断时不会留下写了一半的PDF
+
+    PDF先在内存中生成，写入的同时计算SHA-256，完整性清单不需要再把文件读回来。
+
+    :param pdf_doc: 要保存的fitz.Document对象
+    :param save_path: 目标文件路径
+    :param save_options: 传给fitz.Document.tobytes的参数
+    :return: 元组(文件内容的SHA-256, 字节数)
+    """
+    data = pdf_doc.tobytes(**save_options)
+    write_bytes_atomic(data, save_path)
+    return bytes_sha256(data), len(data)
+
+
+class ExportPlan:
+    """
+    导出计划：在写入任何文件之前确定每张回单的目标路径和处理方式
+
+    每个计划项是一个字典：
+    - item: 回单数据字典
+    - action: "write"（生成PDF）/ "link"（链接已导出的文件）/ "skip"（已导出过，跳过）
+      / "done"（上次中断的导出中已完成）/ "duplicate"（重复页上的回单，跳过）
+    - path: 目标文件完整路径（skip时为已导出文件的路径）
+    - filename: 写入日志的文件名（相对输出目录）
+    - existing: 导出索引中的已导出记录（没有则为None）
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.entries = []
+        self.new_dirs = []  # 需要新建的子文件夹
+        self.renamed_count = 0  # 因重名而追加序号的文件数
+        self.estimated_bytes = 0  # 预计写入的字节数
+        self.free_bytes = None  # 输出目录所在磁盘的可用空间
+
+    def count(self, action):
+        """统计某种处理方式的计划项数量"""
+        return sum(1 for entry in self.entries if entry['action'] == action)
+
+    def has_enough_space(self):
+        """可用空间是否足够（预留10%余量）"""
+        return self.free_bytes is None or self.free_bytes >= self.estimated_bytes * 1.1
+
+    def format_text(self):
+        """
+        生成可读的计划说明（用于预演模式）
+
+        :return: 多行文本
+        """
+        mb = 1024 * 1024.0
+        lines = [
+            f"输出目录: {self.output_dir}",
+            f"生成: {self.count('write')} 个，链接: {self.count('link')} 个，跳过: {self.count('skip')} 个",
+            f"上次已完成: {self.count('done')} 个，重复页跳过: {self.count('duplicate')} 个",
+            f"重名自动加序号: {self.renamed_count} 个",
+            f"需新建子文件夹: {len(self.new_dirs)} 个",
+        ]
+        space = f"预计占用: {self.estimated_bytes / mb:.1f} MB"
+        if self.free_bytes is not None:
+            space += f"，可用空间: {self.free_bytes / mb:.1f} MB"
+            if not self.has_enough_space():
+                space += "（空间不足！）"
+        lines.append(space)
+        lines.append("")
+        labels = {"write": "生成", "link": "链接", "skip": "跳过", "done": "已完成", "duplicate": "重复页"}
+        for entry in self.entries:
+            line = f"[{labels[entry['action']]}] {entry['filename']}"
+            if entry['existing']:
+                line += f"  （已导出: {entry['existing']['output_path']}）"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def shard_dirname(item, shard_by):
+    """
+    计算回单所属的子文件夹名
+
+    :param item: 回单数据字典
+    :param shard_by: SHARD_NONE / SHARD_BY_COUNTERPARTY / SHARD_BY_DATE
+    :return: 子文件夹名，不分组时返回空字符串
+    """
+    if shard_by == SHARD_BY_COUNTERPARTY:
+        return clean_filename(item.get('name', '')) or "未知客户"
+    if shard_by == SHARD_BY_DATE:
+        return item.get('date') or "未知日期"
+    return ""
+
+
+def estimate_receipt_size(doc, source_file):
+    """
+    估算单张回单导出后的文件大小
+
+    按源文件平均每页大小估算（整页裁剪方式会复制整页，这是一个偏保守的上限）。
+
+    :param doc: 源fitz.Document对象
+    :param source_file: 源文件路径或文件内容（bytes）
+    :return: 字节数
+    """
+    if isinstance(source_file, (bytes, bytearray)):
+        total = len(source_file)
+    else:
+        try:
+            total = os.path.getsize(source_file)
+        except OSError:
+            return 0
+    return total // max(len(doc), 1)
+
+
+def plan_export(doc, source_file, items, output_dir, export_index=None, duplicate_mode=DUPLICATE_SKIP,
+                shard_by=SHARD_NONE, journal=None):
+    """
+    生成导出计划，不写入任何文件
+
+    每个目标文件夹只列一次目录，所有文件名和重名序号在内存中确定；
+    已导出索引一次批量查询。网络共享目录上避免了每张回单多次探测文件是否存在。
+
+    :param doc: 源fitz.Document对象
+    :param source_file: 源文件路径
+    :param items: 回单数据字典列表
+    :param output_dir: 输出目录路径
+    :param export_index: 可选的ExportIndex对象
+    :param duplicate_mode: 已导出回单的处理方式
+    :param shard_by: 子文件夹分组方式
+    :param journal: 可选，上次未完成导出的ExportJournal；已完成的回单不再处理，写了一半的沿用原文件名
+    :return: ExportPlan对象
+    """
+    plan = ExportPlan(output_dir)
+    existing_map = {}
+    if export_index is not None and duplicate_mode != DUPLICATE_EXPORT:
+        existing_map = export_index.lookup_many(items)
+
+    taken_names = {}  # {目录: 已占用的文件名集合}
+
+    def names_in(directory):
+        if directory not in taken_names:
+            try:
+                taken_names[directory] = {os.path.normcase(entry.name) for entry in os.scandir(directory)}
+            except FileNotFoundError:
+                taken_names[directory] = set()
+                plan.new_dirs.append(directory)
+        return taken_names[directory]
+
+    if journal is not None:
+        # 上次导出已使用的文件名不再分配给其他回单
+        for record in journal.states.values():
+            if record['action'] in ("write", "link"):
+                subdir, filename = os.path.split(record['filename'])
+                names_in(os.path.join(output_dir, subdir) if subdir else output_dir).add(os.path.normcase(filename))
+
+    per_receipt = estimate_receipt_size(doc, source_file)
+    for item in items:
+        state = journal.state(item) if journal is not None else None
+        if state and state['event'] == "done":
+            plan.entries.append({"item": item, "action": "done", "path": os.path.join(output_dir, state['filename']),
+                                 "filename": state['filename'], "existing": None})
+            continue
+
+        if item.get('duplicate_of'):
+            plan.entries.append({"item": item, "action": "duplicate", "path": None,
+                                 "filename": build_receipt_filename(item), "existing": None})
+            continue
+
+        existing = existing_map.get(item.get('content_hash'))
+        # 已导出的文件被删除或移走后，照常重新导出
+        if existing and not os.path.exists(existing['output_path']):
+            existing = None
+
+        if existing and duplicate_mode == DUPLICATE_SKIP:
+            plan.entries.append({"item": item, "action": "skip", "path": existing['output_path'],
+                                 "filename": os.path.basename(existing['output_path']), "existing": existing})
+            continue
+
+        counter = 0
+        if state:
+            # 上次写到一半中断的回单，沿用原文件名覆盖写入
+            subdir, filename = os.path.split(state['filename'])
+            target_dir = os.path.join(output_dir, subdir) if subdir else output_dir
+        else:
+            subdir = shard_dirname(item, shard_by)
+            target_dir = os.path.join(output_dir, subdir) if subdir else output_dir
+            names = names_in(target_dir)
+            filename = build_receipt_filename(item)
+            while os.path.normcase(filename) in names:
+                # 链接方式下，已导出的文件恰好就是这个目标文件
+                if existing and os.path.normcase(os.path.abspath(os.path.join(target_dir, filename))) == \
+                        os.path.normcase(existing['output_path']):
+                    break
+                counter += 1
+                filename = build_receipt_filename(item, counter)
+            names.add(os.path.normcase(filename))
+        if counter:
+            plan.renamed_count += 1
+
+        action = "link" if existing else "write"
+        if action == "write":
+            plan.estimated_bytes += per_receipt
+        plan.entries.append({"item": item, "action": action, "path": os.path.join(target_dir, filename),
+                             "filename": os.path.join(subdir, filename) if subdir else filename,
+                             "existing": existing})
+
+    # 输出目录可能尚不存在，取最近的已存在上级目录所在磁盘
+    probe = os.path.abspath(output_dir)
+    while not os.path.exists(probe) and os.path.dirname(probe) != probe:
+        probe = os.path.dirname(probe)
+    try:
+        plan.free_bytes = shutil.disk_usage(probe).free
+    except OSError:
+        plan.free_bytes = None
+    return plan
+
+
+def export_receipts(doc, source_file, items, output_dir, progress_callback=None,
+                    export_index=None, duplicate_mode=DUPLICATE_SKIP, export_mode=EXPORT_MODE_CROPBOX, trim=False,
+                    shard_by=SHARD_NONE, plan=None, journal=None, archive=None):
+    """
+    将回单逐个保存为独立的PDF文件，并生成CSV格式的处理日志
+    
+    先生成导出计划（见plan_export），确认磁盘空间足够后按计划写入。
+    如果提供了导出索引，已导出过的回单（内容指纹相同）按duplicate_mode处理：
+    跳过、创建硬链接或照常重新导出；新导出的回单会写入索引。
+    每张回单先写入临时文件再改名，并记录在输出目录的进度日志中（见ExportJournal），
+    导出中断后传入load_export_journal的结果即可从中断处继续。
+    生成和链接的文件同时写入日志旁的完整性清单（见receipt_manifest.py），记录文件的SHA-256、
+    源文件的SHA-256、页面索引和回单区域。
+    
+    :param doc: 源fitz.Document对象
+    :param source_file: 源文件路径（写入日志的原文件名）
+    :param items: 回单数据字典列表
+    :param output_dir: 输出目录路径
+    :param progress_callback: 可选的进度回调，参数为(已处理数量, 总数量)
+    :param export_index: 可选的ExportIndex对象（见receipt_index.py）
+    :param duplicate_mode: 已导出回单的处理方式，DUPLICATE_SKIP / DUPLICATE_LINK / DUPLICATE_EXPORT
+    :param export_mode: 回单PDF的生成方式，EXPORT_MODE_CROPBOX / EXPORT_MODE_CLIP
+    :param trim: 仅EXPORT_MODE_CLIP有效，是否删除回单区域以外的内容
+    :param shard_by: 子文件夹分组方式，SHARD_NONE / SHARD_BY_COUNTERPARTY / SHARD_BY_DATE
+    :param plan: 可选，已生成的导出计划（不提供时自动生成）
+    :param journal: 可选，上次未完成导出的ExportJournal，提供时从中断处继续
+    :param archive: 可选的ArchiveIndex对象（见receipt_archive.py），生成或链接的文件逐张写入全文检索索引
+    :return: 元组(success_count, skipped_count, log_filename)，不含上次已完成的回单
+    """
+    if plan is None:
+        plan = plan_export(doc, source_file, items, output_dir, export_index, duplicate_mode, shard_by, journal)
+    if not plan.has_enough_space():
+        mb = 1024 * 1024.0
+        raise Exception(f"磁盘空间不足：预计需要 {plan.estimated_bytes / mb:.1f} MB，"
+                        f"可用 {plan.free_bytes / mb:.1f} MB")
+    os.makedirs(output_dir, exist_ok=True)
+    for directory in plan.new_dirs:
+        os.makedirs(directory, exist_ok=True)
+
+    source_hash = source_sha256(source_file)
+    if journal is not None and journal.header.get("log_filename"):
+        # 继续上次的导出：沿用原日志文件，追加写入
+        log_filename = journal.header["log_filename"]
+    else:
+        log_filename = f"log_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        journal = ExportJournal.create(export_journal_path(source_file, output_dir, source_hash), {
+            "source_file": os.path.basename(source_file),
+            "source_sha256": source_hash,
+            "log_filename": log_filename,
+            "export_mode": export_mode,
+            "trim": trim,
+            "shard_by": shard_by,
+            "duplicate_mode": duplicate_mode,
+            "started_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+    log_filepath = os.path.join(output_dir, log_filename)
+    write_header = not os.path.exists(log_filepath)
+    manifest_filepath = os.path.join(output_dir, manifest_filename(log_filename))
+    write_manifest_header = not os.path.exists(manifest_filepath)
+
+    failed_count = 0
+    try:
+        with open(log_filepath, 'a', newline='', encoding='utf-8-sig') as log_file, \
+                open(manifest_filepath, 'a', newline='', encoding='utf-8-sig') as manifest_file:
+            writer = csv.writer(log_file)
+            if write_header:
+                writer.writerow(LOG_HEADER)
+            manifest_writer = csv.writer(manifest_file)
+            if write_manifest_header:
+                manifest_writer.writerow(MANIFEST_HEADER)
+
+            success_count = 0
+            skipped_count = 0
+            total_files = len(plan.entries)
+            source_basename = os.path.basename(source_file)
+
+            for done, entry in enumerate(plan.entries, 1):
+                item = entry['item']
+                filename = entry['filename']
+                save_path = entry['path']
+                existing = entry['existing']
+                action = entry['action']
+
+                try:
+                    if action == "done":
+                        continue
+
+                    if action == "duplicate":
+                        writer.writerow([source_basename, filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                         f"与序号 {item['duplicate_of']} 的回单在重复页上，跳过"])
+                        skipped_count += 1
+                        journal.record("done", item, filename, action)
+                        continue
+
+                    if action == "skip":
+                        writer.writerow([source_basename, filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                         f"已导出过，跳过（{existing['output_path']}）"])
+                        skipped_count += 1
+                        journal.record("done", item, filename, action)
+                        continue
+
+                    journal.record("begin", item, filename, action)
+                    if action == "link":
+                        # 不重新生成PDF，直接链接已有文件（跨磁盘时退回复制）
+                        if not os.path.exists(save_path):
+                            try:
+                                os.link(existing['output_path'], save_path)
+                            except OSError:
+                                shutil.copy2(existing['output_path'], save_path + PARTIAL_SUFFIX)
+                                with open(save_path + PARTIAL_SUFFIX, "r+b") as f:
+                                    os.fsync(f.fileno())
+                                os.replace(save_path + PARTIAL_SUFFIX, save_path)
+                        # 链接的文件没有在内存中生成，只能读取文件计算SHA-256
+                        manifest_writer.writerow(manifest_row(filename, file_sha256(save_path),
+                                                              os.path.getsize(save_path), source_basename,
+                                                              source_hash, item))
+                        if archive is not None:
+                            archive.add(item, save_path, source_file,
+                                        receipt_clean_text(doc[item['page_idx']], item['rect']))
+                        writer.writerow([source_basename, filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                         f"已导出过，已链接（{existing['output_path']}）"])
+                        skipped_count += 1
+                        journal.record("done", item, filename, action)
+                        continue
+
+                    new_doc = crop_receipt(doc, item, export_mode, trim)
+                    try:
+                        if export_mode == EXPORT_MODE_CLIP:
+                            sha256, size = save_pdf_atomic(new_doc, save_path, garbage=3, deflate=True)
+                        else:
+                            sha256, size = save_pdf_atomic(new_doc, save_path)
+                    finally:
+                        new_doc.close()
+                    manifest_writer.writerow(manifest_row(filename, sha256, size, source_basename, source_hash, item))
+
+                    if export_index is not None:
+                        export_index.add(item, save_path, source_file)
+                    if archive is not None:
+                        archive.add(item, save_path, source_file,
+                                    receipt_clean_text(doc[item['page_idx']], item['rect']))
+
+                    writer.writerow([source_basename, filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), "成功"])
+                    success_count += 1
+                    journal.record("done", item, filename, action)
+
+                except Exception as item_error:
+                    failed_count += 1
+                    error_msg = f"失败: {str(item_error)}"
+                    writer.writerow([source_basename, filename, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                     error_msg])
+
+                finally:
+                    # 日志逐行落盘，中断时已写入的记录不会丢失
+                    log_file.flush()
+                    manifest_file.flush()
+                    if progress_callback:
+                        progress_callback(done, total_files)
+    finally:
+        journal.close()
+
+    # 全部成功后删除进度日志；有失败的回单时保留，继续导出时只重试失败的回单
+    if failed_count == 0:
+        journal.remove()
+    return success_count, skipped_count, log_filename
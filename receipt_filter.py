@@ -0,0 +1,177 @@
+"""
+解析结果列表的筛选索引
+
+界面中的回单列表有数千行时，逐行比较筛选条件会让每次按键都明显卡顿。
+本模块对回单数据一次性建立索引，之后每次筛选只查索引：
+- 客户名称：按不重复的名称分组，子串匹配只比较不重复的名称；继续输入时只在上次的结果中查找
+- 回单编号：按编号排序的数组，前缀匹配用二分查找定位区间
+- 金额：按金额排序的数组，区间查询用二分查找
+- 状态、页码：分桶
+- 各列排序结果预先计算好，筛选结果直接按当前排序输出
+
+回单数据修改后（编辑、更新客户名称、复核结果）需要重新建立索引。
+"""
+import bisect
+
+# 可排序的列（与界面Treeview的列名一致）
+SORT_COLUMNS = ("seq", "name", "receipt_no", "amount", "status")
+
+
+def parse_amount(text):
+    """
+    将金额字符串转换为数值
+
+    :param text: 金额字符串（可含千分位逗号）
+    :return: float，无法解析时返回None
+    """
+    try:
+        return float(str(text).replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+class ReceiptFilterIndex:
+    """
+    回单列表的筛选索引
+
+    建立后只读；query返回的回单数据字典就是传入的对象本身（不复制）。
+    """
+
+    def __init__(self, items):
+        """
+        :param items: 回单数据字典列表（界面中的preview_data）
+        """
+        self.items = list(items)
+
+        # 客户名称：{小写名称: [位置, ...]}
+        self._names = {}
+        for pos, item in enumerate(self.items):
+            self._names.setdefault(item.get("name", "").lower(), []).append(pos)
+        self._last_name_query = None
+        self._last_name_keys = None
+
+        # 回单编号：按编号排序
+        numbers = sorted((item.get("no", ""), pos) for pos, item in enumerate(self.items))
+        self._number_keys = [no for no, _ in numbers]
+        self._number_pos = [pos for _, pos in numbers]
+
+        # 金额：按数值排序（无法解析的金额不参与区间查询）
+        amount_values = [parse_amount(item.get("amt", "")) for item in self.items]
+        amounts = sorted((amt, pos) for pos, amt in enumerate(amount_values) if amt is not None)
+        self._amount_keys = [amt for amt, _ in amounts]
+        self._amount_pos = [pos for _, pos in amounts]
+
+        # 状态和页码分桶
+        self._status = {}
+        self._pages = {}
+        for pos, item in enumerate(self.items):
+            self._status.setdefault(item.get("status", ""), set()).add(pos)
+            self._pages.setdefault(item.get("page_idx"), set()).add(pos)
+
+        # 各列的排序结果（升序，位置列表）
+        sort_keys = {
+            "seq": lambda pos: self.items[pos].get("seq", 0),
+            "name": lambda pos: self.items[pos].get("name", ""),
+            "receipt_no": lambda pos: self.items[pos].get("no", ""),
+            "amount": lambda pos: (amount_values[pos] is None, amount_values[pos] or 0.0),
+            "status": lambda pos: self.items[pos].get("status", ""),
+        }
+        self._orders = {column: sorted(range(len(self.items)), key=key) for column, key in sort_keys.items()}
+        # 各列中每个位置的名次，筛选结果较少时直接按名次排序
+        self._ranks = {}
+        for column, order in self._orders.items():
+            rank = [0] * len(order)
+            for i, pos in enumerate(order):
+                rank[pos] = i
+            self._ranks[column] = rank
+
+    def __len__(self):
+        return len(self.items)
+
+    def match_name(self, text):
+        """
+        :param text: 客户名称中的任意一段（不区分大小写）
+        :return: 位置集合
+        """
+        text = text.lower()
+        keys = self._names
+        # 继续输入（新条件包含上次的条件）时只在上次匹配的名称中查找
+        if self._last_name_query and self._last_name_query in text:
+            keys = self._last_name_keys
+        matched = [name for name in keys if text in name]
+        self._last_name_query, self._last_name_keys = text, matched
+        return {pos for name in matched for pos in self._names[name]}
+
+    def match_number_prefix(self, prefix):
+        """
+        :param prefix: 回单编号开头的若干位
+        :return: 位置集合
+        """
+        start = bisect.bisect_left(self._number_keys, prefix)
+        end = bisect.bisect_left(self._number_keys, prefix + "\uffff", start)
+        return set(self._number_pos[start:end])
+
+    def match_amount(self, low=None, high=None):
+        """
+        :param low: 金额下限（含），None表示不限
+        :param high: 金额上限（含），None表示不限
+        :return: 位置集合
+        """
+        start = 0 if low is None else bisect.bisect_left(self._amount_keys, low)
+        end = len(self._amount_keys) if high is None else bisect.bisect_right(self._amount_keys, high)
+        return set(self._amount_pos[start:end])
+
+    def match_status(self, status):
+        """:return: 状态为status的位置集合"""
+        return self._status.get(status, set())
+
+    def match_page(self, page_idx):
+        """:return: 位于第page_idx页（从0开始）的位置集合"""
+        return self._pages.get(page_idx, set())
+
+    def query(self, name="", no_prefix="", amt_min=None, amt_max=None, status="", page_idx=None,
+              sort_by="seq", reverse=False):
+        """
+        按条件筛选并排序
+
+        所有条件同时满足（空条件不限制）。
+
+        :param name: 客户名称子串
+        :param no_prefix: 回单编号前缀
+        :param amt_min: 金额下限
+        :param amt_max: 金额上限
+        :param status: 状态
+        :param page_idx: 页面索引（从0开始）
+        :param sort_by: 排序列，SORT_COLUMNS之一
+        :param reverse: 是否降序
+        :return: 回单数据字典列表
+        """
+        candidates = []
+        if name:
+            candidates.append(self.match_name(name))
+        if no_prefix:
+            candidates.append(self.match_number_prefix(no_prefix))
+        if amt_min is not None or amt_max is not None:
+            candidates.append(self.match_amount(amt_min, amt_max))
+        if status:
+            candidates.append(self.match_status(status))
+        if page_idx is not None:
+            candidates.append(self.match_page(page_idx))
+
+        if sort_by not in self._orders:
+            sort_by = "seq"
+        order = self._orders[sort_by]
+        if not candidates:
+            positions = order
+        else:
+            # 从最小的集合开始求交集
+            candidates.sort(key=len)
+            matched = candidates[0].intersection(*candidates[1:])
+            if len(matched) * 8 < len(order):
+                # 结果较少时按名次排序，不遍历整个排序数组
+                positions = sorted(matched, key=self._ranks[sort_by].__getitem__)
+            else:
+                positions = [pos for pos in order if pos in matched]
+        if reverse:
+            positions = positions[::-1]
+        return [self.items[pos] for pos in positions]
@@ -0,0 +1,119 @@
+"""
+跨运行的已导出回单索引
+
+使用内嵌的SQLite数据库记录每张已导出回单的20位回单编号、内容指纹和输出路径。
+对账单下载有重叠（如周对账单与月对账单）时，导出阶段可以据此跳过或链接已导出的回单，
+分析阶段可以据此将其标记为"已导出"。
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+from receipt_core import APP_DATA_DIR, RECEIPT_NO_REGEX_20
+
+# 默认索引文件位置
+DEFAULT_INDEX_PATH = os.path.join(APP_DATA_DIR, "export_index.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exported_receipts (
+    content_hash TEXT PRIMARY KEY,
+    receipt_no   TEXT,
+    output_path  TEXT NOT NULL,
+    source_file  TEXT,
+    exported_at  TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_exported_receipt_no ON exported_receipts (receipt_no);
+"""
+
+
+def _is_receipt_no(text):
+    """判断是否为有效的20位回单编号"""
+    return bool(text) and RECEIPT_NO_REGEX_20.fullmatch(text) is not None
+
+
+class ExportIndex:
+    """
+    已导出回单索引
+
+    同一连接可以被后台分析线程和导出线程共用，内部用锁串行化访问。
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        """
+        :param path: SQLite数据库文件路径，目录不存在时自动创建
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.executescript(_SCHEMA)
+
+    def lookup(self, receipt_no, content_hash):
+        """
+        查找已导出的回单
+
+        以内容指纹为准；如果记录中的回单编号与传入的有效编号不一致（例如手工修改过），视为不同回单。
+
+        :param receipt_no: 回单编号（可能为"未知编号"）
+        :param content_hash: 回单内容指纹
+        :return: 记录字典（receipt_no、content_hash、output_path、source_file、exported_at），未找到返回None
+        """
+        return self.lookup_many([{"no": receipt_no, "content_hash": content_hash}]).get(content_hash)
+
+    def lookup_many(self, items):
+        """
+        批量查找已导出的回单
+
+        :param items: 回单数据字典列表（需包含no和content_hash）
+        :return: 字典 {content_hash: 记录字典}
+        """
+        hashes = [item.get("content_hash") for item in items if item.get("content_hash")]
+        found = {}
+        with self._lock:
+            # SQLite对单条语句的参数个数有限制，分批查询
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row in self._conn.execute(
+                        f"SELECT * FROM exported_receipts WHERE content_hash IN ({placeholders})", chunk):
+                    found[row["content_hash"]] = dict(row)
+
+        result = {}
+        for item in items:
+            row = found.get(item.get("content_hash"))
+            if row is None:
+                continue
+            receipt_no = item.get("no")
+            if _is_receipt_no(receipt_no) and row["receipt_no"] and row["receipt_no"] != receipt_no:
+                continue
+            result[row["content_hash"]] = row
+        return result
+
+    def add(self, item, output_path, source_file):
+        """
+        记录一张已导出的回单（同一指纹再次导出时更新为最新路径）
+
+        :param item: 回单数据字典
+        :param output_path: 导出文件的完整路径，或对象存储地址（如 s3://bucket/xxx.pdf）
+        :param source_file: 源PDF文件路径
+        """
+        if not item.get("content_hash"):
+            return
+        receipt_no = item.get("no") if _is_receipt_no(item.get("no")) else None
+        if "://" not in output_path:
+            output_path = os.path.abspath(output_path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO exported_receipts "
+                "(content_hash, receipt_no, output_path, source_file, exported_at) VALUES (?, ?, ?, ?, ?)",
+                (item["content_hash"], receipt_no, output_path, source_file,
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
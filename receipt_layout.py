@@ -0,0 +1,479 @@
+"""
+回单版式描述与字段提取引擎
+
+各字段的锚点文本、搜索范围、停止词和校验规则写在 layouts/<版式名>.json 中，
+加载时一次编译为预编译正则和frozenset等匹配器，由通用引擎对回单区域内的文字执行。
+银行调整回单版式时只需修改JSON文件（也可以把修改后的文件放到用户数据目录的
+layouts 文件夹中覆盖内置版式），无需修改代码。
+
+字段类型：
+- name：户名。锚点后同一行的文字，遇到完整的停止词时截断
+- digits：数字编号。锚点后同一行的纯数字拼接，拼接结果须通过校验
+- anchor_text：锚点右侧矩形范围内的文字，用正则取出字段值
+
+每个版式还定义了指纹关键词（fingerprints）。BankClassifier把所有版式的关键词编译为一个正则表达式，
+每页文字只扫描一次即可判断属于哪家银行，再按版式名直接取出对应的版式。
+"""
+import json
+import os
+import re
+import sys
+from operator import itemgetter
+
+import fitz  # PyMuPDF
+
+# 内置版式文件目录（打包为exe后位于解压目录中）
+BUNDLED_LAYOUT_DIR = os.path.join(getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__))), "layouts")
+# 默认版式名
+DEFAULT_LAYOUT = "abc"
+
+# 冒号（锚点与字段值之间的分隔符）
+_COLON_CHARS = ("：", ":")
+
+
+class LayoutError(Exception):
+    """版式描述文件无效"""
+
+
+class WordIndex:
+    """
+    回单区域内文字的预处理结果
+
+    每个单词的矩形只构造一次，所有字段的匹配器共用。
+    """
+
+    def __init__(self, words):
+        """
+        :param words: page.get_text("words") 的结果
+        """
+        self.words = words
+        self.rects = [fitz.Rect(w[:4]) for w in words]
+
+    def anchor_positions(self, anchor_text):
+        """包含锚点文本的单词下标（按原顺序）"""
+        return [i for i, w in enumerate(self.words) if anchor_text in w[4]]
+
+    def colon_end(self, anchor_idx, row_tolerance):
+        """
+        锚点同一行、锚点右侧第一个冒号的右边界
+
+        :return: x坐标，没有冒号时返回None
+        """
+        anchor_rect = self.rects[anchor_idx]
+        for w, rect in zip(self.words, self.rects):
+            if abs(rect.y0 - anchor_rect.y0) < row_tolerance and any(c in w[4] for c in _COLON_CHARS):
+                if rect.x0 >= anchor_rect.x0:
+                    return rect.x1
+        return None
+
+
+class StopWords:
+    """
+    停止词匹配器
+
+    所有停止词预先编译为一个正则表达式，绝大多数不含停止词的单词只需一次search即可排除。
+    boundary模式下，停止词前后须是边界字符（空格、标点）或文本边界，才视为完整的词。
+    """
+
+    def __init__(self, words, mode="contains", boundary_chars=""):
+        """
+        :param words: 停止词列表（顺序即优先级）
+        :param mode: "contains"（包含即停止）或 "boundary"（完整的词才停止）
+        :param boundary_chars: boundary模式下的边界字符
+        """
+        if mode not in ("contains", "boundary"):
+            raise LayoutError(f"未知的停止词匹配方式: {mode}")
+        self.words = tuple(words)
+        self.mode = mode
+        self.boundary_chars = frozenset(boundary_chars)
+        self._any = re.compile("|".join(re.escape(w) for w in self.words)) if self.words else None
+
+    def find(self, text):
+        """
+        停止词在文本中的位置
+
+        :return: 第一个命中的停止词（按列表顺序）的位置，没有命中返回-1
+        """
+        if self._any is None or self._any.search(text) is None:
+            return -1
+        for word in self.words:
+            pos = text.find(word)
+            if pos < 0:
+                continue
+            if self.mode == "contains":
+                return pos
+            before = text[pos - 1] if pos > 0 else " "
+            end = pos + len(word)
+            after = text[end] if end < len(text) else " "
+            if before in self.boundary_chars or after in self.boundary_chars:
+                return pos
+        return -1
+
+
+class NameField:
+    """户名字段：锚点（或其后的冒号）之后同一行的文字"""
+
+    def __init__(self, spec, boundary_chars):
+        self.anchors = tuple(spec["anchors"])
+        self.search_width = float(spec.get("search_width", 250))
+        self.row_tolerance = float(spec.get("row_tolerance", 5))
+        self.stop_words = StopWords(spec.get("stop_words", ()), spec.get("stop_match", "boundary"), boundary_chars)
+        self.skip_tokens = frozenset(spec.get("skip_tokens", ()))
+        self.leading_strip = [re.compile(p) for p in spec.get("leading_strip", ())]
+        self.trailing_strip = [re.compile(p) for p in spec.get("trailing_strip", ())]
+
+    def extract(self, index):
+        """
+        :param index: WordIndex对象
+        :return: 户名，未找到返回None
+        """
+        found = self.locate(index)
+        return found[0] if found else None
+
+    def locate(self, index):
+        """
+        :param index: WordIndex对象
+        :return: 元组(户名, 锚点矩形, 字段值单词的矩形列表)，未找到返回None
+        """
+        for anchor_text in self.anchors:
+            positions = index.anchor_positions(anchor_text)
+            if not positions:
+                continue
+            anchor_idx = positions[0]
+            anchor_rect = index.rects[anchor_idx]
+            anchor_y = anchor_rect.y0
+            start_x = index.colon_end(anchor_idx, self.row_tolerance)
+            if start_x is None:
+                start_x = anchor_rect.x1
+            end_x = start_x + self.search_width
+
+            found_words = []
+            for w, rect in zip(index.words, index.rects):
+                if abs(rect.y0 - anchor_y) >= self.row_tolerance or not (start_x <= rect.x0 < end_x):
+                    continue
+                w_text = w[4].strip()
+                if self.stop_words.find(w_text) >= 0:
+                    break
+                if w_text and w_text not in self.skip_tokens:
+                    found_words.append(w)
+
+            if not found_words:
+                continue
+            found_words.sort(key=itemgetter(0))
+            name_text = " ".join(w[4] for w in found_words)
+            for pattern in self.leading_strip:
+                name_text = pattern.sub("", name_text)
+            # 多个单词拼接后再检查一次停止词，确保截断
+            pos = self.stop_words.find(name_text)
+            if pos >= 0:
+                name_text = name_text[:pos].strip()
+            for pattern in self.trailing_strip:
+                name_text = pattern.sub("", name_text)
+            if name_text:
+                return name_text.strip(), anchor_rect, [fitz.Rect(w[:4]) for w in found_words]
+        return None
+
+
+class DigitsField:
+    """数字编号字段：锚点之后同一行的纯数字拼接"""
+
+    def __init__(self, spec, boundary_chars):
+        self.anchors = tuple(spec["anchors"])
+        self.search_width = float(spec.get("search_width", 250))
+        self.row_tolerance = float(spec.get("row_tolerance", 3))
+        self.stop_words = StopWords(spec.get("stop_words", ()), spec.get("stop_match", "contains"), boundary_chars)
+        self.token_regex = re.compile(spec.get("token_pattern", r"^\d+$"))
+        self.validator = re.compile(spec["validator"]) if spec.get("validator") else None
+
+    def extract(self, index):
+        """
+        :param index: WordIndex对象
+        :return: 通过校验的编号，未找到返回None
+        """
+        found = self.locate(index)
+        return found[0] if found else None
+
+    def locate(self, index):
+        """
+        :param index: WordIndex对象
+        :return: 元组(编号, 锚点矩形, 字段值单词的矩形列表)，未找到返回None
+        """
+        for anchor_text in self.anchors:
+            positions = index.anchor_positions(anchor_text)
+            if not positions:
+                continue
+            # 取最靠上、最靠左的锚点
+            anchor_idx = min(positions, key=lambda i: (index.words[i][1], index.words[i][0]))
+            anchor_rect = index.rects[anchor_idx]
+            anchor_y = anchor_rect.y0
+            start_x = index.colon_end(anchor_idx, self.row_tolerance)
+            if start_x is None:
+                start_x = anchor_rect.x1
+            end_x = start_x + self.search_width
+
+            found_words = []
+            for w, rect in zip(index.words, index.rects):
+                if abs(rect.y0 - anchor_y) > self.row_tolerance or not (start_x <= rect.x0 < end_x):
+                    continue
+                w_text = w[4].strip()
+                if self.stop_words.find(w_text) >= 0:
+                    break
+                if w_text and self.token_regex.match(w_text):
+                    found_words.append(w)
+
+            if found_words:
+                found_words.sort(key=itemgetter(0))
+                digits = re.sub(r"[^\d]", "", "".join(w[4] for w in found_words))
+                if self.validator is None or self.validator.fullmatch(digits):
+                    return digits, anchor_rect, [fitz.Rect(w[:4]) for w in found_words]
+        return None
+
+
+class AnchorTextField:
+    """锚点右侧矩形范围内的文字，用正则取出字段值"""
+
+    def __init__(self, spec, boundary_chars):
+        self.anchors = tuple(spec["anchors"])
+        self.search_width = float(spec.get("search_width", 300))
+        self.x_offset = float(spec.get("x_offset", 0))
+        self.y_margin = float(spec.get("y_margin", 3))
+        self.value_regex = re.compile(spec["value_pattern"]) if spec.get("value_pattern") else None
+        self.remove_chars = spec.get("remove_chars", "")
+
+    def _clean(self, value):
+        for char in self.remove_chars:
+            value = value.replace(char, "")
+        return value
+
+    def extract(self, index):
+        """
+        :param index: WordIndex对象
+        :return: 字段值，未找到返回None
+        """
+        found = self.locate(index)
+        return found[0] if found else None
+
+    def locate(self, index):
+        """
+        :param index: WordIndex对象
+        :return: 元组(字段值, 锚点矩形, 搜索范围内单词的矩形列表)，未找到返回None；
+                 锚点右侧有文字但不符合字段值格式时字段值为None
+        """
+        for anchor_text in self.anchors:
+            positions = index.anchor_positions(anchor_text)
+            if not positions:
+                continue
+            anchor_rect = index.rects[positions[0]]
+            search_rect = fitz.Rect(anchor_rect.x1 + self.x_offset, anchor_rect.y0 - self.y_margin,
+                                    anchor_rect.x1 + self.search_width, anchor_rect.y1 + self.y_margin)
+            found_words = [w for w, rect in zip(index.words, index.rects) if rect.intersects(search_rect)]
+            if not found_words:
+                continue
+            found_words.sort(key=itemgetter(0))
+            word_rects = [fitz.Rect(w[:4]) for w in found_words]
+            text = " ".join(w[4] for w in found_words)
+            if self.value_regex is None:
+                return text, anchor_rect, word_rects
+            # 与旧逻辑一致：锚点右侧找到文字后即以此为准，不再尝试下一个锚点
+            text = text.replace("\n", " ").replace("\r", " ").replace("\t", " ")
+            match = self.value_regex.search(text)
+            return (self._clean(match.group(1)) if match else None), anchor_rect, word_rects
+        return None
+
+
+_FIELD_TYPES = {
+    "name": NameField,
+    "digits": DigitsField,
+    "anchor_text": AnchorTextField,
+}
+
+
+class CompiledLayout:
+    """
+    编译后的回单版式
+
+    - fields: {字段名: 匹配器}，匹配器的extract(WordIndex)返回字段值或None
+    - label_patterns: {字段名: 预编译正则}，整页扫描和兜底全文搜索使用，第1组为字段值
+    - defaults: {字段名: 未找到时的默认值}
+    """
+
+    def __init__(self, spec):
+        """
+        :param spec: 版式描述字典（JSON文件内容）
+        """
+        self.name = spec.get("name", "")
+        self.title = spec.get("title", self.name)
+        # 多个版式同时满足时，priority小的优先
+        self.priority = int(spec.get("priority", 100))
+        # 页面中没有分隔线时，按该标签的位置切分回单
+        self.split_label = spec.get("split_label", "回单编号")
+        fingerprints = spec.get("fingerprints", {})
+        self.fingerprint_keywords = frozenset(fingerprints.get("keywords", ()))
+        self.fingerprint_required = frozenset(fingerprints.get("required_any", ()))
+        self.fingerprint_min_matches = int(fingerprints.get("min_matches", 2))
+        boundary_chars = spec.get("boundary_chars", " ")
+        self.fields = {}
+        self.label_patterns = {}
+        self.defaults = {}
+        self.remove_chars = {}
+        for field_name, field_spec in spec.get("fields", {}).items():
+            field_type = field_spec.get("type")
+            if field_type not in _FIELD_TYPES:
+                raise LayoutError(f"字段 {field_name} 的类型无效: {field_type}")
+            if not field_spec.get("anchors"):
+                raise LayoutError(f"字段 {field_name} 缺少锚点文本")
+            try:
+                self.fields[field_name] = _FIELD_TYPES[field_type](field_spec, boundary_chars)
+                if field_spec.get("label_pattern"):
+                    self.label_patterns[field_name] = re.compile(field_spec["label_pattern"])
+            except re.error as e:
+                raise LayoutError(f"字段 {field_name} 的正则表达式无效: {e}")
+            self.defaults[field_name] = field_spec.get("default", "")
+            self.remove_chars[field_name] = field_spec.get("remove_chars", "")
+
+    def extract(self, field_name, index):
+        """
+        提取一个字段
+
+        :param field_name: 字段名
+        :param index: WordIndex对象
+        :return: 字段值，未找到返回None
+        """
+        field = self.fields.get(field_name)
+        return field.extract(index) if field is not None else None
+
+    def locate(self, field_name, index):
+        """
+        字段的锚点和字段值在页面上的位置（调试叠加层使用）
+
+        :param field_name: 字段名
+        :param index: WordIndex对象
+        :return: 元组(字段值, 锚点矩形, 字段值单词的矩形列表)，未找到返回None
+        """
+        field = self.fields.get(field_name)
+        return field.locate(index) if field is not None else None
+
+    def fingerprint_score(self, found_keywords):
+        """
+        页面指纹得分
+
+        :param found_keywords: 页面中出现的关键词集合
+        :return: 命中的关键词数，不满足最少命中数或缺少必需关键词时返回0
+        """
+        if not self.fingerprint_keywords:
+            return 0
+        if self.fingerprint_required and not (found_keywords & self.fingerprint_required):
+            return 0
+        matches = len(found_keywords & self.fingerprint_keywords)
+        return matches if matches >= self.fingerprint_min_matches else 0
+
+    def clean_label_value(self, field_name, value):
+        """去除整页扫描结果中的分隔字符（如金额中的千位逗号）"""
+        for char in self.remove_chars.get(field_name, ""):
+            value = value.replace(char, "")
+        return value
+
+
+def find_layout_file(name, search_dirs=()):
+    """
+    查找版式文件：先找search_dirs中的用户版式，再找内置版式
+
+    :param name: 版式名（不含扩展名）
+    :param search_dirs: 优先查找的目录列表
+    :return: 文件路径，找不到返回None
+    """
+    for directory in list(search_dirs) + [BUNDLED_LAYOUT_DIR]:
+        path = os.path.join(directory, f"{name}.json")
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def load_layout(name=DEFAULT_LAYOUT, search_dirs=()):
+    """
+    加载并编译版式
+
+    :param name: 版式名（不含扩展名）
+    :param search_dirs: 优先查找的目录列表（用户修改过的版式放在这里）
+    :return: CompiledLayout对象
+    """
+    path = find_layout_file(name, search_dirs)
+    if path is None:
+        raise LayoutError(f"找不到版式文件: {name}.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            spec = json.load(f)
+    except ValueError as e:
+        raise LayoutError(f"版式文件 {path} 格式错误: {e}")
+    spec.setdefault("name", name)
+    return CompiledLayout(spec)
+
+
+def load_all_layouts(search_dirs=()):
+    """
+    加载全部版式（内置版式和search_dirs中的版式，同名时search_dirs中的优先）
+
+    :param search_dirs: 优先查找的目录列表
+    :return: 字典 {版式名: CompiledLayout}
+    """
+    names = set()
+    for directory in list(search_dirs) + [BUNDLED_LAYOUT_DIR]:
+        if os.path.isdir(directory):
+            names.update(os.path.splitext(f)[0] for f in os.listdir(directory) if f.endswith(".json"))
+    return {name: load_layout(name, search_dirs) for name in sorted(names)}
+
+
+class BankClassifier:
+    """
+    银行回单格式识别
+
+    所有版式的指纹关键词编译为一个正则表达式（多选一），每页文字只扫描一次，
+    再按各版式命中的关键词数打分；识别结果就是版式对象本身，无需再按银行逐个判断。
+    """
+
+    def __init__(self, layouts):
+        """
+        :param layouts: CompiledLayout对象的可迭代对象
+        """
+        self.layouts = sorted(layouts, key=lambda layout: (layout.priority, layout.name))
+        keywords = set()
+        for layout in self.layouts:
+            keywords |= layout.fingerprint_keywords | layout.fingerprint_required
+        ordered = sorted(keywords, key=lambda k: (-len(k), k))
+        self._regex = re.compile("|".join(re.escape(k) for k in ordered)) if ordered else None
+        # 正则只返回最长的匹配，较长关键词命中时，其中包含的较短关键词也算命中
+        self._implied = {k: frozenset(other for other in keywords if other in k) for k in keywords}
+
+    def classify_text(self, text):
+        """
+        识别一段文字所属的版式
+
+        :param text: 页面文字
+        :return: CompiledLayout对象，无法识别时返回None
+        """
+        if self._regex is None or not text:
+            return None
+        found = set()
+        for match in self._regex.finditer(text):
+            found |= self._implied[match.group(0)]
+        best, best_score = None, 0
+        for layout in self.layouts:
+            score = layout.fingerprint_score(found)
+            if score > best_score:
+                best, best_score = layout, score
+        return best
+
+    def classify(self, doc, check_limit=3):
+        """
+        识别PDF文档的回单格式（检查前几页，任一页识别成功即返回）
+
+        :param doc: fitz.Document对象
+        :param check_limit: 最多检查前几页
+        :return: 元组(CompiledLayout或None, 说明文字)
+        """
+        actual_limit = min(len(doc), check_limit)
+        for i in range(actual_limit):
+            layout = self.classify_text(doc[i].get_text())
+            if layout is not None:
+                return layout, f"识别为{layout.title}"
+        return None, f"在前 {actual_limit} 页中未检测到可识别的银行回单指纹标识。"
@@ -0,0 +1,183 @@
+"""
+导出文件的完整性清单
+
+每次逐张导出时，在日志CSV旁生成一个清单文件（log_XXX.csv 对应 manifest_XXX.csv），
+每张回单一行：输出文件名、文件内容的SHA-256和字节数、源文件名及其SHA-256、页面索引和回单区域。
+文件的SHA-256在写入时直接由内存中的PDF数据计算（见save_pdf_atomic），不需要事后把文件读回来。
+
+审计时用verify_manifest（或命令行）对照清单多线程并行校验归档目录中的文件，
+找出被修改、被删除的文件；指定源文件时同时核对源文件是否就是当初拆分的那一份。
+
+命令行用法：
+    python receipt_manifest.py D:/回单导出/manifest_20240301_120000.csv
+    python receipt_manifest.py D:/回单导出 --source 回单.pdf    # 校验目录中的全部清单
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# 清单文件名前缀（与日志文件 log_XXX.csv 对应）
+MANIFEST_PREFIX = "manifest_"
+MANIFEST_HEADER = ["文件名", "SHA256", "字节数", "源文件", "源文件SHA256", "页面索引", "回单区域", "回单编号"]
+# 计算文件SHA-256时每次读取的字节数
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# 校验结果
+VERIFY_OK = "一致"
+VERIFY_MODIFIED = "已修改"
+VERIFY_MISSING = "缺失"
+
+
+def bytes_sha256(data):
+    """:return: 数据的SHA-256（十六进制字符串）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path):
+    """
+    分块读取文件计算SHA-256
+
+    :param path: 文件路径
+    :return: SHA-256（十六进制字符串）
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_sha256(source):
+    """
+    :param source: 源PDF文件路径或文件内容（bytes）
+    :return: SHA-256（十六进制字符串），源文件不可读时返回空字符串
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return bytes_sha256(source)
+    try:
+        return file_sha256(source)
+    except (OSError, TypeError):
+        return ""
+
+
+def manifest_filename(log_filename):
+    """
+    :param log_filename: 日志文件名，如 log_20240301_120000.csv
+    :return: 对应的清单文件名，如 manifest_20240301_120000.csv
+    """
+    stem = log_filename[len("log_"):] if log_filename.startswith("log_") else log_filename
+    return MANIFEST_PREFIX + stem
+
+
+def manifest_row(filename, sha256, size, source_name, source_hash, item):
+    """
+    :param filename: 输出文件名（相对清单所在目录）
+    :param sha256: 输出文件的SHA-256
+    :param size: 输出文件的字节数
+    :param source_name: 源文件名
+    :param source_hash: 源文件的SHA-256
+    :param item: 回单数据字典
+    :return: 清单中的一行（列表）
+    """
+    rect = item.get("rect") or ()
+    return [filename, sha256, size, source_name, source_hash, item.get("page_idx", ""),
+            ",".join(f"{v:.2f}" for v in rect), item.get("no", "")]
+
+
+def read_manifest(manifest_path):
+    """
+    读取清单文件；中断后继续导出时同一文件可能有多行，以最后一行为准
+
+    :param manifest_path: 清单文件路径
+    :return: 记录字典列表（键为MANIFEST_HEADER中的列名），按首次出现的顺序
+    """
+    records = {}
+    with open(manifest_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header != MANIFEST_HEADER:
+            raise ValueError(f"{manifest_path} 不是回单清单文件")
+        for row in reader:
+            if row:
+                record = dict(zip(MANIFEST_HEADER, row))
+                records[record["文件名"]] = record
+    return list(records.values())
+
+
+def _verify_file(path, expected):
+    """:return: (校验结果, 实际的SHA-256)"""
+    try:
+        actual = file_sha256(path)
+    except FileNotFoundError:
+        return VERIFY_MISSING, ""
+    return (VERIFY_OK if actual == expected else VERIFY_MODIFIED), actual
+
+
+def verify_manifest(manifest_path, base_dir=None, workers=None, progress_callback=None):
+    """
+    对照清单校验文件
+
+    多个线程并行读取文件计算SHA-256（读文件和计算哈希时不占用GIL）。
+
+    :param manifest_path: 清单文件路径
+    :param base_dir: 输出文件所在目录，默认为清单所在目录
+    :param workers: 并行线程数，默认按CPU核数
+    :param progress_callback: 可选的进度回调，参数为(已校验数量, 总数量)
+    :return: 列表，每项为 (清单记录字典, 校验结果, 实际的SHA-256)，顺序与清单一致
+    """
+    records = read_manifest(manifest_path)
+    base_dir = base_dir or os.path.dirname(os.path.abspath(manifest_path))
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_verify_file, os.path.join(base_dir, record["文件名"]), record["SHA256"])
+                   for record in records]
+        for done, (record, future) in enumerate(zip(records, futures), 1):
+            status, actual = future.result()
+            results.append((record, status, actual))
+            if progress_callback:
+                progress_callback(done, len(records))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对照完整性清单校验拆分后的回单文件")
+    parser.add_argument("manifest", help="清单文件（manifest_*.csv），或包含清单文件的目录")
+    parser.add_argument("--source", default=None, help="源PDF文件，同时核对源文件的SHA-256")
+    parser.add_argument("--workers", type=int, default=None, help="并行校验的线程数")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.manifest):
+        manifests = sorted(glob.glob(os.path.join(args.manifest, MANIFEST_PREFIX + "*.csv")))
+        if not manifests:
+            print(f"{args.manifest} 中没有清单文件", file=sys.stderr)
+            sys.exit(1)
+    else:
+        manifests = [args.manifest]
+    source_hash = file_sha256(args.source) if args.source else None
+
+    problems = 0
+    for manifest_path in manifests:
+        results = verify_manifest(manifest_path, workers=args.workers)
+        counts = {VERIFY_OK: 0, VERIFY_MODIFIED: 0, VERIFY_MISSING: 0}
+        for record, status, _ in results:
+            counts[status] += 1
+            if status != VERIFY_OK:
+                print(f"{status}: {record['文件名']}")
+        if source_hash is not None:
+            mismatched = sum(1 for record, _, _ in results if record["源文件SHA256"] != source_hash)
+            if mismatched:
+                print(f"源文件不一致: {mismatched} 个文件不是由 {args.source} 拆分的")
+                problems += mismatched
+        problems += counts[VERIFY_MODIFIED] + counts[VERIFY_MISSING]
+        print(f"{manifest_path}: {len(results)} 个文件，一致 {counts[VERIFY_OK]} 个，"
+              f"已修改 {counts[VERIFY_MODIFIED]} 个，缺失 {counts[VERIFY_MISSING]} 个")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
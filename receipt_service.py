@@ -0,0 +1,298 @@
+"""
+本地HTTP拆分服务
+
+将回单解析和拆分逻辑（receipt_core）封装为只监听本机的HTTP服务，
+办公室内多个客户端可以共享一台机器的CPU，无需每个文件都打开一次图形界面。
+服务没有身份验证，默认拒绝监听非本机地址；确需对外开放时必须显式指定 --allow-remote。
+
+接口：
+- GET  /health                      查看服务状态
+- POST /split?format=json|zip       请求体为PDF文件内容，返回JSON记录或拆分后的ZIP包
+        可选参数 company=本方公司户名（可重复传入多个）；mode=cropbox|clip 回单PDF的生成方式；trim=1 删除回单区域以外的内容
+
+使用方法：
+    python receipt_service.py --port 8765 --workers 4 --max-jobs 4
+    curl --data-binary @回单.pdf -H "Content-Type: application/pdf" \\
+         "http://127.0.0.1:8765/split?format=zip" -o 回单.zip
+"""
+import argparse
+import io
+import ipaddress
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from receipt_core import (EXPORT_MODE_CLIP, EXPORT_MODE_CROPBOX, analyze_document, build_receipt_filename,
+                          crop_receipt, detect_receipt_layout, open_document)
+
+# 单个请求允许上传的最大PDF大小（字节）
+MAX_UPLOAD_SIZE = 200 * 1024 * 1024
+
+
+class ReceiptRejected(Exception):
+    """上传的文件不是可识别的银行回单"""
+
+
+def _warm_up():
+    """
+    预热工作进程
+
+    在工作进程中提前导入PyMuPDF和pdfplumber，避免第一个请求承担导入开销。
+    """
+    import fitz  # noqa: F401
+    import pdfplumber  # noqa: F401
+    return os.getpid()
+
+
+def split_job(pdf_bytes, local_company_name="", want_zip=False, export_mode=EXPORT_MODE_CROPBOX, trim=False):
+    """
+    在工作进程中执行的拆分任务
+
+    :param pdf_bytes: PDF文件内容
+    :param local_company_name: 本方公司户名或户名列表，用于判断客户名称
+    :param want_zip: True返回ZIP包内容，False返回JSON可序列化的记录列表
+    :param export_mode: 回单PDF的生成方式，EXPORT_MODE_CROPBOX / EXPORT_MODE_CLIP
+    :param trim: 仅EXPORT_MODE_CLIP有效，是否删除回单区域以外的内容
+    :return: 元组(records, zip_bytes)，want_zip为False时zip_bytes为None
+    """
+    try:
+        doc = open_document(pdf_bytes)
+    except Exception as e:
+        raise ReceiptRejected(f"无法打开PDF文件: {e}")
+    try:
+        layout, msg = detect_receipt_layout(doc)
+        if layout is None:
+            raise ReceiptRejected(msg)
+
+        records = list(analyze_document(doc, pdf_bytes, local_company_name, layout=layout))
+        if not want_zip:
+            return records, None
+
+        buffer = io.BytesIO()
+        used_names = set()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for item in records:
+                if item.get("duplicate_of"):
+                    # 重复页上的回单不再打包
+                    continue
+                # 在内存中处理重名，规则与导出到目录时一致
+                counter = 0
+                filename = build_receipt_filename(item)
+                while filename in used_names:
+                    counter += 1
+                    filename = build_receipt_filename(item, counter)
+                used_names.add(filename)
+
+                new_doc = crop_receipt(doc, item, export_mode, trim)
+                zf.writestr(filename, new_doc.tobytes(garbage=3, deflate=True))
+                new_doc.close()
+        return records, buffer.getvalue()
+    finally:
+        doc.close()
+
+
+class SplitService:
+    """
+    拆分服务：持有预热的进程池，并限制同时处理的任务数
+    """
+
+    def __init__(self, workers=None, max_jobs=None, queue_timeout=30):
+        """
+        :param workers: 工作进程数，默认等于CPU核数
+        :param max_jobs: 同时处理的最大任务数，默认等于工作进程数
+        :param queue_timeout: 任务排队的最长等待时间（秒），超时返回服务繁忙
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_jobs = max_jobs or self.workers
+        self.queue_timeout = queue_timeout
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self._job_slots = threading.BoundedSemaphore(self.max_jobs)
+        self._lock = threading.Lock()
+        self.active_jobs = 0
+
+        # 预热：让所有工作进程立即启动并完成导入
+        for future in [self.executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+
+    def run(self, pdf_bytes, local_company_name="", want_zip=False, export_mode=EXPORT_MODE_CROPBOX, trim=False):
+        """
+        提交拆分任务并等待结果
+
+        :return: 同split_job；如果排队超时返回None
+        """
+        if not self._job_slots.acquire(timeout=self.queue_timeout):
+            return None
+        try:
+            with self._lock:
+                self.active_jobs += 1
+            return self.executor.submit(split_job, pdf_bytes, local_company_name, want_zip,
+                                        export_mode, trim).result()
+        finally:
+            with self._lock:
+                self.active_jobs -= 1
+            self._job_slots.release()
+
+    def shutdown(self):
+        """关闭进程池"""
+        self.executor.shutdown(wait=True)
+
+
+class SplitRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP请求处理：GET /health 与 POST /split
+    """
+    # 由make_server注入SplitService实例
+    service = None
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode("utf-8"), headers=headers)
+
+    def do_GET(self):
+        if urlparse(self.path).path != "/health":
+            self._send_json(404, {"error": "未知接口"})
+            return
+        self._send_json(200, {
+            "status": "ok",
+            "workers": self.service.workers,
+            "max_jobs": self.service.max_jobs,
+            "active_jobs": self.service.active_jobs,
+        })
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/split":
+            self._send_json(404, {"error": "未知接口"})
+            return
+
+        params = parse_qs(url.query)
+        output_format = params.get("format", ["json"])[0]
+        # company参数可以重复出现，传入多个本方户名
+        local_company_name = [name.strip() for name in params.get("company", []) if name.strip()]
+        export_mode = params.get("mode", [EXPORT_MODE_CROPBOX])[0]
+        trim = params.get("trim", ["0"])[0] in ("1", "true", "yes")
+        if output_format not in ("json", "zip"):
+            self._send_json(400, {"error": "format参数只能是json或zip"})
+            return
+        if export_mode not in (EXPORT_MODE_CROPBOX, EXPORT_MODE_CLIP):
+            self._send_json(400, {"error": "mode参数只能是cropbox或clip"})
+            return
+
+        length_header = self.headers.get("Content-Length")
+        if length_header is None:
+            self._send_json(411, {"error": "缺少Content-Length请求头"})
+            return
+        length_header = length_header.strip()
+        if not (length_header.isascii() and length_header.isdigit()):
+            self._send_json(400, {"error": f"Content-Length不是有效的字节数: {length_header}"})
+            return
+        length = int(length_header)
+        if length == 0:
+            self._send_json(400, {"error": "请求体为空，请上传PDF文件内容"})
+            return
+        if length > MAX_UPLOAD_SIZE:
+            self._send_json(413, {"error": "文件过大"})
+            return
+        pdf_bytes = self.rfile.read(length)
+        if len(pdf_bytes) < length:
+            self._send_json(400, {"error": "请求体不完整"})
+            return
+
+        try:
+            result = self.service.run(pdf_bytes, local_company_name, want_zip=(output_format == "zip"),
+                                      export_mode=export_mode, trim=trim)
+        except ReceiptRejected as e:
+            self._send_json(422, {"error": str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"解析出错: {e}"})
+            return
+
+        if result is None:
+            self._send_json(503, {"error": "服务繁忙，请稍后重试"}, headers={"Retry-After": "5"})
+            return
+
+        records, zip_bytes = result
+        if output_format == "zip":
+            self._send(200, zip_bytes, content_type="application/zip",
+                       headers={"X-Receipt-Count": str(len(records))})
+        else:
+            self._send_json(200, {"count": len(records), "records": records})
+
+
+def is_loopback_host(host):
+    """
+    :param host: 监听地址（IP地址或主机名）
+    :return: 是否只在本机可访问（回环地址或localhost）
+    """
+    if host.lower() == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host.strip("[]")).is_loopback
+    except ValueError:
+        # 其他主机名可能解析到任意网卡，按非本机地址处理
+        return False
+
+
+def make_server(service, host="127.0.0.1", port=8765, allow_remote=False):
+    """
+    创建HTTP服务器
+
+    服务没有身份验证，任何能连上端口的人都可以提交文件，因此默认只允许监听本机地址。
+
+    :param service: SplitService实例
+    :param host: 监听地址，默认127.0.0.1
+    :param port: 监听端口，传0表示自动分配
+    :param allow_remote: 是否允许监听非本机地址（如0.0.0.0）
+    :return: ThreadingHTTPServer对象
+    """
+    if not allow_remote and not is_loopback_host(host):
+        raise ValueError(f"监听地址 {host} 不是本机地址，服务没有身份验证；确需对外开放请指定 allow_remote")
+    handler = type("BoundSplitRequestHandler", (SplitRequestHandler,), {"service": service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="农行电子回单本地拆分服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认仅本机）")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数，默认等于CPU核数")
+    parser.add_argument("--max-jobs", type=int, default=None, help="同时处理的最大任务数")
+    parser.add_argument("--allow-remote", action="store_true",
+                        help="允许监听非本机地址（服务没有身份验证，局域网内任何人都可以提交文件）")
+    args = parser.parse_args()
+
+    if not is_loopback_host(args.host):
+        if not args.allow_remote:
+            parser.error(f"监听地址 {args.host} 不是本机地址，服务没有身份验证；确需对外开放请同时指定 --allow-remote")
+        print(f"警告：服务监听 {args.host}，没有身份验证，能访问该地址的任何人都可以提交文件", file=sys.stderr)
+
+    service = SplitService(workers=args.workers, max_jobs=args.max_jobs)
+    server = make_server(service, args.host, args.port, allow_remote=args.allow_remote)
+    print(f"拆分服务已启动：http://{args.host}:{server.server_address[1]}  (工作进程 {service.workers} 个)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,146 @@
+"""
+按客户汇总回单金额
+
+分别按客户名称和收付方向统计回单笔数和金额合计，金额使用Decimal精确计算。
+汇总结果随回单数据的增加和修改增量更新：每条回单记住它上次计入的客户、方向和金额，
+修改后只减去旧值、加上新值，不需要重新遍历全部回单。
+"""
+import csv
+from decimal import Decimal, InvalidOperation
+
+from receipt_core import clean_filename
+
+# 收付方向
+DIRECTION_PAY = "付款"      # 本方付款：客户名称取自收款方
+DIRECTION_RECEIVE = "收款"  # 对方付款：客户名称取自付款方
+
+# 汇总CSV的表头
+SUMMARY_HEADER = ["客户名称", "方向", "笔数", "金额合计"]
+
+
+def parse_decimal_amount(text):
+    """
+    将金额字符串转换为Decimal
+
+    :param text: 金额字符串（可含千分位逗号）
+    :return: Decimal，无法解析时返回None
+    """
+    try:
+        value = Decimal(str(text).replace(",", "").strip())
+    except InvalidOperation:
+        return None
+    return value if value.is_finite() else None
+
+
+def receipt_direction(item):
+    """
+    判断回单的收付方向
+
+    客户名称等于收款方户名（付款方是本方）时为付款，否则为收款。
+
+    :param item: 回单数据字典
+    :return: DIRECTION_PAY 或 DIRECTION_RECEIVE
+    """
+    name = item.get("name", "")
+    if name == clean_filename(item.get("receiver_name", "")) and name != clean_filename(item.get("payer_name", "")):
+        return DIRECTION_PAY
+    return DIRECTION_RECEIVE
+
+
+class CounterpartySummary:
+    """
+    按客户名称和收付方向汇总的笔数和金额
+
+    重复页上的回单（带duplicate_of）不计入，与导出结果一致。
+    """
+
+    def __init__(self):
+        self._totals = {}   # {(客户名称, 方向): [笔数, 金额合计]}
+        self._entries = {}  # {回单序号: (客户名称, 方向, 金额)}，记录每条回单当前计入的值
+        self.unparsed = set()  # 金额无法解析（按0计入）的回单序号
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, item):
+        """
+        计入一条新回单，或按修改后的字段更新已计入的回单
+
+        :param item: 回单数据字典（需包含seq）
+        """
+        seq = item["seq"]
+        self.remove(seq)
+        if item.get("duplicate_of"):
+            return
+        amount = parse_decimal_amount(item.get("amt", ""))
+        if amount is None:
+            self.unparsed.add(seq)
+            amount = Decimal("0")
+        entry = (item.get("name", ""), receipt_direction(item), amount)
+        total = self._totals.setdefault(entry[:2], [0, Decimal("0")])
+        total[0] += 1
+        total[1] += amount
+        self._entries[seq] = entry
+
+    def remove(self, seq):
+        """
+        移除一条已计入的回单
+
+        :param seq: 回单序号
+        """
+        entry = self._entries.pop(seq, None)
+        self.unparsed.discard(seq)
+        if entry is None:
+            return
+        key = entry[:2]
+        total = self._totals[key]
+        total[0] -= 1
+        total[1] -= entry[2]
+        if total[0] == 0:
+            del self._totals[key]
+
+    def clear(self):
+        """清空汇总"""
+        self._totals.clear()
+        self._entries.clear()
+        self.unparsed.clear()
+
+    def rows(self):
+        """
+        汇总行，按客户名称和方向排序
+
+        :return: 列表，每项为 (客户名称, 方向, 笔数, 金额合计)
+        """
+        return [(name, direction, count, amount)
+                for (name, direction), (count, amount) in sorted(self._totals.items())]
+
+    def direction_totals(self):
+        """
+        按收付方向的合计
+
+        :return: 字典 {方向: (笔数, 金额合计)}
+        """
+        result = {}
+        for (_, direction), (count, amount) in self._totals.items():
+            old_count, old_amount = result.get(direction, (0, Decimal("0")))
+            result[direction] = (old_count + count, old_amount + amount)
+        return result
+
+
+def write_summary_csv(summary, path):
+    """
+    将汇总结果写入CSV文件（utf-8-sig编码，Excel可直接打开），末尾附各方向合计
+
+    :param summary: CounterpartySummary对象
+    :param path: 输出文件路径
+    :return: 写入的汇总行数（不含合计行）
+    """
+    rows = summary.rows()
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_HEADER)
+        for name, direction, count, amount in rows:
+            writer.writerow([name, direction, count, f"{amount:.2f}"])
+        for direction, (count, amount) in sorted(summary.direction_totals().items()):
+            writer.writerow(["合计", direction, count, f"{amount:.2f}"])
+    return len(rows)
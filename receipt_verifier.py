@@ -0,0 +1,89 @@
+"""
+回单解析结果的后台复核
+
+推测模式下（analyze_document(..., speculative=True)）只用PyMuPDF提取字段，结果立即显示给用户；
+本模块的后台线程随后逐条用pdfplumber重新提取回单编号并做规则检查（编号格式、金额格式、户名不为空），
+发现不一致或不合理时通过回调通知调用方，由调用方把状态改为"需核对"。
+后台线程使用自己打开的pdfplumber文档，不与界面和分析线程共用。
+"""
+import queue
+import threading
+
+from receipt_core import STATUS_SCANNED, open_pdfplumber, verify_receipt
+
+# 复核需要的字段（提交时复制一份，避免与界面线程共用同一个字典）
+_VERIFY_FIELDS = ("seq", "page_idx", "rect", "no", "amt", "payer_name", "receiver_name")
+
+
+class ReceiptVerifier:
+    """
+    回单复核线程
+
+    submit提交的回单按顺序复核，每条完成后在后台线程中调用
+    on_result(seq, problems, plumber_no)，调用方负责把结果转交给主线程。
+    """
+
+    def __init__(self, source, on_result, layout=None):
+        """
+        :param source: PDF文件路径或文件内容（bytes）
+        :param on_result: 复核结果回调，参数为(回单序号, 问题说明列表, pdfplumber提取的回单编号或None)
+        :param layout: 可选，CompiledLayout对象，默认使用农行版式
+        """
+        self.source = source
+        self.on_result = on_result
+        self.layout = layout
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, items):
+        """
+        提交需要复核的回单（重复页和扫描页上的回单不复核）
+
+        :param items: 回单数据字典的可迭代对象
+        """
+        for item in items:
+            if item.get("duplicate_of") or item.get("status") == STATUS_SCANNED:
+                continue
+            with self._lock:
+                self._pending += 1
+            self._queue.put({field: item.get(field) for field in _VERIFY_FIELDS})
+
+    def pending_count(self):
+        """:return: 已提交但尚未复核完成的回单数量"""
+        with self._lock:
+            return self._pending
+
+    def close(self):
+        """停止后台线程，未复核的回单不再处理"""
+        self._closed = True
+        self._queue.put(None)
+
+    def _run(self):
+        pdf = None
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None or self._closed:
+                    return
+                if pdf is None:
+                    pdf = open_pdfplumber(self.source)
+                try:
+                    problems, plumber_no = verify_receipt(item, pdf, self.layout)
+                except Exception as e:
+                    problems, plumber_no = [f"复核出错: {e}"], None
+                if self._closed:
+                    return
+                try:
+                    self.on_result(item["seq"], problems, plumber_no)
+                finally:
+                    with self._lock:
+                        self._pending -= 1
+        except Exception:
+            pass
+        finally:
+            if pdf is not None:
+                pdf.close()
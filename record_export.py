@@ -0,0 +1,270 @@
+"""
+回单明细数据导出
+
+将解析出的回单字段（客户名称、回单编号、金额、付款方/收款方户名、页码、区域等）
+以JSON Lines、JSON数组、完整字段CSV或SQLite格式流式写出：每解析出一条就写一条，
+内存占用与回单数量无关，适合每月数万条记录导入财务系统。
+
+命令行用法：
+    python record_export.py 回单1.pdf 回单2.pdf -o 明细.sqlite3
+    python record_export.py 回单.pdf -o 明细.jsonl --company 本方公司户名 --company 另一本方公司户名
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+
+from receipt_core import CompanyMatcher, analyze_document, detect_receipt_layout, open_document
+
+# 导出的字段（顺序即CSV列顺序）
+RECORD_FIELDS = ["source_file", "seq", "page_idx", "name", "no", "amt", "date", "payer_name", "receiver_name",
+                 "status", "bank", "x0", "y0", "x1", "y1", "content_hash"]
+
+# 各格式对应的文件扩展名
+FORMAT_EXTENSIONS = {
+    ".jsonl": "jsonl",
+    ".json": "json",
+    ".csv": "csv",
+    ".sqlite": "sqlite",
+    ".sqlite3": "sqlite",
+    ".db": "sqlite",
+}
+
+
+def record_from_item(item, source_file=""):
+    """
+    将回单数据字典转换为导出记录
+
+    :param item: 回单数据字典（analyze_document的结果或界面中的preview_data）
+    :param source_file: 源PDF文件路径，记录中只保留文件名
+    :return: 字典，键为RECORD_FIELDS
+    """
+    rect = list(item.get("rect") or [None, None, None, None])
+    return {
+        "source_file": os.path.basename(source_file) if source_file else "",
+        "seq": item.get("seq"),
+        "page_idx": item.get("page_idx"),
+        "name": item.get("name", ""),
+        "no": item.get("no", ""),
+        "amt": item.get("amt", ""),
+        "date": item.get("date", ""),
+        "payer_name": item.get("payer_name", ""),
+        "receiver_name": item.get("receiver_name", ""),
+        "status": item.get("status", ""),
+        "bank": item.get("bank", ""),
+        "x0": rect[0],
+        "y0": rect[1],
+        "x1": rect[2],
+        "y1": rect[3],
+        "content_hash": item.get("content_hash", ""),
+    }
+
+
+class JsonlRecordWriter:
+    """JSON Lines格式：每行一条记录"""
+
+    def __init__(self, path, append=False):
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self._file.write("\n")
+
+    def close(self):
+        self._file.close()
+
+
+class JsonArrayRecordWriter:
+    """
+    JSON格式：整个文件是一个记录数组（标准JSON，任何JSON工具都能读取）
+
+    记录逐条写出，不在内存中累积；数组的结尾在close时写入。不支持追加。
+    """
+
+    def __init__(self, path, append=False):
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            raise ValueError("JSON格式不支持追加到已有文件，请使用 .jsonl 格式")
+        self._file = open(path, "w", encoding="utf-8")
+        self._file.write("[")
+        self._count = 0
+
+    def write(self, record):
+        self._file.write(",\n" if self._count else "\n")
+        self._file.write(json.dumps(record, ensure_ascii=False))
+        self._count += 1
+
+    def close(self):
+        self._file.write("\n]\n" if self._count else "]\n")
+        self._file.close()
+
+
+class CsvRecordWriter:
+    """完整字段CSV格式（utf-8-sig编码，Excel可直接打开）"""
+
+    def __init__(self, path, append=False):
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self._file = open(path, "a" if append else "w", newline="", encoding="utf-8-sig")
+        self._writer = csv.DictWriter(self._file, fieldnames=RECORD_FIELDS)
+        if write_header:
+            self._writer.writeheader()
+
+    def write(self, record):
+        self._writer.writerow(record)
+
+    def close(self):
+        self._file.close()
+
+
+class SqliteRecordWriter:
+    """
+    SQLite格式：批量插入，并在回单编号和对方户名上建立索引
+    """
+    _SCHEMA = """
+    CREATE TABLE IF NOT EXISTS receipts (
+        source_file   TEXT,
+        seq           INTEGER,
+        page_idx      INTEGER,
+        name          TEXT,
+        no            TEXT,
+        amt           TEXT,
+        date          TEXT,
+        payer_name    TEXT,
+        receiver_name TEXT,
+        status        TEXT,
+        bank          TEXT,
+        x0 REAL, y0 REAL, x1 REAL, y1 REAL,
+        content_hash  TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_receipts_no ON receipts (no);
+    CREATE INDEX IF NOT EXISTS idx_receipts_name ON receipts (name);
+    CREATE INDEX IF NOT EXISTS idx_receipts_payer ON receipts (payer_name);
+    CREATE INDEX IF NOT EXISTS idx_receipts_receiver ON receipts (receiver_name);
+    """
+    _INSERT = "INSERT INTO receipts ({}) VALUES ({})".format(
+        ", ".join(RECORD_FIELDS), ", ".join("?" * len(RECORD_FIELDS)))
+
+    def __init__(self, path, append=False, batch_size=500):
+        """
+        :param path: 数据库文件路径
+        :param append: False时清空已有的receipts表
+        :param batch_size: 每批插入的记录数
+        """
+        self._conn = sqlite3.connect(path)
+        self._conn.executescript(self._SCHEMA)
+        if not append:
+            self._conn.execute("DELETE FROM receipts")
+        self._batch = []
+        self._batch_size = batch_size
+
+    def write(self, record):
+        self._batch.append(tuple(record[field] for field in RECORD_FIELDS))
+        if len(self._batch) >= self._batch_size:
+            self.flush()
+
+    def flush(self):
+        """写入缓冲中的记录"""
+        if self._batch:
+            with self._conn:
+                self._conn.executemany(self._INSERT, self._batch)
+            self._batch = []
+
+    def close(self):
+        self.flush()
+        self._conn.commit()
+        self._conn.close()
+
+
+_WRITERS = {
+    "jsonl": JsonlRecordWriter,
+    "json": JsonArrayRecordWriter,
+    "csv": CsvRecordWriter,
+    "sqlite": SqliteRecordWriter,
+}
+
+
+def detect_format(path):
+    """
+    根据文件扩展名判断导出格式
+
+    :param path: 输出文件路径
+    :return: "jsonl" / "json" / "csv" / "sqlite"，无法识别时返回None
+    """
+    return FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def open_record_writer(path, fmt=None, append=False):
+    """
+    打开明细数据写入器
+
+    :param path: 输出文件路径
+    :param fmt: 导出格式，不指定时按扩展名判断
+    :param append: 是否追加到已有文件
+    :return: 写入器对象（write(record) / close()）
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in _WRITERS:
+        raise ValueError(f"不支持的导出格式: {os.path.splitext(path)[1] or path}（支持 .jsonl / .json / .csv / .sqlite）")
+    return _WRITERS[fmt](path, append=append)
+
+
+def write_records(items, path, source_file="", fmt=None, append=False):
+    """
+    将回单数据逐条写入明细文件
+
+    :param items: 回单数据字典的可迭代对象（可以是analyze_document生成器，边解析边写）
+    :param path: 输出文件路径
+    :param source_file: 源PDF文件路径
+    :param fmt: 导出格式，不指定时按扩展名判断
+    :param append: 是否追加到已有文件
+    :return: 写入的记录数
+    """
+    writer = open_record_writer(path, fmt, append)
+    count = 0
+    try:
+        for item in items:
+            writer.write(record_from_item(item, source_file))
+            count += 1
+    finally:
+        writer.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出银行电子回单明细数据（JSON Lines / JSON / CSV / SQLite）")
+    parser.add_argument("pdf_files", nargs="+", help="回单PDF文件")
+    parser.add_argument("-o", "--output", required=True, help="输出文件（.jsonl / .json / .csv / .sqlite）")
+    parser.add_argument("--format", choices=sorted(_WRITERS), default=None, help="导出格式，默认按扩展名判断")
+    parser.add_argument("--company", action="append", default=[],
+                        help="本方公司户名，用于判断客户名称（可重复指定多个）")
+    args = parser.parse_args()
+
+    # 本方户名只编译一次，所有文件共用
+    own_companies = CompanyMatcher(args.company)
+    writer = open_record_writer(args.output, args.format)
+    total = 0
+    try:
+        for pdf_file in args.pdf_files:
+            doc = open_document(pdf_file)
+            try:
+                # 每个文件只识别一次格式，混合了多家银行回单的文件夹可以一次处理
+                layout, msg = detect_receipt_layout(doc)
+                if layout is None:
+                    print(f"跳过 {pdf_file}: {msg}", file=sys.stderr)
+                    continue
+                count = 0
+                for item in analyze_document(doc, pdf_file, own_companies, layout=layout):
+                    writer.write(record_from_item(item, pdf_file))
+                    count += 1
+                total += count
+                print(f"{pdf_file}: {layout.title}，{count} 条")
+            finally:
+                doc.close()
+    finally:
+        writer.close()
+    print(f"共导出 {total} 条记录至 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+测试公用的夹具
+
+测试用的回单PDF在临时目录中现场生成（农行电子回单版式，每页3张，虚线分隔），
+不需要提交样例文件。
+"""
+import os
+import random
+import sys
+
+import fitz  # PyMuPDF
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PAYERS = ["北京甲公司", "上海乙有限公司", "本方集团有限公司"]
+RECEIVERS = ["丙商贸", "丁科技有限公司"]
+
+
+def make_statement(path, pages=2, per_page=3, seed=0, dashes="[3 3] 0"):
+    """
+    生成测试用的回单PDF
+
+    :param path: 输出文件路径
+    :param pages: 页数
+    :param per_page: 每页回单数
+    :param seed: 随机种子（不同的种子生成内容不同、其他方面相同的文件）
+    :param dashes: 分隔线的虚线样式，None表示实线
+    :return: 回单编号列表（按出现顺序）
+    """
+    rng = random.Random(seed)
+    doc = fitz.open()
+    numbers = []
+    for _ in range(pages):
+        page = doc.new_page(width=595, height=842)
+        height = 842 / per_page
+        for i in range(per_page):
+            y = i * height
+            no = str(rng.randint(10 ** 19, 10 ** 20 - 1))
+            numbers.append(no)
+            amount = f"{rng.randint(1, 99999):,}.{rng.randint(0, 99):02d}"
+            lines = [((200, y + 30), "中国农业银行 电子回单"), ((40, y + 55), "回单编号："), ((100, y + 55), no),
+                     ((40, y + 80), "付款方户名："), ((110, y + 80), rng.choice(PAYERS)),
+                     ((320, y + 80), "收款方户名："), ((390, y + 80), rng.choice(RECEIVERS)),
+                     ((40, y + 105), "账号：6228480000000000"), ((40, y + 130), "金额（小写）："),
+                     ((110, y + 130), amount), ((40, y + 155), "摘要：货款")]
+            for point, text in lines:
+                page.insert_text(point, text, fontname="china-s", fontsize=9)
+            if i > 0:
+                page.draw_line((10, y), (585, y), dashes=dashes, width=0.5)
+    doc.save(path)
+    doc.close()
+    return numbers
+
+
+@pytest.fixture
+def statement_pdf(tmp_path):
+    """2页6张回单的测试PDF路径"""
+    path = str(tmp_path / "回单.pdf")
+    make_statement(path)
+    return path
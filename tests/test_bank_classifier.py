@@ -0,0 +1,57 @@
+"""
+银行回单格式识别：按指纹关键词打分选择版式，得分相同时按优先级和版式名
+"""
+import fitz  # PyMuPDF
+
+from receipt_core import analyze_document, open_document
+from receipt_layout import BankClassifier, CompiledLayout, load_all_layouts
+
+
+def _layout(name, keywords, priority=100, required_any=(), min_matches=2):
+    return CompiledLayout({"name": name, "priority": priority, "fingerprints": {
+        "keywords": keywords, "required_any": list(required_any), "min_matches": min_matches}})
+
+
+def test_bundled_layouts_selected_by_fingerprint(statement_pdf):
+    classifier = BankClassifier(load_all_layouts().values())
+    doc = open_document(statement_pdf)
+    layout, message = classifier.classify(doc)
+    assert layout.name == "abc" and layout.title in message
+    assert {item['bank'] for item in analyze_document(doc, statement_pdf)} == {"abc"}
+    doc.close()
+    assert classifier.classify_text("中国工商银行 电子回单号码：123456789").name == "icbc"
+    assert classifier.classify_text("中国建设银行 客户专用回单 交易流水号").name == "ccb"
+    assert classifier.classify_text("中国银行 国内支付业务回单").name == "boc"
+    # 缺少必需关键词或命中数不足时不识别
+    assert classifier.classify_text("电子回单 交易流水号") is None
+    assert classifier.classify_text("中国农业银行 对账单") is None
+    assert classifier.classify_text("") is None
+
+
+def test_highest_score_wins():
+    classifier = BankClassifier([_layout("a", ["甲", "乙"]), _layout("b", ["甲", "乙", "丙"], priority=200)])
+    assert classifier.classify_text("甲乙").name == "a"
+    assert classifier.classify_text("甲乙丙").name == "b"
+
+
+def test_ties_broken_by_priority_then_name():
+    keywords = ["甲", "乙"]
+    classifier = BankClassifier([_layout("z", keywords, priority=5), _layout("a", keywords, priority=50)])
+    assert classifier.classify_text("甲乙").name == "z"
+    classifier = BankClassifier([_layout("z", keywords), _layout("a", keywords)])
+    assert classifier.classify_text("甲乙").name == "a"
+
+
+def test_longer_keyword_implies_contained_keyword():
+    # 正则只返回最长的匹配，"电子回单"命中时"回单"也算命中
+    classifier = BankClassifier([_layout("short", ["回单", "流水号"]), _layout("long", ["电子回单", "编号"])])
+    assert classifier.classify_text("电子回单 流水号").name == "short"
+
+
+def test_unrecognized_document():
+    doc = fitz.open()
+    for _ in range(5):
+        doc.new_page().insert_text((50, 50), "对账单")
+    layout, message = BankClassifier(load_all_layouts().values()).classify(doc)
+    assert layout is None and "前 3 页" in message
+    assert BankClassifier([]).classify_text("中国农业银行 电子回单") is None
@@ -0,0 +1,54 @@
+"""
+合并导出：每张回单一页，重复页不放入，无法放置的回单跳过而不中断整个文档
+"""
+import fitz  # PyMuPDF
+import pytest
+
+from receipt_core import analyze_document, build_combined_document, export_combined, open_document
+
+
+@pytest.fixture
+def analyzed(statement_pdf):
+    doc = open_document(statement_pdf)
+    items = list(analyze_document(doc, statement_pdf))
+    yield doc, items
+    doc.close()
+
+
+def test_one_page_per_receipt_sized_to_region(analyzed, tmp_path):
+    doc, items = analyzed
+    output = str(tmp_path / "合并.pdf")
+    assert export_combined(doc, items, output) == len(items)
+    with fitz.open(output) as combined:
+        assert len(combined) == len(items)
+        for page, item in zip(combined, items):
+            rect = fitz.Rect(item["rect"])
+            assert page.rect.width == pytest.approx(rect.width, abs=0.5)
+            assert page.rect.height == pytest.approx(rect.height, abs=0.5)
+            assert item["no"] in page.get_text()
+
+
+def test_duplicate_pages_left_out(analyzed):
+    doc, items = analyzed
+    items[1]["duplicate_of"] = items[0]["seq"]
+    out_doc, placed = build_combined_document(doc, items)
+    try:
+        assert placed == len(out_doc) == len(items) - 1
+    finally:
+        out_doc.close()
+
+
+def test_bad_item_is_skipped_without_aborting(analyzed):
+    doc, items = analyzed
+    items[1] = dict(items[1], page_idx=len(doc) + 3)
+    items[2] = dict(items[2], rect=[0, 5000, 100, 5100])  # 区域完全在页面以外
+    progress = []
+    out_doc, placed = build_combined_document(doc, items, progress_callback=lambda d, t: progress.append((d, t)))
+    try:
+        assert placed == len(out_doc) == len(items) - 2
+        texts = [page.get_text() for page in out_doc]
+        assert [item["no"] for item in items[:1] + items[3:]] == [
+            next(item["no"] for item in items if item["no"] in text) for text in texts]
+    finally:
+        out_doc.close()
+    assert progress == [(done, len(items)) for done in range(1, len(items) + 1)]
@@ -0,0 +1,89 @@
+"""
+回单缩略图总览：并行渲染缩略图、生成总览PDF/PNG
+"""
+import os
+
+import fitz  # PyMuPDF
+import pytest
+from conftest import make_statement
+
+import contact_sheet
+from contact_sheet import build_contact_sheet, iter_thumbnails, thumbnail_label, write_contact_sheet
+from receipt_core import STATUS_DUPLICATE_PAGE, analyze_document, open_document
+
+
+@pytest.fixture
+def analyzed(tmp_path):
+    path = str(tmp_path / "回单.pdf")
+    make_statement(path, pages=4)
+    doc = open_document(path)
+    items = list(analyze_document(doc, path))
+    yield doc, items, path
+    doc.close()
+
+
+def _ppm_size(data):
+    magic, size, _ = data.split(b"\n", 3)[:3]
+    assert magic == b"P6"
+    width, height = map(int, size.split())
+    return width, height
+
+
+def test_thumbnails_cover_every_receipt(analyzed, monkeypatch):
+    doc, items, path = analyzed
+    monkeypatch.setattr(contact_sheet, "THUMBNAIL_CHUNK_SIZE", 5)
+    results = dict(iter_thumbnails(path, items, workers=2))
+    assert sorted(results) == [item['seq'] for item in items]
+    for item in items:
+        expected = doc[item['page_idx']].get_pixmap(dpi=contact_sheet.THUMBNAIL_DPI, clip=fitz.Rect(item['rect']))
+        assert _ppm_size(results[item['seq']]) == (expected.width, expected.height)
+    # 源文件内容（bytes）与路径的结果相同
+    with open(path, "rb") as f:
+        assert dict(iter_thumbnails(f.read(), items[:3], workers=1)) == {seq: results[seq] for seq in (1, 2, 3)}
+
+
+def test_thumbnails_stop_early_and_empty(analyzed):
+    doc, items, path = analyzed
+    thumbnails = iter_thumbnails(path, items, workers=1)
+    first = next(thumbnails)
+    thumbnails.close()
+    assert first[0] in {item['seq'] for item in items}
+    assert list(iter_thumbnails(path, [])) == []
+
+
+def test_thumbnail_label():
+    assert thumbnail_label({"seq": 3, "no": "12345", "amt": "1.00"}) == "#3  12345  1.00"
+    assert thumbnail_label({"seq": 4, "no": "未知编号", "amt": "0.00"}) == "#4  -  0.00"
+
+
+def test_contact_sheet_pages_and_highlight(analyzed):
+    doc, items, path = analyzed
+    items[0]['status'] = "需核对"
+    sheet = build_contact_sheet(doc, items, columns=2)
+    try:
+        text = "".join(page.get_text() for page in sheet)
+        assert all(thumbnail_label(item) in text for item in items)
+        # 需核对的回单用红框标出
+        reds = [d for page in sheet for d in page.get_drawings() if d.get("color") == pytest.approx((0.85, 0, 0), abs=0.01)]
+        assert len(reds) == 1
+        a4 = fitz.paper_rect("a4")
+        assert all(page.rect == a4 for page in sheet) and len(sheet) >= 2
+    finally:
+        sheet.close()
+    assert len(build_contact_sheet(doc, [])) == 0
+
+
+def test_write_contact_sheet(analyzed, tmp_path, monkeypatch):
+    doc, items, path = analyzed
+    items[-1].update(status=STATUS_DUPLICATE_PAGE, duplicate_of=1)
+    pdf_path = str(tmp_path / "总览.pdf")
+    assert write_contact_sheet(doc, items, pdf_path) == [pdf_path]
+    with fitz.open(pdf_path) as sheet:
+        text = "".join(page.get_text() for page in sheet)
+    assert thumbnail_label(items[0]) in text and thumbnail_label(items[-1]) not in text
+    # PNG长图过长时分为多张
+    monkeypatch.setattr(contact_sheet, "SHEET_MAX_HEIGHT", 200)
+    png_path = str(tmp_path / "总览.png")
+    paths = write_contact_sheet(doc, items, png_path, columns=4)
+    assert paths[0] == png_path and paths[1] == str(tmp_path / "总览_2.png")
+    assert all(os.path.getsize(p) > 0 for p in paths)
@@ -0,0 +1,68 @@
+"""
+重复页：整页重复的页面复用前一页的解析结果，标记为重复页且不再导出
+"""
+import fitz  # PyMuPDF
+import pytest
+
+import receipt_core
+from receipt_core import STATUS_DUPLICATE_PAGE, analyze_document, open_document, page_fingerprint, plan_export
+
+
+@pytest.fixture
+def doubled_pdf(statement_pdf, tmp_path):
+    """同一对账单下载两次后合并的PDF（第3、4页与第1、2页完全相同）"""
+    path = str(tmp_path / "合并.pdf")
+    doc = fitz.open(statement_pdf)
+    doc.insert_pdf(fitz.open(statement_pdf))
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def _count_extractions(monkeypatch):
+    calls = []
+    original = receipt_core.extract_receipt_fields
+
+    def counting(page, page_idx, *args, **kwargs):
+        calls.append(page_idx)
+        return original(page, page_idx, *args, **kwargs)
+
+    monkeypatch.setattr(receipt_core, "extract_receipt_fields", counting)
+    return calls
+
+
+def test_duplicate_pages_reuse_results(doubled_pdf, monkeypatch, tmp_path):
+    calls = _count_extractions(monkeypatch)
+    doc = open_document(doubled_pdf)
+    items = []
+    for item in analyze_document(doc, doubled_pdf):
+        items.append(item)
+        # 调用方修改产出的字典不影响重复页复用的结果
+        item['name'] = "已改名"
+    assert len(items) == 12 and sorted(set(calls)) == [0, 1]
+    originals, duplicates = items[:6], items[6:]
+    assert all('duplicate_of' not in item for item in originals)
+    for original, duplicate in zip(originals, duplicates):
+        assert duplicate['duplicate_of'] == original['seq']
+        assert duplicate['status'] == STATUS_DUPLICATE_PAGE
+        assert duplicate['page_idx'] == original['page_idx'] + 2
+        assert (duplicate['no'], duplicate['amt'], duplicate['rect']) == (original['no'], original['amt'], original['rect'])
+    assert [item['seq'] for item in items] == list(range(1, 13))
+    assert plan_export(doc, doubled_pdf, items, str(tmp_path / "out")).count("duplicate") == 6
+    doc.close()
+
+
+def test_duplicate_detection_can_be_disabled(doubled_pdf, monkeypatch):
+    calls = _count_extractions(monkeypatch)
+    doc = open_document(doubled_pdf)
+    items = list(analyze_document(doc, doubled_pdf, skip_duplicate_pages=False))
+    doc.close()
+    assert len(items) == 12 and sorted(set(calls)) == [0, 1, 2, 3]
+    assert all('duplicate_of' not in item and item['status'] != STATUS_DUPLICATE_PAGE for item in items)
+
+
+def test_fingerprint_distinguishes_pages(doubled_pdf):
+    doc = open_document(doubled_pdf)
+    prints = [page_fingerprint(page) for page in doc]
+    doc.close()
+    assert prints[0] == prints[2] and prints[1] == prints[3] and prints[0] != prints[1]
@@ -0,0 +1,70 @@
+"""
+跨运行的已导出回单索引：再次导出同一对账单（或重叠的对账单）时跳过、链接或照常导出
+"""
+import glob
+import os
+
+import pytest
+
+from receipt_core import (DUPLICATE_EXPORT, DUPLICATE_LINK, DUPLICATE_SKIP, analyze_document, export_receipts,
+                          open_document)
+from receipt_index import ExportIndex
+
+
+@pytest.fixture
+def index(tmp_path):
+    export_index = ExportIndex(str(tmp_path / "index.sqlite3"))
+    yield export_index
+    export_index.close()
+
+
+def _export(path, output_dir, index, duplicate_mode=DUPLICATE_SKIP):
+    doc = open_document(path)
+    try:
+        items = list(analyze_document(doc, path))
+        success, skipped, _ = export_receipts(doc, path, items, output_dir, export_index=index,
+                                              duplicate_mode=duplicate_mode)
+    finally:
+        doc.close()
+    return success, skipped, sorted(glob.glob(os.path.join(output_dir, "*.pdf")))
+
+
+def test_second_run_skips_exported_receipts(statement_pdf, tmp_path, index):
+    assert _export(statement_pdf, str(tmp_path / "一月"), index)[:2] == (6, 0)
+    success, skipped, files = _export(statement_pdf, str(tmp_path / "二月"), index)
+    assert (success, skipped, files) == (0, 6, [])
+
+
+def test_deleted_export_is_written_again(statement_pdf, tmp_path, index):
+    _, _, first_files = _export(statement_pdf, str(tmp_path / "一月"), index)
+    os.remove(first_files[0])
+    success, skipped, files = _export(statement_pdf, str(tmp_path / "二月"), index)
+    assert (success, skipped, len(files)) == (1, 5, 1)
+    assert os.path.basename(files[0]) == os.path.basename(first_files[0])
+
+
+def test_link_mode_hard_links_previous_files(statement_pdf, tmp_path, index):
+    _, _, first_files = _export(statement_pdf, str(tmp_path / "一月"), index)
+    success, skipped, files = _export(statement_pdf, str(tmp_path / "二月"), index, DUPLICATE_LINK)
+    # 链接的回单不重新生成，计入跳过数量
+    assert (success, skipped, len(files)) == (0, 6, 6)
+    for original, linked in zip(first_files, files):
+        assert os.path.samefile(original, linked)
+
+
+def test_export_mode_writes_again(statement_pdf, tmp_path, index):
+    _export(statement_pdf, str(tmp_path / "一月"), index)
+    success, skipped, files = _export(statement_pdf, str(tmp_path / "二月"), index, DUPLICATE_EXPORT)
+    assert (success, skipped, len(files)) == (6, 0, 6)
+
+
+def test_lookup_matches_content_hash_and_respects_edited_numbers(index, tmp_path):
+    item = {"no": "12345678901234567890", "content_hash": "abc"}
+    index.add(item, str(tmp_path / "a.pdf"), "回单.pdf")
+    assert index.lookup("12345678901234567890", "abc")["output_path"] == os.path.abspath(str(tmp_path / "a.pdf"))
+    # 编号未识别时按内容指纹匹配；编号被改成另一个有效编号时视为不同回单
+    assert index.lookup("未知编号", "abc") is not None
+    assert index.lookup("09876543210987654321", "abc") is None
+    assert index.lookup("12345678901234567890", "other") is None
+    index.add({"no": "12345678901234567890"}, str(tmp_path / "b.pdf"), "回单.pdf")  # 没有指纹的回单不记录
+    assert len(index.lookup_many([item, {"no": "x", "content_hash": ""}])) == 1
@@ -0,0 +1,125 @@
+import csv
+import glob
+import json
+import os
+import shutil
+
+import pytest
+
+from conftest import make_statement
+from receipt_core import (JOURNAL_PREFIX, PARTIAL_SUFFIX, ExportJournal, analyze_document, detect_receipt_layout,
+                          export_journal_path, export_receipts, load_export_journal, open_document,
+                          write_bytes_atomic)
+from receipt_manifest import VERIFY_OK, manifest_filename, verify_manifest
+
+
+class Interrupted(Exception):
+    pass
+
+
+def _analyze(path):
+    doc = open_document(path)
+    layout, _ = detect_receipt_layout(doc)
+    return doc, list(analyze_document(doc, path, layout=layout))
+
+
+def _interrupted_export(path, output_dir, stop_after):
+    doc, items = _analyze(path)
+
+    def progress(done, total):
+        if done == stop_after:
+            raise Interrupted()
+
+    try:
+        with pytest.raises(Interrupted):
+            export_receipts(doc, path, items, output_dir, progress_callback=progress)
+    finally:
+        doc.close()
+
+
+def _pdf_files(directory):
+    return sorted(os.path.basename(p) for p in glob.glob(os.path.join(directory, "*.pdf")))
+
+
+def test_resume_finishes_only_missing_receipts(statement_pdf, tmp_path):
+    output_dir = str(tmp_path / "out")
+    _interrupted_export(statement_pdf, output_dir, stop_after=3)
+    assert len(_pdf_files(output_dir)) == 3
+
+    journal = load_export_journal(statement_pdf, output_dir)
+    assert journal is not None and journal.done_count() == 3
+
+    doc, items = _analyze(statement_pdf)
+    try:
+        success, skipped, log_filename = export_receipts(doc, statement_pdf, items, output_dir, journal=journal)
+    finally:
+        doc.close()
+    assert (success, skipped) == (3, 0)
+    files = _pdf_files(output_dir)
+    assert len(files) == 6 and not any("_1.pdf" in name for name in files)
+    assert not glob.glob(os.path.join(output_dir, JOURNAL_PREFIX + "*"))
+    assert load_export_journal(statement_pdf, output_dir) is None
+
+    with open(os.path.join(output_dir, log_filename), encoding="utf-8-sig") as f:
+        assert len(list(csv.reader(f))) == 1 + 6
+    results = verify_manifest(os.path.join(output_dir, manifest_filename(log_filename)))
+    assert len(results) == 6 and all(status == VERIFY_OK for _, status, _ in results)
+
+
+def test_same_name_and_size_different_statement_does_not_resume(tmp_path):
+    first_dir, second_dir = tmp_path / "一月", tmp_path / "二月"
+    first_dir.mkdir()
+    second_dir.mkdir()
+    first, second = str(first_dir / "回单.pdf"), str(second_dir / "回单.pdf")
+    make_statement(first, seed=1)
+    make_statement(second, seed=2)
+    output_dir = str(tmp_path / "out")
+    _interrupted_export(first, output_dir, stop_after=2)
+
+    assert export_journal_path(first, output_dir) != export_journal_path(second, output_dir)
+    assert load_export_journal(first, output_dir) is not None
+    assert load_export_journal(second, output_dir) is None
+
+    # 源文件被替换为另一份同样大小的内容时也不能沿用旧进度（改动第二行的二进制注释，PDF仍然有效）
+    with open(first, "rb") as f:
+        data = bytearray(f.read())
+    data[11] ^= 0x01
+    with open(second, "wb") as f:
+        f.write(bytes(data))
+    assert os.path.getsize(first) == os.path.getsize(second)
+    assert export_journal_path(first, output_dir) != export_journal_path(second, output_dir)
+    shutil.copyfile(second, first)
+    assert load_export_journal(first, output_dir) is None
+
+
+def test_journal_with_other_source_hash_is_ignored(statement_pdf, tmp_path):
+    output_dir = str(tmp_path)
+    path = export_journal_path(statement_pdf, output_dir)
+    journal = ExportJournal.create(path, {"log_filename": "log_x.csv", "source_sha256": "0" * 64})
+    journal.close()
+    assert load_export_journal(statement_pdf, output_dir) is None
+
+
+def test_load_skips_half_written_last_line(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    item = {"page_idx": 0, "rect": (0, 0, 10, 10), "content_hash": "abc"}
+    journal = ExportJournal.create(path, {"log_filename": "log_x.csv"})
+    journal.record("begin", item, "a.pdf", "write")
+    journal.record("done", item, "a.pdf", "write")
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"event": "begin", "key": "1:0.0,0.0:def"})[:20])
+
+    loaded = ExportJournal.load(path)
+    assert loaded.header["log_filename"] == "log_x.csv"
+    assert loaded.done_count() == 1
+    assert loaded.state(item)["filename"] == "a.pdf"
+
+
+def test_write_bytes_atomic_replaces_without_leaving_part_file(tmp_path):
+    path = str(tmp_path / "a.pdf")
+    write_bytes_atomic(b"old", path)
+    write_bytes_atomic(b"new", path)
+    with open(path, "rb") as f:
+        assert f.read() == b"new"
+    assert not os.path.exists(path + PARTIAL_SUFFIX)
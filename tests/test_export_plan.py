@@ -0,0 +1,75 @@
+"""
+导出计划：重名在内存中追加序号，预演不写入任何文件，计划与实际导出一致
+"""
+import os
+
+import pytest
+
+from receipt_core import (SHARD_BY_COUNTERPARTY, analyze_document, build_receipt_filename, export_receipts,
+                          open_document, plan_export)
+
+
+@pytest.fixture
+def analyzed(statement_pdf):
+    doc = open_document(statement_pdf)
+    items = list(analyze_document(doc, statement_pdf))
+    # 前三张回单的文件名相同（客户名称、编号和金额都一样）
+    for item in items[1:3]:
+        item.update(name=items[0]["name"], no=items[0]["no"], amt=items[0]["amt"])
+    yield doc, items, statement_pdf
+    doc.close()
+
+
+def _tree(directory):
+    return sorted(os.path.relpath(os.path.join(folder, name), directory)
+                  for folder, _, names in os.walk(directory) for name in names)
+
+
+def test_collisions_resolved_in_memory(analyzed, tmp_path):
+    doc, items, path = analyzed
+    output_dir = str(tmp_path / "out")
+    os.makedirs(output_dir)
+    base = build_receipt_filename(items[0])
+    # 输出目录中已有同名文件（大小写不同也算重名）
+    open(os.path.join(output_dir, base), "wb").close()
+    plan = plan_export(doc, path, items, output_dir)
+    names = [entry["filename"] for entry in plan.entries[:3]]
+    assert names == [build_receipt_filename(items[0], n) for n in (1, 2, 3)]
+    assert plan.renamed_count == 3
+    assert plan.count("write") == 6 and plan.new_dirs == []
+    assert len({entry["path"] for entry in plan.entries}) == 6
+
+
+def test_dry_run_writes_nothing(analyzed, tmp_path):
+    doc, items, path = analyzed
+    output_dir = str(tmp_path / "out")
+    plan = plan_export(doc, path, items, output_dir, shard_by=SHARD_BY_COUNTERPARTY)
+    assert not os.path.exists(output_dir)
+    # 尚不存在的子文件夹只记录在计划中
+    assert {os.path.dirname(entry["path"]) for entry in plan.entries} == set(plan.new_dirs)
+    assert all(os.path.dirname(folder) == output_dir for folder in plan.new_dirs)
+    assert plan.estimated_bytes > 0
+    text = plan.format_text()
+    assert "生成: 6 个" in text and "重名自动加序号: 2 个" in text
+
+
+def test_export_follows_plan(analyzed, tmp_path):
+    doc, items, path = analyzed
+    output_dir = str(tmp_path / "out")
+    plan = plan_export(doc, path, items, output_dir, shard_by=SHARD_BY_COUNTERPARTY)
+    success, skipped, log_filename = export_receipts(doc, path, items, output_dir, plan=plan)
+    assert (success, skipped) == (6, 0)
+    pdfs = [name for name in _tree(output_dir) if name.endswith(".pdf")]
+    assert sorted(pdfs) == sorted(entry["filename"] for entry in plan.entries)
+    assert all(os.path.dirname(name) for name in pdfs)
+
+
+def test_insufficient_space_is_reported(analyzed, tmp_path):
+    doc, items, path = analyzed
+    output_dir = str(tmp_path / "out")
+    plan = plan_export(doc, path, items, output_dir)
+    plan.free_bytes = 1
+    assert not plan.has_enough_space() and "空间不足" in plan.format_text()
+    with pytest.raises(Exception, match="磁盘空间不足"):
+        export_receipts(doc, path, items, output_dir, plan=plan)
+    assert not os.path.exists(output_dir)
@@ -0,0 +1,162 @@
+"""
+export_sink的S3导出目标：用moto模拟的对象存储检查逐张上传、重名处理、分块上传和失败报告
+"""
+import csv
+import io
+
+import pytest
+
+pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+import boto3  # noqa: E402
+
+import export_sink  # noqa: E402
+from export_sink import S3Sink, export_combined_to_sink, export_to_sink  # noqa: E402
+from receipt_core import analyze_document, build_receipt_filename, detect_receipt_layout, open_document  # noqa: E402
+from receipt_manifest import MANIFEST_HEADER, bytes_sha256, manifest_filename  # noqa: E402
+
+BUCKET = "receipt-exports"
+PREFIX = "回单/2024-03"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """moto模拟的S3客户端（已创建测试存储桶）"""
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        client = boto3.client("s3", region_name="us-east-1")
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+
+@pytest.fixture
+def analyzed(statement_pdf):
+    doc = open_document(statement_pdf)
+    layout, _ = detect_receipt_layout(doc)
+    items = list(analyze_document(doc, statement_pdf, layout=layout))
+    yield doc, items
+    doc.close()
+
+
+def _objects(client, prefix=PREFIX + "/"):
+    response = client.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
+    return {obj["Key"][len(prefix):]: obj for obj in response.get("Contents", [])}
+
+
+def _read(client, key):
+    return client.get_object(Bucket=BUCKET, Key=f"{PREFIX}/{key}")["Body"].read()
+
+
+def _csv_rows(data):
+    return list(csv.reader(io.StringIO(data.decode("utf-8-sig"))))
+
+
+def test_export_uploads_receipts_log_and_manifest(s3, analyzed, statement_pdf):
+    doc, items = analyzed
+    sink = S3Sink(BUCKET, PREFIX, client=s3, max_workers=2)
+    try:
+        success, skipped, failed, log_filename = export_to_sink(doc, statement_pdf, items, sink)
+    finally:
+        sink.close()
+    assert (success, skipped, failed) == (6, 0, 0)
+
+    objects = _objects(s3)
+    pdf_keys = sorted(key for key in objects if key.endswith(".pdf"))
+    assert pdf_keys == sorted(build_receipt_filename(item) for item in items)
+    assert log_filename in objects and manifest_filename(log_filename) in objects
+
+    log_rows = _csv_rows(_read(s3, log_filename))
+    assert [row[3] for row in log_rows[1:]] == ["成功"] * 6
+    manifest_rows = _csv_rows(_read(s3, manifest_filename(log_filename)))
+    assert manifest_rows[0] == MANIFEST_HEADER
+    for row in manifest_rows[1:]:
+        data = _read(s3, row[0])
+        assert row[1] == bytes_sha256(data) and int(row[2]) == len(data)
+        assert data.startswith(b"%PDF")
+    head = s3.head_object(Bucket=BUCKET, Key=f"{PREFIX}/{pdf_keys[0]}")
+    assert head["ContentType"] == "application/pdf"
+
+
+def test_existing_keys_get_numbered_suffix(s3, analyzed, statement_pdf):
+    doc, items = analyzed
+    first = build_receipt_filename(items[0])
+    # 已有对象名只是大小写不同，也视为重名
+    s3.put_object(Bucket=BUCKET, Key=f"{PREFIX}/{first.upper()}", Body=b"old")
+    sink = S3Sink(BUCKET, PREFIX, client=s3, max_workers=2)
+    try:
+        assert first.upper() in sink.existing_keys()
+        export_to_sink(doc, statement_pdf, items[:1], sink)
+    finally:
+        sink.close()
+    objects = _objects(s3)
+    assert build_receipt_filename(items[0], 1) in objects
+    assert _read(s3, first.upper()) == b"old"
+
+
+def test_combined_export_above_threshold_uses_multipart(s3, analyzed):
+    doc, items = analyzed
+    sink = S3Sink(BUCKET, PREFIX, client=s3, max_workers=2, multipart_threshold=1024)
+    try:
+        placed = export_combined_to_sink(doc, items, sink, "合并.pdf")
+    finally:
+        sink.close()
+    assert placed == len(items)
+    head = s3.head_object(Bucket=BUCKET, Key=f"{PREFIX}/合并.pdf")
+    # 分块上传的对象ETag形如 "<md5>-<分块数>"
+    assert "-" in head["ETag"]
+    assert head["ContentLength"] > 1024
+
+
+def test_flush_reports_failed_upload(s3, monkeypatch):
+    monkeypatch.setattr(export_sink, "UPLOAD_ATTEMPTS", 2)
+    monkeypatch.setattr(export_sink, "UPLOAD_RETRY_DELAY", 0)
+    sink = S3Sink(BUCKET, PREFIX, client=s3, max_workers=2)
+    upload = s3.upload_fileobj
+    attempts = []
+
+    def flaky_upload(fileobj, bucket, key, **kwargs):
+        if key.endswith("bad.pdf"):
+            attempts.append(key)
+            raise IOError("连接被重置")
+        return upload(fileobj, bucket, key, **kwargs)
+
+    monkeypatch.setattr(s3, "upload_fileobj", flaky_upload)
+    try:
+        sink.write("good.pdf", b"%PDF good")
+        sink.write("bad.pdf", b"%PDF bad")
+        failures = sink.flush()
+        assert list(failures) == ["bad.pdf"] and "连接被重置" in failures["bad.pdf"]
+        assert len(attempts) == 2
+        # 失败只报告一次
+        assert sink.flush() == {}
+    finally:
+        sink.close()
+    assert set(_objects(s3)) == {"good.pdf"}
+
+
+def test_failed_receipt_is_logged_and_left_out_of_manifest(s3, analyzed, statement_pdf, monkeypatch):
+    doc, items = analyzed
+    monkeypatch.setattr(export_sink, "UPLOAD_ATTEMPTS", 1)
+    bad_key = build_receipt_filename(items[2])
+    sink = S3Sink(BUCKET, PREFIX, client=s3, max_workers=2)
+    upload = s3.upload_fileobj
+
+    def flaky_upload(fileobj, bucket, key, **kwargs):
+        if key.endswith(bad_key):
+            raise IOError("上传超时")
+        return upload(fileobj, bucket, key, **kwargs)
+
+    monkeypatch.setattr(s3, "upload_fileobj", flaky_upload)
+    try:
+        success, skipped, failed, log_filename = export_to_sink(doc, statement_pdf, items, sink)
+    finally:
+        sink.close()
+    assert (success, skipped, failed) == (5, 0, 1)
+    log_rows = _csv_rows(_read(s3, log_filename))
+    assert [row[3] for row in log_rows[1:]].count("成功") == 5
+    assert any(row[1] == bad_key and "上传超时" in row[3] for row in log_rows[1:])
+    manifest_names = [row[0] for row in _csv_rows(_read(s3, manifest_filename(log_filename)))[1:]]
+    assert bad_key not in manifest_names and len(manifest_names) == 5
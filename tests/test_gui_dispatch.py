@@ -0,0 +1,96 @@
+import gui_dispatch
+from gui_dispatch import MAX_BATCH, WAKE_EVENT, GuiDispatcher, ProgressThrottle
+
+
+class FakeTk:
+    def __init__(self, threaded):
+        self.threaded = threaded
+
+    def eval(self, script):
+        return "1" if self.threaded else "0"
+
+
+class FakeRoot:
+    """记录事件和定时任务的根窗口替身（测试环境没有显示器）"""
+
+    def __init__(self, threaded=True):
+        self.tk = FakeTk(threaded)
+        self.bindings = {}
+        self.events = []
+        self.after_calls = []
+
+    def bind(self, sequence, func):
+        self.bindings[sequence] = func
+
+    def event_generate(self, sequence, when=None):
+        self.events.append(sequence)
+
+    def after(self, delay, func):
+        self.after_calls.append((delay, func))
+
+
+def test_post_wakes_main_thread_once_until_drained():
+    root = FakeRoot()
+    dispatcher = GuiDispatcher(root)
+    calls = []
+    dispatcher.post(calls.append, 1)
+    dispatcher.post(calls.append, 2)
+    assert root.events == [WAKE_EVENT]
+
+    root.bindings[WAKE_EVENT](None)
+    assert calls == [1, 2]
+    dispatcher.post(calls.append, 3)
+    assert root.events == [WAKE_EVENT, WAKE_EVENT]
+
+
+def test_failing_callback_does_not_strand_later_updates(capsys):
+    root = FakeRoot()
+    dispatcher = GuiDispatcher(root)
+    calls = []
+
+    def broken():
+        raise ValueError("界面更新出错")
+
+    dispatcher.post(broken)
+    dispatcher.post(calls.append, "reset_ui")
+    dispatcher.drain()
+    assert calls == ["reset_ui"]
+    assert "界面更新出错" in capsys.readouterr().err
+
+
+def test_large_backlog_is_drained_in_batches():
+    root = FakeRoot()
+    dispatcher = GuiDispatcher(root)
+    calls = []
+    for i in range(MAX_BATCH + 5):
+        dispatcher.post(calls.append, i)
+    dispatcher.drain()
+    assert len(calls) == MAX_BATCH
+    assert len(root.after_calls) == 1
+    root.after_calls[0][1]()
+    assert calls == list(range(MAX_BATCH + 5))
+
+
+def test_falls_back_to_polling_without_thread_support():
+    root = FakeRoot(threaded=False)
+    dispatcher = GuiDispatcher(root)
+    calls = []
+    dispatcher.post(calls.append, 1)
+    assert root.events == []
+    delay, poll = root.after_calls[-1]
+    assert delay == gui_dispatch.POLL_INTERVAL
+    poll()
+    assert calls == [1]
+
+
+def test_progress_throttle_publishes_first_and_last(monkeypatch):
+    published = []
+    now = [100.0]
+    monkeypatch.setattr(gui_dispatch.time, "monotonic", lambda: now[0])
+    throttle = ProgressThrottle(lambda done, total: published.append(done), interval=1.0)
+    for done in range(1, 11):
+        throttle(done, 10)
+    assert published == [1, 10]
+    now[0] += 1.5
+    throttle(3, 20)
+    assert published == [1, 10, 3]
@@ -0,0 +1,60 @@
+"""
+多个本方户名：付款方为任一本方主体时取收款方作为客户名称
+"""
+import pytest
+from conftest import PAYERS, RECEIVERS, make_statement
+
+from receipt_core import (CompanyMatcher, analyze_document, load_own_companies, open_document,
+                          remap_counterparties, save_own_companies)
+
+OWN = ["本方集团有限公司", "上海乙有限公司"]
+
+
+@pytest.fixture
+def items(tmp_path):
+    path = str(tmp_path / "回单.pdf")
+    make_statement(path, pages=4, seed=3)
+    doc = open_document(path)
+    result = list(analyze_document(doc, path, local_company_name=OWN))
+    doc.close()
+    return result
+
+
+def test_matcher_prefers_longest_name():
+    matcher = CompanyMatcher(["上海乙", " 上海乙有限公司 ", "", "上海乙"])
+    assert matcher.names == ["上海乙有限公司", "上海乙"]
+    assert matcher.matches("上海乙有限公司北京分公司")
+    assert not matcher.matches("北京甲公司") and not matcher.matches("")
+    assert not CompanyMatcher() and CompanyMatcher.coerce(None).names == []
+    assert CompanyMatcher.coerce("上海乙").names == ["上海乙"]
+    assert CompanyMatcher.coerce(matcher) is matcher
+
+
+def test_counterparty_for_each_own_company(items):
+    payers = {item['payer_name'] for item in items}
+    assert set(OWN) <= payers and "北京甲公司" in payers
+    for item in items:
+        if item['payer_name'] in OWN:
+            assert item['name'] == item['receiver_name'] and item['name'] in RECEIVERS
+        else:
+            assert item['name'] == item['payer_name']
+
+
+def test_remap_after_list_change(items):
+    items[0]['status'] = "已修正"
+    items[0]['name'] = "手工客户"
+    changed = remap_counterparties(items, ["本方集团有限公司"])
+    assert changed and all(item['payer_name'] == "上海乙有限公司" for item in changed)
+    assert items[0]['name'] == "手工客户"
+    for item in items[1:]:
+        expected = item['receiver_name'] if item['payer_name'] == "本方集团有限公司" else item['payer_name']
+        assert item['name'] == expected
+    # 列表不变时不应有任何回单被修改
+    assert remap_counterparties(items, CompanyMatcher(["本方集团有限公司"])) == []
+
+
+def test_saved_list_round_trip(tmp_path):
+    path = str(tmp_path / "own.txt")
+    assert load_own_companies(path) == []
+    save_own_companies(OWN + ["  ", PAYERS[0]], path)
+    assert load_own_companies(path) == OWN + [PAYERS[0]]
@@ -0,0 +1,58 @@
+"""
+PageRasterCache：从整页图切出的回单预览与单独渲染的尺寸一致、像素对齐
+"""
+import fitz  # PyMuPDF
+import pytest
+
+from preview_renderer import PageRasterCache, render_clip_ppm
+from receipt_core import analyze_document, open_document
+
+
+def _split_ppm(data):
+    magic, size, maxval, pixels = data.split(b"\n", 3)
+    width, height = (int(v) for v in size.split())
+    assert magic == b"P6" and maxval == b"255"
+    assert len(pixels) == width * height * 3
+    return (width, height), pixels
+
+
+@pytest.fixture
+def document(statement_pdf):
+    doc = open_document(statement_pdf)
+    items = list(analyze_document(doc, statement_pdf))
+    yield doc, items
+    doc.close()
+
+
+@pytest.mark.parametrize("dpi", [72, 100, 150, 96.3, 12.5])
+def test_clip_matches_separate_render(document, dpi):
+    doc, items = document
+    cache = PageRasterCache(doc)
+    for item in items:
+        clip = fitz.Rect(item["rect"])
+        size, pixels = _split_ppm(cache.clip_ppm(item["page_idx"], clip, dpi))
+        expected_size, expected = _split_ppm(render_clip_ppm(doc[item["page_idx"]], clip, dpi))
+        assert size == expected_size
+        # 抗锯齿边缘允许轻微差异，像素错位会让差异遍布整张图
+        diffs = [abs(a - b) for a, b in zip(pixels, expected)]
+        assert sum(1 for d in diffs if d) <= len(diffs) * 0.05
+        assert max(diffs) <= 64
+
+
+def test_page_rendered_once_per_dpi_and_evicted_lru(document):
+    doc, _ = document
+    cache = PageRasterCache(doc, max_pages=1)
+    first = cache.page_pixmap(0, 72)
+    assert cache.page_pixmap(0, 72) is first
+    cache.page_pixmap(1, 72)
+    assert cache.page_pixmap(0, 72) is not first
+
+
+def test_oversized_page_falls_back_to_clip_render(document):
+    doc, items = document
+    cache = PageRasterCache(doc, max_pixels=1000)
+    item = items[0]
+    clip = fitz.Rect(item["rect"])
+    assert cache.page_pixmap(item["page_idx"], 100) is None
+    assert cache.clip_ppm(item["page_idx"], clip, 100) == render_clip_ppm(doc[item["page_idx"]], clip, 100)
+
@@ -0,0 +1,82 @@
+"""
+打印排版：每页2张/3张的页数、分组换页，以及无法放置的回单不影响整份文档
+"""
+import fitz  # PyMuPDF
+import pytest
+
+from conftest import make_statement
+from print_sheet import build_print_document, group_print_items, write_print_pdf
+from receipt_core import SHARD_BY_COUNTERPARTY, SHARD_BY_DATE, SHARD_NONE, analyze_document, open_document
+
+
+@pytest.fixture
+def analyzed(tmp_path):
+    path = str(tmp_path / "七张.pdf")
+    make_statement(path, pages=3, per_page=3)
+    doc = open_document(path)
+    items = list(analyze_document(doc, path))[:7]
+    yield doc, items
+    doc.close()
+
+
+def _labels(page):
+    return [line for line in page.get_text().splitlines() if line.startswith("#")]
+
+
+@pytest.mark.parametrize("per_page, pages", [(2, 4), (3, 3)])
+def test_page_count_per_layout(analyzed, tmp_path, per_page, pages):
+    doc, items = analyzed
+    output = str(tmp_path / "打印.pdf")
+    assert write_print_pdf(doc, items, output, per_page=per_page) == (7, pages)
+    with fitz.open(output) as printed:
+        assert len(printed) == pages
+        assert all(page.rect == fitz.paper_rect("a4") for page in printed)
+        seqs = [int(label.split()[0][1:]) for page in printed for label in _labels(page)]
+    assert seqs == [item["seq"] for item in items]
+
+
+def test_rejects_unsupported_per_page(analyzed):
+    doc, items = analyzed
+    with pytest.raises(ValueError):
+        build_print_document(doc, items, per_page=4)
+
+
+def test_groups_start_on_new_page(analyzed):
+    doc, items = analyzed
+    for item, name in zip(items, ["乙", "甲", "乙", "甲", "乙", "乙", "乙"]):
+        item["name"] = name
+    groups = group_print_items(items, SHARD_BY_COUNTERPARTY)
+    assert [(name, len(group)) for name, group in groups] == [("乙", 5), ("甲", 2)]
+    out_doc, placed = build_print_document(doc, items, per_page=3, group_by=SHARD_BY_COUNTERPARTY)
+    try:
+        # "乙"组5张占2页，"甲"组2张从新的一页开始
+        assert placed == 7 and len(out_doc) == 3
+        assert [len(_labels(page)) for page in out_doc] == [3, 2, 2]
+    finally:
+        out_doc.close()
+
+
+def test_date_grouping_and_duplicates(analyzed):
+    doc, items = analyzed
+    items[0]["date"] = "2024-03-02"
+    items[1]["duplicate_of"] = items[0]["seq"]
+    groups = group_print_items(items, SHARD_BY_DATE)
+    assert [name for name, _ in groups] == ["2024-03-02", "未知日期"]
+    assert sum(len(group) for _, group in groups) == 6
+    assert group_print_items([], SHARD_NONE) == []
+
+
+def test_bad_item_is_skipped_without_aborting(analyzed):
+    doc, items = analyzed
+    items[1] = dict(items[1], page_idx=len(doc) + 1)
+    progress = []
+    out_doc, placed = build_print_document(doc, items, per_page=3,
+                                           progress_callback=lambda d, t: progress.append((d, t)))
+    try:
+        assert placed == 6
+        # 跳过的回单位置留空，其余回单位置不变
+        assert len(out_doc) == 3
+        assert [len(_labels(page)) for page in out_doc] == [2, 3, 1]
+    finally:
+        out_doc.close()
+    assert progress[-1] == (7, 7) and len(progress) == 7
@@ -0,0 +1,121 @@
+"""
+raster_separators：在渲染图上识别短线段拼成或画在图片中的虚线分隔线，以及标签之间的空白带
+"""
+import fitz  # PyMuPDF
+import pytest
+
+import raster_separators
+from raster_separators import boundaries_between_labels, render_page_raster
+from conftest import make_statement
+from receipt_core import analyze_document, find_receipt_rects, open_document
+
+pytest.importorskip("numpy")
+
+
+def _segment_dashes(page, y, dash=3, gap=3):
+    """用许多独立的短实线段拼出一条横向虚线（没有虚线样式）"""
+    x = 10
+    while x < 585:
+        page.draw_line((x, y), (min(x + dash, 585), y), width=0.5)
+        x += dash + gap
+
+
+def test_segment_dashes_found_and_solid_border_ignored():
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((40, 100), "回单编号：12345678901234567890", fontname="china-s", fontsize=9)
+    _segment_dashes(page, 300)
+    page.draw_line((10, 500), (585, 500), width=0.5)  # 实线表格边框
+    positions = render_page_raster(page).rule_positions()
+    assert len(positions) == 1
+    assert abs(positions[0] - 300) <= 3
+
+
+def test_dashes_inside_background_image():
+    source = fitz.open()
+    drawn = source.new_page(width=595, height=842)
+    drawn.draw_line((10, 421), (585, 421), dashes="[3 3] 0", width=0.5)
+    image = drawn.get_pixmap(dpi=150, alpha=False).tobytes("png")
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_image(page.rect, stream=image)
+    assert page.get_drawings() == []
+    positions = render_page_raster(page).rule_positions()
+    assert len(positions) == 1
+    assert abs(positions[0] - 421) <= 3
+
+
+def test_boundaries_between_labels_use_gap_bands():
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    for top in (60, 340, 620):
+        for line in range(6):
+            page.insert_text((40, top + line * 14), "回单编号：12345 付款方户名：北京甲公司", fontname="china-s", fontsize=9)
+    raster = render_page_raster(page)
+    assert raster.rule_positions() == []
+    # 每段文字第一行"回单编号"的上边缘
+    label_tops = [rect.y0 for rect in page.search_for("回单编号")][::6]
+    boundaries = boundaries_between_labels(raster, label_tops)
+    assert len(boundaries) == 2
+    # 第一段文字结束于约y=130，第二段开始于约y=330
+    assert 130 < boundaries[0] < 330
+    assert 410 < boundaries[1] < 610
+    # 相邻两个标签之间没有空白带时返回None
+    assert boundaries_between_labels(raster, [label_tops[0], label_tops[0] + 14]) is None
+
+
+def test_statement_with_segment_dashes_splits_per_receipt(tmp_path):
+    path = str(tmp_path / "segments.pdf")
+    doc = fitz.open()
+    for _ in range(2):
+        page = doc.new_page(width=595, height=842)
+        height = 842 / 3
+        for i in range(3):
+            y = i * height
+            for point, text in [((200, y + 30), "中国农业银行 电子回单"), ((40, y + 55), "回单编号："),
+                                ((100, y + 55), "1234567890123456789%d" % i),
+                                ((40, y + 80), "付款方户名："), ((110, y + 80), "北京甲公司"),
+                                ((320, y + 80), "收款方户名："), ((390, y + 80), "丙商贸"),
+                                ((40, y + 130), "金额（小写）："), ((110, y + 130), "1,000.00")]:
+                page.insert_text(point, text, fontname="china-s", fontsize=9)
+            if i > 0:
+                _segment_dashes(page, y)
+    doc.save(path)
+    doc.close()
+
+    doc = open_document(path)
+    try:
+        items = list(analyze_document(doc, path))
+    finally:
+        doc.close()
+    assert len(items) == 6
+    assert [item["no"][-1] for item in items] == ["0", "1", "2"] * 2
+
+
+def test_without_numpy_returns_none(monkeypatch):
+    monkeypatch.setattr(raster_separators, "numpy", None)
+    doc = fitz.open()
+    page = doc.new_page()
+    assert render_page_raster(page) is None
+
+
+@pytest.mark.parametrize("dashes", ["[3 3] 0", None], ids=["dashed", "solid"])
+def test_vector_rules_split_without_raster(tmp_path, monkeypatch, dashes):
+    """矢量分隔线（虚线和实线，与原有行为一致）直接切分，不需要渲染"""
+    path = str(tmp_path / "statement.pdf")
+    numbers = make_statement(path, dashes=dashes)
+    monkeypatch.setattr(raster_separators, "PageRaster", None)  # 渲染识别不应被调用
+    doc = open_document(path)
+    try:
+        height = 842 / 3
+        expected = [fitz.Rect(0, 2, 595, height - 2), fitz.Rect(0, height + 2, 595, 2 * height - 2),
+                    fitz.Rect(0, 2 * height + 2, 595, 840)]
+        for page in doc:
+            rects = find_receipt_rects(page)
+            assert len(rects) == 3
+            for rect, want in zip(rects, expected):
+                assert abs(rect.y0 - want.y0) < 0.5 and abs(rect.y1 - want.y1) < 0.5
+        items = list(analyze_document(doc, path))
+    finally:
+        doc.close()
+    assert [item["no"] for item in items] == numbers
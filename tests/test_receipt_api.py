@@ -0,0 +1,29 @@
+"""
+receipt_api的来源处理：路径、bytes和文件对象得到相同的回单；磁盘文件的文件对象不被整个读入内存
+"""
+import io
+
+from receipt_api import iter_receipts
+
+
+def _records(source):
+    return [(record.seq, record.no, record.amt) for record in iter_receipts(source)]
+
+
+def test_path_bytes_and_stream_sources_agree(statement_pdf):
+    expected = _records(statement_pdf)
+    assert len(expected) == 6
+    with open(statement_pdf, "rb") as f:
+        data = f.read()
+    assert _records(data) == expected
+    assert _records(io.BytesIO(data)) == expected
+
+
+def test_disk_file_object_is_opened_by_path(statement_pdf):
+    expected = _records(statement_pdf)
+    with open(statement_pdf, "rb") as f:
+        def refuse_read(*args):
+            raise AssertionError("磁盘文件不应被整个读入内存")
+        wrapper = io.BufferedReader(f.raw)
+        wrapper.read = refuse_read
+        assert _records(wrapper) == expected
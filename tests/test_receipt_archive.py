@@ -0,0 +1,66 @@
+"""
+ArchiveIndex.search：全文检索与LIKE回退的结果一致，各筛选条件组合正确
+"""
+import pytest
+
+from receipt_archive import ArchiveIndex
+
+ROWS = [
+    ({"name": "上海乙有限公司", "no": "12345000000000000001", "amt": "1,200.00", "date": "2024-03-05",
+      "payer_name": "本方集团有限公司", "receiver_name": "上海乙有限公司"}, "摘要：三月货款 账号6228480001"),
+    ({"name": "上海乙有限公司", "no": "12345000000000000002", "amt": "80.50", "date": "2024-04-01",
+      "payer_name": "本方集团有限公司", "receiver_name": "上海乙有限公司"}, "摘要：运费"),
+    ({"name": "北京甲公司", "no": "99999000000000000003", "amt": "5,000.00", "date": "2024-03-20",
+      "payer_name": "北京甲公司", "receiver_name": "本方集团有限公司"}, "摘要：服务费_100%预付"),
+]
+
+
+@pytest.fixture(params=[True, False], ids=["fts", "like"])
+def archive(request, tmp_path):
+    index = ArchiveIndex(str(tmp_path / "archive.sqlite3"))
+    for seq, (item, body) in enumerate(ROWS, 1):
+        index.add(dict(item, page_idx=0, rect=(0, 0, 595, 280)), str(tmp_path / f"{seq}.pdf"), "回单.pdf", body)
+    if not request.param:
+        # 模拟不支持FTS5的SQLite：检索全部走LIKE
+        index.full_text = False
+    elif not index.full_text:
+        pytest.skip("当前SQLite不支持FTS5 trigram分词")
+    yield index
+    index.close()
+
+
+def _numbers(results):
+    return [row["receipt_no"][-1] for row in results]
+
+
+@pytest.mark.parametrize("conditions, expected", [
+    ({}, ["2", "3", "1"]),
+    ({"text": "三月货款"}, ["1"]),
+    ({"text": "上海乙 运费"}, ["2"]),
+    ({"text": "本方集团"}, ["2", "3", "1"]),
+    ({"text": "6228480001"}, ["1"]),
+    ({"text": "乙"}, ["2", "1"]),
+    ({"text": "100%"}, ["3"]),
+    ({"text": "_1"}, ["3"]),
+    ({"name": "甲"}, ["3"]),
+    ({"no_prefix": "12345"}, ["2", "1"]),
+    ({"date_prefix": "2024-03"}, ["3", "1"]),
+    ({"amt_min": 100, "amt_max": 1200}, ["1"]),
+    ({"text": "摘要", "date_prefix": "2024-03", "amt_min": 2000}, ["3"]),
+    ({"text": "不存在的内容"}, []),
+])
+def test_search(archive, conditions, expected):
+    assert _numbers(archive.search(**conditions)) == expected
+
+
+def test_limit(archive):
+    assert len(archive.search(limit=2)) == 2
+
+
+def test_readding_same_output_replaces_record(archive, tmp_path):
+    item = dict(ROWS[0][0], no="12345000000000000009", page_idx=0, rect=(0, 0, 1, 1))
+    archive.add(item, str(tmp_path / "1.pdf"), "回单.pdf", "摘要：更正后的正文")
+    assert archive.count() == 3
+    assert archive.contains(str(tmp_path / "1.pdf"))
+    assert archive.search(text="三月货款") == []
+    assert _numbers(archive.search(text="更正后的正文")) == ["9"]
@@ -0,0 +1,104 @@
+"""
+ReceiptFilterIndex：索引查询的结果与逐行比较的结果一致
+"""
+import random
+
+import pytest
+
+from receipt_filter import ReceiptFilterIndex, parse_amount
+
+NAMES = ["北京甲公司", "上海乙有限公司", "甲乙丙商贸", "Alpha Trading", "丁科技"]
+STATUSES = ["正常", "需核对", "已修正", "重复页"]
+
+
+def _items(count=200, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for seq in range(1, count + 1):
+        items.append({
+            "seq": seq,
+            "name": rng.choice(NAMES),
+            "no": "".join(rng.choice("0123") for _ in range(6)),
+            "amt": rng.choice(["{:,.2f}".format(rng.uniform(0, 5000)), "未知"]),
+            "status": rng.choice(STATUSES),
+            "page_idx": rng.randrange(10),
+        })
+    return items
+
+
+def _brute(items, name="", no_prefix="", amt_min=None, amt_max=None, status="", page_idx=None):
+    result = []
+    for item in items:
+        amt = parse_amount(item["amt"])
+        if name and name.lower() not in item["name"].lower():
+            continue
+        if no_prefix and not item["no"].startswith(no_prefix):
+            continue
+        if amt_min is not None or amt_max is not None:
+            if amt is None or (amt_min is not None and amt < amt_min) or (amt_max is not None and amt > amt_max):
+                continue
+        if status and item["status"] != status:
+            continue
+        if page_idx is not None and item["page_idx"] != page_idx:
+            continue
+        result.append(item)
+    return result
+
+
+@pytest.mark.parametrize("conditions", [
+    {},
+    {"name": "甲"},
+    {"name": "alpha"},
+    {"no_prefix": "01"},
+    {"no_prefix": "0123"},
+    {"amt_min": 1000.0},
+    {"amt_max": 250.5},
+    {"amt_min": 100.0, "amt_max": 3000.0, "status": "正常"},
+    {"name": "公司", "page_idx": 3},
+    {"status": "不存在的状态"},
+])
+def test_query_matches_linear_scan(conditions):
+    items = _items()
+    index = ReceiptFilterIndex(items)
+    assert index.query(**conditions) == _brute(items, **conditions)
+
+
+def test_incremental_name_typing_uses_previous_result():
+    items = _items()
+    index = ReceiptFilterIndex(items)
+    # 逐字输入，之后删掉一个字再输入另一个字，结果都应与逐行比较一致
+    for text in ["上", "上海", "上海乙", "上海", "北", "北京甲"]:
+        assert index.query(name=text) == _brute(items, name=text)
+
+
+def test_number_prefix_boundaries():
+    items = [{"seq": i, "no": no, "amt": "1", "status": "正常", "page_idx": 0}
+             for i, no in enumerate(["10", "1", "19", "2", "199", "0"], 1)]
+    index = ReceiptFilterIndex(items)
+    assert sorted(item["no"] for item in index.query(no_prefix="1")) == ["1", "10", "19", "199"]
+    assert [item["no"] for item in index.query(no_prefix="19")] == ["19", "199"]
+    assert index.query(no_prefix="3") == []
+
+
+@pytest.mark.parametrize("sort_by", ["seq", "name", "receipt_no", "amount", "status"])
+@pytest.mark.parametrize("reverse", [False, True])
+def test_sorting_small_and_large_results(sort_by, reverse):
+    items = _items()
+    index = ReceiptFilterIndex(items)
+    for conditions in ({}, {"no_prefix": "012"}):
+        result = index.query(sort_by=sort_by, reverse=reverse, **conditions)
+        key = {
+            "seq": lambda item: item["seq"],
+            "name": lambda item: item["name"],
+            "receipt_no": lambda item: item["no"],
+            "amount": lambda item: (parse_amount(item["amt"]) is None, parse_amount(item["amt"]) or 0.0),
+            "status": lambda item: item["status"],
+        }[sort_by]
+        keys = [key(item) for item in result]
+        assert keys == sorted(keys, reverse=reverse)
+        assert sorted(item["seq"] for item in result) == [item["seq"] for item in _brute(items, **conditions)]
+
+
+def test_unknown_sort_column_falls_back_to_seq():
+    items = _items(20)
+    assert [item["seq"] for item in ReceiptFilterIndex(items).query(sort_by="nope")] == list(range(1, 21))
@@ -0,0 +1,93 @@
+"""
+版式描述文件：字段提取、用户版式覆盖和无效版式的报错
+"""
+import json
+
+import fitz  # PyMuPDF
+import pytest
+
+from receipt_core import analyze_document, open_document
+from receipt_layout import BUNDLED_LAYOUT_DIR, LayoutError, WordIndex, load_all_layouts, load_layout
+
+
+def _receipt_index(page, i, per_page=3):
+    """第i张回单区域内文字的WordIndex"""
+    height = page.rect.height / per_page
+    clip = fitz.Rect(0, i * height, page.rect.width, (i + 1) * height)
+    return WordIndex(page.get_text("words", clip=clip))
+
+
+def _abc_spec():
+    with open(f"{BUNDLED_LAYOUT_DIR}/abc.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_fields_match_analysis(statement_pdf):
+    layout = load_layout("abc")
+    doc = open_document(statement_pdf)
+    items = list(analyze_document(doc, statement_pdf))
+    for n, item in enumerate(items):
+        index = _receipt_index(doc[n // 3], n % 3)
+        assert layout.extract("no", index) == item['no']
+        # 测试文件中金额与锚点连成一个单词，区域内找不到时由整页扫描的正则取值
+        text = " ".join(w[4] for w in index.words)
+        amount = layout.extract("amt", index) or layout.label_patterns["amt"].search(text).group(1)
+        assert layout.clean_label_value("amt", amount) == item['amt']
+        assert layout.extract("payer_name", index) == item['payer_name']
+        assert layout.extract("receiver_name", index) == item['receiver_name']
+        value, anchor_rect, word_rects = layout.locate("no", index)
+        assert value == item['no'] and word_rects and anchor_rect.x1 <= word_rects[0].x0
+    doc.close()
+
+
+def test_anchor_text_field_reads_right_of_anchor():
+    layout = load_layout("abc")
+    words = [(40, 121, 103, 131, "金额（小写）：", 0, 0, 0), (110, 121, 160, 131, "1,234.50", 0, 0, 1),
+             (110, 146, 160, 156, "9,999.99", 0, 0, 2)]
+    value, anchor_rect, word_rects = layout.locate("amt", WordIndex(words))
+    assert value == "1234.50" and anchor_rect == fitz.Rect(words[0][:4]) and len(word_rects) == 1
+    # 锚点右侧有文字但不是金额格式时不再尝试其他锚点
+    assert layout.extract("amt", WordIndex([words[0], (110, 121, 160, 131, "见附件", 0, 0, 1)])) is None
+
+
+def test_missing_field_falls_back_to_default():
+    layout = load_layout("abc")
+    index = WordIndex([(40, 50, 100, 60, "摘要：货款", 0, 0, 0)])
+    assert layout.extract("no", index) is None and layout.defaults["no"] == "未知编号"
+    assert layout.extract("不存在的字段", index) is None and layout.locate("不存在的字段", index) is None
+    match = layout.label_patterns["amt"].search("金额（小写）：1,234.50")
+    assert layout.clean_label_value("amt", match.group(1)) == "1234.50"
+
+
+def test_user_layout_overrides_bundled(tmp_path):
+    spec = _abc_spec()
+    spec["title"] = "自定义农行版式"
+    spec["fields"]["no"]["default"] = "无编号"
+    (tmp_path / "abc.json").write_text(json.dumps(spec, ensure_ascii=False), encoding="utf-8")
+    layout = load_layout("abc", [str(tmp_path)])
+    assert layout.title == "自定义农行版式" and layout.defaults["no"] == "无编号"
+    layouts = load_all_layouts([str(tmp_path)])
+    assert layouts["abc"].title == "自定义农行版式" and "icbc" in layouts
+    assert load_layout("abc").title != "自定义农行版式"
+
+
+@pytest.mark.parametrize("change, message", [
+    (lambda spec: spec["fields"]["no"].update(type="unknown"), "类型无效"),
+    (lambda spec: spec["fields"]["amt"].update(anchors=[]), "缺少锚点"),
+    (lambda spec: spec["fields"]["no"].update(label_pattern="(\\d"), "正则表达式无效"),
+    (lambda spec: spec["fields"]["payer_name"].update(stop_match="prefix"), "停止词匹配方式"),
+])
+def test_invalid_layout_raises(tmp_path, change, message):
+    spec = _abc_spec()
+    change(spec)
+    (tmp_path / "bad.json").write_text(json.dumps(spec, ensure_ascii=False), encoding="utf-8")
+    with pytest.raises(LayoutError, match=message):
+        load_layout("bad", [str(tmp_path)])
+
+
+def test_unreadable_layout_file(tmp_path):
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+    with pytest.raises(LayoutError, match="格式错误"):
+        load_layout("broken", [str(tmp_path)])
+    with pytest.raises(LayoutError, match="找不到版式文件"):
+        load_layout("missing", [str(tmp_path)])
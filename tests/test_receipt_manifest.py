@@ -0,0 +1,94 @@
+"""
+receipt_manifest：对照清单找出被修改、被删除的导出文件
+"""
+import csv
+import os
+import sys
+
+import pytest
+
+import receipt_manifest
+from receipt_core import analyze_document, detect_receipt_layout, export_receipts, open_document
+from receipt_manifest import (MANIFEST_HEADER, VERIFY_MISSING, VERIFY_MODIFIED, VERIFY_OK, file_sha256,
+                              manifest_filename, read_manifest, source_sha256, verify_manifest)
+
+
+@pytest.fixture
+def exported(statement_pdf, tmp_path):
+    """导出测试PDF，返回(输出目录, 清单路径)"""
+    output_dir = str(tmp_path / "out")
+    doc = open_document(statement_pdf)
+    try:
+        layout, _ = detect_receipt_layout(doc)
+        items = list(analyze_document(doc, statement_pdf, layout=layout))
+        _, _, log_filename = export_receipts(doc, statement_pdf, items, output_dir)
+    finally:
+        doc.close()
+    return output_dir, os.path.join(output_dir, manifest_filename(log_filename))
+
+
+def test_fresh_export_verifies(exported, statement_pdf):
+    _, manifest_path = exported
+    results = verify_manifest(manifest_path, workers=2)
+    assert len(results) == 6
+    assert all(status == VERIFY_OK for _, status, _ in results)
+    assert {record["源文件SHA256"] for record, _, _ in results} == {file_sha256(statement_pdf)}
+
+
+def test_detects_modified_and_missing_files(exported):
+    output_dir, manifest_path = exported
+    records = read_manifest(manifest_path)
+    with open(os.path.join(output_dir, records[0]["文件名"]), "ab") as f:
+        f.write(b"%tampered\n")
+    os.remove(os.path.join(output_dir, records[1]["文件名"]))
+
+    progress = []
+    results = verify_manifest(manifest_path, progress_callback=lambda done, total: progress.append((done, total)))
+    statuses = [status for _, status, _ in results]
+    assert statuses == [VERIFY_MODIFIED, VERIFY_MISSING] + [VERIFY_OK] * 4
+    assert results[0][2] == file_sha256(os.path.join(output_dir, records[0]["文件名"]))
+    assert progress[-1] == (6, 6)
+
+
+def test_read_manifest_keeps_last_row_per_file(tmp_path):
+    path = tmp_path / "manifest_x.csv"
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(MANIFEST_HEADER)
+        writer.writerow(["a.pdf", "old", "1", "s.pdf", "", "0", "", "1"])
+        writer.writerow(["b.pdf", "bbb", "2", "s.pdf", "", "0", "", "2"])
+        writer.writerow(["a.pdf", "new", "3", "s.pdf", "", "0", "", "1"])
+    records = read_manifest(str(path))
+    assert [(r["文件名"], r["SHA256"]) for r in records] == [("a.pdf", "new"), ("b.pdf", "bbb")]
+
+
+def test_read_manifest_rejects_other_csv(tmp_path):
+    path = tmp_path / "log.csv"
+    path.write_text("序号,客户名称\n1,甲\n", encoding="utf-8-sig")
+    with pytest.raises(ValueError):
+        read_manifest(str(path))
+
+
+def test_source_sha256_accepts_bytes_and_missing_paths(statement_pdf, tmp_path):
+    with open(statement_pdf, "rb") as f:
+        data = f.read()
+    assert source_sha256(data) == file_sha256(statement_pdf)
+    assert source_sha256(str(tmp_path / "missing.pdf")) == ""
+
+
+def test_command_line_exit_codes(exported, statement_pdf, tmp_path, monkeypatch, capsys):
+    output_dir, manifest_path = exported
+
+    def run(*args):
+        monkeypatch.setattr(sys, "argv", ["receipt_manifest.py"] + list(args))
+        with pytest.raises(SystemExit) as exit_info:
+            receipt_manifest.main()
+        return exit_info.value.code
+
+    assert run(output_dir, "--source", statement_pdf) == 0
+    other = tmp_path / "other.pdf"
+    other.write_bytes(b"%PDF-1.4 other")
+    assert run(manifest_path, "--source", str(other)) == 1
+    assert "源文件不一致" in capsys.readouterr().out
+    os.remove(os.path.join(output_dir, read_manifest(manifest_path)[0]["文件名"]))
+    assert run(manifest_path) == 1
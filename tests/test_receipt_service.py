@@ -0,0 +1,97 @@
+"""
+receipt_service的监听地址检查（没有身份验证的服务默认只允许监听本机地址）和请求体长度校验
+"""
+import http.client
+import json
+import socket
+import threading
+
+import pytest
+
+from receipt_service import MAX_UPLOAD_SIZE, is_loopback_host, make_server
+
+
+@pytest.mark.parametrize("host", ["127.0.0.1", "127.0.0.2", "localhost", "LOCALHOST", "::1", "[::1]"])
+def test_loopback_hosts(host):
+    assert is_loopback_host(host)
+
+
+@pytest.mark.parametrize("host", ["0.0.0.0", "::", "192.168.1.10", "", "office-pc"])
+def test_remote_hosts(host):
+    assert not is_loopback_host(host)
+
+
+def test_make_server_refuses_remote_host_without_opt_in():
+    with pytest.raises(ValueError):
+        make_server(service=None, host="0.0.0.0", port=0)
+
+
+def test_make_server_binds_loopback():
+    server = make_server(service=None, host="127.0.0.1", port=0)
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+        assert server.server_address[1] > 0
+    finally:
+        server.server_close()
+
+
+class _FakeService:
+    workers = 1
+    max_jobs = 1
+    active_jobs = 0
+
+    def __init__(self):
+        self.calls = []
+
+    def run(self, pdf_bytes, local_company_name, want_zip=False, export_mode="cropbox", trim=False):
+        self.calls.append(pdf_bytes)
+        return [], b""
+
+
+@pytest.fixture
+def server():
+    service = _FakeService()
+    server = make_server(service, host="127.0.0.1", port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server, service
+    server.shutdown()
+    server.server_close()
+
+
+def _post_raw(server, length_header, body=b""):
+    """发送原始请求（可以带不合法的Content-Length），返回(状态码, JSON内容)"""
+    host, port = server.server_address
+    head = "POST /split HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+    if length_header is not None:
+        head += f"Content-Length: {length_header}\r\n"
+    with socket.create_connection((host, port), timeout=10) as sock:
+        sock.sendall(head.encode("ascii") + b"\r\n" + body)
+        sock.shutdown(socket.SHUT_WR)
+        response = http.client.HTTPResponse(sock)
+        response.begin()
+        return response.status, json.loads(response.read().decode("utf-8"))
+
+
+@pytest.mark.parametrize("length_header, body, status", [
+    (None, b"", 411),
+    ("abc", b"", 400),
+    ("-5", b"", 400),
+    ("1e3", b"", 400),
+    ("0", b"", 400),
+    (str(MAX_UPLOAD_SIZE + 1), b"", 413),
+    ("100", b"%PDF-short", 400),
+])
+def test_invalid_content_length_gets_error_response(server, length_header, body, status):
+    server, service = server
+    code, payload = _post_raw(server, length_header, body)
+    assert code == status
+    assert payload["error"]
+    assert service.calls == []
+
+
+def test_valid_body_reaches_service(server):
+    server, service = server
+    code, payload = _post_raw(server, "8", b"%PDF-1.4")
+    assert code == 200 and payload == {"count": 0, "records": []}
+    assert service.calls == [b"%PDF-1.4"]
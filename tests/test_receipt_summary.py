@@ -0,0 +1,92 @@
+"""
+CounterpartySummary：增量更新的结果与从头汇总一致，金额按Decimal精确累加
+"""
+import csv
+import random
+from decimal import Decimal
+
+from receipt_summary import (DIRECTION_PAY, DIRECTION_RECEIVE, CounterpartySummary, receipt_direction,
+                             write_summary_csv)
+
+
+def _item(seq, name, amt, payer="北京甲公司", receiver="丙商贸", **extra):
+    item = {"seq": seq, "name": name, "amt": amt, "payer_name": payer, "receiver_name": receiver}
+    item.update(extra)
+    return item
+
+
+def _rebuilt(items):
+    summary = CounterpartySummary()
+    for item in items:
+        summary.update(item)
+    return summary
+
+
+def test_direction_follows_counterparty_name():
+    assert receipt_direction(_item(1, "丙商贸", "1")) == DIRECTION_PAY
+    assert receipt_direction(_item(1, "北京甲公司", "1")) == DIRECTION_RECEIVE
+
+
+def test_decimal_totals_are_exact():
+    summary = _rebuilt([_item(seq, "北京甲公司", "0.10") for seq in range(1, 11)])
+    assert summary.rows() == [("北京甲公司", DIRECTION_RECEIVE, 10, Decimal("1.00"))]
+
+
+def test_update_moves_amount_between_groups():
+    items = [_item(1, "北京甲公司", "1,000.10"), _item(2, "北京甲公司", "2.05"), _item(3, "丙商贸", "3.00")]
+    summary = _rebuilt(items)
+    items[1]["name"] = "丙商贸"
+    items[1]["amt"] = "20.50"
+    summary.update(items[1])
+    assert summary.rows() == [
+        ("丙商贸", DIRECTION_PAY, 2, Decimal("23.50")),
+        ("北京甲公司", DIRECTION_RECEIVE, 1, Decimal("1000.10")),
+    ]
+    assert summary.rows() == _rebuilt(items).rows()
+
+
+def test_remove_drops_empty_groups_and_unparsed_marks():
+    summary = _rebuilt([_item(1, "北京甲公司", "未知"), _item(2, "丙商贸", "5")])
+    assert summary.unparsed == {1}
+    assert len(summary) == 2
+    summary.remove(1)
+    summary.remove(99)  # 未计入的序号忽略
+    assert summary.unparsed == set()
+    assert summary.rows() == [("丙商贸", DIRECTION_PAY, 1, Decimal("5"))]
+
+
+def test_duplicate_pages_are_not_counted():
+    summary = _rebuilt([_item(1, "丙商贸", "5"), _item(2, "丙商贸", "5", duplicate_of=1)])
+    assert summary.rows() == [("丙商贸", DIRECTION_PAY, 1, Decimal("5"))]
+    assert len(summary) == 1
+
+
+def test_random_edits_match_full_rebuild():
+    rng = random.Random(0)
+    names = ["北京甲公司", "丙商贸", "丁科技"]
+    items = [_item(seq, rng.choice(names), f"{rng.randrange(100000) / 100:.2f}") for seq in range(1, 51)]
+    summary = _rebuilt(items)
+    for _ in range(200):
+        item = rng.choice(items)
+        item["name"] = rng.choice(names)
+        item["amt"] = rng.choice([f"{rng.randrange(100000) / 100:,.2f}", "未知"])
+        summary.update(item)
+    expected = _rebuilt(items)
+    assert summary.rows() == expected.rows()
+    assert summary.direction_totals() == expected.direction_totals()
+    assert summary.unparsed == expected.unparsed
+
+
+def test_write_summary_csv(tmp_path):
+    summary = _rebuilt([_item(1, "丙商贸", "1.5"), _item(2, "北京甲公司", "2"), _item(3, "丙商贸", "0.25")])
+    path = tmp_path / "summary.csv"
+    assert write_summary_csv(summary, str(path)) == 2
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        ["客户名称", "方向", "笔数", "金额合计"],
+        ["丙商贸", DIRECTION_PAY, "2", "1.75"],
+        ["北京甲公司", DIRECTION_RECEIVE, "1", "2.00"],
+        ["合计", DIRECTION_PAY, "2", "1.75"],
+        ["合计", DIRECTION_RECEIVE, "1", "2.00"],
+    ]
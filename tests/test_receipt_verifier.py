@@ -0,0 +1,127 @@
+import threading
+
+from receipt_core import analyze_document, detect_receipt_layout, open_document
+from receipt_verifier import ReceiptVerifier
+
+
+def _items(path):
+    doc = open_document(path)
+    try:
+        layout, _ = detect_receipt_layout(doc)
+        return list(analyze_document(doc, path, layout=layout)), layout
+    finally:
+        doc.close()
+
+
+def test_pending_count_reaches_zero_after_all_results(statement_pdf):
+    items, layout = _items(statement_pdf)
+    results = []
+    finished = threading.Event()
+
+    def on_result(seq, problems, plumber_no):
+        results.append((seq, problems, plumber_no))
+        if len(results) == len(items):
+            finished.set()
+
+    verifier = ReceiptVerifier(statement_pdf, on_result, layout)
+    try:
+        verifier.submit(items)
+        assert verifier.pending_count() > 0
+        assert finished.wait(30)
+        for _ in range(100):
+            if verifier.pending_count() == 0:
+                break
+            finished.wait(0.01)
+        assert verifier.pending_count() == 0
+    finally:
+        verifier.close()
+    assert [seq for seq, _, _ in results] == [item["seq"] for item in items]
+    assert all(problems == [] for _, problems, _ in results)
+    assert [no for _, _, no in results] == [item["no"] for item in items]
+
+
+def test_duplicate_and_scanned_items_are_not_counted(statement_pdf):
+    items, layout = _items(statement_pdf)
+    items[0]["duplicate_of"] = 99
+    items[1]["status"] = "扫描件"
+    verifier = ReceiptVerifier(statement_pdf, lambda *args: None, layout)
+    verifier.close()
+    verifier.submit(items[:2])
+    assert verifier.pending_count() == 0
+
+
+class _FakeTree:
+    def __init__(self):
+        self.rows = {}
+
+    def exists(self, item_id):
+        return item_id in self.rows
+
+    def item(self, item_id, option=None, values=None):
+        if values is not None:
+            self.rows[item_id] = values
+        return {"values": self.rows[item_id]} if option is None else self.rows[item_id]
+
+
+class _FakeApp:
+    """只包含_on_receipt_verified用到的属性，不需要Tk"""
+
+    def __init__(self, items):
+        self.verifier = object()
+        self.tree = _FakeTree()
+        self.items_by_seq = {}
+        self.invalidated = 0
+        for item in items:
+            item["item_id"] = f"I{item['seq']}"
+            self.tree.rows[item["item_id"]] = (item["seq"], item["name"], item["no"], item["amt"], item["status"])
+            self.items_by_seq[item["seq"]] = item
+
+    def _invalidate_filter(self):
+        self.invalidated += 1
+
+    def verified(self, seq, problems, plumber_no=None):
+        from main import ReceiptSplitterApp
+        ReceiptSplitterApp._on_receipt_verified(self, self.verifier, seq, problems, plumber_no)
+
+
+def _row(seq, no="12345678901234567890", status="正常"):
+    return {"seq": seq, "name": "丙商贸", "no": no, "amt": "1.00", "status": status}
+
+
+def test_filled_receipt_number_restores_normal_status():
+    item = _row(1, no="未知编号", status="需核对")
+    app = _FakeApp([item])
+    app.verified(1, ["回单编号格式不正确"], "12345678901234567890")
+    assert item["no"] == "12345678901234567890"
+    assert item["status"] == "正常" and "verify_notes" not in item
+    assert app.tree.rows["I1"][2:] == ("12345678901234567890", "1.00", "正常")
+    assert app.invalidated == 1
+
+
+def test_remaining_problems_keep_review_status():
+    item = _row(1, no="未知编号", status="需核对")
+    app = _FakeApp([item])
+    app.verified(1, ["回单编号格式不正确", "收款方户名为空"], "12345678901234567890")
+    assert item["status"] == "需核对" and item["verify_notes"] == ["收款方户名为空"]
+
+
+def test_only_normal_rows_are_downgraded_and_unchanged_rows_skip_refresh():
+    items = [_row(1), _row(2, status="已更新"), _row(3, status="已修正"), _row(4)]
+    app = _FakeApp(items)
+    app.verified(1, ["金额格式不正确或未找到金额"])
+    app.verified(2, ["金额格式不正确或未找到金额"])
+    app.verified(3, ["金额格式不正确或未找到金额"])
+    app.verified(4, [], "12345678901234567890")
+    app.verified(99, ["不存在的序号"])
+    assert [item["status"] for item in items] == ["需核对", "已更新", "已修正", "正常"]
+    assert items[1]["verify_notes"] == ["金额格式不正确或未找到金额"]
+    assert "verify_notes" not in items[2]
+    assert app.invalidated == 1
+
+
+def test_results_from_a_replaced_verifier_are_ignored():
+    item = _row(1)
+    app = _FakeApp([item])
+    from main import ReceiptSplitterApp
+    ReceiptSplitterApp._on_receipt_verified(app, object(), 1, ["金额格式不正确或未找到金额"], None)
+    assert item["status"] == "正常" and app.invalidated == 0
@@ -0,0 +1,82 @@
+import csv
+import json
+import sqlite3
+
+import pytest
+
+from receipt_core import analyze_document, detect_receipt_layout, open_document
+from record_export import RECORD_FIELDS, detect_format, open_record_writer, write_records
+
+
+@pytest.fixture
+def items(statement_pdf):
+    doc = open_document(statement_pdf)
+    try:
+        layout, _ = detect_receipt_layout(doc)
+        return list(analyze_document(doc, statement_pdf, layout=layout))
+    finally:
+        doc.close()
+
+
+def test_json_extension_writes_a_valid_json_array(items, tmp_path):
+    path = str(tmp_path / "明细.json")
+    assert write_records(iter(items), path, "回单.pdf") == len(items)
+    with open(path, encoding="utf-8") as f:
+        records = json.load(f)
+    assert [r["no"] for r in records] == [item["no"] for item in items]
+    assert set(records[0]) == set(RECORD_FIELDS)
+    assert records[0]["source_file"] == "回单.pdf"
+
+
+def test_empty_json_export_is_an_empty_array(tmp_path):
+    path = str(tmp_path / "明细.json")
+    write_records([], path)
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f) == []
+
+
+def test_json_array_refuses_append(items, tmp_path):
+    path = str(tmp_path / "明细.json")
+    write_records(items, path)
+    with pytest.raises(ValueError):
+        open_record_writer(path, append=True)
+
+
+def test_jsonl_has_one_record_per_line(items, tmp_path):
+    path = str(tmp_path / "明细.jsonl")
+    write_records(items, path)
+    write_records(items[:2], path, append=True)
+    with open(path, encoding="utf-8") as f:
+        lines = [json.loads(line) for line in f]
+    assert len(lines) == len(items) + 2
+
+
+def test_csv_append_writes_header_once(items, tmp_path):
+    path = str(tmp_path / "明细.csv")
+    write_records(items, path)
+    write_records(items, path, append=True)
+    with open(path, encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == RECORD_FIELDS
+    assert len(rows) == 1 + 2 * len(items)
+
+
+def test_sqlite_replaces_unless_appending(items, tmp_path):
+    path = str(tmp_path / "明细.sqlite3")
+    write_records(items, path)
+    write_records(items, path)
+    write_records(items[:1], path, append=True)
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM receipts").fetchone()[0] == len(items) + 1
+    finally:
+        conn.close()
+
+
+def test_detect_format():
+    assert detect_format("a.JSON") == "json"
+    assert detect_format("a.jsonl") == "jsonl"
+    assert detect_format("a.db") == "sqlite"
+    assert detect_format("a.txt") is None
+    with pytest.raises(ValueError):
+        open_record_writer("a.txt")
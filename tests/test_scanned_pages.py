@@ -0,0 +1,69 @@
+"""
+扫描页：没有文字层的页面不运行文字提取流程，按图片位置或图片中的分隔线切分
+"""
+import fitz  # PyMuPDF
+import pytest
+
+import receipt_core
+from receipt_core import PAGE_IMAGE, PAGE_TEXT, STATUS_SCANNED, analyze_document, classify_page, open_document
+
+
+def _scan_of(page, dpi=72):
+    """页面渲染后的PNG图片（模拟扫描件）"""
+    return page.get_pixmap(dpi=dpi).tobytes("png")
+
+
+@pytest.fixture
+def mixed_pdf(statement_pdf, tmp_path):
+    """第1页为文字页，第2页为第2页的整页扫描件，第3页每张回单单独一张图片"""
+    source = fitz.open(statement_pdf)
+    doc = fitz.open()
+    doc.insert_pdf(source, to_page=0)
+    page = doc.new_page(width=595, height=842)
+    page.insert_image(page.rect, stream=_scan_of(source[1]))
+    page = doc.new_page(width=595, height=842)
+    height = 842 / 3
+    for i in range(3):
+        rect = fitz.Rect(0, i * height, 595, (i + 1) * height)
+        page.insert_image(rect, stream=source[0].get_pixmap(clip=rect).tobytes("png"))
+    path = str(tmp_path / "扫描.pdf")
+    doc.save(path)
+    doc.close()
+    source.close()
+    return path
+
+
+def test_scanned_pages_bypass_text_pipeline(mixed_pdf, monkeypatch):
+    calls = []
+    original = receipt_core.extract_receipt_fields
+    monkeypatch.setattr(receipt_core, "extract_receipt_fields",
+                        lambda page, page_idx, *a, **kw: calls.append(page_idx) or original(page, page_idx, *a, **kw))
+    doc = open_document(mixed_pdf)
+    items = list(analyze_document(doc, mixed_pdf))
+    assert set(calls) == {0}
+    assert [item['page_idx'] for item in items] == [0, 0, 0, 1, 1, 1, 2, 2, 2]
+    text_items, scanned = items[:3], items[3:]
+    assert all(item['status'] != STATUS_SCANNED for item in text_items)
+    for item in scanned:
+        assert item['status'] == STATUS_SCANNED and item['bank'] == "abc"
+        assert (item['no'], item['amt'], item['date']) == ("未知编号", "0.00", "")
+    # 整页扫描件按切分得到的区域与文字页一致
+    for text_item, scanned_item in zip(text_items, scanned[:3]):
+        assert fitz.Rect(scanned_item['rect']).y0 == pytest.approx(fitz.Rect(text_item['rect']).y0, abs=12)
+    # 每张回单一张图片时按图片位置切分
+    assert [round(fitz.Rect(item['rect']).y0) for item in scanned[3:]] == [0, 281, 561]
+    assert len({item['content_hash'] for item in items}) == 9
+    doc.close()
+
+
+def test_classify_page(mixed_pdf):
+    doc = open_document(mixed_pdf)
+    assert classify_page(doc[0]) == (PAGE_TEXT, [])
+    page_type, image_rects = classify_page(doc[1])
+    assert page_type == PAGE_IMAGE and image_rects == [doc[1].rect]
+    assert classify_page(doc[2])[0] == PAGE_IMAGE and len(classify_page(doc[2])[1]) == 3
+    # 只有一个小图标、没有文字的页面不算扫描页
+    page = doc.new_page(width=595, height=842)
+    page.insert_image(fitz.Rect(0, 0, 100, 100), stream=_scan_of(doc[0]))
+    assert classify_page(page) == (PAGE_TEXT, [])
+    doc.close()
@@ -0,0 +1,65 @@
+"""
+整页扫描快速路径：与逐区域提取的结果一致，不能唯一确定的区域留给逐区域提取
+"""
+import fitz  # PyMuPDF
+import pytest
+
+from conftest import make_statement
+from receipt_core import analyze_document, find_receipt_rects, open_document, sweep_page_fields
+
+FIELDS = ("page_idx", "rect", "name", "no", "amt", "payer_name", "receiver_name", "status", "content_hash")
+
+
+def _analyze(path, fast_path):
+    doc = open_document(path)
+    try:
+        return [{field: item.get(field) for field in FIELDS}
+                for item in analyze_document(doc, path, fast_path=fast_path)]
+    finally:
+        doc.close()
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_fast_path_matches_per_region_extraction(tmp_path, seed):
+    path = str(tmp_path / f"statement_{seed}.pdf")
+    make_statement(path, pages=3, seed=seed)
+    fast = _analyze(path, fast_path=True)
+    slow = _analyze(path, fast_path=False)
+    assert len(fast) == 9
+    assert fast == slow
+
+
+def test_sweep_resolves_every_region(statement_pdf):
+    doc = open_document(statement_pdf)
+    try:
+        page = doc[0]
+        rects = find_receipt_rects(page)
+        swept = sweep_page_fields(page, rects)
+        items = [item for item in analyze_document(doc, statement_pdf, fast_path=False) if item["page_idx"] == 0]
+    finally:
+        doc.close()
+    assert sorted(swept) == [0, 1, 2]
+    assert [swept[idx]["no"] for idx in range(3)] == [item["no"] for item in items]
+    assert [swept[idx]["amt"] for idx in range(3)] == [item["amt"] for item in items]
+
+
+def test_ambiguous_region_left_to_per_region_extraction(statement_pdf):
+    doc = open_document(statement_pdf)
+    try:
+        page = doc[0]
+        rects = find_receipt_rects(page)
+        # 第一张回单中再出现一个"回单编号"，整页扫描无法唯一确定该区域的编号
+        page.insert_text((40, rects[0].y0 + 200), "回单编号：11112222333344445555", fontname="china-s", fontsize=9)
+        swept = sweep_page_fields(page, rects)
+    finally:
+        doc.close()
+    assert "no" not in swept.get(0, {})
+    assert "amt" in swept[0]
+    assert "no" in swept[1] and "no" in swept[2]
+
+
+def test_words_outside_regions_are_ignored():
+    doc = fitz.open()
+    page = doc.new_page(width=595, height=842)
+    page.insert_text((40, 30), "回单编号：12345678901234567890", fontname="china-s", fontsize=9)
+    assert sweep_page_fields(page, [fitz.Rect(0, 100, 595, 400)]) == {}